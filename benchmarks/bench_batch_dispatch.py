@@ -0,0 +1,123 @@
+'''
+File: bench_batch_dispatch.py
+Description: Compare the task launch speed of the single and the batch dispatch
+Date: 19/10/2026
+Author: Saurabh Badhwar <sbadhwar@redhat.com>
+
+Connects a set of agents subscribed to the same topic to a local bolt server
+and launches the tasks, first one by one through new_task and execute_task,
+then through submit_many and execute_many. The time is measured until every
+agent has received all the messages.
+
+Usage: python benchmarks/bench_batch_dispatch.py --tasks 20000 --agents 10
+'''
+import argparse
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SERVER_PORT = 15400
+TOPIC = 'bench'
+PLUGIN = 'Inventory'
+
+class BenchPluginLoader(object):
+    """Serve the structure of a single plugin without loading any plugins"""
+
+    def get_plugin_structure(self, name):
+        """Get the message structure of the plugin"""
+
+        if name != PLUGIN:
+            raise KeyError("The requested plugin is not loaded")
+        return {'index': 0, 'path': '/'}
+
+class Agent(object):
+    """A client counting the newline terminated messages it receives"""
+
+    def __init__(self, name):
+        """Connect the agent and start receiving"""
+
+        self.received = 0
+        self.conn = socket.create_connection(('127.0.0.1', SERVER_PORT))
+        self.conn.sendall('%s:%s' % (TOPIC, name))
+        thread = threading.Thread(target=self.receive)
+        thread.daemon = True
+        thread.start()
+
+    def receive(self):
+        """Count the received messages until the connection closes"""
+
+        while True:
+            data = self.conn.recv(1 << 20)
+            if not data:
+                return
+            self.received = self.received + data.count('\n')
+
+def wait_for(agents, expected):
+    """Wait until every agent has received the expected number of messages"""
+
+    while [agent for agent in agents if agent.received < expected] != []:
+        time.sleep(0.001)
+
+def run(tasks, agents):
+    """Run the benchmark
+
+    Returns:
+        Dict with the benchmark results
+    """
+
+    os.environ['BOLT_SERVER_PORT'] = str(SERVER_PORT)
+    os.environ['BOLT_TASK_COALESCE'] = '0'
+    from bolt_server.socket_handler import SocketHandler
+    from bolt_server.message_dispatcher import MessageDispatcher
+    from bolt_server.execution_engine import ExecutionEngine
+
+    server = SocketHandler()
+    engine = ExecutionEngine(MessageDispatcher(server), BenchPluginLoader())
+    time.sleep(0.2)
+    clients = [Agent('agent%d' % index) for index in range(agents)]
+    while len(server.client_list.get_clients(TOPIC)) < agents:
+        time.sleep(0.01)
+
+    start = time.time()
+    for index in range(tasks):
+        task_id = engine.new_task('single-%d' % index, PLUGIN, {'index': index}, [TOPIC])
+        engine.execute_task(task_id)
+    wait_for(clients, tasks)
+    single_seconds = time.time() - start
+
+    start = time.time()
+    task_ids = engine.submit_many([{
+        'task_name': 'batch-%d' % index,
+        'plugin_name': PLUGIN,
+        'task_params': {'index': index},
+        'task_topics': [TOPIC]
+    } for index in range(tasks)])
+    engine.execute_many(task_ids)
+    wait_for(clients, tasks * 2)
+    batch_seconds = time.time() - start
+
+    return {
+        'tasks': tasks,
+        'agents': agents,
+        'single_tasks_per_second': int(tasks / single_seconds),
+        'batch_tasks_per_second': int(tasks / batch_seconds),
+        'speedup': round(single_seconds / batch_seconds, 1)
+    }
+
+def main():
+    """Parse the arguments and run the benchmark"""
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tasks', type=int, default=20000)
+    parser.add_argument('--agents', type=int, default=10)
+    args = parser.parse_args()
+
+    print json.dumps(run(args.tasks, args.agents))
+
+if __name__ == '__main__':
+    main()
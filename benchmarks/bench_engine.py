@@ -0,0 +1,153 @@
+'''
+File: bench_engine.py
+Description: Measure the execution engine and the dispatcher without sockets
+Date: 19/10/2026
+Author: Saurabh Badhwar <sbadhwar@redhat.com>
+
+Runs the execution engine and the message dispatcher over the in-memory
+transport, with scripted agents replying after a seeded random latency on a
+virtual clock. The tasks are run anycast over the agents, keeping a window of
+tasks in flight, and the clock is advanced to the next reply whenever the
+window is full. As nothing depends on the wall clock or on the threads, the
+same arguments always lead to the same schedule: the virtual round trip
+percentiles and the virtual run time are stable, and the task throughput only
+measures the CPU time spent in the engine and the dispatcher.
+
+Usage: python benchmarks/bench_engine.py --agents 100 --tasks 50000 --window 1000
+'''
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bolt_server.memory_transport import MemorySocketHandler, FakeClient, VirtualClock
+
+TOPIC = 'engine'
+PLUGIN = 'Engine'
+
+class EnginePluginLoader(object):
+    """Serve the engine plugin without loading any plugins"""
+
+    def __init__(self, clock, submitted, latencies):
+        """Initialize the plugin loader"""
+
+        class EngineExecutor(object):
+            """Record the virtual round trips of the tasks"""
+
+            def handle(self, result, engine):
+                """Record the round trip of the task"""
+
+                latencies.append(clock() - submitted.pop(result['seq']))
+
+        self.executor = EngineExecutor
+
+    def get_plugin_structure(self, name):
+        """Get the message structure of the plugin"""
+
+        if name != PLUGIN:
+            raise KeyError("The requested plugin is not loaded")
+        return {'seq': 0}
+
+    def get_plugin_executor(self, name):
+        """Get the executor of the plugin"""
+
+        return self.executor
+
+def percentiles(values):
+    """Get the round trip percentiles in milliseconds
+
+    Returns: Dict
+    """
+
+    values = sorted(values)
+    result = {}
+    for name, percentile in (('p50', 50), ('p90', 90), ('p99', 99)):
+        result[name] = round(values[min(len(values) - 1, int(len(values) * percentile / 100.0))] * 1000, 3)
+    result['max'] = round(values[-1] * 1000, 3)
+    return result
+
+def run(agents, tasks, window, batch, latency, jitter, seed):
+    """Run the benchmark
+
+    Returns:
+        Dict with the benchmark results
+    """
+
+    os.environ['BOLT_TASK_COALESCE'] = '0'
+    from bolt_server.socket_handler import ClientSelector
+    from bolt_server.message_dispatcher import MessageDispatcher
+    from bolt_server.execution_engine import ExecutionEngine
+
+    rand = random.Random(seed)
+    clock = VirtualClock()
+    transport = MemorySocketHandler(clock)
+    for index in range(agents):
+        agent_latency = latency * (1 + rand.random())
+        transport.add_client(FakeClient('agent%d' % index, [TOPIC], None,
+                                        lambda payload, base=agent_latency: base + rand.expovariate(1.0 / jitter)
+                                        if jitter > 0 else base))
+
+    submitted = {}
+    latencies = []
+    engine = ExecutionEngine(MessageDispatcher(transport), EnginePluginLoader(clock, submitted, latencies))
+    engine.clock = clock
+
+    start = time.time()
+    sent = 0
+    while len(latencies) < tasks:
+        count = min(batch, tasks - sent, window - len(submitted))
+        if count > 0:
+            for seq in range(sent, sent + count):
+                submitted[seq] = clock()
+            task_ids = engine.submit_many([{
+                'task_name': 'engine-%d' % seq,
+                'plugin_name': PLUGIN,
+                'task_params': {'seq': seq},
+                'task_topics': [TOPIC],
+                'delivery': ClientSelector.DELIVERY_ROUND_ROBIN
+            } for seq in range(sent, sent + count)])
+            engine.execute_many(task_ids)
+            sent = sent + count
+        else:
+            clock.run_next()
+    seconds = time.time() - start
+
+    return {
+        'config': {
+            'agents': agents,
+            'tasks': tasks,
+            'window': window,
+            'batch': batch,
+            'latency_ms': latency * 1000,
+            'jitter_ms': jitter * 1000,
+            'seed': seed
+        },
+        'tasks_per_second': int(tasks / seconds),
+        'messages': transport.message_count,
+        'virtual_seconds': round(clock(), 3),
+        'virtual_tasks_per_second': int(tasks / clock()),
+        'virtual_round_trip_ms': percentiles(latencies)
+    }
+
+def main():
+    """Parse the arguments and run the benchmark"""
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--agents', type=int, default=100)
+    parser.add_argument('--tasks', type=int, default=50000)
+    parser.add_argument('--window', type=int, default=1000, help='The maximum number of tasks in flight')
+    parser.add_argument('--batch', type=int, default=100, help='The number of tasks submitted at once')
+    parser.add_argument('--latency', type=float, default=0.005, help='The base agent run time in seconds')
+    parser.add_argument('--jitter', type=float, default=0.001, help='The mean extra agent run time in seconds')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    print json.dumps(run(args.agents, args.tasks, args.window, min(args.batch, args.window),
+                         args.latency, args.jitter, args.seed))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+'''
+File: bench_federation.py
+Description: Measure the message routing throughput of a bolt server federation
+Date: 19/10/2026
+Author: Saurabh Badhwar <sbadhwar@redhat.com>
+
+Starts the requested number of federated nodes on localhost, connects a set of
+agents to every node, each node's agents subscribing to a topic of their own,
+and measures how fast the first node routes the messages sent round robin
+across the topics.
+
+Usage: python benchmarks/bench_federation.py --nodes 4 --messages 20000
+'''
+import argparse
+import json
+import multiprocessing
+import os
+import select
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SERVER_PORT = 15200
+FEDERATION_PORT = 15300
+
+def node_environment(index):
+    """Set up the environment for the node with the provided index
+
+    Keyword arguments:
+    index -- The index of the node
+
+    Returns:
+        String The node id of the node
+    """
+
+    os.environ['BOLT_SERVER_PORT'] = str(SERVER_PORT + index)
+    os.environ['BOLT_FEDERATION_PORT'] = str(FEDERATION_PORT + index)
+    return '127.0.0.1:%d' % (FEDERATION_PORT + index)
+
+def start_node(index, peers):
+    """Start a federated node
+
+    Keyword arguments:
+    index -- The index of the node
+    peers -- The node ids of all the nodes in the federation
+
+    Returns:
+        FederatedSocketHandler
+    """
+
+    from bolt_server.socket_handler import SocketHandler
+    from bolt_server.federation import FederatedSocketHandler
+
+    node_environment(index)
+    federation = FederatedSocketHandler(SocketHandler(), peers)
+    federation.register_handler(lambda message: None)
+    return federation
+
+def run_node(index, peers):
+    """Run a federated node until the process gets terminated"""
+
+    start_node(index, peers)
+    while True:
+        time.sleep(1)
+
+def connect_agents(nodes, agents):
+    """Connect the agents to every node
+
+    Keyword arguments:
+    nodes -- The number of nodes
+    agents -- The number of agents per node
+
+    Returns:
+        Dict {socket: topic}
+    """
+
+    connections = {}
+    for index in range(nodes):
+        topic = 'node%d' % index
+        for agent in range(agents):
+            while True:
+                try:
+                    conn = socket.create_connection(('127.0.0.1', SERVER_PORT + index))
+                    break
+                except socket.error:
+                    time.sleep(0.1)
+            conn.sendall('%s:agent-%d-%d' % (topic, index, agent))
+            connections[conn] = topic
+    return connections
+
+def run(nodes, agents, messages, size):
+    """Run the benchmark for a federation with the provided number of nodes
+
+    Returns:
+        Dict with the benchmark results
+    """
+
+    peers = ['127.0.0.1:%d' % (FEDERATION_PORT + index) for index in range(nodes)]
+    processes = []
+    for index in range(1, nodes):
+        process = multiprocessing.Process(target=run_node, args=(index, peers))
+        process.daemon = True
+        process.start()
+        processes.append(process)
+
+    origin = start_node(0, peers)
+    connections = connect_agents(nodes, agents)
+    topics = ['node%d' % index for index in range(nodes)]
+    while set(origin.get_topics()) != set(topics):
+        time.sleep(0.05)
+
+    packet = json.dumps({'id': 'bench', 'payload': 'x' * size})
+    expected = {}
+    for message in range(messages):
+        topic = topics[message % nodes]
+        expected[topic] = expected.get(topic, 0) + len(packet)
+    remaining = dict((conn, expected[topic]) for conn, topic in connections.items())
+
+    def send_messages():
+        for message in range(messages):
+            origin.send_message(topics[message % nodes], packet)
+
+    start = time.time()
+    sender = threading.Thread(target=send_messages)
+    sender.daemon = True
+    sender.start()
+
+    while remaining:
+        readable, _, _ = select.select(remaining.keys(), [], [], 10)
+        if readable == []:
+            break
+        for conn in readable:
+            remaining[conn] = remaining[conn] - len(conn.recv(1 << 20))
+            if remaining[conn] <= 0:
+                del remaining[conn]
+    elapsed = time.time() - start
+
+    for process in processes:
+        process.terminate()
+
+    return {
+        'nodes': nodes,
+        'agents_per_node': agents,
+        'messages': messages,
+        'seconds': round(elapsed, 3),
+        'messages_per_second': int(messages / elapsed),
+        'deliveries_per_second': int(messages * agents / elapsed),
+        'complete': remaining == {}
+    }
+
+def main():
+    """Parse the arguments and run the benchmark"""
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--nodes', type=int, default=1)
+    parser.add_argument('--agents', type=int, default=4)
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--size', type=int, default=256)
+    args = parser.parse_args()
+
+    print json.dumps(run(args.nodes, args.agents, args.messages, args.size))
+
+if __name__ == '__main__':
+    main()
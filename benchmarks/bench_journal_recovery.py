@@ -0,0 +1,92 @@
+'''
+File: bench_journal_recovery.py
+Description: Measure the task journal write and crash recovery speed
+Date: 19/10/2026
+Author: Saurabh Badhwar <sbadhwar@redhat.com>
+
+Writes a journal where every task goes through a submission, a message
+mapping and two status changes, then measures how long it takes to replay the
+journal and rebuild the TaskQueue and the message map.
+
+Usage: python benchmarks/bench_journal_recovery.py --records 1000000
+'''
+import argparse
+import gc
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bolt_server.execution_engine import TaskQueue
+from bolt_server.journal import TaskJournal
+
+def run(records, journal_dir):
+    """Run the benchmark
+
+    Keyword arguments:
+    records -- The number of journal records to write
+    journal_dir -- The directory to keep the journal in
+
+    Returns:
+        Dict with the benchmark results
+    """
+
+    journal = TaskJournal(journal_dir, snapshot_records=0)
+    tasks = records // 4
+    start = time.time()
+    for index in range(tasks):
+        task_id = hashlib.md5(str(index)).hexdigest()
+        journal.record_task(task_id, 'task-%d' % index, 'Inventory', {}, ['rhel8.x86_64'], None, None, None,
+                            TaskQueue.TASK_QUEUED, TaskQueue.PRIORITY_NORMAL, 'Inventory', None, None)
+        journal.record_message(hashlib.sha256(str(index)).hexdigest(), task_id)
+        journal.record_status(task_id, TaskQueue.TASK_RUNNING)
+        journal.record_status(task_id, TaskQueue.TASK_COMPLETE)
+    journal.close()
+    write_seconds = time.time() - start
+
+    journal = TaskJournal(journal_dir, snapshot_records=0)
+    start = time.time()
+    state = journal.replay()
+    replay_seconds = time.time() - start
+
+    gc.disable()
+    task_queue = TaskQueue()
+    task_queue.restore_tasks(state.tasks, state.statuses, state.decode_task)
+    message_map = dict(state.message_map)
+    gc.enable()
+    recovery_seconds = time.time() - start
+    journal.close()
+
+    assert len(task_queue.get_task_list()) == tasks
+    assert len(message_map) == tasks
+    assert task_queue.get_task_status(task_id) == TaskQueue.TASK_COMPLETE
+    assert task_queue.get_task(task_id)[1] == 'task-%d' % (tasks - 1)
+
+    return {
+        'records': tasks * 4,
+        'journal_bytes': os.path.getsize(os.path.join(journal_dir, TaskJournal.JOURNAL_FILE)),
+        'write_records_per_second': int(tasks * 4 / write_seconds),
+        'replay_seconds': round(replay_seconds, 3),
+        'recovery_seconds': round(recovery_seconds, 3)
+    }
+
+def main():
+    """Parse the arguments and run the benchmark"""
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--records', type=int, default=1000000)
+    args = parser.parse_args()
+
+    journal_dir = tempfile.mkdtemp()
+    try:
+        print json.dumps(run(args.records, journal_dir))
+    finally:
+        shutil.rmtree(journal_dir)
+
+if __name__ == '__main__':
+    main()
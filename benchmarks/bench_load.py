@@ -0,0 +1,355 @@
+'''
+File: bench_load.py
+Description: Load the bolt server with simulated agents and measure its capacity
+Date: 19/10/2026
+Author: Saurabh Badhwar <sbadhwar@redhat.com>
+
+Starts a bolt server (socket handler, message dispatcher and execution engine)
+in this process and spins up the simulated agents in one or more agent
+processes. Every agent process drives its agents from a single epoll loop:
+the agents connect, do the handshake subscribing to the load topic and reply
+to every task they receive after the configured latency, with a result of the
+configured size. The server runs the tasks anycast over the agents, keeping
+a window of tasks in flight, and the round trip of every task is measured
+from its submission until the plugin executor gets its result.
+
+Reports the task throughput, the round trip percentiles, and the CPU time
+and the memory (RSS) used by the server process. The results are written as
+JSON along with the configuration, so that the runs can be compared.
+
+Usage: python benchmarks/bench_load.py --agents 2000 --processes 4 --tasks 50000 --output load.json
+'''
+import argparse
+import heapq
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import select
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SERVER_PORT = 15800
+TOPIC = 'load'
+PLUGIN = 'Load'
+
+def raise_file_limit():
+    """Raise the open file limit to its maximum for the sockets"""
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+class AgentLoop(object):
+    """Drive a set of simulated agents from a single event loop
+
+    The agents split the received data into the newline terminated tasks and
+    reply to each of them once its latency has passed. The replies are
+    newline terminated as well.
+    """
+
+    def __init__(self, first, count, latency, jitter, result_size, seed):
+        """Initialize the agent loop
+
+        Keyword arguments:
+        first -- The index of the first agent
+        count -- The number of agents
+        latency -- The time in seconds an agent takes to run a task
+        jitter -- The mean of the exponential delay added to the latency
+        result_size -- The size of the result payload in bytes
+        seed -- The seed for the jitter
+        """
+
+        self.first = first
+        self.count = count
+        self.latency = latency
+        self.jitter = jitter
+        self.payload = 'x' * result_size
+        self.random = random.Random(seed)
+        self.poller = select.epoll()
+        #The connection, name and the unterminated data of every agent
+        self.agents = {}
+        #The pending replies, [(due time, sequence, fileno, reply)]
+        self.replies = []
+        self.sequence = 0
+
+    def connect(self):
+        """Connect the agents and do the handshake"""
+
+        for index in range(self.first, self.first + self.count):
+            conn = socket.create_connection(('127.0.0.1', SERVER_PORT))
+            name = 'agent%d' % index
+            conn.sendall('%s:%s' % (TOPIC, name))
+            conn.setblocking(False)
+            self.agents[conn.fileno()] = [conn, name, '']
+            self.poller.register(conn.fileno(), select.EPOLLIN)
+
+    def run(self):
+        """Receive the tasks and send the replies until the server closes"""
+
+        while self.agents:
+            timeout = -1
+            if self.replies:
+                timeout = max(0, self.replies[0][0] - time.time())
+            for fileno, event in self.poller.poll(timeout):
+                self.receive(fileno)
+
+            now = time.time()
+            while self.replies and self.replies[0][0] <= now:
+                due, sequence, fileno, reply = heapq.heappop(self.replies)
+                if fileno in self.agents:
+                    conn = self.agents[fileno][0]
+                    conn.setblocking(True)
+                    conn.sendall(reply)
+                    conn.setblocking(False)
+
+    def receive(self, fileno):
+        """Read the tasks sent to an agent and schedule the replies
+
+        Keyword arguments:
+        fileno -- The file descriptor of the agent connection
+        """
+
+        agent = self.agents[fileno]
+        try:
+            data = agent[0].recv(1 << 16)
+        except socket.error:
+            data = ''
+        if not data:
+            self.poller.unregister(fileno)
+            agent[0].close()
+            del self.agents[fileno]
+            return
+
+        messages = (agent[2] + data).split('\n')
+        agent[2] = messages.pop()
+        for message in messages:
+            packet = json.loads(message)
+            reply = json.dumps({
+                'id': packet['id'],
+                'result': {'seq': packet['payload']['seq'], 'data': self.payload},
+                'client': agent[1]
+            }) + '\n'
+            due = time.time() + self.latency
+            if self.jitter > 0:
+                due = due + self.random.expovariate(1.0 / self.jitter)
+            self.sequence = self.sequence + 1
+            heapq.heappush(self.replies, (due, self.sequence, fileno, reply))
+
+def run_agents(first, count, latency, jitter, result_size):
+    """Run a set of agents inside an agent process"""
+
+    raise_file_limit()
+    loop = AgentLoop(first, count, latency, jitter, result_size, first)
+    loop.connect()
+    loop.run()
+
+class LoadRecorder(object):
+    """Record the round trips of the tasks"""
+
+    def __init__(self):
+        """Initialize the recorder"""
+
+        self.submitted = {}
+        self.latencies = []
+        self.condition = threading.Condition()
+
+    def submit(self, seq):
+        """Record the submission of a task"""
+
+        self.submitted[seq] = time.time()
+
+    def complete(self, seq):
+        """Record the result of a task"""
+
+        with self.condition:
+            start = self.submitted.pop(seq, None)
+            if start is not None:
+                self.latencies.append(time.time() - start)
+            self.condition.notify()
+
+    def get_inflight(self):
+        """Get the number of tasks awaiting their result
+
+        Returns: Integer
+        """
+
+        return len(self.submitted)
+
+class LoadPluginLoader(object):
+    """Serve the load plugin without loading any plugins"""
+
+    def __init__(self, recorder):
+        """Initialize the plugin loader"""
+
+        class LoadExecutor(object):
+            """Record the results of the load tasks"""
+
+            def handle(self, result, engine):
+                """Record the round trip of the task"""
+
+                recorder.complete(result['seq'])
+
+        self.executor = LoadExecutor
+
+    def get_plugin_structure(self, name):
+        """Get the message structure of the plugin"""
+
+        if name != PLUGIN:
+            raise KeyError("The requested plugin is not loaded")
+        return {'seq': 0}
+
+    def get_plugin_executor(self, name):
+        """Get the executor of the plugin"""
+
+        return self.executor
+
+def get_memory():
+    """Get the current and the peak RSS of this process in MB
+
+    Returns:
+        Tuple (current, peak)
+    """
+
+    current = None
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    current = round(int(line.split()[1]) / 1024.0, 1)
+    except IOError:
+        pass
+    return current, round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1)
+
+def percentiles(values):
+    """Get the round trip percentiles in milliseconds
+
+    Returns: Dict
+    """
+
+    values = sorted(values)
+    result = {}
+    for name, percentile in (('p50', 50), ('p90', 90), ('p99', 99), ('p999', 99.9)):
+        result[name] = round(values[min(len(values) - 1, int(len(values) * percentile / 100.0))] * 1000, 2)
+    result['max'] = round(values[-1] * 1000, 2)
+    return result
+
+def run(agents, processes, tasks, window, batch, latency, jitter, result_size):
+    """Run the benchmark
+
+    Returns:
+        Dict with the benchmark results
+    """
+
+    raise_file_limit()
+    os.environ['BOLT_SERVER_PORT'] = str(SERVER_PORT)
+    os.environ['BOLT_TASK_COALESCE'] = '0'
+    from bolt_server.socket_handler import SocketHandler, ClientSelector
+    from bolt_server.message_dispatcher import MessageDispatcher
+    from bolt_server.execution_engine import ExecutionEngine
+
+    recorder = LoadRecorder()
+    server = SocketHandler()
+    engine = ExecutionEngine(MessageDispatcher(server), LoadPluginLoader(recorder))
+    time.sleep(0.2)
+
+    start = time.time()
+    workers = []
+    for process in range(processes):
+        first = agents * process // processes
+        count = agents * (process + 1) // processes - first
+        worker = multiprocessing.Process(target=run_agents, args=(first, count, latency, jitter, result_size))
+        worker.daemon = True
+        worker.start()
+        workers.append(worker)
+    while len(server.client_list.get_clients(TOPIC) or []) < agents:
+        time.sleep(0.01)
+    connect_seconds = time.time() - start
+
+    usage_start = resource.getrusage(resource.RUSAGE_SELF)
+    start = time.time()
+    submitted = 0
+    while len(recorder.latencies) < tasks:
+        with recorder.condition:
+            while recorder.get_inflight() > window - batch:
+                recorder.condition.wait(0.1)
+
+        count = min(batch, tasks - submitted)
+        if count > 0:
+            for seq in range(submitted, submitted + count):
+                recorder.submit(seq)
+            task_ids = engine.submit_many([{
+                'task_name': 'load-%d' % seq,
+                'plugin_name': PLUGIN,
+                'task_params': {'seq': seq},
+                'task_topics': [TOPIC],
+                'delivery': ClientSelector.DELIVERY_ROUND_ROBIN
+            } for seq in range(submitted, submitted + count)])
+            engine.execute_many(task_ids)
+            submitted = submitted + count
+        elif recorder.get_inflight() > 0:
+            with recorder.condition:
+                recorder.condition.wait(0.1)
+    seconds = time.time() - start
+    usage_end = resource.getrusage(resource.RUSAGE_SELF)
+
+    cpu_seconds = (usage_end.ru_utime - usage_start.ru_utime) + (usage_end.ru_stime - usage_start.ru_stime)
+    rss, peak_rss = get_memory()
+    for worker in workers:
+        worker.terminate()
+        worker.join()
+    #Let the receivers see the agents disconnect before exiting
+    time.sleep(0.5)
+
+    return {
+        'config': {
+            'agents': agents,
+            'processes': processes,
+            'tasks': tasks,
+            'window': window,
+            'batch': batch,
+            'latency_ms': latency * 1000,
+            'jitter_ms': jitter * 1000,
+            'result_size': result_size
+        },
+        'host': {'platform': platform.platform(), 'cpus': multiprocessing.cpu_count()},
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'connect_seconds': round(connect_seconds, 2),
+        'tasks_per_second': int(tasks / seconds),
+        'round_trip_ms': percentiles(recorder.latencies),
+        'server_cpu_seconds': round(cpu_seconds, 2),
+        'server_cpu_percent': round(cpu_seconds / seconds * 100, 1),
+        'server_rss_mb': rss,
+        'server_peak_rss_mb': peak_rss
+    }
+
+def main():
+    """Parse the arguments and run the benchmark"""
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--agents', type=int, default=1000)
+    parser.add_argument('--processes', type=int, default=2)
+    parser.add_argument('--tasks', type=int, default=20000)
+    parser.add_argument('--window', type=int, default=1000, help='The maximum number of tasks in flight')
+    parser.add_argument('--batch', type=int, default=100, help='The number of tasks submitted at once')
+    parser.add_argument('--latency', type=float, default=0.005, help='The agent run time in seconds')
+    parser.add_argument('--jitter', type=float, default=0.0, help='The mean extra agent run time in seconds')
+    parser.add_argument('--result-size', type=int, default=256, help='The result payload size in bytes')
+    parser.add_argument('--output', help='The file to write the results to')
+    args = parser.parse_args()
+
+    result = run(args.agents, args.processes, args.tasks, args.window, min(args.batch, args.window),
+                 args.latency, args.jitter, args.result_size)
+    if args.output is not None:
+        with open(args.output, 'w') as output:
+            json.dump(result, output, indent=2, sort_keys=True)
+    print json.dumps(result)
+
+if __name__ == '__main__':
+    main()
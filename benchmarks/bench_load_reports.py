@@ -0,0 +1,173 @@
+'''
+File: bench_load_reports.py
+Description: Compare the anycast delivery modes over agents of mixed capacity
+Date: 19/10/2026
+Author: Saurabh Badhwar <sbadhwar@redhat.com>
+
+Runs the execution engine over the in-memory transport with scripted agents
+of mixed hardware: every agent runs a seeded number of tasks at once and
+takes a seeded time per task, the tasks beyond its capacity wait on the agent
+for a free slot. The agents piggyback their load on their replies. The tasks
+arrive at a seeded random rate, a share of the capacity of the whole fleet,
+and are run with each of the anycast delivery modes in turn, the tasks the
+least loaded delivery defers are retried as the replies come in.
+
+Reports the virtual round trip percentiles, from the arrival of a task until
+its result is handled, and the virtual run time for every delivery mode. As
+everything runs on a virtual clock, the same arguments always give the same
+results.
+
+Usage: python benchmarks/bench_load_reports.py --agents 100 --tasks 20000 --load 0.8
+'''
+import argparse
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bolt_server.memory_transport import MemorySocketHandler, FakeClient, VirtualClock
+
+TOPIC = 'fleet'
+PLUGIN = 'Fleet'
+CAPACITIES = (1, 2, 4, 8)
+
+class FleetPluginLoader(object):
+    """Serve the fleet plugin without loading any plugins"""
+
+    def __init__(self, clock, submitted, latencies):
+        """Initialize the plugin loader"""
+
+        class FleetExecutor(object):
+            """Record the virtual round trips of the tasks"""
+
+            def handle(self, result, engine):
+                """Record the round trip of the task"""
+
+                latencies.append(clock() - submitted.pop(result['seq']))
+
+        self.executor = FleetExecutor
+
+    def get_plugin_structure(self, name):
+        """Get the message structure of the plugin"""
+
+        if name != PLUGIN:
+            raise KeyError("The requested plugin is not loaded")
+        return {'seq': 0}
+
+    def get_plugin_executor(self, name):
+        """Get the executor of the plugin"""
+
+        return self.executor
+
+def percentiles(values):
+    """Get the round trip percentiles in milliseconds
+
+    Returns: Dict
+    """
+
+    values = sorted(values)
+    result = {}
+    for name, percentile in (('p50', 50), ('p90', 90), ('p99', 99)):
+        result[name] = round(values[min(len(values) - 1, int(len(values) * percentile / 100.0))] * 1000, 3)
+    result['max'] = round(values[-1] * 1000, 3)
+    return result
+
+def run_mode(agents, tasks, load, latency, seed, delivery):
+    """Run the tasks with a delivery mode
+
+    Returns:
+        Dict with the results of the delivery mode
+    """
+
+    from bolt_server.message_dispatcher import MessageDispatcher
+    from bolt_server.execution_engine import ExecutionEngine
+
+    rand = random.Random(seed)
+    clock = VirtualClock()
+    transport = MemorySocketHandler(clock)
+    #Until they report, the agents are assumed to run a single task at once
+    transport.client_selector.load_table.capacity = 1
+    fleet_rate = 0.0
+    for index in range(agents):
+        capacity = rand.choice(CAPACITIES)
+        agent_latency = latency * (1 + 3 * rand.random())
+        fleet_rate = fleet_rate + capacity / agent_latency
+        transport.add_client(FakeClient('agent%d' % index, [TOPIC], None, agent_latency, capacity))
+
+    submitted = {}
+    latencies = []
+    engine = ExecutionEngine(MessageDispatcher(transport), FleetPluginLoader(clock, submitted, latencies))
+    engine.clock = clock
+
+    arrival = 0.0
+    sent = 0
+    pending = []
+    while len(latencies) < tasks:
+        due = clock.get_next()
+        if sent < tasks and (due is None or arrival <= due):
+            clock.advance_to(arrival)
+            submitted[sent] = clock()
+            pending.extend(engine.submit_many([{
+                'task_name': 'fleet-%d' % sent,
+                'plugin_name': PLUGIN,
+                'task_params': {'seq': sent},
+                'task_topics': [TOPIC],
+                'delivery': delivery
+            }]))
+            sent = sent + 1
+            arrival = arrival + rand.expovariate(fleet_rate * load)
+        else:
+            clock.run_next()
+
+        if pending != []:
+            executed = engine.execute_many(pending)
+            pending = [task_id for task_id, done in zip(pending, executed) if not done]
+
+    return {
+        'virtual_seconds': round(clock(), 3),
+        'virtual_tasks_per_second': int(tasks / clock()),
+        'virtual_round_trip_ms': percentiles(latencies),
+        'fleet_tasks_per_second': int(fleet_rate)
+    }
+
+def run(agents, tasks, load, latency, seed):
+    """Run the benchmark
+
+    Returns:
+        Dict with the benchmark results
+    """
+
+    os.environ['BOLT_TASK_COALESCE'] = '0'
+    from bolt_server.socket_handler import ClientSelector
+
+    modes = (('round_robin', ClientSelector.DELIVERY_ROUND_ROBIN),
+             ('least_outstanding', ClientSelector.DELIVERY_LEAST_OUTSTANDING),
+             ('least_loaded', ClientSelector.DELIVERY_LEAST_LOADED))
+    return {
+        'config': {
+            'agents': agents,
+            'tasks': tasks,
+            'load': load,
+            'latency_ms': latency * 1000,
+            'seed': seed
+        },
+        'modes': dict((name, run_mode(agents, tasks, load, latency, seed, delivery)) for name, delivery in modes)
+    }
+
+def main():
+    """Parse the arguments and run the benchmark"""
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--agents', type=int, default=100)
+    parser.add_argument('--tasks', type=int, default=20000)
+    parser.add_argument('--load', type=float, default=0.8, help='The task arrival rate as a share of the fleet capacity')
+    parser.add_argument('--latency', type=float, default=0.01, help='The base agent run time of a task in seconds')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    print json.dumps(run(args.agents, args.tasks, args.load, args.latency, args.seed))
+
+if __name__ == '__main__':
+    main()
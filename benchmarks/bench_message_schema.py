@@ -0,0 +1,92 @@
+'''
+File: bench_message_schema.py
+Description: Measure the message validation and packet building speed
+Date: 19/10/2026
+Author: Saurabh Badhwar <sbadhwar@redhat.com>
+
+Registers a message with a large structure and measures how many sets of
+params per second are validated, and how many packets per second are built,
+by the compiled MessageSchema. The previous approach, scanning the structure
+keys for every param and building the packet from the updated structure, is
+measured for comparison.
+
+Usage: python benchmarks/bench_message_schema.py --fields 200 --params 10
+'''
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bolt_server.message_dispatcher.structures import MessageSchema
+
+def scan_validate(message_structure, params):
+    """Validate the params by scanning the structure keys"""
+
+    for key in params.keys():
+        if key not in message_structure.keys():
+            raise KeyError("Parameter mismatch in message structure and provided params")
+
+def scan_build(message_structure, params):
+    """Build the packet by validating and updating the structure"""
+
+    for key in params.keys():
+        if key not in message_structure.keys():
+            raise KeyError("Parameter mismatch in message structure and provided params")
+        else:
+            message_structure[key] = params[key]
+    message_id = hashlib.sha256(str(message_structure)).hexdigest()
+    return (message_id, json.dumps({'id': message_id, 'payload': message_structure}))
+
+def rate(count, function, *args):
+    """Measure the number of calls per second
+
+    Returns: Integer
+    """
+
+    start = time.time()
+    for index in xrange(count):
+        function(*args)
+    return int(count / (time.time() - start))
+
+def run(fields, params, count):
+    """Run the benchmark
+
+    Returns:
+        Dict with the benchmark results
+    """
+
+    message_structure = dict(('field_%d' % index, 'default value %d' % index) for index in range(fields))
+    message_params = dict(('field_%d' % index, 'value %d' % index) for index in range(0, fields, fields // params))
+    schema = MessageSchema(message_structure)
+
+    packet = json.loads(schema.build(message_params)[1])['payload']
+    expected = dict(message_structure)
+    expected.update(message_params)
+    assert packet == expected
+
+    return {
+        'fields': fields,
+        'params': len(message_params),
+        'scan_validations_per_second': rate(count // 10, scan_validate, message_structure, message_params),
+        'schema_validations_per_second': rate(count, schema.validate, message_params),
+        'scan_builds_per_second': rate(count // 10, scan_build, dict(message_structure), message_params),
+        'schema_builds_per_second': rate(count // 10, schema.build, message_params)
+    }
+
+def main():
+    """Parse the arguments and run the benchmark"""
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--fields', type=int, default=200)
+    parser.add_argument('--params', type=int, default=10)
+    parser.add_argument('--count', type=int, default=100000)
+    args = parser.parse_args()
+
+    print json.dumps(run(args.fields, args.params, args.count))
+
+if __name__ == '__main__':
+    main()
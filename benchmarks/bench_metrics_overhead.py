@@ -0,0 +1,144 @@
+'''
+File: bench_metrics_overhead.py
+Description: Measure the overhead of the metrics on the message sending path
+Date: 19/10/2026
+Author: Saurabh Badhwar <sbadhwar@redhat.com>
+
+Starts two local bolt servers, one with the metrics enabled and one with them
+disabled, each with an agent connected, and sends the messages through the
+MessageDispatcher until the agent has received all of them. The rounds on the
+two servers are alternated and the best round of each is compared. The cost
+of the single metric updates is measured as well, which gives a steadier
+estimate of the overhead than the noisy difference of the rounds.
+
+Usage: python benchmarks/bench_metrics_overhead.py --messages 20000 --rounds 10
+'''
+import argparse
+import functools
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SERVER_PORT = 15700
+TOPIC = 'bench'
+COUNTERS_PER_MESSAGE = 2
+
+class Agent(object):
+    """A client counting the newline terminated messages it receives"""
+
+    def __init__(self, port):
+        """Connect the agent and start receiving"""
+
+        self.received = 0
+        self.conn = socket.create_connection(('127.0.0.1', port))
+        self.conn.sendall('%s:agent%d' % (TOPIC, port))
+        thread = threading.Thread(target=self.receive)
+        thread.daemon = True
+        thread.start()
+
+    def receive(self):
+        """Count the received messages until the connection closes"""
+
+        while True:
+            data = self.conn.recv(1 << 20)
+            if not data:
+                return
+            self.received = self.received + data.count('\n')
+
+def start_server(port, enabled):
+    """Start a bolt server with the metrics enabled or disabled
+
+    Returns:
+        Tuple (MessageDispatcher, Agent)
+    """
+
+    from bolt_server.metrics import MetricsRegistry, set_registry
+    from bolt_server.socket_handler import SocketHandler
+    from bolt_server.message_dispatcher import MessageDispatcher
+
+    set_registry(MetricsRegistry(enabled))
+    os.environ['BOLT_SERVER_PORT'] = str(port)
+    server = SocketHandler()
+    dispatcher = MessageDispatcher(server)
+    dispatcher.register_message('bench', {'index': 0, 'path': '/'}, [TOPIC])
+    time.sleep(0.2)
+    agent = Agent(port)
+    while not server.client_list.get_clients(TOPIC):
+        time.sleep(0.01)
+    return dispatcher, agent
+
+def send_round(dispatcher, agent, messages):
+    """Send the messages and wait for the agent to receive them
+
+    Returns: Float seconds
+    """
+
+    expected = agent.received + messages
+    start = time.time()
+    for index in xrange(messages):
+        dispatcher.send_message('bench', {'index': index})
+    while agent.received < expected:
+        time.sleep(0.0005)
+    return time.time() - start
+
+def update_cost(update, count):
+    """Measure the cost of a metric update in nanoseconds
+
+    Returns: Integer
+    """
+
+    start = time.time()
+    for index in xrange(count):
+        update()
+    return int((time.time() - start) / count * 1e9)
+
+def run(messages, rounds):
+    """Run the benchmark
+
+    Returns:
+        Dict with the benchmark results
+    """
+
+    from bolt_server.metrics import MetricsRegistry
+
+    enabled = start_server(SERVER_PORT, True)
+    disabled = start_server(SERVER_PORT + 1, False)
+
+    enabled_times = []
+    disabled_times = []
+    for index in range(rounds):
+        disabled_times.append(send_round(disabled[0], disabled[1], messages))
+        enabled_times.append(send_round(enabled[0], enabled[1], messages))
+
+    registry = MetricsRegistry()
+    counter_cost = update_cost(registry.counter('bench_total', 'Bench').increment, 200000)
+    return {
+        'messages': messages,
+        'disabled_messages_per_second': int(messages / min(disabled_times)),
+        'enabled_messages_per_second': int(messages / min(enabled_times)),
+        'overhead_percent': round((min(enabled_times) / min(disabled_times) - 1) * 100, 2),
+        #A sent message increments the dispatcher and the socket counters
+        'estimated_overhead_percent': round(COUNTERS_PER_MESSAGE * counter_cost * 1e-9 /
+                                            (min(disabled_times) / messages) * 100, 2),
+        'counter_increment_ns': counter_cost,
+        'histogram_observe_ns': update_cost(functools.partial(registry.histogram('bench_seconds', 'Bench').observe,
+                                                              0.001), 200000)
+    }
+
+def main():
+    """Parse the arguments and run the benchmark"""
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--rounds', type=int, default=10)
+    args = parser.parse_args()
+
+    print json.dumps(run(args.messages, args.rounds))
+
+if __name__ == '__main__':
+    main()
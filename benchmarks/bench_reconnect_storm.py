@@ -0,0 +1,166 @@
+'''
+File: bench_reconnect_storm.py
+Description: Measure how the bolt server copes with a reconnect storm
+Date: 19/10/2026
+Author: Saurabh Badhwar <sbadhwar@redhat.com>
+
+Starts a bolt server in this process and connects all the agents at once
+from the agent processes, as after a mass agent restart. A number of silent
+clients connect first and never send their handshake. The agents follow the
+retry hints of the server: a shed agent reconnects once the hinted time has
+passed.
+
+Reports the time until every agent is connected, the number of connections
+shed and of connection attempts, and the handshakes dropped on timeout, for
+the admission limits given.
+
+Usage: python benchmarks/bench_reconnect_storm.py --agents 2000 --accept-rate 1000 --max-connections 0
+'''
+import argparse
+import heapq
+import json
+import multiprocessing
+import os
+import resource
+import select
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SERVER_PORT = 16000
+TOPIC = 'storm'
+
+def raise_file_limit():
+    """Raise the open file limit to its maximum for the sockets"""
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+def run_agents(first, count, attempts):
+    """Connect a set of agents, reconnecting the shed ones as hinted
+
+    Keyword arguments:
+    first -- The index of the first agent
+    count -- The number of agents
+    attempts -- The shared counter of the connection attempts
+    """
+
+    raise_file_limit()
+    poller = select.epoll()
+    conns = {}
+    #The agents to (re)connect, [(due time, index)]
+    pending = [(0, index) for index in range(first, first + count)]
+    while pending or conns:
+        now = time.time()
+        while pending and pending[0][0] <= now:
+            index = heapq.heappop(pending)[1]
+            with attempts.get_lock():
+                attempts.value = attempts.value + 1
+            try:
+                conn = socket.create_connection(('127.0.0.1', SERVER_PORT))
+                conn.sendall('%s:agent%d' % (TOPIC, index))
+            except socket.error:
+                heapq.heappush(pending, (now + 0.1, index))
+                continue
+            conns[conn.fileno()] = (conn, index)
+            poller.register(conn.fileno(), select.EPOLLIN)
+
+        timeout = 0.1
+        if pending:
+            timeout = max(0, min(timeout, pending[0][0] - time.time()))
+        for fileno, event in poller.poll(timeout):
+            conn, index = conns[fileno]
+            try:
+                data = conn.recv(1000)
+            except socket.error:
+                data = ''
+            retry_after = 0.1
+            if data:
+                try:
+                    retry_after = json.loads(data.split('\n')[0])['retry_after']
+                except (ValueError, KeyError):
+                    continue
+            poller.unregister(fileno)
+            del conns[fileno]
+            conn.close()
+            heapq.heappush(pending, (time.time() + retry_after, index))
+
+def run(agents, processes, silent, accept_rate, max_connections):
+    """Run the benchmark
+
+    Returns:
+        Dict with the benchmark results
+    """
+
+    raise_file_limit()
+    os.environ['BOLT_SERVER_PORT'] = str(SERVER_PORT)
+    os.environ['BOLT_ACCEPT_RATE'] = str(accept_rate)
+    os.environ['BOLT_MAX_CONNECTIONS'] = str(max_connections)
+    os.environ['BOLT_HANDSHAKE_TIMEOUT'] = '1'
+    from bolt_server.socket_handler import SocketHandler
+    from bolt_server.metrics import get_registry
+
+    server = SocketHandler()
+    time.sleep(0.2)
+    silent_clients = [socket.create_connection(('127.0.0.1', SERVER_PORT)) for index in range(silent)]
+
+    attempts = multiprocessing.Value('l', 0)
+    start = time.time()
+    workers = []
+    for process in range(processes):
+        first = agents * process // processes
+        count = agents * (process + 1) // processes - first
+        worker = multiprocessing.Process(target=run_agents, args=(first, count, attempts))
+        worker.daemon = True
+        worker.start()
+        workers.append(worker)
+    while len(server.client_list.get_clients(TOPIC) or []) < agents:
+        time.sleep(0.005)
+    seconds = time.time() - start
+
+    registry = get_registry()
+    shed = dict((reason, registry.counter('bolt_socket_shed_total', 'Connections shed', {'reason': reason})
+                 .get_value()) for reason in ('rate', 'connections'))
+    timeouts = registry.counter('bolt_socket_handshake_failures_total', 'Connections dropped in the handshake',
+                                {'reason': 'timeout'}).get_value()
+    for worker in workers:
+        worker.terminate()
+        worker.join()
+    for conn in silent_clients:
+        conn.close()
+    #Let the receivers see the agents disconnect before exiting
+    time.sleep(0.5)
+
+    return {
+        'config': {
+            'agents': agents,
+            'processes': processes,
+            'silent_clients': silent,
+            'accept_rate': accept_rate,
+            'max_connections': max_connections
+        },
+        'connect_seconds': round(seconds, 2),
+        'connects_per_second': int(agents / seconds),
+        'attempts': attempts.value,
+        'shed': shed,
+        'handshake_timeouts': timeouts
+    }
+
+def main():
+    """Parse the arguments and run the benchmark"""
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--agents', type=int, default=2000)
+    parser.add_argument('--processes', type=int, default=2)
+    parser.add_argument('--silent', type=int, default=20, help='The clients which never send the handshake')
+    parser.add_argument('--accept-rate', type=float, default=1000, help='The accepted connections per second')
+    parser.add_argument('--max-connections', type=int, default=0)
+    args = parser.parse_args()
+
+    print json.dumps(run(args.agents, args.processes, args.silent, args.accept_rate, args.max_connections))
+
+if __name__ == '__main__':
+    main()
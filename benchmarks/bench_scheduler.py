@@ -0,0 +1,178 @@
+'''
+File: bench_scheduler.py
+Description: Simulate the task dispatch order under load and report the queue wait
+Date: 19/10/2026
+Author: Saurabh Badhwar <sbadhwar@redhat.com>
+
+Simulates an execution engine with a fixed number of running task slots. At
+the start a low priority batch and a normal priority bulk submission are
+queued, while a few tenants keep submitting normal priority tasks and an
+operator submits urgent ones. The simulation is run once dispatching in the
+submission order and once through the TaskScheduler, and reports the p50/p99
+queue wait (in simulated seconds) by priority class and by tenant.
+
+Usage: python benchmarks/bench_scheduler.py --batch 20000 --duration 600
+'''
+import argparse
+import collections
+import heapq
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bolt_server.execution_engine import TaskQueue, TaskScheduler
+
+PRIORITY_NAMES = {
+    TaskQueue.PRIORITY_HIGH: 'high',
+    TaskQueue.PRIORITY_NORMAL: 'normal',
+    TaskQueue.PRIORITY_LOW: 'low'
+}
+
+class FifoScheduler(object):
+    """Dispatch the ready tasks in their submission order"""
+
+    def __init__(self):
+        """Initialize the scheduler"""
+
+        self.queue = collections.deque()
+
+    def add_task(self, task_id, priority, tenant):
+        """Add a ready task"""
+
+        self.queue.append(task_id)
+
+    def next_task(self):
+        """Get the next task to be dispatched"""
+
+        if self.queue:
+            return self.queue.popleft()
+        return None
+
+def make_workload(rand, batch, bulk, duration):
+    """Generate the task arrivals
+
+    Keyword arguments:
+    rand -- The random number generator
+    batch -- The size of the low priority batch queued at the start
+    bulk -- The size of the normal priority bulk submission queued at the start
+    duration -- The time in seconds the steady submissions last for
+
+    Returns:
+        List of (arrival, priority, tenant) sorted by the arrival
+    """
+
+    tasks = [(0.0, TaskQueue.PRIORITY_LOW, 'batch')] * batch
+    tasks.extend([(0.0, TaskQueue.PRIORITY_NORMAL, 'bulk')] * bulk)
+
+    steady = [('ops', TaskQueue.PRIORITY_HIGH, 0.5)]
+    steady.extend([('team%d' % team, TaskQueue.PRIORITY_NORMAL, 1.0) for team in range(4)])
+    for tenant, priority, rate in steady:
+        arrival = rand.expovariate(rate)
+        while arrival < duration:
+            tasks.append((arrival, priority, tenant))
+            arrival = arrival + rand.expovariate(rate)
+
+    tasks.sort(key=lambda task: task[0])
+    return tasks
+
+def simulate(scheduler, tasks, slots, service_time, seed):
+    """Run the dispatch simulation
+
+    Keyword arguments:
+    scheduler -- The scheduler deciding the dispatch order
+    tasks -- The task arrivals
+    slots -- The number of tasks which can run at once
+    service_time -- The mean task run time in seconds
+    seed -- The seed for the task run times
+
+    Returns:
+        Dict {task_id: queue wait}
+    """
+
+    rand = random.Random(seed)
+    completions = []
+    waits = {}
+    now = 0.0
+    index = 0
+
+    while index < len(tasks) or completions or len(waits) < len(tasks):
+        next_arrival = tasks[index][0] if index < len(tasks) else None
+        if completions and (next_arrival is None or completions[0] <= next_arrival):
+            now = heapq.heappop(completions)
+        else:
+            now = next_arrival
+            while index < len(tasks) and tasks[index][0] <= now:
+                scheduler.add_task(index, tasks[index][1], tasks[index][2])
+                index = index + 1
+
+        while len(completions) < slots:
+            task_id = scheduler.next_task()
+            if task_id is None:
+                break
+            waits[task_id] = now - tasks[task_id][0]
+            heapq.heappush(completions, now + rand.expovariate(1.0 / service_time))
+
+    return waits
+
+def percentiles(values):
+    """Get the p50 and p99 of the values
+
+    Returns: Dict
+    """
+
+    values = sorted(values)
+    return {
+        'p50': round(values[len(values) // 2], 2),
+        'p99': round(values[min(len(values) - 1, int(len(values) * 0.99))], 2)
+    }
+
+def summarize(tasks, waits):
+    """Summarize the queue waits by priority class and by tenant
+
+    Returns: Dict
+    """
+
+    by_priority = collections.defaultdict(list)
+    by_tenant = collections.defaultdict(list)
+    for task_id, wait in waits.iteritems():
+        by_priority[PRIORITY_NAMES[tasks[task_id][1]]].append(wait)
+        by_tenant[tasks[task_id][2]].append(wait)
+
+    return {
+        'priority': dict((name, percentiles(values)) for name, values in by_priority.iteritems()),
+        'tenant': dict((name, percentiles(values)) for name, values in by_tenant.iteritems())
+    }
+
+def run(batch, bulk, duration, slots, service_time):
+    """Run the benchmark
+
+    Returns:
+        Dict with the benchmark results
+    """
+
+    tasks = make_workload(random.Random(42), batch, bulk, duration)
+    return {
+        'tasks': len(tasks),
+        'slots': slots,
+        'fifo': summarize(tasks, simulate(FifoScheduler(), tasks, slots, service_time, 7)),
+        'scheduler': summarize(tasks, simulate(TaskScheduler(), tasks, slots, service_time, 7))
+    }
+
+def main():
+    """Parse the arguments and run the benchmark"""
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--batch', type=int, default=20000)
+    parser.add_argument('--bulk', type=int, default=2000)
+    parser.add_argument('--duration', type=float, default=600)
+    parser.add_argument('--slots', type=int, default=8)
+    parser.add_argument('--service-time', type=float, default=1.0)
+    args = parser.parse_args()
+
+    print json.dumps(run(args.batch, args.bulk, args.duration, args.slots, args.service_time))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+'''
+File: bench_shards.py
+Description: Compare the fan out throughput of a single shard and of multiple shards
+Date: 19/10/2026
+Author: Saurabh Badhwar <sbadhwar@redhat.com>
+
+Starts the ShardedSocketHandler with a single shard and then with the given
+number of shards, and connects the same number of clients to each, held by
+agent processes of their own so that the clients don't compete with the
+shards for the interpreter. The supervisor sends the messages on a topic all
+the clients subscribe to, so every shard writes every message to each of its
+clients, and the agents count the messages they receive.
+
+Reports the messages delivered per second and the time taken for every shard
+count, along with the speedup of the multiple shards. The shards only scale
+as far as the host has the cores to run them.
+
+Usage: python benchmarks/bench_shards.py --shards 4 --clients 64 --messages 2000
+'''
+import argparse
+import json
+import multiprocessing
+import os
+import select
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SERVER_PORT = 15700
+TOPIC = 'bench'
+
+def run_agents(port, clients, messages, ready, results):
+    """Connect the clients of an agent process and count their messages
+
+    Keyword arguments:
+    port -- The port the shards listen on
+    clients -- The number of clients to connect
+    messages -- The number of messages every client waits for
+    ready -- The queue to report the connected clients on
+    results -- The queue to report the time of the last message on
+    """
+
+    conns = []
+    for index in range(clients):
+        for attempt in range(500):
+            conn = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            if conn.connect_ex(('127.0.0.1', port)) == 0:
+                break
+            conn.close()
+            time.sleep(0.01)
+        conn.sendall('%s:agent%d-%d' % (TOPIC, os.getpid(), index))
+        conns.append(conn)
+    ready.put(clients)
+
+    counts = dict((conn, 0) for conn in conns)
+    last = None
+    deadline = time.time() + 120
+    while counts != {} and time.time() < deadline:
+        readable = select.select(counts.keys(), [], [], 1)[0]
+        for conn in readable:
+            data = conn.recv(1 << 16)
+            if not data:
+                del counts[conn]
+                continue
+            counts[conn] = counts[conn] + data.count('\n')
+            if counts[conn] >= messages:
+                del counts[conn]
+            last = time.time()
+    results.put((clients - len(counts), last))
+    for conn in conns:
+        conn.close()
+
+def run_shards(shards, port, clients, agents, messages, size):
+    """Measure the fan out with a number of shards
+
+    Returns:
+        Dict with the results of the shard count
+    """
+
+    os.environ['BOLT_SERVER_PORT'] = str(port)
+    from bolt_server.shard_handler import ShardedSocketHandler
+
+    handler = ShardedSocketHandler(shards)
+    ready = multiprocessing.Queue()
+    results = multiprocessing.Queue()
+    processes = []
+    for agent in range(agents):
+        count = clients // agents + (1 if agent < clients % agents else 0)
+        process = multiprocessing.Process(target=run_agents, args=(port, count, messages, ready, results))
+        process.daemon = True
+        process.start()
+        processes.append(process)
+
+    try:
+        for process in processes:
+            ready.get(timeout=60)
+        #Let the shards finish the handshakes of the clients
+        while TOPIC not in handler.get_topics():
+            time.sleep(0.01)
+        time.sleep(0.5)
+
+        payload = json.dumps({'id': 'x', 'payload': {'data': 'x' * size}})
+        start = time.time()
+        for index in range(messages):
+            handler.send_message(TOPIC, payload)
+        send_seconds = time.time() - start
+
+        completed = 0
+        last = start
+        for process in processes:
+            done, finished = results.get(timeout=180)
+            completed = completed + done
+            if finished is not None:
+                last = max(last, finished)
+        for process in processes:
+            process.join()
+    finally:
+        handler.stop_listening()
+
+    seconds = last - start
+    return {
+        'clients_completed': completed,
+        'seconds': round(seconds, 3),
+        'send_seconds': round(send_seconds, 3),
+        'delivered_per_second': int(completed * messages / seconds) if seconds > 0 else None
+    }
+
+def run(shards, clients, agents, messages, size):
+    """Run the benchmark
+
+    Returns:
+        Dict with the benchmark results
+    """
+
+    single = run_shards(1, SERVER_PORT, clients, agents, messages, size)
+    multiple = run_shards(shards, SERVER_PORT + 1, clients, agents, messages, size)
+    speedup = None
+    if single['delivered_per_second'] and multiple['delivered_per_second']:
+        speedup = round(float(multiple['delivered_per_second']) / single['delivered_per_second'], 2)
+
+    return {
+        'config': {
+            'shards': shards,
+            'clients': clients,
+            'agents': agents,
+            'messages': messages,
+            'size': size,
+            'cpus': multiprocessing.cpu_count()
+        },
+        'single_shard': single,
+        'multiple_shards': multiple,
+        'speedup': speedup
+    }
+
+def main():
+    """Parse the arguments and run the benchmark"""
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--shards', type=int, default=max(2, multiprocessing.cpu_count()))
+    parser.add_argument('--clients', type=int, default=64)
+    parser.add_argument('--agents', type=int, default=4, help='The number of agent processes holding the clients')
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--size', type=int, default=256)
+    args = parser.parse_args()
+
+    print json.dumps(run(args.shards, args.clients, args.agents, args.messages, args.size))
+
+if __name__ == '__main__':
+    main()
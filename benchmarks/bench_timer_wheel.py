@@ -0,0 +1,122 @@
+'''
+File: bench_timer_wheel.py
+Description: Measure the timer wheel under a large number of recurring timers
+Date: 19/10/2026
+Author: Saurabh Badhwar <sbadhwar@redhat.com>
+
+Schedules the given number of recurring timers, each firing once per interval
+with a random jitter, as for a periodic collection across many hosts, and
+then moves the time forward tick by tick, rescheduling every fired timer for
+its next interval. The same run is made with the TimerWheel and with the heap
+of the DeadlineQueue, so the two can be compared.
+
+Reports the time taken to schedule the timers, and the mean, p99 and maximum
+time per tick and per fired timer during the run.
+
+Usage: python benchmarks/bench_timer_wheel.py --timers 200000 --interval 60 --duration 300
+'''
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bolt_server.execution_engine import DeadlineQueue, TimerWheel
+
+class HeapTimers(object):
+    """Expose the DeadlineQueue heap with the timer wheel interface"""
+
+    def __init__(self):
+        """Initialize the heap timers"""
+
+        self.queue = DeadlineQueue()
+
+    def add(self, key, due):
+        """Add a timer"""
+
+        self.queue.set_deadline(key, due)
+
+    def advance(self, now):
+        """Fire the timers due"""
+
+        return self.queue.pop_expired(now)
+
+def run_timers(timers, count, interval, jitter, duration, tick, seed):
+    """Run the recurring timers on a timer structure
+
+    Returns:
+        Dict with the results of the timer structure
+    """
+
+    rand = random.Random(seed)
+    nominal = {}
+    start = time.time()
+    for key in range(count):
+        nominal[key] = rand.random() * interval
+        timers.add(key, nominal[key] + rand.random() * jitter)
+    add_seconds = time.time() - start
+
+    tick_times = []
+    fired = 0
+    now = 0.0
+    while now < duration:
+        now = now + tick
+        start = time.time()
+        keys = timers.advance(now)
+        for key in keys:
+            nominal[key] = nominal[key] + interval
+            timers.add(key, nominal[key] + rand.random() * jitter)
+        tick_times.append(time.time() - start)
+        fired = fired + len(keys)
+
+    tick_times.sort()
+    return {
+        'add_us': round(add_seconds / count * 1e6, 3),
+        'tick_ms': {
+            'mean': round(sum(tick_times) / len(tick_times) * 1000, 3),
+            'p99': round(tick_times[int(len(tick_times) * 0.99)] * 1000, 3),
+            'max': round(tick_times[-1] * 1000, 3)
+        },
+        'fired': fired,
+        'fire_us': round(sum(tick_times) / max(1, fired) * 1e6, 3)
+    }
+
+def run(count, interval, jitter, duration, tick, seed):
+    """Run the benchmark
+
+    Returns:
+        Dict with the benchmark results
+    """
+
+    return {
+        'config': {
+            'timers': count,
+            'interval': interval,
+            'jitter': jitter,
+            'duration': duration,
+            'tick': tick,
+            'seed': seed
+        },
+        'timer_wheel': run_timers(TimerWheel(tick), count, interval, jitter, duration, tick, seed),
+        'heap': run_timers(HeapTimers(), count, interval, jitter, duration, tick, seed)
+    }
+
+def main():
+    """Parse the arguments and run the benchmark"""
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--timers', type=int, default=200000)
+    parser.add_argument('--interval', type=float, default=60, help='The interval of the timers in seconds')
+    parser.add_argument('--jitter', type=float, default=10, help='The maximum jitter of the timers in seconds')
+    parser.add_argument('--duration', type=float, default=300, help='The simulated time in seconds')
+    parser.add_argument('--tick', type=float, default=0.1, help='The tick of the timer wheel in seconds')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    print json.dumps(run(args.timers, args.interval, args.jitter, args.duration, args.tick, args.seed))
+
+if __name__ == '__main__':
+    main()
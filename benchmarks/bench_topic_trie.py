@@ -0,0 +1,144 @@
+'''
+File: bench_topic_trie.py
+Description: Measure the wildcard topic matching cost against the subscriptions
+Date: 19/10/2026
+Author: Saurabh Badhwar <sbadhwar@redhat.com>
+
+Subscribes a mix of exact topics and wildcard patterns to a TopicTrie and
+measures how many published topics can be matched per second, both without
+and with the match cache. A linear scan over all the patterns is measured for
+comparison.
+
+Usage: python benchmarks/bench_topic_trie.py --subscriptions 100000
+'''
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bolt_server.socket_handler import TopicTrie
+
+def make_pattern(rand):
+    """Generate a random subscription pattern
+
+    Keyword arguments:
+    rand -- The random number generator
+
+    Returns: String
+    """
+
+    dc = 'dc%d' % rand.randint(0, 9)
+    rack = 'rack%d' % rand.randint(0, 99)
+    host = 'host%d' % rand.randint(0, 999)
+    kind = rand.random()
+    if kind < 0.7:
+        return '.'.join([dc, rack, host])
+    elif kind < 0.85:
+        return '.'.join([dc, rack, '*'])
+    elif kind < 0.95:
+        return '.'.join(['*', rack, host])
+    return '.'.join([dc, '#'])
+
+def make_topic(rand):
+    """Generate a random topic to publish to
+
+    Keyword arguments:
+    rand -- The random number generator
+
+    Returns: String
+    """
+
+    return 'dc%d.rack%d.host%d' % (rand.randint(0, 9), rand.randint(0, 99), rand.randint(0, 999))
+
+def linear_match(patterns, topic):
+    """Match the topic by scanning through all the patterns
+
+    Keyword arguments:
+    patterns -- The list of (levels, member) subscriptions
+    topic -- The topic to be matched
+
+    Returns:
+        List of members
+    """
+
+    levels = topic.split('.')
+    matched = []
+    for pattern, member in patterns:
+        if pattern[-1] == '#':
+            if levels[:len(pattern) - 1] == pattern[:-1]:
+                matched.append(member)
+        elif len(pattern) == len(levels):
+            for expected, level in zip(pattern, levels):
+                if expected != '*' and expected != level:
+                    break
+            else:
+                matched.append(member)
+    return matched
+
+def rate(count, function, topics):
+    """Measure the number of calls per second
+
+    Returns: Integer
+    """
+
+    start = time.time()
+    for topic in topics[:count]:
+        function(topic)
+    return int(count / (time.time() - start))
+
+def run(subscriptions, lookups):
+    """Run the benchmark
+
+    Returns:
+        Dict with the benchmark results
+    """
+
+    rand = random.Random(42)
+    trie = TopicTrie()
+    patterns = []
+    start = time.time()
+    for member in range(subscriptions):
+        pattern = make_pattern(rand)
+        trie.add(pattern, member)
+        patterns.append((pattern.split('.'), member))
+    build_seconds = time.time() - start
+
+    topics = [make_topic(rand) for i in range(lookups)]
+
+    def cold_match(topic):
+        trie.match_cache = {}
+        return trie.match(topic)
+
+    for topic in topics[:100]:
+        assert sorted(cold_match(topic)) == sorted(linear_match(patterns, topic))
+
+    cold_rate = rate(lookups, cold_match, topics)
+    matched = sum(len(trie.match(topic)) for topic in topics[:1000]) / 1000.0
+    for topic in topics[:TopicTrie.CACHE_SIZE]:
+        trie.match(topic)
+
+    return {
+        'subscriptions': subscriptions,
+        'build_seconds': round(build_seconds, 3),
+        'average_matched_subscribers': matched,
+        'trie_matches_per_second': cold_rate,
+        'cached_matches_per_second': rate(min(lookups, TopicTrie.CACHE_SIZE), trie.match, topics),
+        'linear_matches_per_second': rate(min(lookups, 200), lambda topic: linear_match(patterns, topic), topics)
+    }
+
+def main():
+    """Parse the arguments and run the benchmark"""
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--subscriptions', type=int, default=100000)
+    parser.add_argument('--lookups', type=int, default=20000)
+    args = parser.parse_args()
+
+    print json.dumps(run(args.subscriptions, args.lookups))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+'''
+File: bench_transport_latency.py
+Description: Compare the message round trip latency of the TCP and unix socket transports
+Date: 19/10/2026
+Author: Saurabh Badhwar <sbadhwar@redhat.com>
+
+Connects one agent over TCP loopback and one over the unix domain socket to a
+local bolt server. Every agent echoes the messages it receives back to the
+server, and the round trip time from send_message to the reply reaching the
+message handler is measured for each transport, along with the CPU time used
+by the benchmark process.
+
+Usage: python benchmarks/bench_transport_latency.py --messages 5000
+'''
+import argparse
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SERVER_PORT = 15500
+
+class EchoAgent(object):
+    """A client echoing back every message it receives"""
+
+    def __init__(self, family, address, topic):
+        """Connect the agent and start echoing"""
+
+        self.conn = socket.socket(family, socket.SOCK_STREAM)
+        self.conn.connect(address)
+        self.conn.sendall('%s:%s' % (topic, topic))
+        thread = threading.Thread(target=self.echo)
+        thread.daemon = True
+        thread.start()
+
+    def echo(self):
+        """Echo the received messages until the connection closes"""
+
+        while True:
+            data = self.conn.recv(1 << 16)
+            if not data:
+                return
+            self.conn.sendall(data)
+
+def percentiles(values):
+    """Get the p50 and p99 of the values in microseconds
+
+    Returns: Dict
+    """
+
+    values = sorted(values)
+    return {
+        'p50_us': int(values[len(values) // 2] * 1e6),
+        'p99_us': int(values[min(len(values) - 1, int(len(values) * 0.99))] * 1e6)
+    }
+
+def measure(server, replied, topic, messages, payload):
+    """Measure the round trips of the messages sent on a topic
+
+    Returns: Dict
+    """
+
+    latencies = []
+    cpu_start = time.clock()
+    for index in range(messages):
+        replied.clear()
+        start = time.time()
+        server.send_message(topic, payload)
+        replied.wait()
+        latencies.append(time.time() - start)
+    cpu_seconds = time.clock() - cpu_start
+
+    result = percentiles(latencies)
+    result['cpu_us_per_message'] = int(cpu_seconds / messages * 1e6)
+    return result
+
+def run(messages, size):
+    """Run the benchmark
+
+    Returns:
+        Dict with the benchmark results
+    """
+
+    unix_path = os.path.join(tempfile.mkdtemp(), 'bolt.sock')
+    os.environ['BOLT_SERVER_PORT'] = str(SERVER_PORT)
+    from bolt_server.socket_handler import SocketHandler
+
+    replied = threading.Event()
+    server = SocketHandler(unix_path=unix_path)
+    server.register_handler(lambda message: replied.set())
+    time.sleep(0.2)
+    EchoAgent(socket.AF_INET, ('127.0.0.1', SERVER_PORT), 'tcp')
+    EchoAgent(socket.AF_UNIX, unix_path, 'unix')
+    while not server.client_list.get_clients('tcp') or not server.client_list.get_clients('unix'):
+        time.sleep(0.01)
+
+    payload = json.dumps({'id': 'x', 'payload': {'data': 'x' * size}})
+    #Warm up both of the paths before measuring
+    measure(server, replied, 'tcp', 100, payload)
+    measure(server, replied, 'unix', 100, payload)
+
+    return {
+        'messages': messages,
+        'size': size,
+        'tcp': measure(server, replied, 'tcp', messages, payload),
+        'unix': measure(server, replied, 'unix', messages, payload)
+    }
+
+def main():
+    """Parse the arguments and run the benchmark"""
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--messages', type=int, default=5000)
+    parser.add_argument('--size', type=int, default=256)
+    args = parser.parse_args()
+
+    print json.dumps(run(args.messages, args.size))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,430 @@
+'''
+File: replay_capture.py
+Description: Replay a captured traffic against the bolt server
+Date: 19/10/2026
+Author: Saurabh Badhwar <sbadhwar@redhat.com>
+
+Reads a capture file written by the socket handler (BOLT_CAPTURE_FILE) and
+replays it against the socket handler of this tree, at the original speed or
+accelerated. The original clients are simulated from an agent process: they
+connect with their recorded handshakes at the recorded times, answer every
+message with the reply recorded for it after the recorded latency, send the
+unsolicited data they sent, and disconnect when they disconnected.
+
+The server side sends the recorded messages at the recorded times. A message
+written to several clients at once is broadcasted on a topic they share, a
+message written to a single client is sent round robin on the topic of the
+client, so the client selection of this tree applies. The messages keep their
+ids as the ids are derived from the payloads, which lets the clients match
+the recorded replies.
+
+Reports the replayed throughput and the round trip percentiles next to the
+ones of the capture, as JSON, so that the runs on the different builds can be
+compared (see run_benchmarks.py --compare).
+
+Usage: python benchmarks/replay_capture.py capture.bin --speed 10 --output replay.json
+'''
+import argparse
+import collections
+import heapq
+import json
+import multiprocessing
+import os
+import platform
+import select
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bolt_server.capture import CaptureReader, CaptureRecord
+
+SERVER_PORT = 15900
+#The outbound frames with the same id written within this time in seconds
+#are taken as a single send to several clients
+SEND_WINDOW = 0.01
+
+def get_message_id(message):
+    """Get the id of a JSON formatted message
+
+    Returns:
+        String
+        None if the message has no id
+    """
+
+    try:
+        packet = json.loads(message)
+    except ValueError:
+        return None
+    if not isinstance(packet, dict):
+        return None
+    return packet.get('id')
+
+def split_frames(pending, data):
+    """Split the read data into the newline terminated messages
+
+    A read without any newline is a single message, as for the socket handler.
+
+    Returns:
+        Tuple (messages, pending)
+    """
+
+    if pending == '' and '\n' not in data:
+        return [data], ''
+    messages = (pending + data).split('\n')
+    pending = messages.pop()
+    return [message for message in messages if message != ''], pending
+
+class CaptureScript(object):
+    """The traffic of a capture, arranged for the replay
+
+    The general structure looks like:
+    clients = {connection: {handshake, topics, connect, disconnect}}
+    sends = [(time, message_id, message, [connection])], in the time order
+    replies = {message_id: [(latency, reply)]}
+    unsolicited = [(time, connection, data)]
+    """
+
+    def __init__(self, path):
+        """Read and arrange a capture
+
+        Keyword arguments:
+        path -- The path of the capture file
+        """
+
+        self.clients = collections.OrderedDict()
+        self.sends = []
+        self.replies = collections.defaultdict(list)
+        self.unsolicited = []
+        self.duration = 0.0
+
+        #The last send of every message id, {message_id: send}
+        last_sends = {}
+        #The time every message id was last written to a connection
+        written = {}
+        pending = collections.defaultdict(str)
+        for record in CaptureReader(path):
+            self.duration = record.time
+            connection = record.connection
+            if record.kind == CaptureRecord.CONNECT:
+                topics = record.data.split(':')[0].split(',')
+                self.clients[connection] = {'handshake': record.data, 'topics': topics,
+                                            'connect': record.time, 'disconnect': None}
+            elif connection not in self.clients:
+                continue
+            elif record.kind == CaptureRecord.DISCONNECT:
+                self.clients[connection]['disconnect'] = record.time
+            elif record.kind == CaptureRecord.OUTBOUND:
+                for message in record.data.split('\n'):
+                    message_id = get_message_id(message) if message != '' else None
+                    if message_id is None:
+                        continue
+                    send = last_sends.get(message_id)
+                    if send is None or record.time - send[0] > SEND_WINDOW:
+                        send = (record.time, message_id, message, [])
+                        self.sends.append(send)
+                        last_sends[message_id] = send
+                    send[3].append(connection)
+                    written[(connection, message_id)] = record.time
+            elif record.kind == CaptureRecord.INBOUND:
+                messages, pending[connection] = split_frames(pending[connection], record.data)
+                for message in messages:
+                    message_id = get_message_id(message)
+                    if (connection, message_id) in written:
+                        latency = record.time - written.pop((connection, message_id))
+                        self.replies[message_id].append((latency, message))
+                    else:
+                        self.unsolicited.append((record.time, connection, message))
+
+    def get_latencies(self):
+        """Get the recorded round trips
+
+        Returns: List of seconds
+        """
+
+        return [latency for replies in self.replies.itervalues() for latency, reply in replies]
+
+class ReplayClients(object):
+    """Simulate the clients of a capture from a single event loop"""
+
+    def __init__(self, script, port, speed, start):
+        """Initialize the simulated clients
+
+        Keyword arguments:
+        script -- The CaptureScript to replay
+        port -- The port of the server
+        speed -- The replay speed, 2 replays twice as fast
+        start -- The wall clock time the replay starts at
+        """
+
+        self.script = script
+        self.port = port
+        self.speed = speed
+        self.start = start
+        self.poller = select.epoll()
+        #The connected clients, {fileno: [conn, connection, pending data]}
+        self.conns = {}
+        #The connected clients by their capture connection
+        self.connections = {}
+        #The scheduled actions, [(due, sequence, action, connection, data)]
+        self.actions = []
+        self.sequence = 0
+        #The number of replies every client has yet to send
+        self.outstanding = collections.defaultdict(int)
+        #The clients to be disconnected once their replies are sent
+        self.closing = set()
+
+    def schedule(self, at, action, connection, data=None):
+        """Schedule an action at a time of the capture"""
+
+        self.sequence = self.sequence + 1
+        heapq.heappush(self.actions, (self.start + at / self.speed, self.sequence, action, connection, data))
+
+    def run(self):
+        """Run the clients until the capture ends and the server closes"""
+
+        for connection, client in self.script.clients.iteritems():
+            self.schedule(client['connect'], self.connect, connection, client['handshake'])
+            if client['disconnect'] is not None:
+                self.schedule(client['disconnect'], self.close, connection)
+        for at, connection, data in self.script.unsolicited:
+            self.schedule(at, self.send, connection, data + '\n')
+
+        while self.actions or self.conns:
+            timeout = -1
+            if self.actions:
+                timeout = max(0, self.actions[0][0] - time.time())
+            for fileno, event in self.poller.poll(timeout):
+                self.receive(fileno)
+
+            now = time.time()
+            while self.actions and self.actions[0][0] <= now:
+                due, sequence, action, connection, data = heapq.heappop(self.actions)
+                action(connection, data)
+
+    def connect(self, connection, handshake):
+        """Connect a client and send its handshake"""
+
+        conn = socket.create_connection(('127.0.0.1', self.port))
+        conn.sendall(handshake)
+        #Let the handshake be read on its own
+        time.sleep(0.001)
+        conn.setblocking(False)
+        self.conns[conn.fileno()] = [conn, connection, '']
+        self.connections[connection] = conn
+        self.poller.register(conn.fileno(), select.EPOLLIN)
+
+    def close(self, connection, data=None):
+        """Disconnect a client once it has sent its replies
+
+        A replay running slower than the capture would otherwise drop the
+        replies due after the recorded disconnect.
+        """
+
+        if self.outstanding[connection] > 0:
+            self.closing.add(connection)
+        else:
+            self.disconnect(connection)
+
+    def disconnect(self, connection, data=None):
+        """Disconnect a client"""
+
+        self.closing.discard(connection)
+        conn = self.connections.pop(connection, None)
+        if conn is not None:
+            self.poller.unregister(conn.fileno())
+            del self.conns[conn.fileno()]
+            conn.close()
+
+    def send(self, connection, data):
+        """Send the data from a client, if it is connected"""
+
+        conn = self.connections.get(connection)
+        if conn is not None:
+            conn.setblocking(True)
+            conn.sendall(data)
+            conn.setblocking(False)
+
+    def reply(self, connection, data):
+        """Send a reply from a client"""
+
+        self.outstanding[connection] = self.outstanding[connection] - 1
+        self.send(connection, data)
+        if connection in self.closing and self.outstanding[connection] == 0:
+            self.disconnect(connection)
+
+    def receive(self, fileno):
+        """Read the messages sent to a client and schedule the replies"""
+
+        client = self.conns[fileno]
+        try:
+            data = client[0].recv(1 << 16)
+        except socket.error:
+            data = ''
+        if not data:
+            self.disconnect(client[1])
+            return
+
+        messages, client[2] = split_frames(client[2], data)
+        now = (time.time() - self.start) * self.speed
+        for message in messages:
+            replies = self.script.replies.get(get_message_id(message))
+            if replies:
+                latency, reply = replies.pop(0)
+                self.outstanding[client[1]] = self.outstanding[client[1]] + 1
+                self.schedule(now + latency, self.reply, client[1], reply + '\n')
+
+def run_clients(script, port, speed, start):
+    """Run the simulated clients inside the agent process"""
+
+    ReplayClients(script, port, speed, start).run()
+
+class ReplayRecorder(object):
+    """Record the round trips of the replayed messages"""
+
+    def __init__(self):
+        """Initialize the recorder"""
+
+        self.sent = {}
+        self.latencies = []
+        self.unmatched = 0
+        self.lock = threading.Lock()
+
+    def handle(self, message):
+        """Record a reply received by the server"""
+
+        now = time.time()
+        with self.lock:
+            start = self.sent.get(get_message_id(message))
+            if start is None:
+                self.unmatched = self.unmatched + 1
+            else:
+                self.latencies.append(now - start)
+
+def percentiles(values):
+    """Get the round trip percentiles in milliseconds
+
+    Returns: Dict
+    """
+
+    if values == []:
+        return {}
+    values = sorted(values)
+    result = {}
+    for name, percentile in (('p50', 50), ('p90', 90), ('p99', 99)):
+        result[name] = round(values[min(len(values) - 1, int(len(values) * percentile / 100.0))] * 1000, 2)
+    result['max'] = round(values[-1] * 1000, 2)
+    return result
+
+def get_frames(script, send):
+    """Get the frames replaying a recorded send
+
+    Returns:
+        List of (topic, message, delivery, delivery_key)
+    """
+
+    from bolt_server.socket_handler import ClientSelector
+
+    send_time, message_id, message, connections = send
+    topics = [script.clients[connection]['topics'] for connection in connections]
+    if len(connections) == 1:
+        return [(topics[0][0], message, ClientSelector.DELIVERY_ROUND_ROBIN, None)]
+
+    shared = [topic for topic in topics[0] if all(topic in client_topics for client_topics in topics)]
+    if shared != []:
+        return [(shared[0], message, ClientSelector.DELIVERY_BROADCAST, None)]
+    return [(client_topics[0], message, ClientSelector.DELIVERY_ROUND_ROBIN, None) for client_topics in topics]
+
+def run(path, speed, port, drain):
+    """Run the replay
+
+    Returns:
+        Dict with the replay results
+    """
+
+    os.environ['BOLT_SERVER_PORT'] = str(port)
+    from bolt_server.socket_handler import SocketHandler
+
+    script = CaptureScript(path)
+    recorder = ReplayRecorder()
+    server = SocketHandler()
+    server.register_handler(recorder.handle)
+    time.sleep(0.2)
+
+    start = time.time() + 0.5
+    worker = multiprocessing.Process(target=run_clients, args=(script, port, speed, start))
+    worker.daemon = True
+    worker.start()
+
+    dropped = 0
+    index = 0
+    while index < len(script.sends):
+        due = start + script.sends[index][0] / speed
+        delay = due - time.time()
+        if delay > 0:
+            time.sleep(delay)
+
+        #Send everything due by now in a single batch
+        now = time.time()
+        frames = []
+        with recorder.lock:
+            while index < len(script.sends) and start + script.sends[index][0] / speed <= now:
+                frames.extend(get_frames(script, script.sends[index]))
+                recorder.sent[script.sends[index][1]] = now
+                index = index + 1
+        dropped = dropped + server.send_many(frames).count(None)
+
+    expected = len(script.get_latencies())
+    end = start + script.duration / speed
+    deadline = end + drain
+    while len(recorder.latencies) < expected and time.time() < deadline:
+        time.sleep(0.01)
+    seconds = max(end, time.time()) - start
+
+    server.stop_listening()
+    worker.terminate()
+    worker.join()
+
+    return {
+        'config': {'capture': path, 'speed': speed},
+        'host': {'platform': platform.platform(), 'cpus': multiprocessing.cpu_count()},
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'capture': {
+            'clients': len(script.clients),
+            'sends': len(script.sends),
+            'replies': expected,
+            'seconds': round(script.duration, 3),
+            'round_trip_ms': percentiles(script.get_latencies())
+        },
+        'replay': {
+            'seconds': round(seconds, 3),
+            'dropped_sends': dropped,
+            'replies': len(recorder.latencies),
+            'unmatched_replies': recorder.unmatched,
+            'replies_per_second': int(len(recorder.latencies) / seconds),
+            'round_trip_ms': percentiles(recorder.latencies)
+        }
+    }
+
+def main():
+    """Parse the arguments and run the replay"""
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('capture', help='The capture file to replay')
+    parser.add_argument('--speed', type=float, default=1.0, help='The replay speed, 10 replays 10x faster')
+    parser.add_argument('--port', type=int, default=SERVER_PORT)
+    parser.add_argument('--drain', type=float, default=5.0,
+                        help='The time in seconds to wait for the replies after the capture ends')
+    parser.add_argument('--output', help='The file to write the results to')
+    args = parser.parse_args()
+
+    result = run(args.capture, args.speed, args.port, args.drain)
+    if args.output is not None:
+        with open(args.output, 'w') as output:
+            json.dump(result, output, indent=2, sort_keys=True)
+    print json.dumps(result)
+
+if __name__ == '__main__':
+    main()
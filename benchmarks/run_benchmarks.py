@@ -0,0 +1,118 @@
+'''
+File: run_benchmarks.py
+Description: Run the benchmark suite and compare the results with a previous run
+Date: 19/10/2026
+Author: Saurabh Badhwar <sbadhwar@redhat.com>
+
+Runs the benchmarks in this directory one after another, each in its own
+process with its default arguments, and collects the JSON they print into a
+single results file. With a previous results file given, the numeric results
+present in both runs are compared.
+
+Usage: python benchmarks/run_benchmarks.py --output results.json --compare baseline.json bench_load bench_scheduler
+'''
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def get_benchmarks():
+    """Get the names of the benchmarks in the suite
+
+    Returns: List of names
+    """
+
+    return sorted(name[:-3] for name in os.listdir(BENCHMARK_DIR)
+                  if name.startswith('bench_') and name.endswith('.py'))
+
+def run_benchmark(name):
+    """Run a benchmark in its own process
+
+    Keyword arguments:
+    name -- The name of the benchmark
+
+    Returns:
+        Dict with the benchmark results, {error} if the benchmark failed
+    """
+
+    process = subprocess.Popen([sys.executable, os.path.join(BENCHMARK_DIR, name + '.py')],
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    output, errors = process.communicate()
+    lines = output.strip().split('\n')
+    if process.returncode != 0 or lines == ['']:
+        return {'error': errors.strip().split('\n')[-1]}
+    try:
+        return json.loads(lines[-1])
+    except ValueError:
+        return {'error': 'The benchmark output is not JSON'}
+
+def flatten(result, prefix=''):
+    """Flatten the numeric values of a result
+
+    Returns:
+        Dict {dotted path: value}
+    """
+
+    values = {}
+    for key, value in result.iteritems():
+        path = prefix + str(key)
+        if isinstance(value, dict):
+            values.update(flatten(value, path + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[path] = value
+    return values
+
+def compare(previous, current):
+    """Print the changes of the numeric results between two runs
+
+    Keyword arguments:
+    previous -- The results of the previous run
+    current -- The results of the current run
+    """
+
+    for name in sorted(current['benchmarks']):
+        if name not in previous['benchmarks']:
+            continue
+        old = flatten(previous['benchmarks'][name])
+        new = flatten(current['benchmarks'][name])
+        for path in sorted(set(old) & set(new)):
+            if old[path] == new[path]:
+                continue
+            change = '%+.1f%%' % ((new[path] - old[path]) * 100.0 / old[path]) if old[path] != 0 else 'n/a'
+            print '%s %s: %s -> %s (%s)' % (name, path, old[path], new[path], change)
+
+def main():
+    """Parse the arguments and run the benchmark suite"""
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('benchmarks', nargs='*', help='The benchmarks to run (Default: All of them)')
+    parser.add_argument('--output', help='The file to write the results to')
+    parser.add_argument('--compare', help='The results file of a previous run to compare with')
+    args = parser.parse_args()
+
+    names = args.benchmarks or get_benchmarks()
+    unknown = [name for name in names if name not in get_benchmarks()]
+    if unknown != []:
+        parser.error('Unknown benchmarks: %s' % ', '.join(unknown))
+
+    results = {'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'benchmarks': {}}
+    for name in names:
+        start = time.time()
+        results['benchmarks'][name] = run_benchmark(name)
+        print '%s finished in %.1fs' % (name, time.time() - start)
+
+    if args.output is not None:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2, sort_keys=True)
+    if args.compare is not None:
+        with open(args.compare) as previous:
+            compare(json.load(previous), results)
+    if args.output is None:
+        print json.dumps(results)
+
+if __name__ == '__main__':
+    main()
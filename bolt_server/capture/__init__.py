@@ -0,0 +1,2 @@
+from capture import CaptureWriter, CaptureReader
+from structures import CaptureRecord
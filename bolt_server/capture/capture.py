@@ -0,0 +1,154 @@
+'''
+File: capture.py
+Description: Capture the traffic of the socket handler to a file
+Date: 19/10/2026
+Author: Saurabh Badhwar <sbadhwar@redhat.com>
+'''
+from structures import CaptureRecord
+import itertools
+import struct
+import threading
+import time
+
+#The capture file starts with the magic and the wall clock start time
+MAGIC = 'BOLTCAP1'
+FILE_HEADER = struct.Struct('!8sd')
+
+class CaptureWriter(object):
+    """Record the frames of the socket handler in a binary capture file
+
+    Every connection gets an id the first time it is seen, so the frames can
+    be attributed to the clients without keeping their addresses. The records
+    are written through a buffer, a capture cut short by a crash loses the
+    records still buffered and is read up to its last complete record.
+    """
+
+    def __init__(self, path, buffer_size=1 << 16):
+        """Open the capture file, replacing an existing one
+
+        Keyword arguments:
+        path -- The path of the capture file
+        buffer_size -- The size of the write buffer in bytes (Default: 65536)
+        """
+
+        self.path = path
+        self.start_time = time.time()
+        self.capture_file = open(path, 'wb', buffer_size)
+        self.capture_file.write(FILE_HEADER.pack(MAGIC, self.start_time))
+        self.lock = threading.Lock()
+        #The ids of the connections, {conn: id}
+        self.connections = {}
+        self.next_connection = itertools.count(1).next
+        self.closed = False
+
+    def connect(self, conn, handshake):
+        """Record a new client connection
+
+        Keyword arguments:
+        conn -- The connection of the client
+        handshake -- The handshake sent by the client
+        """
+
+        self.__record(CaptureRecord.CONNECT, conn, handshake)
+
+    def inbound(self, conn, data):
+        """Record the data read from a client
+
+        Keyword arguments:
+        conn -- The connection of the client
+        data -- The data read
+        """
+
+        self.__record(CaptureRecord.INBOUND, conn, data)
+
+    def outbound(self, conn, data):
+        """Record the data written to a client
+
+        Keyword arguments:
+        conn -- The connection of the client
+        data -- The data written
+        """
+
+        self.__record(CaptureRecord.OUTBOUND, conn, data)
+
+    def disconnect(self, conn):
+        """Record a client disconnecting
+
+        Keyword arguments:
+        conn -- The connection of the client
+        """
+
+        self.__record(CaptureRecord.DISCONNECT, conn)
+        with self.lock:
+            self.connections.pop(conn, None)
+
+    def flush(self):
+        """Write the buffered records to the capture file"""
+
+        with self.lock:
+            if not self.closed:
+                self.capture_file.flush()
+
+    def close(self):
+        """Close the capture file, the later frames are not recorded"""
+
+        with self.lock:
+            if not self.closed:
+                self.closed = True
+                self.capture_file.close()
+
+    def __record(self, kind, conn, data=''):
+        """Append a record to the capture file"""
+
+        now = time.time() - self.start_time
+        with self.lock:
+            if self.closed:
+                return
+            connection = self.connections.get(conn)
+            if connection is None:
+                connection = self.connections[conn] = self.next_connection()
+            self.capture_file.write(CaptureRecord(now, kind, connection, data).encode())
+
+class CaptureReader(object):
+    """Read the records of a capture file
+
+    Iterating over the reader yields the CaptureRecord objects in the order
+    they were recorded, a truncated last record is skipped.
+    """
+
+    def __init__(self, path):
+        """Open a capture file
+
+        Keyword arguments:
+        path -- The path of the capture file
+
+        Raises:
+            RuntimeError if the file is not a capture file
+        """
+
+        self.path = path
+        with open(path, 'rb') as capture_file:
+            header = capture_file.read(FILE_HEADER.size)
+        if len(header) < FILE_HEADER.size or FILE_HEADER.unpack(header)[0] != MAGIC:
+            raise RuntimeError("The file is not a bolt capture file")
+        self.start_time = FILE_HEADER.unpack(header)[1]
+
+    def __iter__(self):
+        """Iterate over the records
+
+        Returns:
+            Generator of CaptureRecord
+        """
+
+        header_size = CaptureRecord.HEADER.size
+        with open(self.path, 'rb') as capture_file:
+            capture_file.seek(FILE_HEADER.size)
+            while True:
+                header = capture_file.read(header_size)
+                if len(header) < header_size:
+                    return
+                record_time, kind, connection, length = CaptureRecord.decode_header(header)
+                data = capture_file.read(length)
+                if len(data) < length:
+                    return
+                yield CaptureRecord(record_time, kind, connection, data)
@@ -0,0 +1,60 @@
+'''
+File: structures.py
+Description: Structures used by the traffic capture
+Date: 19/10/2026
+Author: Saurabh Badhwar <sbadhwar@redhat.com>
+'''
+import struct
+
+class CaptureRecord(object):
+    """A frame seen by the socket handler
+
+    The time of the record is the time in seconds since the capture started.
+    The data of a connect record is the handshake of the client, the data of
+    the inbound and the outbound records is the data read from and written to
+    the client, exactly as read or written.
+    """
+
+    CONNECT = 1
+    INBOUND = 2
+    OUTBOUND = 3
+    DISCONNECT = 4
+
+    #Record header: time, kind, connection id, data length
+    HEADER = struct.Struct('!dBII')
+
+    def __init__(self, time, kind, connection, data=''):
+        """Initialize the record
+
+        Keyword arguments:
+        time -- The time since the capture started
+        kind -- One of the CONNECT, INBOUND, OUTBOUND, DISCONNECT kinds
+        connection -- The id of the connection within the capture
+        data -- The frame data (Default: '')
+        """
+
+        self.time = time
+        self.kind = kind
+        self.connection = connection
+        self.data = data
+
+    def encode(self):
+        """Encode the record for the capture file
+
+        Returns: String
+        """
+
+        return self.HEADER.pack(self.time, self.kind, self.connection, len(self.data)) + self.data
+
+    @classmethod
+    def decode_header(cls, header):
+        """Decode a record header
+
+        Keyword arguments:
+        header -- The HEADER.size bytes of the header
+
+        Returns:
+            Tuple (time, kind, connection, data length)
+        """
+
+        return cls.HEADER.unpack(header)
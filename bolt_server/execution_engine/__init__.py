@@ -1,2 +1,2 @@
-from structures import TaskQueue, Task
+from structures import TaskQueue, Task, TaskScheduler, DeadlineQueue, TimerWheel, RunTimeTracker, ResultCache, Aggregation
 from execution_engine import ExecutionEngine
@@ -4,7 +4,18 @@ Description: An out of order execution engine for Bolt
 Date: 06/10/2017
 Author: Saurabh Badhwar <sbadhwar@redhat.com>
 '''
-from structures import TaskQueue
+from structures import TaskQueue, TaskScheduler, DeadlineQueue, TimerWheel, RunTimeTracker, ResultCache, Aggregation
+from bolt_server.socket_handler import ClientSelector
+from bolt_server.metrics import get_registry
+from bolt_server.tracing import get_tracer
+import collections
+import copy
+import gc
+import json
+import os
+import random
+import threading
+import time
 
 class ExecutionEngine(object):
     """Execution engine for task execution
@@ -14,10 +25,61 @@ class ExecutionEngine(object):
     will be executed and is also responsible for updating their state in the
     task queue.
 
+    The ready tasks are dispatched by priority class and, within a class,
+    fairly shared between the tenants (see TaskScheduler). To keep the queue
+    wait of the urgent tasks bounded under load, the number of the tasks
+    running at once can be capped, in which case the remaining ready tasks
+    wait in the schedule for the running ones to finish.
+
+    Every dispatch of a task can carry a deadline. A task which doesn't get
+    any reply before its deadline is dispatched again while it has retries
+    left and is halted otherwise. The anycast tasks can also be dispatched
+    speculatively to another subscriber once they run far longer than the
+    recent tasks of the same plugin, in which case only the first result is
+    taken.
+
+    The results of the plugins marked as idempotent can be cached, keyed by
+    the plugin, the parameters and the topics of the task. The results of a
+    task are cached once it is marked complete, and an identical task
+    executed while they are valid completes locally by handing the cached
+    results to the plugin executor, without sending any message.
+
+    An executed task identical to a task which is still in flight (same
+    plugin, parameters, topics and delivery) isn't sent again. It is attached
+    to the in flight task instead and finishes with its status.
+
+    The replies to the tasks of a plugin with an aggregator are reduced as
+    they arrive instead of being handed to the plugin executor one by one.
+    Once the quorum of the clients the task was delivered to has replied, the
+    plugin executor gets the aggregated result and the task is completed.
+
+    The tasks can be scheduled to be submitted after a delay or at a fixed
+    interval. The schedules sit on a hierarchical timer wheel, which the
+    cycles advance to queue the tasks which came due.
+
+    The clients can report their load on their replies. The tasks with the
+    least loaded delivery go to the client with the most spare capacity, and
+    are only dispatched while the clients of their topics have capacity left,
+    the others stay queued for a later cycle.
+
+    With a ResultStore set, every reply taken by the engine is also appended
+    to the store, so the results can be queried by task, client or time later.
+
+    With the tracing enabled (see Tracer), the lifecycle stages of every task
+    are recorded as spans: queue (submission until the first cycle looks at
+    the task), dependency_wait, schedule (ready until dispatched), serialize,
+    send, agent (dispatch until the result is taken) and handle.
+
     TODO: Add a multithreaded execution mechanism
     """
 
-    def __init__(self, message_dispatcher, plugin_loader, execution_threads=3):
+    #Maximum number of the replies kept for the messages not yet mapped
+    EARLY_REPLY_LIMIT = 10000
+    #Maximum number of the messages of the finished tasks whose replies are
+    #dropped
+    DROPPED_MESSAGE_LIMIT = 10000
+
+    def __init__(self, message_dispatcher, plugin_loader, execution_threads=3, journal=None, max_running=None):
         """Initialize the execution engine
 
         Keyword arguments:
@@ -25,19 +87,100 @@ class ExecutionEngine(object):
         plugin_loader -- The plugin loader object to access the loaded plugins
         execution_threads -- The number of execution threads to run concurrently
                              for the task execution (Default: 3)
+        journal -- The TaskJournal used to persist the task state. If provided,
+                   the task queue and the message map are recovered from it
+                   (Default: None)
+        max_running -- The maximum number of tasks running at once, 0 for no
+                       limit (Default: BOLT_EXECUTION_MAX_RUNNING or 0)
         """
 
+        if max_running is None:
+            max_running = int(os.getenv('BOLT_EXECUTION_MAX_RUNNING', 0))
+
         self.message_dispatcher = message_dispatcher
         self.plugin_loader = plugin_loader
         self.execution_threads = execution_threads
-        self.task_queue = TaskQueue()
+        self.journal = journal
+        self.task_queue = TaskQueue(journal)
+        self.scheduler = TaskScheduler()
+        self.max_running = max_running
+        #Default timeout in seconds of a task dispatch, 0 for no timeout
+        self.task_timeout = float(os.getenv('BOLT_TASK_TIMEOUT', 0))
+        #Default number of dispatch retries after a timeout
+        self.task_retries = int(os.getenv('BOLT_TASK_RETRIES', 0))
+        #Multiple of the median run time after which a speculative copy of an
+        #anycast task is dispatched, 0 to disable the speculation
+        self.speculation_factor = float(os.getenv('BOLT_TASK_SPECULATION', 0))
+        self.clock = time.time
+        self.deadlines = DeadlineQueue()
+        self.speculation_deadlines = DeadlineQueue()
+        #The delayed and recurring tasks by their schedule id, as
+        #[task, next firing, interval, jitter, firings], fired by the timer
+        #wheel which ticks every BOLT_TIMER_TICK seconds
+        self.timers = TimerWheel(float(os.getenv('BOLT_TIMER_TICK', 0.1)), self.clock())
+        self.timed_tasks = {}
+        self.timer_sequence = 0
+        self.timer_random = random.Random()
+        self.timer_lock = threading.Lock()
+        self.run_times = RunTimeTracker()
+        #The dispatch time and count of the tasks awaiting their first reply
+        self.dispatch_times = {}
+        self.task_attempts = {}
+        #The running tasks with a speculative copy dispatched
+        self.speculated = set()
+        self.result_cache = ResultCache()
+        #The result cache time to live of the idempotent plugins
+        self.cache_policy = {}
+        #The cache key and the results gathered so far of the running tasks
+        self.cache_keys = {}
+        self.task_results = {}
+        #Coalesce the identical in flight tasks
+        self.coalesce = int(os.getenv('BOLT_TASK_COALESCE', 1)) != 0
+        #The in flight tasks by their identity, and the tasks attached to them
+        self.inflight = {}
+        self.inflight_keys = {}
+        self.followers = {}
+        #Guards the coalescing maps, the tasks complete on the receiver and
+        #the deadline threads
+        self.coalesce_lock = threading.Lock()
+        #The aggregators of the plugins and the aggregations of the running tasks
+        self.aggregators = {}
+        self.aggregations = {}
+        #Serializes the replies of the fan out messages, which arrive on the
+        #receiver threads of the clients
+        self.aggregation_lock = threading.Lock()
+        #The store keeping the received results, None to not keep them
+        self.result_store = None
+        #The plugin handler time histograms by the plugin
+        self.metrics = get_registry()
+        self.handler_times = {}
+        self.metric_fired = self.metrics.counter('bolt_execution_timer_fired_total',
+                                                 'Delayed and recurring tasks submitted')
+        self.metrics.gauge('bolt_execution_timers', 'Delayed and recurring tasks scheduled',
+                           function=lambda: len(self.timed_tasks))
+        self.count_deferred = self.metrics.counter('bolt_execution_deferred_total',
+                                                   'Dispatches deferred as the clients were at capacity').increment
+        self.tracer = get_tracer()
         #Provide a strcuture to map the message id to task id
         self.message_map = {}
+        #The messages sent for every running task, {task_id: [message_ids]}
+        self.task_messages = {}
+        #The replies which arrived before their message was mapped to its task
+        self.early_replies = collections.OrderedDict()
+        #The messages whose replies are dropped, as their task took the reply
+        #of another copy
+        self.dropped_messages = collections.OrderedDict()
+        self.reply_lock = threading.Lock()
+
+        if self.journal is not None:
+            self.__recover()
+            self.journal.set_snapshot_provider(self.__get_journal_snapshot)
 
         #Register the execution engine message handler to message dispatcher
         self.message_dispatcher.register_handler(self.__handle_incoming_message)
 
-    def new_task(self, task_name, plugin_name, task_params, task_topics, task_dependency=None):
+    def new_task(self, task_name, plugin_name, task_params, task_topics, task_dependency=None,
+                 delivery=None, delivery_key=None, priority=None, tenant=None, timeout=None, retries=None):
         """Create a new task and queue it inside the task queue
 
         Keyword arguments:
@@ -46,14 +189,125 @@ class ExecutionEngine(object):
         task_params -- The parameters associated with the task
         task_topics -- The topics to which the task should be broadcasted
         task_dependency -- The dependency tree for the task (Default: None)
+        delivery -- The delivery mode for the task, one of the
+                    ClientSelector.DELIVERY_* modes. An anycast mode runs the
+                    task on a single client per topic instead of all of them.
+                    None uses the delivery mode of the topics (Default: None)
+        delivery_key -- The key used by the consistent hash delivery
+                        (Default: None)
+        priority -- The priority class of the task, one of the
+                    TaskQueue.PRIORITY_* values (Default: PRIORITY_NORMAL)
+        tenant -- The tenant the task is accounted to by the fair share
+                  scheduling (Default: The plugin name)
+        timeout -- The time in seconds a dispatch of the task may take before
+                   it is retried or halted (Default: task_timeout)
+        retries -- The number of times the task is dispatched again after a
+                   timeout (Default: task_retries)
 
         Returns:
             task_id The task id of the current task
         """
 
-        task_id = self.task_queue.queue_task(task_name, plugin_name, task_params, task_topics, task_dependency)
+        task_id = self.task_queue.queue_task(task_name, plugin_name, task_params, task_topics, task_dependency,
+                                             delivery, delivery_key, priority, tenant, timeout, retries)
+        if self.tracer.enabled:
+            self.tracer.begin(task_id, 'queue')
         return task_id
 
+    def set_tenant_weight(self, tenant, weight):
+        """Set the fair share weight of a tenant
+
+        Keyword arguments:
+        tenant -- The tenant to set the weight for
+        weight -- The relative share of the dispatch the tenant gets within
+                  its priority class (Default weight: 1)
+
+        Raises:
+            ValueError if the weight is not positive
+        """
+
+        self.scheduler.set_weight(tenant, weight)
+
+    def set_result_cache(self, plugin_name, ttl):
+        """Cache the results of an idempotent plugin
+
+        Keyword arguments:
+        plugin_name -- The name of the plugin
+        ttl -- The time in seconds the results stay valid for, 0 to stop
+               caching the results of the plugin
+        """
+
+        if ttl > 0:
+            self.cache_policy[plugin_name] = ttl
+        else:
+            self.cache_policy.pop(plugin_name, None)
+
+    def set_aggregator(self, plugin_name, reducer, initial=None, quorum=1.0):
+        """Aggregate the replies to the tasks of a plugin
+
+        Keyword arguments:
+        plugin_name -- The name of the plugin
+        reducer -- The callable folding a result into the accumulator as
+                   reducer(accumulator, result), returning the new
+                   accumulator, None to stop aggregating the replies
+        initial -- The initial value of the accumulator, copied for every
+                   task (Default: None)
+        quorum -- The fraction of the clients the task was delivered to which
+                  should reply for the task to complete (Default: 1.0)
+
+        Raises:
+            RuntimeError if the socket server doesn't report the clients the
+            tasks are delivered to
+        """
+
+        if reducer is None:
+            self.aggregators.pop(plugin_name, None)
+        elif not self.message_dispatcher.reports_recipients():
+            raise RuntimeError("The replies can't be aggregated without knowing the recipients")
+        else:
+            self.aggregators[plugin_name] = (reducer, initial, quorum)
+
+    def set_result_store(self, result_store):
+        """Keep the received results in a result store
+
+        Keyword arguments:
+        result_store -- The ResultStore to append the results to, None to stop
+                        keeping the results
+        """
+
+        self.result_store = result_store
+
+    def get_task_progress(self, task_id):
+        """Get the reply progress of an aggregated task
+
+        Keyword arguments:
+        task_id -- The id of the task
+
+        Raises:
+            KeyError if the task isn't being aggregated
+
+        Returns:
+            Dict {replies, required, pending}, required and pending are None
+            when the recipients of the task are not known
+        """
+
+        with self.aggregation_lock:
+            aggregation = self.aggregations[task_id]
+            return {
+                'replies': aggregation.get_replies(),
+                'required': aggregation.required,
+                'pending': aggregation.get_pending()
+            }
+
+    def get_cache_stats(self):
+        """Get the result cache statistics
+
+        Returns:
+            Dict {hits, misses, evictions, expirations, entries, size}
+        """
+
+        return self.result_cache.get_stats()
+
     def update_task(self, task_id, status):
         """Update the status of the task
 
@@ -69,6 +323,136 @@ class ExecutionEngine(object):
             self.task_queue.change_task_status(task_id, status)
         except KeyError:
             return False
+
+        if task_id in self.cache_keys and status in (self.task_queue.TASK_COMPLETE, self.task_queue.TASK_HALTED):
+            cache_key = self.cache_keys.pop(task_id)
+            results = self.task_results.pop(task_id)
+            ttl = self.cache_policy.get(cache_key[0])
+            #Only the tasks which got their results from the clients are cached
+            if status == self.task_queue.TASK_COMPLETE and ttl is not None and results != []:
+                self.result_cache.put(cache_key[1], results, ttl, self.clock())
+
+        if status in (self.task_queue.TASK_COMPLETE, self.task_queue.TASK_HALTED):
+            self.scheduler.forget_task(task_id)
+            with self.aggregation_lock:
+                self.aggregations.pop(task_id, None)
+            speculated = task_id in self.speculated
+            self.speculated.discard(task_id)
+            for message_id in self.task_messages.pop(task_id, []):
+                self.message_dispatcher.forget_message(message_id)
+                #The reply of the copy which lost the race is not taken
+                if speculated:
+                    with self.reply_lock:
+                        self.message_map.pop(message_id, None)
+                        if len(self.dropped_messages) >= self.DROPPED_MESSAGE_LIMIT:
+                            self.dropped_messages.popitem(last=False)
+                        self.dropped_messages[message_id] = task_id
+            if self.tracer.enabled:
+                self.tracer.close(task_id, {'status': self.task_queue.STATUS_NAMES[status]})
+
+        if task_id in self.inflight_keys and status in (self.task_queue.TASK_COMPLETE, self.task_queue.TASK_HALTED):
+            with self.coalesce_lock:
+                inflight_key = self.inflight_keys.pop(task_id, None)
+                if inflight_key is not None:
+                    self.inflight.pop(inflight_key, None)
+                followers = self.followers.pop(task_id, [])
+            for follower in followers:
+                self.update_task(follower, status)
+        return True
+
+    def submit_many(self, tasks):
+        """Create a batch of tasks and queue them inside the task queue
+
+        The whole batch is validated before any of the tasks is queued, looking
+        up the structure of every plugin once.
+
+        Keyword arguments:
+        tasks -- The list of tasks, every task being a dict with the keyword
+                 arguments of new_task
+
+        Raises:
+            KeyError if a plugin isn't loaded or the task params do not match
+            the plugin structure
+
+        Returns:
+            List of task ids
+        """
+
+        structures = {}
+        for task in tasks:
+            plugin_name = task['plugin_name']
+            if plugin_name not in structures:
+                structures[plugin_name] = self.plugin_loader.get_plugin_structure(plugin_name)
+            for key in task['task_params'].keys():
+                if key not in structures[plugin_name]:
+                    raise KeyError("Parameter mismatch in plugin structure and provided params")
+
+        task_ids = [self.task_queue.queue_task(**task) for task in tasks]
+        if self.tracer.enabled:
+            start = self.tracer.now()
+            for task_id in task_ids:
+                self.tracer.begin(task_id, 'queue', start)
+        return task_ids
+
+    def schedule_task(self, task, delay=0, interval=None, jitter=0):
+        """Submit a task after a delay, and again at every interval
+
+        Every firing queues a new task, named after the task and the number of
+        the firing, which the following cycles run like any other task. A
+        recurring task fires on a fixed grid of its interval from the first
+        firing, and every firing is held back by a random jitter so that the
+        tasks scheduled together don't all fire at once. The firings missed
+        while the cycles didn't run are skipped. The schedules are not kept in
+        the journal.
+
+        Keyword arguments:
+        task -- The task, a dict with the keyword arguments of new_task
+        delay -- The time in seconds until the first firing (Default: 0)
+        interval -- The time in seconds between the firings, None to fire
+                    once (Default: None)
+        jitter -- The maximum random delay in seconds of every firing
+                  (Default: 0)
+
+        Raises:
+            KeyError if the plugin isn't loaded or the task params do not match
+            the plugin structure
+            ValueError if the interval is not positive
+
+        Returns:
+            Integer The id of the schedule
+        """
+
+        plugin_structure = self.plugin_loader.get_plugin_structure(task['plugin_name'])
+        if [key for key in task['task_params'].keys() if key not in plugin_structure] != []:
+            raise KeyError("Parameter mismatch in plugin structure and provided params")
+        if interval is not None and interval <= 0:
+            raise ValueError("The interval of a recurring task should be positive")
+
+        now = self.clock()
+        with self.timer_lock:
+            if len(self.timers) == 0:
+                #Bring the idle wheel up to the clock
+                self.timers.advance(now)
+            self.timer_sequence = self.timer_sequence + 1
+            schedule_id = self.timer_sequence
+            self.timed_tasks[schedule_id] = [dict(task), now + delay, interval, jitter, 0]
+            self.timers.add(schedule_id, now + delay + self.__get_jitter(jitter))
+        return schedule_id
+
+    def cancel_schedule(self, schedule_id):
+        """Cancel the future firings of a delayed or recurring task
+
+        Keyword arguments:
+        schedule_id -- The id of the schedule
+
+        Returns:
+            Bool False if there was no such schedule
+        """
+
+        with self.timer_lock:
+            if self.timed_tasks.pop(schedule_id, None) is None:
+                return False
+            self.timers.cancel(schedule_id)
         return True
 
     def execute_task(self, task_id):
@@ -81,48 +465,252 @@ class ExecutionEngine(object):
             Bool
         """
 
-        task = self.__resolve_task(task_id)
+        return self.execute_many([task_id])[0]
 
-        if task == False:
-            return
+    def execute_many(self, task_ids):
+        """Execute a batch of tasks on their topics
 
-        task_id = task[0]
-        task_name = task[1]
-        task_plugin = task[2]
-        task_params = task[3]
-        task_topics = task[4]
+        The message of every plugin is registered once for the batch and the
+        messages of all the tasks are sent at once, so that every client gets
+        its messages in a single write.
 
-        try:
-            plugin_structure = self.plugin_loader.get_plugin_structure(task_plugin)
-        except KeyError:
-            return False
+        Keyword arguments:
+        task_ids -- The ids of the tasks to be executed
+
+        Returns:
+            List of Bool, whether each of the tasks was executed
+        """
+
+        executed = [False] * len(task_ids)
+        early_replies = []
+        messages = []
+        dispatches = []
+        batch_followers = []
+        batch_leaders = {}
+        registered = []
+        #The messages the clients of every (topic, delivery) can still take
+        headroom = {}
+
+        tracing = self.tracer.enabled
+        for index, task_id in enumerate(task_ids):
+            task = self.__resolve_task(task_id)
+            if task == False:
+                continue
+            if tracing:
+                for stage in ('queue', 'dependency_wait', 'schedule'):
+                    self.tracer.end(task_id, stage)
+
+            task_plugin = task[2]
+            task_params = task[3]
+            task_topics = task[4]
+
+            try:
+                plugin_structure = self.plugin_loader.get_plugin_structure(task_plugin)
+            except KeyError:
+                continue
+            if [key for key in task_params.keys() if key not in plugin_structure] != []:
+                continue
+
+            delivery, delivery_key = self.task_queue.get_task_delivery(task_id)
+            task_key = None
+            if self.coalesce or task_plugin in self.cache_policy:
+                task_key = ResultCache.get_key(task_plugin, task_params, task_topics, delivery)
+
+            cache_key = None
+            if task_plugin in self.cache_policy:
+                cache_key = (task_plugin, task_key)
+                results = self.result_cache.get(task_key, self.clock())
+                if results is not None:
+                    executed[index] = self.__complete_cached(task_id, task_plugin, results)
+                    continue
 
-        if not self.message_dispatcher.message_exists(task_plugin):
-            self.message_dispatcher.register_message(task_plugin, plugin_structure, task_topics)
+            inflight_key = None
+            if self.coalesce:
+                inflight_key = (task_key, delivery_key)
+                leader = self.inflight.get(inflight_key, batch_leaders.get(inflight_key))
+                if leader is not None and leader != task_id:
+                    batch_followers.append((index, task_id, leader))
+                    continue
+
+            #Only the tasks which are sent take up the headroom
+            if not self.__take_headroom(headroom, task_topics, delivery):
+                self.count_deferred()
+                continue
+            if inflight_key is not None:
+                batch_leaders[inflight_key] = task_id
+
+            if not self.message_dispatcher.message_exists(task_plugin):
+                self.message_dispatcher.register_message(task_plugin, plugin_structure, task_topics)
+                registered.append(task_plugin)
+
+            messages.append((task_plugin, task_params, delivery, delivery_key, task_topics))
+            dispatches.append((index, task_id, task_plugin, delivery, cache_key, inflight_key))
 
         try:
-            message_id = self.message_dispatcher.send_message(task_plugin, task_params)
+            trace_ids = [dispatch[1] for dispatch in dispatches] if tracing else None
+            message_ids = self.message_dispatcher.send_many(messages, trace_ids) if messages != [] else []
+        finally:
+            for task_plugin in registered:
+                self.message_dispatcher.unregister_message(task_plugin)
+
+        for dispatch, message_id in zip(dispatches, message_ids):
+            index, task_id, task_plugin, delivery, cache_key, inflight_key = dispatch
+            if message_id is None:
+                continue
+
             self.task_queue.change_task_status(task_id, self.task_queue.TASK_RUNNING)
-            self.message_map[message_id] = task_id
+            if self.journal is not None:
+                self.journal.record_message(message_id, task_id)
 
-        except (KeyError, RuntimeError):
-            return False
+            self.task_attempts[task_id] = self.task_attempts.get(task_id, 0) + 1
+            self.__track_dispatch(task_id, task_plugin, delivery)
+            if tracing:
+                self.tracer.begin(task_id, 'agent', attributes={'attempt': self.task_attempts[task_id]})
+            if cache_key is not None:
+                self.cache_keys[task_id] = cache_key
+                self.task_results[task_id] = []
+            with self.aggregation_lock:
+                if task_id in self.aggregations:
+                    #A retry keeps the replies to the earlier attempts
+                    self.aggregations[task_id].add_recipients(self.message_dispatcher.get_recipients(message_id))
+                elif task_plugin in self.aggregators:
+                    reducer, initial, quorum = self.aggregators[task_plugin]
+                    self.aggregations[task_id] = Aggregation(reducer, copy.deepcopy(initial),
+                                                             self.message_dispatcher.get_recipients(message_id),
+                                                             quorum)
+            if inflight_key is not None:
+                with self.coalesce_lock:
+                    if task_id not in self.inflight_keys:
+                        self.inflight[inflight_key] = task_id
+                        self.inflight_keys[task_id] = inflight_key
+                        self.followers[task_id] = []
+            early_replies.extend(self.__map_message(message_id, task_id))
+            executed[index] = True
 
-        self.message_dispatcher.unregister_message(task_plugin)
-        return True
+        #The followers of a leader which failed to dispatch stay queued
+        for index, task_id, leader in batch_followers:
+            with self.coalesce_lock:
+                if leader in self.followers:
+                    self.task_queue.change_task_status(task_id, self.task_queue.TASK_RUNNING)
+                    self.followers[leader].append(task_id)
+                    executed[index] = True
+
+        for message in early_replies:
+            self.__handle_incoming_message(message)
+        return executed
+
+    def check_deadlines(self):
+        """Handle the tasks whose deadlines have expired
+
+        The stragglers get a speculative copy dispatched. The tasks which
+        timed out are queued again while they have retries left and are
+        halted otherwise.
+        """
+
+        now = self.clock()
+        for task_id in self.speculation_deadlines.pop_expired(now):
+            if self.task_queue.get_task_status(task_id) == self.task_queue.TASK_RUNNING:
+                self.__dispatch_speculative(task_id)
+
+        for task_id in self.deadlines.pop_expired(now):
+            if self.task_queue.get_task_status(task_id) != self.task_queue.TASK_RUNNING:
+                continue
+
+            self.__clear_dispatch(task_id)
+            retries = self.task_queue.get_task_limits(task_id)[1]
+            if retries is None:
+                retries = self.task_retries
+            if self.tracer.enabled:
+                self.tracer.end(task_id, 'agent', attributes={'timeout': True})
+            self.speculated.discard(task_id)
+            if self.task_attempts.get(task_id, 0) <= retries:
+                self.task_queue.change_task_status(task_id, self.task_queue.TASK_QUEUED)
+            else:
+                self.update_task(task_id, self.task_queue.TASK_HALTED)
 
     def cycle_tasks(self):
         """Cycle through the tasks and determine which tasks to execute
 
-        The mechanism allows for cycling through the task queue to determine
-        if the task is ready to execute or not. If the task is ready to execute
-        the execution method is called with the task_id to get the task to
-        execution state.
+        The mechanism allows for cycling through the queued tasks to determine
+        if the task is ready to execute or not. The ready tasks are added to
+        the schedule and executed as a batch, in the scheduled order, for as
+        long as the running task limit allows. The expired deadlines are handled first, so
+        that the timed out tasks can be dispatched again in the same cycle, and
+        the delayed and recurring tasks which came due are queued.
         """
 
-        for task in self.task_queue.get_task_list():
-            if self.__check_ready_to_execute(task):
-                self.execute_task(task)
+        self.check_deadlines()
+        self.__fire_timers()
+
+        for task_id in self.task_queue.get_tasks_by_status(self.task_queue.TASK_QUEUED):
+            if self.scheduler.is_scheduled(task_id):
+                continue
+            if self.__check_ready_to_execute(task_id):
+                priority, tenant = self.task_queue.get_task_schedule(task_id)
+                self.scheduler.add_task(task_id, priority, tenant)
+                if self.tracer.enabled:
+                    start = self.tracer.now()
+                    self.tracer.end(task_id, 'queue', start)
+                    self.tracer.end(task_id, 'dependency_wait', start)
+                    self.tracer.begin(task_id, 'schedule', start)
+            elif self.tracer.enabled and self.tracer.end(task_id, 'queue') is not None:
+                self.tracer.begin(task_id, 'dependency_wait')
+
+        running = len(self.task_queue.get_tasks_by_status(self.task_queue.TASK_RUNNING))
+        batch = []
+        while self.max_running == 0 or running + len(batch) < self.max_running:
+            task_id = self.scheduler.next_task()
+            if task_id is None:
+                break
+            if self.task_queue.get_task_status(task_id) == self.task_queue.TASK_QUEUED:
+                batch.append(task_id)
+
+        #Tasks which failed to dispatch stay queued for the next cycle
+        if batch != []:
+            self.execute_many(batch)
+
+    def __fire_timers(self):
+        """Queue the delayed and recurring tasks which came due
+
+        Returns:
+            List of the ids of the queued tasks
+        """
+
+        now = self.clock()
+        firings = []
+        with self.timer_lock:
+            for schedule_id in self.timers.advance(now):
+                timed = self.timed_tasks[schedule_id]
+                timed[4] = timed[4] + 1
+                firings.append((timed[0], timed[4]))
+                if timed[2] is None:
+                    del self.timed_tasks[schedule_id]
+                    continue
+
+                timed[1] = timed[1] + timed[2]
+                if timed[1] <= now:
+                    timed[1] = timed[1] + (int((now - timed[1]) / timed[2]) + 1) * timed[2]
+                self.timers.add(schedule_id, timed[1] + self.__get_jitter(timed[3]))
+
+        task_ids = []
+        for task, firing in firings:
+            task_ids.append(self.new_task(**dict(task, task_name='%s#%d' % (task['task_name'], firing))))
+        if task_ids != []:
+            self.metric_fired.inc(len(task_ids))
+        return task_ids
+
+    def __get_jitter(self, jitter):
+        """Get the random delay of a firing
+
+        Keyword arguments:
+        jitter -- The maximum delay in seconds
+
+        Returns: Float
+        """
+
+        if jitter <= 0:
+            return 0.0
+        return self.timer_random.uniform(0, jitter)
 
     def __check_ready_to_execute(self, task_id):
         """Check if the task is ready to execute or not
@@ -143,8 +731,11 @@ class ExecutionEngine(object):
         except KeyError:
             return False
 
-        for dependency in dependency_list:
-            dependency_status = self.task_queue.get_task_status(dependency)
+        for dependency in dependency_list or []:
+            try:
+                dependency_status = self.task_queue.get_task_status(dependency)
+            except KeyError:
+                return False
             if dependency_status != self.task_queue.TASK_COMPLETE:
                 return False
 
@@ -164,6 +755,256 @@ class ExecutionEngine(object):
 
         return task
 
+    def __complete_cached(self, task_id, task_plugin, results):
+        """Complete a task from the cached results
+
+        Keyword arguments:
+        task_id -- The id of the task
+        task_plugin -- The plugin the task runs
+        results -- The cached results
+
+        Returns: Bool
+        """
+
+        self.task_queue.change_task_status(task_id, self.task_queue.TASK_RUNNING)
+        plugin_executor = self.plugin_loader.get_plugin_executor(task_plugin)
+        for result in results:
+            self.__run_handler(task_id, task_plugin, plugin_executor, result)
+
+        if self.task_queue.get_task_status(task_id) == self.task_queue.TASK_RUNNING:
+            self.update_task(task_id, self.task_queue.TASK_COMPLETE)
+        return True
+
+    def __run_handler(self, task_id, task_plugin, plugin_executor, result):
+        """Hand a result to a new instance of the plugin executor
+
+        Keyword arguments:
+        task_id -- The id of the task the result belongs to
+        task_plugin -- The name of the plugin
+        plugin_executor -- The plugin executor class
+        result -- The result to be handled
+        """
+
+        trace_start = self.tracer.now() if self.tracer.enabled else None
+        start = time.time()
+        plugin_executor().handle(result, self)
+        self.__get_handler_time(task_plugin).observe(time.time() - start)
+        if trace_start is not None:
+            self.tracer.record(task_id, 'handle', trace_start, self.tracer.now(), {'plugin': task_plugin})
+
+    def __get_handler_time(self, task_plugin):
+        """Get the handler time histogram of a plugin
+
+        Keyword arguments:
+        task_plugin -- The name of the plugin
+
+        Returns: Histogram
+        """
+
+        if task_plugin not in self.handler_times:
+            self.handler_times[task_plugin] = self.metrics.histogram(
+                'bolt_plugin_handle_seconds', 'Time taken by the plugin executors to handle a result',
+                {'plugin': task_plugin})
+        return self.handler_times[task_plugin]
+
+    def __take_headroom(self, headroom, topics, delivery):
+        """Take a message off the headroom of the clients of the task topics
+
+        Keyword arguments:
+        headroom -- The headroom left by (topic, delivery) in the batch
+        topics -- The topics of the task
+        delivery -- The delivery mode of the task
+
+        Returns:
+            Bool False if the clients of a topic are at their capacity
+        """
+
+        keys = [(topic, delivery) for topic in topics]
+        for key in keys:
+            if key not in headroom:
+                headroom[key] = self.message_dispatcher.get_headroom(*key)
+            if headroom[key] is not None and headroom[key] <= 0:
+                return False
+
+        for key in keys:
+            if headroom[key] is not None:
+                headroom[key] = headroom[key] - 1
+        return True
+
+    def __track_dispatch(self, task_id, task_plugin, delivery):
+        """Set the deadlines of a dispatched task
+
+        Keyword arguments:
+        task_id -- The id of the dispatched task
+        task_plugin -- The plugin the task runs
+        delivery -- The delivery mode the task was dispatched with
+        """
+
+        now = self.clock()
+        self.dispatch_times[task_id] = now
+
+        timeout = self.task_queue.get_task_limits(task_id)[0]
+        if timeout is None:
+            timeout = self.task_timeout
+        if timeout > 0:
+            self.deadlines.set_deadline(task_id, now + timeout)
+
+        #Only an anycast task can be sent to another subscriber
+        if self.speculation_factor > 0 and delivery not in (None, ClientSelector.DELIVERY_BROADCAST):
+            median = self.run_times.get_median(task_plugin)
+            if median is not None:
+                self.speculation_deadlines.set_deadline(task_id, now + median * self.speculation_factor)
+
+    def __clear_dispatch(self, task_id):
+        """Forget the deadlines of a task which replied or timed out
+
+        Keyword arguments:
+        task_id -- The id of the task
+        """
+
+        self.dispatch_times.pop(task_id, None)
+        self.deadlines.cancel(task_id)
+        self.speculation_deadlines.cancel(task_id)
+
+    def __dispatch_speculative(self, task_id):
+        """Dispatch a copy of a straggling task to another subscriber
+
+        The copy is sent to the least loaded subscriber, as per its load
+        reports or else its outstanding messages, which excludes the one still
+        working on the original dispatch.
+
+        Keyword arguments:
+        task_id -- The id of the straggling task
+
+        Returns:
+            Bool
+        """
+
+        task = self.__resolve_task(task_id)
+        if task == False:
+            return False
+
+        task_plugin = task[2]
+        registered = False
+        try:
+            if not self.message_dispatcher.message_exists(task_plugin):
+                plugin_structure = self.plugin_loader.get_plugin_structure(task_plugin)
+                self.message_dispatcher.register_message(task_plugin, plugin_structure, task[4])
+                registered = True
+            message_id = self.message_dispatcher.send_message(task_plugin, task[3],
+                                                              ClientSelector.DELIVERY_LEAST_LOADED)
+        except (KeyError, RuntimeError):
+            return False
+        finally:
+            if registered:
+                self.message_dispatcher.unregister_message(task_plugin)
+
+        if self.journal is not None:
+            self.journal.record_message(message_id, task_id)
+        self.speculated.add(task_id)
+        for message in self.__map_message(message_id, task_id):
+            self.__handle_incoming_message(message)
+        return True
+
+    def __report_load(self, client, load):
+        """Pass the load reported by a client on to the message dispatcher
+
+        The malformed reports are ignored.
+
+        Keyword arguments:
+        client -- The name of the client
+        load -- The reported load
+        """
+
+        try:
+            cpu = load.get('cpu')
+            capacity = load.get('capacity')
+            self.message_dispatcher.report_load(client, int(load['inflight']),
+                                                float(cpu) if cpu is not None else None,
+                                                int(capacity) if capacity is not None else None)
+        except (AttributeError, KeyError, TypeError, ValueError):
+            pass
+
+    def __map_message(self, message_id, task_id):
+        """Map a sent message to its task
+
+        The message is only mapped once the bookkeeping of its dispatch is
+        done, as the replies can arrive before the send returns.
+
+        Keyword arguments:
+        message_id -- The id of the sent message
+        task_id -- The id of the task
+
+        Returns:
+            List of the replies to the message which arrived before it was
+            mapped, to be handled by the caller
+        """
+
+        with self.reply_lock:
+            self.message_map[message_id] = task_id
+            self.task_messages.setdefault(task_id, []).append(message_id)
+            return self.early_replies.pop(message_id, [])
+
+    def __recover(self):
+        """Recover the task queue and the message map from the journal"""
+
+        state = self.journal.replay()
+
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            self.task_queue.restore_tasks(state.tasks, state.statuses, state.decode_task)
+            self.message_map.update(state.message_map)
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+        #The coalesced followers are not journaled, the running tasks without
+        #a message of their own are queued again to be coalesced anew with
+        #the recovered leaders
+        mapped = set(self.message_map.itervalues())
+        for task_id in self.task_queue.get_tasks_by_status(self.task_queue.TASK_RUNNING):
+            if task_id not in mapped:
+                self.task_queue.change_task_status(task_id, self.task_queue.TASK_QUEUED)
+                continue
+
+            #The dispatch time of the running tasks is lost, restart their
+            #deadlines
+            self.task_attempts[task_id] = 1
+            task = self.task_queue.get_task(task_id)
+            self.__track_dispatch(task_id, task[2], None)
+            if self.coalesce:
+                delivery, delivery_key = self.task_queue.get_task_delivery(task_id)
+                inflight_key = (ResultCache.get_key(task[2], task[3], task[4], delivery), delivery_key)
+                if inflight_key not in self.inflight:
+                    self.inflight[inflight_key] = task_id
+                    self.inflight_keys[task_id] = inflight_key
+                    self.followers[task_id] = []
+
+    def __get_journal_snapshot(self):
+        """Provide the current state for the journal snapshot
+
+        The finished tasks are left out along with their messages, unless an
+        unfinished task depends on them, so they are gone after a restart.
+
+        Returns: Dict
+        """
+
+        finished = (self.task_queue.TASK_COMPLETE, self.task_queue.TASK_HALTED)
+        tasks = self.task_queue.get_task_records()
+        needed = set()
+        for task in tasks.itervalues():
+            if task[7] not in finished:
+                needed.update(task[4])
+        for task_id, task in tasks.items():
+            if task[7] in finished and task_id not in needed:
+                del tasks[task_id]
+
+        with self.reply_lock:
+            message_map = dict((message_id, task_id) for message_id, task_id in self.message_map.iteritems()
+                               if task_id in tasks)
+        return {'tasks': tasks, 'message_map': message_map}
+
     def __handle_incoming_message(self, message):
         """Handle the incoming message responses
 
@@ -172,25 +1013,91 @@ class ExecutionEngine(object):
         is responsible for handling the actions that needs to be taken once the
         status update is received by the Execution Engine.
 
+        The replies are expected in the format {"id": <message id>,
+        "result": <result>}, optionally carrying the name of the replying
+        client as "client" and its load as "load": {"inflight": <running
+        tasks>, "cpu": <CPU load>, "capacity": <tasks it can run at once>}.
+
         Keyword arguments:
-        message -- The incoming message dict
+        message -- The incoming message, either a dict or JSON formatted
         """
 
+        if isinstance(message, basestring):
+            message = json.loads(message)
+
         message_id = message['id']
         message_payload = message['result']
+        load = message.pop('load', None)
+        if load is not None and message.get('client') is not None:
+            self.__report_load(message['client'], load)
 
-        #Resolve the task id from the incoming message
-        task_id = self.message_map[message_id]
+        #Resolve the task id from the incoming message, keeping the replies
+        #which raced ahead of the dispatch bookkeeping until it is done
+        with self.reply_lock:
+            task_id = self.message_map.get(message_id)
+            if task_id is None:
+                if message_id in self.dropped_messages:
+                    return
+                if message_id not in self.early_replies and len(self.early_replies) >= self.EARLY_REPLY_LIMIT:
+                    self.early_replies.popitem(last=False)
+                self.early_replies.setdefault(message_id, []).append(message)
+                return
 
         #Resolve the task from task id
         task = self.__resolve_task(task_id)
 
-        if task != False:
-            task_plugin = task[2]
+        if task == False:
+            return
+        task_plugin = task[2]
+
+        with self.aggregation_lock:
+            aggregation = self.aggregations.get(task_id)
+            dispatch_time = self.dispatch_times.pop(task_id, None)
+        if dispatch_time is not None:
+            self.run_times.add(task_plugin, self.clock() - dispatch_time)
+            if aggregation is None:
+                self.__clear_dispatch(task_id)
+            else:
+                #The aggregated task keeps its deadline until the quorum replies
+                self.speculation_deadlines.cancel(task_id)
+        elif task_id in self.speculated and aggregation is None:
+            #Only the first result of a speculatively dispatched task is taken
+            return
+
+        #A late reply to a timed out dispatch saves the retry, the deadline
+        #of the dispatch was cleared as it timed out
+        if self.task_queue.get_task_status(task_id) == self.task_queue.TASK_QUEUED:
+            self.task_queue.change_task_status(task_id, self.task_queue.TASK_RUNNING)
+
+        if self.result_store is not None:
+            self.result_store.append(task_id, message.get('client'), message_payload, self.clock())
+
+        if aggregation is not None:
+            #Only the reply which completes the aggregation goes on, once
+            with self.aggregation_lock:
+                if not aggregation.add(message_payload, message.get('client')) or not aggregation.is_complete():
+                    return
+                if self.aggregations.pop(task_id, None) is not aggregation:
+                    return
+            self.deadlines.cancel(task_id)
+            message_payload = aggregation.accumulator
+        elif task_plugin in self.aggregators and self.task_queue.get_task_status(task_id) in \
+                (self.task_queue.TASK_COMPLETE, self.task_queue.TASK_HALTED):
+            #The replies arriving after the quorum are dropped
+            return
+
+        if task_id in self.task_results:
+            self.task_results[task_id].append(message_payload)
 
         #Resolve the plugin executor
         plugin_executor = self.plugin_loader.get_plugin_executor(task_plugin)
-        plugin_executor_instance = plugin_executor()
+        if self.tracer.enabled:
+            client = message.get('client')
+            self.tracer.end(task_id, 'agent', attributes={'client': client} if client is not None else None)
 
         #Forward the message to plugin executor along with the callback object
-        plugin_executor_instance.handle(message_payload, self)
+        self.__run_handler(task_id, task_plugin, plugin_executor, message_payload)
+
+        if aggregation is not None and \
+                self.task_queue.get_task_status(task_id) == self.task_queue.TASK_RUNNING:
+            self.update_task(task_id, self.task_queue.TASK_COMPLETE)
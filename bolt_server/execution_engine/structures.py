@@ -4,13 +4,19 @@ Description: Structures being used by the execution engine
 Date: 06/10/2017
 Author: Saurabh Badhwar <sbadhwar@redhat.com>
 '''
-import hashlib
-import random
+from bolt_server.metrics import get_registry
+import collections
+import heapq
+import json
+import math
+import os
+import uuid
 
 class Task(object):
     """Create a new task which can encapsulate all the data objects"""
 
-    def __init__(self, task_name, plugin_name, task_params, task_topics):
+    def __init__(self, task_name, plugin_name, task_params, task_topics, delivery=None, delivery_key=None,
+                 task_id=None, priority=None, tenant=None, timeout=None, retries=None):
         """Initialize the Task object
 
         Keyword arguments:
@@ -18,13 +24,35 @@ class Task(object):
         plugin_name -- The name of the plugin which is to be called
         task_params -- The parameters to be passed to the task
         task_topics -- The topics to which the task should be executed on
+        delivery -- The delivery mode for the task messages, None to use the
+                    delivery mode of the topics (Default: None)
+        delivery_key -- The key used by the consistent hash delivery
+                        (Default: None)
+        task_id -- The id of the task, generated if not provided (Default: None)
+        priority -- The priority class of the task (Default: None)
+        tenant -- The tenant the task is accounted to by the fair share
+                  scheduling (Default: None)
+        timeout -- The time in seconds a dispatch of the task may take before
+                   it is retried or halted, None for the engine default
+                   (Default: None)
+        retries -- The number of times the task is dispatched again after a
+                   timeout, None for the engine default (Default: None)
         """
 
         self.task_name = task_name
-        self.task_id = hashlib.md5(self.task_name + str(random.randint(1,25000))).hexdigest()
+        if task_id is None:
+            #Random ids, so the ids of a large batch of tasks don't collide
+            task_id = uuid.uuid4().hex
+        self.task_id = task_id
         self.plugin_name = plugin_name
         self.task_params = task_params
         self.task_topics = task_topics
+        self.delivery = delivery
+        self.delivery_key = delivery_key
+        self.priority = priority
+        self.tenant = tenant
+        self.timeout = timeout
+        self.retries = retries
 
     def get_task_id(self):
         """Get the task id
@@ -44,6 +72,33 @@ class Task(object):
 
         return [self.task_id, self.task_name, self.plugin_name, self.task_params, self.task_topics]
 
+    def get_delivery(self):
+        """Get the delivery options of the task
+
+        Returns:
+            Tuple (delivery, delivery_key)
+        """
+
+        return (self.delivery, self.delivery_key)
+
+    def get_schedule(self):
+        """Get the scheduling options of the task
+
+        Returns:
+            Tuple (priority, tenant)
+        """
+
+        return (self.priority, self.tenant)
+
+    def get_limits(self):
+        """Get the timeout options of the task
+
+        Returns:
+            Tuple (timeout, retries)
+        """
+
+        return (self.timeout, self.retries)
+
 class TaskQueue(object):
     """Create and queue a new task for execution"""
 
@@ -54,12 +109,44 @@ class TaskQueue(object):
     TASK_HALTED = 3
     TASK_COMPLETE = 4
 
-    def __init__(self):
-        """Initialize the task queue structure."""
+    #Task priority classes, the lower value is dispatched first
+    PRIORITY_HIGH = 0
+    PRIORITY_NORMAL = 1
+    PRIORITY_LOW = 2
+
+    #Status names used by the metrics
+    STATUS_NAMES = {
+        TASK_QUEUED: 'queued',
+        TASK_PENDING: 'pending',
+        TASK_RUNNING: 'running',
+        TASK_HALTED: 'halted',
+        TASK_COMPLETE: 'complete'
+    }
+
+    def __init__(self, journal=None):
+        """Initialize the task queue structure.
+
+        Keyword arguments:
+        journal -- The TaskJournal to record the task submissions and status
+                   changes in (Default: None)
+        """
 
         self.task_queue = {}
+        #Index of the task ids by their status
+        self.status_index = {}
+        self.journal = journal
+        self.task_decoder = None
 
-    def queue_task(self, task_name, plugin_name, task_params, task_topics, task_dependency=None):
+        metrics = get_registry()
+        self.transition_counters = {}
+        for status, name in self.STATUS_NAMES.items():
+            self.transition_counters[status] = metrics.counter(
+                'bolt_task_transitions_total', 'Tasks moved to a status', {'status': name}).increment
+            metrics.gauge('bolt_tasks', 'Tasks by their current status', {'status': name},
+                          lambda status=status: len(self.status_index.get(status, ())))
+
+    def queue_task(self, task_name, plugin_name, task_params, task_topics, task_dependency=None,
+                   delivery=None, delivery_key=None, priority=None, tenant=None, timeout=None, retries=None):
         """Queue a new task
 
         Keyword arguments:
@@ -68,16 +155,98 @@ class TaskQueue(object):
         task_params -- The parameters to be passed to the task structure
         task_topic -- The topics the task should be broadcasted to
         task_dependency -- The tasks on which the current task depends
+        delivery -- The delivery mode for the task messages (Default: None)
+        delivery_key -- The key used by the consistent hash delivery
+                        (Default: None)
+        priority -- The priority class of the task, one of the PRIORITY_*
+                    values (Default: PRIORITY_NORMAL)
+        tenant -- The tenant the task is accounted to by the fair share
+                  scheduling (Default: The plugin name)
+        timeout -- The time in seconds a dispatch of the task may take
+                   (Default: None)
+        retries -- The number of times the task is dispatched again after a
+                   timeout (Default: None)
 
         Returns:
             task_id The id of the task
         """
 
-        task = Task(task_name, plugin_name, task_params, task_topics)
+        if priority is None:
+            priority = self.PRIORITY_NORMAL
+        if tenant is None:
+            tenant = plugin_name
+
+        task = Task(task_name, plugin_name, task_params, task_topics, delivery, delivery_key, None, priority,
+                    tenant, timeout, retries)
         task_id = task.get_task_id()
         self.task_queue[task_id] = [task, self.TASK_QUEUED, task_dependency]
+        self.__index_status(task_id, None, self.TASK_QUEUED)
+        if self.journal is not None:
+            self.journal.record_task(task_id, task_name, plugin_name, task_params, task_topics, task_dependency,
+                                     delivery, delivery_key, self.TASK_QUEUED, priority, tenant, timeout, retries)
         return task_id
 
+    def restore_tasks(self, records, statuses, decoder):
+        """Restore the previously queued tasks, as recovered from the journal
+
+        The tasks are restored in their encoded form and only decoded once
+        they are accessed, so that a large number of tasks can be restored
+        quickly. The restored tasks are not recorded in the journal again.
+
+        Keyword arguments:
+        records -- Dict {task_id: encoded task}
+        statuses -- Dict {task_id: status}, the status can be a string
+        decoder -- Callable decoding an encoded task into the list
+                   [name, plugin, params, topics, dependencies, delivery,
+                    delivery_key, priority, tenant, timeout, retries]
+        """
+
+        self.task_decoder = decoder
+        task_queue = self.task_queue
+        status_index = self.status_index
+        for task_id, record in records.iteritems():
+            status = int(statuses[task_id])
+            task_queue[task_id] = [record, status, None]
+            if status not in status_index:
+                status_index[status] = set()
+            status_index[status].add(task_id)
+
+    def get_task_records(self):
+        """Get the complete state of the queued tasks
+
+        Returns:
+            Dict {task_id: [name, plugin, params, topics, dependencies,
+                            delivery, delivery_key, status, priority, tenant,
+                            timeout, retries]}
+        """
+
+        records = {}
+        for task_id in self.task_queue.keys():
+            task = self.__get_task_object(task_id)
+            status, dependency = self.task_queue[task_id][1:]
+            records[task_id] = [task.task_name, task.plugin_name, task.task_params, task.task_topics,
+                                dependency or [], task.delivery, task.delivery_key, status, task.priority,
+                                task.tenant, task.timeout, task.retries]
+        return records
+
+    def __get_task_object(self, task_id):
+        """Get the Task object, decoding the task if it was restored
+
+        Keyword arguments:
+        task_id -- The id of the task
+
+        Returns:
+            Task
+        """
+
+        entry = self.task_queue[task_id]
+        if isinstance(entry[0], str):
+            fields = self.task_decoder(entry[0])
+            entry[0] = Task(fields[0], fields[1], fields[2], fields[3], fields[5], fields[6], task_id, fields[7],
+                            fields[8], fields[9], fields[10])
+            entry[2] = fields[4]
+        return entry[0]
+
     def get_task(self, task_id):
         """Return the task based on its task id
 
@@ -91,10 +260,28 @@ class TaskQueue(object):
             List
         """
 
-        if task_id not in self.task_queue.keys():
+        if task_id not in self.task_queue:
             raise KeyError("The mentioned task has not been queued")
 
-        return self.task_queue[task_id][0].get_task()
+        return self.__get_task_object(task_id).get_task()
+
+    def get_task_delivery(self, task_id):
+        """Get the delivery options of the task
+
+        Keyword arguments:
+        task_id -- The id of the task
+
+        Raises:
+            KeyError if the task is not present
+
+        Returns:
+            Tuple (delivery, delivery_key)
+        """
+
+        if task_id not in self.task_queue:
+            raise KeyError("The mentioned task has not been queued")
+
+        return self.__get_task_object(task_id).get_delivery()
 
     def get_task_list(self):
         """Returns the list of tasks currently in the queue
@@ -105,6 +292,54 @@ class TaskQueue(object):
 
         return self.task_queue.keys()
 
+    def get_tasks_by_status(self, task_status):
+        """Get the list of tasks currently in the given status
+
+        Keyword arguments:
+        task_status -- The status to look the tasks up for
+
+        Returns:
+            List
+        """
+
+        return list(self.status_index.get(task_status, ()))
+
+    def get_task_schedule(self, task_id):
+        """Get the scheduling options of the task
+
+        Keyword arguments:
+        task_id -- The id of the task
+
+        Raises:
+            KeyError if the task is not present
+
+        Returns:
+            Tuple (priority, tenant)
+        """
+
+        if task_id not in self.task_queue:
+            raise KeyError("The mentioned task has not been queued")
+
+        return self.__get_task_object(task_id).get_schedule()
+
+    def get_task_limits(self, task_id):
+        """Get the timeout options of the task
+
+        Keyword arguments:
+        task_id -- The id of the task
+
+        Raises:
+            KeyError if the task is not present
+
+        Returns:
+            Tuple (timeout, retries)
+        """
+
+        if task_id not in self.task_queue:
+            raise KeyError("The mentioned task has not been queued")
+
+        return self.__get_task_object(task_id).get_limits()
+
     def get_task_status(self, task_id):
         """Get the status of the current task
 
@@ -118,7 +353,7 @@ class TaskQueue(object):
             Integer The status of the task
         """
 
-        if task_id not in self.task_queue.keys():
+        if task_id not in self.task_queue:
             raise KeyError("The provided task is not queued")
 
         return self.task_queue[task_id][1]
@@ -135,9 +370,10 @@ class TaskQueue(object):
             List The dependencies for the given task
         """
 
-        if task_id not in self.task_queue.keys():
+        if task_id not in self.task_queue:
             raise KeyError("Task is not queued")
 
+        self.__get_task_object(task_id)
         return self.task_queue[task_id][2]
 
     def change_task_status(self, task_id, task_status):
@@ -151,7 +387,719 @@ class TaskQueue(object):
             KeyError if the task is not queued
         """
 
-        if task_id not in self.task_queue.keys():
+        if task_id not in self.task_queue:
             raise KeyError("The provided task is not present")
 
+        self.__index_status(task_id, self.task_queue[task_id][1], task_status)
         self.task_queue[task_id][1] = task_status
+        if self.journal is not None:
+            self.journal.record_status(task_id, task_status)
+
+    def __index_status(self, task_id, old_status, new_status):
+        """Move the task to its new status in the status index
+
+        Keyword arguments:
+        task_id -- The id of the task
+        old_status -- The previous status of the task, None for a new task
+        new_status -- The new status of the task
+        """
+
+        if old_status is not None:
+            self.status_index[old_status].discard(task_id)
+        if new_status not in self.status_index:
+            self.status_index[new_status] = set()
+        self.status_index[new_status].add(task_id)
+        self.transition_counters[new_status]()
+
+class TaskScheduler(object):
+    """Order the ready tasks for the dispatch
+
+    The priority classes are served strictly in order, a task of a lower
+    priority class is only dispatched once no task of a higher class is
+    waiting. Within a priority class the dispatch is shared between the
+    tenants through weighted deficit round robin: on its turn a tenant earns
+    credit equal to its weight and dispatches one task, in FIFO order, per
+    unit of credit. A tenant with a large backlog hence can't starve the other
+    tenants of the same class.
+
+    A task keeps its place in the FIFO order of its tenant when it is added
+    again, after its dispatch was deferred or timed out, until it is
+    forgotten once finished.
+
+    The general structure looks like:
+    classes: {priority: [deque of active tenants,
+                         {tenant: heap of (sequence, task id)},
+                         {tenant: credit}]}
+    """
+
+    def __init__(self):
+        """Initialize the task scheduler"""
+
+        self.classes = {}
+        self.weights = {}
+        self.scheduled = set()
+        #The place of every task in the FIFO order, kept across its additions
+        self.sequence = {}
+        self.next_sequence = 0
+
+    def set_weight(self, tenant, weight):
+        """Set the fair share weight of a tenant
+
+        Keyword arguments:
+        tenant -- The tenant to set the weight for
+        weight -- The number of tasks the tenant may dispatch per round, can
+                  be fractional (Default weight: 1)
+
+        Raises:
+            ValueError if the weight is not positive
+        """
+
+        if weight <= 0:
+            raise ValueError("The tenant weight should be positive")
+
+        self.weights[tenant] = weight
+
+    def add_task(self, task_id, priority, tenant):
+        """Add a ready task to the schedule
+
+        Keyword arguments:
+        task_id -- The id of the task
+        priority -- The priority class of the task
+        tenant -- The tenant the task is accounted to
+
+        Returns: Bool
+        """
+
+        if task_id in self.scheduled:
+            return False
+
+        if priority not in self.classes:
+            self.classes[priority] = [collections.deque(), {}, {}]
+        active, queues, credits = self.classes[priority]
+
+        if tenant not in queues:
+            queues[tenant] = []
+            #The tenant at the head of the round has already earned its credit
+            credits[tenant] = self.weights.get(tenant, 1) if not active else 0
+            active.append(tenant)
+
+        sequence = self.sequence.get(task_id)
+        if sequence is None:
+            sequence = self.sequence[task_id] = self.next_sequence
+            self.next_sequence = self.next_sequence + 1
+        heapq.heappush(queues[tenant], (sequence, task_id))
+        self.scheduled.add(task_id)
+        return True
+
+    def next_task(self):
+        """Get the next task to be dispatched
+
+        Returns:
+            task_id of the next task
+            None if no task is scheduled
+        """
+
+        for priority in sorted(self.classes.keys()):
+            active, queues, credits = self.classes[priority]
+            while active:
+                tenant = active[0]
+                if credits[tenant] >= 1:
+                    credits[tenant] = credits[tenant] - 1
+                    task_id = heapq.heappop(queues[tenant])[1]
+                    if not queues[tenant]:
+                        self.__drop_tenant(active, queues, credits)
+                    self.scheduled.discard(task_id)
+                    return task_id
+
+                #The turn of the tenant is over, move to the next one
+                active.rotate(-1)
+                credits[active[0]] = credits[active[0]] + self.weights.get(active[0], 1)
+
+            del self.classes[priority]
+
+        return None
+
+    def forget_task(self, task_id):
+        """Forget the place of a finished task in the FIFO order
+
+        Keyword arguments:
+        task_id -- The id of the task
+        """
+
+        self.sequence.pop(task_id, None)
+
+    def is_scheduled(self, task_id):
+        """Check if the task is waiting in the schedule
+
+        Keyword arguments:
+        task_id -- The id of the task
+
+        Returns: Bool
+        """
+
+        return task_id in self.scheduled
+
+    def __len__(self):
+        """Get the number of the scheduled tasks"""
+
+        return len(self.scheduled)
+
+    def __drop_tenant(self, active, queues, credits):
+        """Remove the tenant at the head of the round once it has no tasks left
+
+        Keyword arguments:
+        active -- The deque of the active tenants
+        queues -- The task queues of the tenants
+        credits -- The credits of the tenants
+        """
+
+        tenant = active.popleft()
+        del queues[tenant]
+        del credits[tenant]
+        if active:
+            credits[active[0]] = credits[active[0]] + self.weights.get(active[0], 1)
+
+class DeadlineQueue(object):
+    """Track the deadlines of the tasks
+
+    The deadlines are kept in a heap, a task has at most one deadline at a
+    time. Setting a new deadline or cancelling it leaves the old heap entry
+    behind, which is skipped once it reaches the top of the heap.
+    """
+
+    def __init__(self):
+        """Initialize the deadline queue"""
+
+        self.heap = []
+        self.deadlines = {}
+
+    def set_deadline(self, task_id, deadline):
+        """Set the deadline of a task, replacing the previous one
+
+        Keyword arguments:
+        task_id -- The id of the task
+        deadline -- The time at which the deadline expires
+        """
+
+        self.deadlines[task_id] = deadline
+        heapq.heappush(self.heap, (deadline, task_id))
+
+    def cancel(self, task_id):
+        """Cancel the deadline of a task
+
+        Keyword arguments:
+        task_id -- The id of the task
+        """
+
+        self.deadlines.pop(task_id, None)
+
+    def pop_expired(self, now):
+        """Remove and return the tasks whose deadline has expired
+
+        Keyword arguments:
+        now -- The current time
+
+        Returns:
+            List of task ids in the order of their deadlines
+        """
+
+        expired = []
+        heap = self.heap
+        while heap and heap[0][0] <= now:
+            deadline, task_id = heapq.heappop(heap)
+            if self.deadlines.get(task_id) == deadline:
+                del self.deadlines[task_id]
+                expired.append(task_id)
+        return expired
+
+    def __len__(self):
+        """Get the number of the pending deadlines"""
+
+        return len(self.deadlines)
+
+class TimerWheel(object):
+    """Fire the timers on a hierarchical timing wheel
+
+    The time is cut into ticks of the wheel resolution. Every level of the
+    wheel has SLOTS slots and a window of SLOTS units starting at the current
+    tick, a unit of a level spanning the whole window of the level below. A
+    timer sits in the finest level whose window holds its tick, the slots of
+    the coarser levels keeping their timers by the unit of the level below.
+    As the windows slide along with the ticks, the unit entering the window
+    of a level is moved down from the coarser level, so every timer is moved
+    on its own unit rather than with a whole slot, and the tick work stays
+    flat however many timers are pending. Adding and cancelling a timer are
+    single slot updates, and the runs of ticks with nothing to fire or to
+    move are skipped. The timers are never fired early, and at most a tick
+    late.
+
+    The general structure looks like:
+    levels = [[{key: tick}] * SLOTS] + [[{unit: {key: tick}}] * SLOTS] * (LEVELS - 1)
+    timers = {key: bucket}
+    """
+
+    BITS = 8
+    SLOTS = 1 << BITS
+    LEVELS = 4
+
+    def __init__(self, resolution=0.1, now=0.0):
+        """Initialize the timer wheel
+
+        Keyword arguments:
+        resolution -- The length of a tick in seconds (Default: 0.1)
+        now -- The current time (Default: 0.0)
+        """
+
+        self.resolution = resolution
+        #The next tick to be processed
+        self.tick = int(math.floor(now / resolution)) + 1
+        self.levels = [[{} for slot in range(self.SLOTS)] for level in range(self.LEVELS)]
+        #The number of the timers in every level
+        self.counts = [0] * self.LEVELS
+        #The timers due before the next tick and the ones beyond the last level
+        self.due = {}
+        self.overflow = {}
+        self.timers = {}
+
+    def add(self, key, due):
+        """Add a timer, replacing the previous timer with the same key
+
+        Keyword arguments:
+        key -- The key of the timer
+        due -- The time at which the timer fires
+        """
+
+        self.cancel(key)
+        self.__place(key, int(math.ceil(due / self.resolution)))
+
+    def cancel(self, key):
+        """Cancel a timer
+
+        Keyword arguments:
+        key -- The key of the timer
+
+        Returns:
+            Bool False if there was no such timer
+        """
+
+        bucket = self.timers.pop(key, None)
+        if bucket is None:
+            return False
+
+        tick = bucket.pop(key)
+        if bucket is self.levels[0][tick & (self.SLOTS - 1)]:
+            self.counts[0] = self.counts[0] - 1
+            return True
+        for level in range(1, self.LEVELS):
+            shift = self.BITS * level
+            slot = self.levels[level][(tick >> shift) & (self.SLOTS - 1)]
+            unit = tick >> (shift - self.BITS)
+            if slot.get(unit) is bucket:
+                self.counts[level] = self.counts[level] - 1
+                if not bucket:
+                    del slot[unit]
+                break
+        return True
+
+    def advance(self, now):
+        """Move the wheel to the current time and fire the timers due
+
+        Keyword arguments:
+        now -- The current time
+
+        Returns:
+            List of the keys of the fired timers in the order of their ticks
+        """
+
+        fired = [entry[0] for entry in sorted(self.__pop_bucket(self.due, None), key=lambda entry: entry[1])]
+        target = int(math.floor(now / self.resolution))
+        levels = self.levels
+        while self.tick <= target and self.timers:
+            tick = self.tick
+            #Move the units entering the windows, the coarser levels first
+            for level in range(self.LEVELS, 0, -1):
+                shift = self.BITS * (level - 1)
+                if tick & ((1 << shift) - 1) != 0:
+                    continue
+                if level == self.LEVELS:
+                    entries = self.__pop_bucket(self.overflow, None)
+                else:
+                    unit = (tick >> shift) + self.SLOTS - 1
+                    bucket = levels[level][(unit >> self.BITS) & (self.SLOTS - 1)].pop(unit, None)
+                    if bucket is None:
+                        continue
+                    entries = self.__pop_bucket(bucket, level)
+                for key, entry in entries:
+                    self.__place(key, entry)
+
+            slot = levels[0][tick & (self.SLOTS - 1)]
+            if slot:
+                fired.extend([entry[0] for entry in self.__pop_bucket(slot, 0)])
+            self.tick = tick + 1
+
+            if self.counts[0] == 0 and self.timers:
+                self.tick = min(target + 1, self.__get_next_tick())
+
+        #Nothing is pending, so the empty ticks are skipped
+        if not self.timers:
+            self.tick = target + 1
+        return fired
+
+    def __get_next_tick(self):
+        """Get the next tick at which a timer is moved, with the first level empty
+
+        Returns:
+            Integer
+        """
+
+        level = 1
+        while level < self.LEVELS and self.counts[level] == 0:
+            level = level + 1
+
+        shift = self.BITS * min(level, self.LEVELS - 1)
+        #The units of the coarser levels are moved on the boundaries of
+        #this level
+        boundary = ((self.tick + (1 << shift) - 1) >> shift) << shift
+        if level == self.LEVELS:
+            return boundary
+
+        slots = self.levels[level]
+        start = self.tick >> shift
+        for offset in range(self.SLOTS):
+            slot = slots[(start + offset) & (self.SLOTS - 1)]
+            if slot:
+                unit = min(slot)
+                return max(self.tick, min(boundary, (unit - self.SLOTS + 1) << (shift - self.BITS)))
+        return self.tick
+
+    def __place(self, key, tick):
+        """Put a timer in the finest level whose window holds its tick
+
+        Keyword arguments:
+        key -- The key of the timer
+        tick -- The tick at which the timer fires
+        """
+
+        bucket = self.overflow
+        if tick < self.tick:
+            bucket = self.due
+        else:
+            for level in range(self.LEVELS):
+                shift = self.BITS * level
+                if (tick >> shift) - (self.tick >> shift) >= self.SLOTS:
+                    continue
+                if level == 0:
+                    bucket = self.levels[0][tick & (self.SLOTS - 1)]
+                else:
+                    unit = tick >> (shift - self.BITS)
+                    slot = self.levels[level][(tick >> shift) & (self.SLOTS - 1)]
+                    bucket = slot.get(unit)
+                    if bucket is None:
+                        bucket = slot[unit] = {}
+                self.counts[level] = self.counts[level] + 1
+                break
+        bucket[key] = tick
+        self.timers[key] = bucket
+
+    def __pop_bucket(self, bucket, level):
+        """Empty a bucket of timers
+
+        Keyword arguments:
+        bucket -- The bucket to be emptied
+        level -- The level of the bucket, None for the buckets outside the
+                 levels
+
+        Returns:
+            List of the (key, tick) entries of the bucket
+        """
+
+        entries = bucket.items()
+        for key in bucket:
+            del self.timers[key]
+        if level is not None:
+            self.counts[level] = self.counts[level] - len(bucket)
+        bucket.clear()
+        return entries
+
+    def __contains__(self, key):
+        """Check if a timer is pending"""
+
+        return key in self.timers
+
+    def __len__(self):
+        """Get the number of the pending timers"""
+
+        return len(self.timers)
+
+class RunTimeTracker(object):
+    """Keep the recent run times of the tasks to spot the stragglers"""
+
+    def __init__(self, samples=100):
+        """Initialize the run time tracker
+
+        Keyword arguments:
+        samples -- The number of recent run times kept per key (Default: 100)
+        """
+
+        self.samples = samples
+        self.run_times = {}
+
+    def add(self, key, run_time):
+        """Record a run time
+
+        Keyword arguments:
+        key -- The key to record the run time under, like the plugin name
+        run_time -- The run time in seconds
+        """
+
+        if key not in self.run_times:
+            self.run_times[key] = collections.deque(maxlen=self.samples)
+        self.run_times[key].append(run_time)
+
+    def get_median(self, key, min_samples=10):
+        """Get the median of the recent run times
+
+        Keyword arguments:
+        key -- The key to get the median for
+        min_samples -- The number of run times needed for a median
+                       (Default: 10)
+
+        Returns:
+            Float The median run time
+            None if not enough run times have been recorded
+        """
+
+        run_times = self.run_times.get(key, ())
+        if len(run_times) < min_samples:
+            return None
+        return sorted(run_times)[len(run_times) // 2]
+
+class ResultCache(object):
+    """Cache the results of the idempotent tasks
+
+    The results are kept in the least recently used order and evicted once
+    either the number of entries or their total size crosses the limit. An
+    entry also expires once its time to live runs out.
+
+    The general structure looks like:
+    entries: {key: [results, expiry, size]}
+    """
+
+    def __init__(self, max_entries=None, max_size=None):
+        """Initialize the result cache
+
+        Keyword arguments:
+        max_entries -- The maximum number of cached results
+                       (Default: BOLT_RESULT_CACHE_ENTRIES or 10000)
+        max_size -- The maximum total size in bytes of the cached results
+                    (Default: BOLT_RESULT_CACHE_SIZE or 67108864)
+        """
+
+        if max_entries is None:
+            max_entries = int(os.getenv('BOLT_RESULT_CACHE_ENTRIES', 10000))
+        if max_size is None:
+            max_size = int(os.getenv('BOLT_RESULT_CACHE_SIZE', 67108864))
+
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.entries = collections.OrderedDict()
+        self.size = 0
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0}
+
+    @classmethod
+    def get_key(cls, plugin_name, task_params, task_topics, delivery=None):
+        """Get the cache key of a task
+
+        Keyword arguments:
+        plugin_name -- The name of the plugin the task runs
+        task_params -- The parameters of the task
+        task_topics -- The topics the task runs on
+        delivery -- The delivery mode of the task, as a broadcast gets the
+                    results of every client and an anycast of a single one
+                    (Default: None)
+
+        Returns: String
+        """
+
+        return json.dumps([plugin_name, task_params, sorted(task_topics), delivery], sort_keys=True)
+
+    def get(self, key, now):
+        """Get the cached results
+
+        Keyword arguments:
+        key -- The cache key
+        now -- The current time
+
+        Returns:
+            List of results on a hit
+            None on a miss
+        """
+
+        entry = self.entries.get(key)
+        if entry is not None and entry[1] <= now:
+            self.__remove(key)
+            self.stats['expirations'] = self.stats['expirations'] + 1
+            entry = None
+
+        if entry is None:
+            self.stats['misses'] = self.stats['misses'] + 1
+            return None
+
+        #Move the entry to the most recently used end
+        del self.entries[key]
+        self.entries[key] = entry
+        self.stats['hits'] = self.stats['hits'] + 1
+        return entry[0]
+
+    def put(self, key, results, ttl, now):
+        """Cache the results
+
+        Results larger than the whole cache are not cached.
+
+        Keyword arguments:
+        key -- The cache key
+        results -- The list of results
+        ttl -- The time in seconds the results stay valid for
+        now -- The current time
+
+        Returns: Bool
+        """
+
+        size = len(json.dumps(results))
+        if size > self.max_size or self.max_entries <= 0:
+            return False
+
+        if key in self.entries:
+            self.__remove(key)
+        while self.entries and (len(self.entries) >= self.max_entries or self.size + size > self.max_size):
+            self.__remove(next(iter(self.entries)))
+            self.stats['evictions'] = self.stats['evictions'] + 1
+
+        self.entries[key] = [results, now + ttl, size]
+        self.size = self.size + size
+        return True
+
+    def get_stats(self):
+        """Get the cache statistics
+
+        Returns:
+            Dict {hits, misses, evictions, expirations, entries, size}
+        """
+
+        stats = dict(self.stats)
+        stats['entries'] = len(self.entries)
+        stats['size'] = self.size
+        return stats
+
+    def __remove(self, key):
+        """Remove an entry from the cache
+
+        Keyword arguments:
+        key -- The cache key
+        """
+
+        entry = self.entries.pop(key)
+        self.size = self.size - entry[2]
+
+class Aggregation(object):
+    """Reduce the replies to a fan out message as they arrive
+
+    Every reply is folded into the accumulator by the reducer right away, so
+    that only the accumulator is kept instead of the raw replies. The replies
+    carrying the name of the client are counted once per client, the rest
+    are counted as they come.
+
+    The aggregation isn't thread safe, the execution engine updates it under
+    its aggregation lock.
+    """
+
+    def __init__(self, reducer, initial, recipients=None, quorum=1.0):
+        """Initialize the aggregation
+
+        Keyword arguments:
+        reducer -- The callable folding a reply into the accumulator as
+                   reducer(accumulator, result), returning the new accumulator
+        initial -- The initial value of the accumulator
+        recipients -- The names of the clients the message was delivered to,
+                      None if not known (Default: None)
+        quorum -- The fraction of the recipients which should reply for the
+                  aggregation to complete (Default: 1.0)
+        """
+
+        self.reducer = reducer
+        self.accumulator = initial
+        self.quorum = quorum
+        self.recipients = None
+        self.replied = set()
+        self.anonymous = 0
+        self.required = None
+        if recipients is not None:
+            self.recipients = []
+            self.add_recipients(recipients)
+
+    def add_recipients(self, recipients):
+        """Count the clients a retry of the message was delivered to
+
+        The replies folded so far are kept and the quorum is taken over all
+        the recipients of the message.
+
+        Keyword arguments:
+        recipients -- The names of the clients the retry was delivered to,
+                      None if not known
+        """
+
+        if recipients is None or self.recipients is None:
+            self.recipients = None
+            self.required = None
+            return
+        self.recipients.extend(client for client in recipients if client not in self.recipients)
+        self.required = max(1, int(math.ceil(self.quorum * len(self.recipients))))
+
+    def add(self, result, client=None):
+        """Fold a reply into the accumulator
+
+        Keyword arguments:
+        result -- The result carried by the reply
+        client -- The name of the replying client (Default: None)
+
+        Returns:
+            Bool False if the client has already replied
+        """
+
+        if client is not None:
+            if client in self.replied:
+                return False
+            self.replied.add(client)
+        else:
+            self.anonymous = self.anonymous + 1
+
+        self.accumulator = self.reducer(self.accumulator, result)
+        return True
+
+    def get_replies(self):
+        """Get the number of the replies folded so far
+
+        Returns: Integer
+        """
+
+        return len(self.replied) + self.anonymous
+
+    def get_pending(self):
+        """Get the recipients which haven't replied yet
+
+        Returns:
+            List of client names
+            None if the recipients are not known
+        """
+
+        if self.recipients is None:
+            return None
+        return [client for client in self.recipients if client not in self.replied]
+
+    def is_complete(self):
+        """Check if the quorum of the recipients has replied
+
+        Returns: Bool
+        """
+
+        return self.required is not None and self.get_replies() >= self.required
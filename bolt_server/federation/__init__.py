@@ -0,0 +1,2 @@
+from federation import FederatedSocketHandler
+from structures import PeerTable, RouteTable
@@ -0,0 +1,506 @@
+'''
+File: federation.py
+Description: Federation of multiple bolt servers with topic based routing
+Date: 19/10/2026
+Author: Saurabh Badhwar <sbadhwar@redhat.com>
+'''
+from structures import PeerTable, RouteTable
+from bolt_server.shard_handler import ControlChannel
+from bolt_server.socket_handler import ClientSelector, TopicTrie
+import json
+import os
+import socket
+import threading
+import time
+
+class FederatedSocketHandler(object):
+    """Federate the local socket handler with the other bolt server nodes
+
+    Every node advertises the topics its local clients are subscribed to, to
+    all of its peers. A message sent on any of the nodes is delivered to the
+    local subscribers and routed only to the peers which advertised the topic.
+    The replies for the routed messages travel back to the node where the
+    message originated: a routed message is delivered with a route id naming
+    its origin node in place of its id, which the reply carries back.
+
+    To avoid duplicate links, a node only dials the peers whose node id sorts
+    after its own and accepts the connections from the rest. The node id is
+    the 'host:port' of the federation listener.
+
+    The outbound rate limits apply to the local clients of the node, the
+    messages routed to a peer are limited by the limits set on that peer.
+    """
+
+    #The peers don't report the clients the messages were sent to, so the
+    #replies can't be counted against the recipients
+    REPORTS_RECIPIENTS = False
+
+    def __init__(self, socket_handler, peers=None):
+        """Initialize the federated socket handler
+
+        Keyword arguments:
+        socket_handler -- The local socket handler (SocketHandler or
+                          ShardedSocketHandler)
+        peers -- The list of peer node ids in 'host:port' format
+                 (Default: BOLT_FEDERATION_PEERS as a comma separated list)
+        """
+
+        self.socket_handler = socket_handler
+        self.host = os.getenv('BOLT_FEDERATION_HOST', '127.0.0.1')
+        self.port = int(os.getenv('BOLT_FEDERATION_PORT', 5300))
+        self.retry_interval = float(os.getenv('BOLT_FEDERATION_RETRY_INTERVAL', 1))
+        #The time in seconds an accepted peer has to identify itself
+        self.hello_timeout = float(os.getenv('BOLT_FEDERATION_HELLO_TIMEOUT', 5))
+        self.node_id = '%s:%d' % (self.host, self.port)
+
+        if peers is None:
+            peers = [peer for peer in os.getenv('BOLT_FEDERATION_PEERS', '').split(',') if peer != '']
+        self.peer_list = [peer for peer in peers if peer != self.node_id]
+
+        self.peer_table = PeerTable()
+        self.route_table = RouteTable()
+        self.local_topics = set()
+        self.local_trie = TopicTrie()
+        self.client_selector = ClientSelector()
+        self.topic_delivery = {}
+        self.topic_lock = threading.Lock()
+        self.listen = True
+        self.thread_pool = []
+
+        self.socket_handler.register_handler(self.__handle_local_message)
+        self.socket_handler.register_topic_listener(self.__handle_topic_change)
+
+        self.__start_thread(self.__setup_federation_server, 'bolt-federation-listener')
+        for peer in self.peer_list:
+            if peer > self.node_id:
+                self.__start_thread(self.__dial_peer, 'bolt-federation-dialer', (peer,))
+
+    def __start_thread(self, target, name, args=()):
+        """Start a new daemon thread
+
+        Keyword arguments:
+        target -- The target method to run as thread
+        name -- The name of the thread
+        args -- The arguments to be passed to the target (Default: ())
+        """
+
+        thread = threading.Thread(target=target, args=args, name=name)
+        thread.daemon = True
+        self.thread_pool.append(thread)
+        thread.start()
+
+    def __setup_federation_server(self):
+        """Setup the federation server to accept the peer connections"""
+
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind((self.host, self.port))
+        self.socket.listen(len(self.peer_list) + 1)
+
+        while self.listen:
+            conn, addr = self.socket.accept()
+            #A peer slow to identify itself doesn't hold up the others
+            self.__start_thread(self.__accept_peer, 'bolt-federation-peer', (conn,))
+
+    def __accept_peer(self, conn):
+        """Await the hello of an accepted peer and exchange the frames with it
+
+        The peers which don't send their hello within the hello timeout are
+        dropped.
+
+        Keyword arguments:
+        conn -- The accepted connection of the peer
+        """
+
+        channel = ControlChannel(conn)
+        conn.settimeout(self.hello_timeout)
+        frame = channel.recv_frame()
+        if frame is None or frame[0] != ControlChannel.OP_HELLO:
+            channel.close()
+            return
+
+        conn.settimeout(None)
+        self.__run_peer(frame[1], channel)
+
+    def __dial_peer(self, node_id):
+        """Keep a connection open to the peer
+
+        Keyword arguments:
+        node_id -- The identifier of the peer node to connect to
+        """
+
+        host, port = node_id.rsplit(':', 1)
+        while self.listen:
+            try:
+                conn = socket.create_connection((host, int(port)))
+            except socket.error:
+                time.sleep(self.retry_interval)
+                continue
+
+            channel = ControlChannel(conn)
+            try:
+                channel.send_frame(ControlChannel.OP_HELLO, self.node_id)
+            except RuntimeError:
+                continue
+
+            self.__run_peer(node_id, channel)
+            time.sleep(self.retry_interval)
+
+    def __run_peer(self, node_id, channel):
+        """Exchange the frames with a connected peer
+
+        Advertises the local topics to the peer and processes the frames
+        received from it until the link goes down.
+
+        Keyword arguments:
+        node_id -- The identifier of the peer node
+        channel -- The control channel connected to the peer
+        """
+
+        if not self.peer_table.add_peer(node_id, channel):
+            channel.close()
+            return
+
+        try:
+            with self.topic_lock:
+                for topic in self.local_topics:
+                    channel.send_frame(ControlChannel.OP_TOPIC_ADD, topic)
+        except RuntimeError:
+            pass
+
+        while self.listen:
+            frame = channel.recv_frame()
+            if frame is None:
+                break
+
+            op, topic, payload = frame
+            if op == ControlChannel.OP_SEND:
+                try:
+                    self.socket_handler.send_message(topic, self.__route_message(node_id, payload))
+                except RuntimeError:
+                    pass
+            elif op == ControlChannel.OP_SEND_ONE:
+                delivery, delivery_key, message = ControlChannel.unpack_delivery(payload)
+                try:
+                    self.socket_handler.send_message(topic, self.__route_message(node_id, message), delivery,
+                                                     delivery_key)
+                except RuntimeError:
+                    pass
+            elif op == ControlChannel.OP_BROADCAST:
+                self.socket_handler.broadcast(payload)
+            elif op == ControlChannel.OP_INBOUND:
+                self.client_selector.message_received(node_id)
+                self.handle(payload)
+            elif op == ControlChannel.OP_TOPIC_ADD:
+                self.peer_table.add_topic(node_id, topic)
+            elif op == ControlChannel.OP_TOPIC_REMOVE:
+                self.peer_table.remove_topic(node_id, topic)
+
+        self.peer_table.remove_peer(node_id)
+        channel.close()
+
+    def __decode_message(self, message):
+        """Decode a message carrying an id
+
+        Keyword arguments:
+        message -- The message, either a dict or JSON formatted
+
+        Returns:
+            Dict, a copy of the message, on success
+            None if the message doesn't carry an id
+        """
+
+        try:
+            decoded = dict(message) if isinstance(message, dict) else json.loads(message)
+            if decoded.get('id') is not None:
+                return decoded
+        except (TypeError, ValueError, AttributeError):
+            pass
+        return None
+
+    def __route_message(self, node_id, message):
+        """Record the route of a message sent by a peer
+
+        Keyword arguments:
+        node_id -- The identifier of the peer which sent the message
+        message -- The JSON formatted message
+
+        Returns:
+            The message to be delivered to the local clients, carrying its
+            route id
+        """
+
+        decoded = self.__decode_message(message)
+        if decoded is None:
+            return message
+        decoded['id'] = self.route_table.add_route(node_id, decoded['id'])
+        return json.dumps(decoded)
+
+    def __handle_topic_change(self, topic, active):
+        """Advertise the change in the local topics to the peers
+
+        Keyword arguments:
+        topic -- The topic whose availability changed
+        active -- True if the topic gained local subscribers, False otherwise
+        """
+
+        with self.topic_lock:
+            if active:
+                self.local_topics.add(topic)
+                if TopicTrie.is_pattern(topic):
+                    self.local_trie.add(topic, self.node_id)
+                op = ControlChannel.OP_TOPIC_ADD
+            else:
+                self.local_topics.discard(topic)
+                self.local_trie.remove(topic, self.node_id)
+                op = ControlChannel.OP_TOPIC_REMOVE
+
+            for channel in self.peer_table.get_channels():
+                try:
+                    channel.send_frame(op, topic)
+                except RuntimeError:
+                    pass
+
+    def __handle_local_message(self, message):
+        """Handle the messages received from the local clients
+
+        The replies to the messages routed from a peer are sent back to the
+        peer, everything else is handled locally.
+
+        Keyword arguments:
+        message -- The incoming message
+        """
+
+        decoded = self.__decode_message(message)
+        route = self.route_table.get_route(decoded['id']) if decoded is not None else None
+        if route is not None:
+            node_id, decoded['id'] = route
+            try:
+                self.peer_table.get_channel(node_id).send_frame(ControlChannel.OP_INBOUND, '',
+                                                                json.dumps(decoded))
+                return
+            except (KeyError, RuntimeError):
+                pass
+
+        self.client_selector.message_received(self.node_id)
+        self.handle(message)
+
+    def __is_local_topic(self, topic):
+        """Check if the local clients hold subscribers for the topic
+
+        Keyword arguments:
+        topic -- The topic being published to
+
+        Returns: Bool
+        """
+
+        if topic in self.local_topics:
+            return True
+        return self.local_trie.pattern_count != 0 and self.local_trie.match(topic) != []
+
+    def register_handler(self, message_handler):
+        """Register a new message handler
+
+        Keyword arguments:
+        message_handler -- The message handling object
+        """
+
+        self.message_handler = message_handler
+
+    def register_topic_listener(self, listener):
+        """Register a listener for the local topic availability changes
+
+        Keyword arguments:
+        listener -- The callable to be notified as listener(topic, active)
+        """
+
+        self.socket_handler.register_topic_listener(listener)
+
+    def handle(self, message):
+        """Handle the incoming messages
+
+        Keyword arguments:
+        message -- The message to be processed
+        """
+
+        self.message_handler(message)
+
+    def get_topics(self):
+        """Get the list of topics available across the federation
+
+        Returns: List of topics
+        """
+
+        with self.topic_lock:
+            topics = set(self.local_topics)
+        topics.update(self.peer_table.topic_table.keys())
+        return list(topics)
+
+    def set_topic_delivery(self, topic, delivery):
+        """Set the default delivery mode for a topic
+
+        Keyword arguments:
+        topic -- The topic to set the delivery mode for
+        delivery -- One of the ClientSelector.DELIVERY_* modes
+        """
+
+        self.topic_delivery[topic] = delivery
+
+    def report_load(self, client_name, inflight, cpu=None, capacity=None):
+        """Record the load reported by a client
+
+        The reports come from the local clients and are passed on to the local
+        socket handler, the peer nodes are selected by their outstanding
+        messages.
+
+        Keyword arguments:
+        client_name -- The name of the client
+        inflight -- The number of tasks the client is running
+        cpu -- The CPU load of the client (Default: None)
+        capacity -- The number of tasks the client can run at once
+                    (Default: None)
+        """
+
+        self.socket_handler.report_load(client_name, inflight, cpu, capacity)
+
+    def get_headroom(self, topic, delivery=None):
+        """Get the number of messages the clients of a topic can take
+
+        Returns:
+            None as the capacity of the clients is not tracked here
+        """
+
+        return None
+
+    def send_message(self, topic, message, delivery=None, delivery_key=None):
+        """Send a new message to the clients subscribed to a particular topic
+
+        The message is delivered to the local subscribers and routed to the
+        peers which have advertised subscribers for the topic. With an anycast
+        delivery mode a single node is selected, which then selects a single
+        client out of its own subscribers.
+
+        Keyword arguments:
+        topic -- The topic to which the message should be sent
+        message -- The JSON formatted message that needs to be sent
+        delivery -- The delivery mode for the message (Default: None)
+        delivery_key -- The key used by the consistent hash delivery
+                        (Default: None)
+
+        Raises:
+            RuntimeError if no node has subscribers for the topic
+        """
+
+        if delivery is None:
+            delivery = self.topic_delivery.get(topic, ClientSelector.DELIVERY_BROADCAST)
+
+        if delivery != ClientSelector.DELIVERY_BROADCAST:
+            self.__send_anycast(topic, message, delivery, delivery_key)
+            return
+
+        delivered = False
+        if self.__is_local_topic(topic):
+            self.socket_handler.send_message(topic, message)
+            delivered = True
+
+        for node_id, channel in self.peer_table.get_peers(topic):
+            try:
+                channel.send_frame(ControlChannel.OP_SEND, topic, message)
+                delivered = True
+            except RuntimeError:
+                pass
+
+        if not delivered:
+            raise RuntimeError("The specified topic doesn't exist")
+
+    def send_many(self, messages):
+        """Send a batch of messages, forwarding them one by one
+
+        Keyword arguments:
+        messages -- The list of (topic, message, delivery, delivery_key)
+
+        Returns:
+            List with True for the messages which were forwarded, as the
+            recipients are not known here, and None for the messages whose
+            topic doesn't exist
+        """
+
+        sent = []
+        for topic, message, delivery, delivery_key in messages:
+            try:
+                self.send_message(topic, message, delivery, delivery_key)
+                sent.append(True)
+            except RuntimeError:
+                sent.append(None)
+        return sent
+
+    def __send_anycast(self, topic, message, delivery, delivery_key):
+        """Send the message to a single node holding subscribers for the topic
+
+        Keyword arguments:
+        topic -- The topic to which the message should be sent
+        message -- The JSON formatted message that needs to be sent
+        delivery -- The anycast delivery mode
+        delivery_key -- The key used by the consistent hash delivery
+
+        Raises:
+            RuntimeError if no node has subscribers for the topic
+        """
+
+        channels = dict(self.peer_table.get_peers(topic))
+        nodes = sorted(channels.keys())
+        if self.__is_local_topic(topic):
+            nodes.insert(0, self.node_id)
+        if nodes == []:
+            raise RuntimeError("The specified topic doesn't exist")
+
+        node_id = self.client_selector.select(topic, nodes, delivery, delivery_key,
+                                              dict((node, node) for node in nodes))
+        if node_id == self.node_id:
+            self.socket_handler.send_message(topic, message, delivery, delivery_key)
+        else:
+            payload = ControlChannel.pack_delivery(delivery, delivery_key, message)
+            channels[node_id].send_frame(ControlChannel.OP_SEND_ONE, topic, payload)
+        self.client_selector.message_sent(node_id)
+
+    def set_topic_rate(self, topic, rate, burst=None):
+        """Limit the rate of the messages sent on a topic to the local clients
+
+        Keyword arguments:
+        topic -- The topic to limit, as the messages are sent on it
+        rate -- The number of messages per second, 0 to remove the limit
+        burst -- The number of messages which can be sent at once
+                 (Default: The rate, at least 1)
+        """
+
+        self.socket_handler.set_topic_rate(topic, rate, burst)
+
+    def set_client_rate(self, client_name, rate, burst=None):
+        """Limit the rate of the writes to a local client
+
+        Keyword arguments:
+        client_name -- The name the client sends in its handshake
+        rate -- The number of writes per second, 0 to remove the limit
+        burst -- The number of writes which can be sent at once
+                 (Default: The rate, at least 1)
+        """
+
+        self.socket_handler.set_client_rate(client_name, rate, burst)
+
+    def broadcast(self, message):
+        """Broadcast a message to all the connected clients across the federation"""
+
+        self.socket_handler.broadcast(message)
+        for channel in self.peer_table.get_channels():
+            try:
+                channel.send_frame(ControlChannel.OP_BROADCAST, '', message)
+            except RuntimeError:
+                pass
+
+    def stop_listening(self):
+        """Stop the federation and the local socket handler"""
+
+        self.listen = False
+        for channel in self.peer_table.get_channels():
+            channel.close()
+        self.socket_handler.stop_listening()
@@ -0,0 +1,208 @@
+'''
+File: structures.py
+Description: Structures used for federating multiple bolt servers
+Date: 19/10/2026
+Author: Saurabh Badhwar <sbadhwar@redhat.com>
+'''
+from bolt_server.socket_handler import TopicTrie
+import collections
+import threading
+
+class PeerTable(object):
+    """Keep track of the federation peers and the topics they advertise
+
+    The general structure looks like:
+    peers: {node_id: ControlChannel}
+    topic_table: {'topic': set([node_id])}
+
+    The topics advertised with wildcard levels are also indexed in a TopicTrie.
+    """
+
+    def __init__(self):
+        """Initialize the peer table"""
+
+        self.peers = {}
+        self.topic_table = {}
+        self.topic_trie = TopicTrie()
+        self.lock = threading.Lock()
+
+    def add_peer(self, node_id, channel):
+        """Add a new peer to the table
+
+        Keyword arguments:
+        node_id -- The identifier of the peer node
+        channel -- The control channel connected to the peer
+
+        Returns:
+            True on success
+            False if the peer is already connected
+        """
+
+        with self.lock:
+            if node_id in self.peers:
+                return False
+            self.peers[node_id] = channel
+        return True
+
+    def remove_peer(self, node_id):
+        """Remove the peer along with the topics it advertised
+
+        Keyword arguments:
+        node_id -- The identifier of the peer node
+        """
+
+        with self.lock:
+            if node_id in self.peers:
+                del self.peers[node_id]
+            for topic in self.topic_table.keys():
+                self.topic_table[topic].discard(node_id)
+                self.topic_trie.remove(topic, node_id)
+                if not self.topic_table[topic]:
+                    del self.topic_table[topic]
+
+    def is_peer(self, node_id):
+        """Check if the peer is connected
+
+        Keyword arguments:
+        node_id -- The identifier of the peer node
+
+        Returns: Bool
+        """
+
+        return node_id in self.peers
+
+    def get_channel(self, node_id):
+        """Get the control channel for the peer
+
+        Keyword arguments:
+        node_id -- The identifier of the peer node
+
+        Raises:
+            KeyError if the peer is not connected
+
+        Returns:
+            ControlChannel
+        """
+
+        with self.lock:
+            if node_id not in self.peers:
+                raise KeyError("The peer is not connected")
+            return self.peers[node_id]
+
+    def get_channels(self):
+        """Get the control channels for all the connected peers
+
+        Returns: List of ControlChannel
+        """
+
+        with self.lock:
+            return self.peers.values()
+
+    def add_topic(self, node_id, topic):
+        """Record a topic advertised by the peer
+
+        Keyword arguments:
+        node_id -- The identifier of the peer node
+        topic -- The topic advertised by the peer
+        """
+
+        with self.lock:
+            self.topic_table.setdefault(topic, set()).add(node_id)
+            if TopicTrie.is_pattern(topic):
+                self.topic_trie.add(topic, node_id)
+
+    def remove_topic(self, node_id, topic):
+        """Remove a topic withdrawn by the peer
+
+        Keyword arguments:
+        node_id -- The identifier of the peer node
+        topic -- The topic withdrawn by the peer
+        """
+
+        with self.lock:
+            if topic in self.topic_table:
+                self.topic_table[topic].discard(node_id)
+                self.topic_trie.remove(topic, node_id)
+                if not self.topic_table[topic]:
+                    del self.topic_table[topic]
+
+    def get_peers(self, topic):
+        """Get the peers advertising subscribers for the topic
+
+        Includes the peers advertising subscription patterns which match the
+        topic.
+
+        Keyword arguments:
+        topic -- The topic to look up
+
+        Returns:
+            List of (node_id, ControlChannel)
+        """
+
+        with self.lock:
+            nodes = set(self.topic_table.get(topic, ()))
+        if self.topic_trie.pattern_count != 0:
+            nodes.update(self.topic_trie.match(topic))
+
+        with self.lock:
+            return [(node_id, self.peers[node_id]) for node_id in nodes if node_id in self.peers]
+
+class RouteTable(object):
+    """Remember the origin node of the messages delivered on behalf of peers
+
+    The message ids are derived from the message content, so the same id can
+    arrive from several peers. Every route is kept by its origin node along
+    with the message id, as a route id the message is delivered with, and the
+    replies from the local clients carry it back to their origin node. The
+    table is bounded and forgets the oldest routes first.
+
+    The general structure looks like:
+    route_table: {route_id: (node_id, message_id)}
+    """
+
+    def __init__(self, max_routes=100000):
+        """Initialize the route table
+
+        Keyword arguments:
+        max_routes -- The maximum number of routes to remember (Default: 100000)
+        """
+
+        self.max_routes = max_routes
+        self.route_table = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def add_route(self, node_id, message_id):
+        """Record the origin node of a message
+
+        Keyword arguments:
+        node_id -- The identifier of the origin node
+        message_id -- The id of the message on the origin node
+
+        Returns:
+            String, the route id to deliver the message with
+        """
+
+        route_id = '%s/%s' % (node_id, message_id)
+        with self.lock:
+            if route_id in self.route_table:
+                del self.route_table[route_id]
+            self.route_table[route_id] = (node_id, message_id)
+            if len(self.route_table) > self.max_routes:
+                self.route_table.popitem(last=False)
+        return route_id
+
+    def get_route(self, route_id):
+        """Get the origin node and the original id of a message
+
+        Keyword arguments:
+        route_id -- The id the message was delivered with
+
+        Returns:
+            Tuple (node_id, message_id) on success
+            None if the message was not delivered on behalf of a peer
+        """
+
+        if not isinstance(route_id, basestring):
+            return None
+        with self.lock:
+            return self.route_table.get(route_id)
@@ -0,0 +1,2 @@
+from journal import TaskJournal
+from structures import JournalState
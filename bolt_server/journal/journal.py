@@ -0,0 +1,243 @@
+'''
+File: journal.py
+Description: Write ahead journal for the task state
+Date: 19/10/2026
+Author: Saurabh Badhwar <sbadhwar@redhat.com>
+'''
+from structures import JournalState
+import gc
+import os
+import threading
+import time
+
+class TaskJournal(object):
+    """Append only journal of the task submissions and status changes
+
+    The records are appended to the journal file and synced to the disk in
+    batches, either once the batch size is reached or after the sync interval
+    elapses, whichever happens first. Once enough records have been written,
+    a snapshot of the complete state is written and the journal is truncated.
+    The snapshot holds the state the snapshot provider gives, which can leave
+    out the finished tasks.
+
+    The journal directory contains:
+    snapshot.log -- The last snapshot of the state, in the journal format
+    journal.log -- The records written after the last snapshot
+    """
+
+    SNAPSHOT_FILE = 'snapshot.log'
+    JOURNAL_FILE = 'journal.log'
+
+    def __init__(self, journal_dir=None, sync_batch=None, sync_interval=None, snapshot_records=None):
+        """Initialize the task journal
+
+        Keyword arguments:
+        journal_dir -- The directory to keep the journal in
+                       (Default: BOLT_JOURNAL_DIR or 'bolt_journal')
+        sync_batch -- The number of records after which the journal is synced
+                      (Default: BOLT_JOURNAL_SYNC_BATCH or 1000)
+        sync_interval -- The maximum time in seconds a record can stay unsynced
+                         (Default: BOLT_JOURNAL_SYNC_INTERVAL or 0.05)
+        snapshot_records -- The number of records after which a snapshot is taken
+                            and the journal is compacted, 0 to disable
+                            (Default: BOLT_JOURNAL_SNAPSHOT_RECORDS or 1000000)
+        """
+
+        if journal_dir is None:
+            journal_dir = os.getenv('BOLT_JOURNAL_DIR', 'bolt_journal')
+        if sync_batch is None:
+            sync_batch = int(os.getenv('BOLT_JOURNAL_SYNC_BATCH', 1000))
+        if sync_interval is None:
+            sync_interval = float(os.getenv('BOLT_JOURNAL_SYNC_INTERVAL', 0.05))
+        if snapshot_records is None:
+            snapshot_records = int(os.getenv('BOLT_JOURNAL_SNAPSHOT_RECORDS', 1000000))
+
+        self.journal_dir = journal_dir
+        self.sync_batch = sync_batch
+        self.sync_interval = sync_interval
+        self.snapshot_records = snapshot_records
+        self.snapshot_path = os.path.join(journal_dir, self.SNAPSHOT_FILE)
+        self.journal_path = os.path.join(journal_dir, self.JOURNAL_FILE)
+
+        if not os.path.isdir(journal_dir):
+            os.makedirs(journal_dir)
+
+        self.lock = threading.Lock()
+        self.closed = False
+        self.snapshot_provider = None
+        self.unsynced = 0
+        self.record_count = 0
+        self.journal_file = open(self.journal_path, 'a')
+
+        self.sync_thread = threading.Thread(target=self.__start_syncer, name='bolt-journal-sync')
+        self.sync_thread.daemon = True
+        self.sync_thread.start()
+
+    def set_snapshot_provider(self, provider):
+        """Set the callable providing the state for the snapshots
+
+        The provider should return a dict in the format:
+        {'tasks': {task_id: [name, plugin, params, topics, dependencies,
+                             delivery, delivery_key, status, priority, tenant,
+                             timeout, retries]},
+         'message_map': {message_id: task_id}}
+
+        The provider is called with the journal lock held, hence the state
+        changes should be journaled after they are applied so that nothing gets
+        lost during the compaction.
+
+        Keyword arguments:
+        provider -- The callable returning the state
+        """
+
+        self.snapshot_provider = provider
+
+    def record_task(self, task_id, task_name, plugin_name, task_params, task_topics, task_dependency,
+                    delivery, delivery_key, status, priority, tenant, timeout, retries):
+        """Record a new task submission"""
+
+        self.__append(JournalState.encode_task(task_id, task_name, plugin_name, task_params, task_topics,
+                                               task_dependency, delivery, delivery_key, status, priority,
+                                               tenant, timeout, retries))
+
+    def record_status(self, task_id, status):
+        """Record a task status change
+
+        Keyword arguments:
+        task_id -- The id of the task
+        status -- The new status of the task
+        """
+
+        self.__append(JournalState.encode_status(task_id, status))
+
+    def record_message(self, message_id, task_id):
+        """Record the mapping of a message to its task
+
+        Keyword arguments:
+        message_id -- The id of the message sent for the task
+        task_id -- The id of the task
+        """
+
+        self.__append(JournalState.encode_message(message_id, task_id))
+
+    def replay(self):
+        """Rebuild the state from the snapshot and the journal
+
+        A partially written record at the end of the journal, left behind by a
+        crash, is ignored.
+
+        Returns:
+            JournalState
+        """
+
+        state = JournalState()
+        with self.lock:
+            self.__sync()
+            #The cyclic garbage collector only slows down the bulk load of the
+            #acyclic task records
+            gc_enabled = gc.isenabled()
+            gc.disable()
+            try:
+                if os.path.exists(self.snapshot_path):
+                    with open(self.snapshot_path) as snapshot_file:
+                        state.apply(snapshot_file.read())
+
+                with open(self.journal_path) as journal_file:
+                    self.record_count = state.apply(journal_file.read())
+            finally:
+                if gc_enabled:
+                    gc.enable()
+
+        return state
+
+    def sync(self):
+        """Flush and sync the pending records to the disk"""
+
+        with self.lock:
+            self.__sync()
+
+    def compact(self):
+        """Write a snapshot of the state and truncate the journal
+
+        Returns: Bool
+        """
+
+        with self.lock:
+            return self.__compact()
+
+    def close(self):
+        """Sync the pending records and close the journal"""
+
+        with self.lock:
+            self.__sync()
+            self.journal_file.close()
+            self.closed = True
+
+    def __append(self, record):
+        """Append a record to the journal
+
+        Keyword arguments:
+        record -- The encoded record
+        """
+
+        with self.lock:
+            self.journal_file.write(record)
+            self.unsynced = self.unsynced + 1
+            self.record_count = self.record_count + 1
+            if self.unsynced >= self.sync_batch:
+                self.__sync()
+            if self.snapshot_records and self.record_count >= self.snapshot_records:
+                self.__compact()
+
+    def __sync(self):
+        """Flush and sync the journal file, the lock must be held"""
+
+        if self.unsynced == 0 or self.journal_file.closed:
+            return
+
+        self.journal_file.flush()
+        os.fsync(self.journal_file.fileno())
+        self.unsynced = 0
+
+    def __compact(self):
+        """Snapshot the state and truncate the journal, the lock must be held
+
+        Returns: Bool
+        """
+
+        if self.snapshot_provider is None:
+            return False
+
+        self.__sync()
+        tmp_path = self.snapshot_path + '.tmp'
+        snapshot = self.snapshot_provider()
+        with open(tmp_path, 'w') as snapshot_file:
+            for task_id, task in snapshot['tasks'].iteritems():
+                snapshot_file.write(JournalState.encode_task(task_id, task[0], task[1], task[2], task[3], task[4],
+                                                             task[5], task[6], task[7], task[8], task[9],
+                                                             task[10], task[11]))
+            for message_id, task_id in snapshot['message_map'].iteritems():
+                snapshot_file.write(JournalState.encode_message(message_id, task_id))
+            snapshot_file.flush()
+            os.fsync(snapshot_file.fileno())
+        os.rename(tmp_path, self.snapshot_path)
+        dir_fd = os.open(self.journal_dir, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+        self.journal_file.close()
+        self.journal_file = open(self.journal_path, 'w')
+        os.fsync(self.journal_file.fileno())
+        self.record_count = 0
+        return True
+
+    def __start_syncer(self):
+        """Periodically sync the pending records to the disk"""
+
+        while not self.closed:
+            time.sleep(self.sync_interval)
+            with self.lock:
+                if not self.closed:
+                    self.__sync()
@@ -0,0 +1,204 @@
+'''
+File: structures.py
+Description: Structures used by the task journal
+Date: 19/10/2026
+Author: Saurabh Badhwar <sbadhwar@redhat.com>
+'''
+import json
+import re
+
+class JournalState(object):
+    """The task state rebuilt from the journal
+
+    Journal records are single tab separated lines:
+    Q <task_id> <status> <name> <plugin> <topics> <dependencies> <delivery> <key>
+      <priority> <tenant> <timeout> <retries> <params>
+    S <task_id> <status>
+    M <message_id> <task_id>
+
+    The list fields (topics and dependencies), the delivery key and the
+    parameters are JSON encoded, keeping the values and their types as they
+    were, and the empty optional fields are written as '-'. The list fields
+    written comma separated by the earlier versions are still read. The
+    snapshots use the same format, a Q record carrying the current status of
+    every task followed by the M records.
+
+    To keep the recovery fast, the task submission records are kept as is
+    and only decoded (decode_task) once the task is accessed. The statuses are
+    kept as the strings they were recorded as.
+
+    The general structure looks like:
+    tasks: {task_id: Q record}
+    statuses: {task_id: 'status'}
+    message_map: {message_id: task_id}
+    """
+
+    EMPTY = '-'
+    ESCAPES = {'n': '\n', 't': '\t', '\\': '\\'}
+    ESCAPE_PATTERN = re.compile(r'\\(.)')
+
+    def __init__(self):
+        """Initialize the journal state"""
+
+        self.tasks = {}
+        self.statuses = {}
+        self.message_map = {}
+
+    @classmethod
+    def encode_task(cls, task_id, task_name, plugin_name, task_params, task_topics, task_dependency,
+                    delivery, delivery_key, status, priority, tenant, timeout, retries):
+        """Encode the task submission record
+
+        Returns: String
+        """
+
+        return '\t'.join([
+            'Q',
+            task_id,
+            str(status),
+            cls.__escape(task_name),
+            cls.__escape(plugin_name),
+            cls.__encode_list(task_topics),
+            cls.__encode_list(task_dependency),
+            cls.EMPTY if delivery is None else str(delivery),
+            cls.EMPTY if delivery_key is None else json.dumps(delivery_key),
+            str(priority),
+            cls.__escape(str(tenant)),
+            cls.EMPTY if timeout is None else repr(float(timeout)),
+            cls.EMPTY if retries is None else str(retries),
+            json.dumps(task_params)
+        ]) + '\n'
+
+    @classmethod
+    def encode_status(cls, task_id, status):
+        """Encode the task status change record
+
+        Returns: String
+        """
+
+        return 'S\t%s\t%d\n' % (task_id, status)
+
+    @classmethod
+    def encode_message(cls, message_id, task_id):
+        """Encode the message to task mapping record
+
+        Returns: String
+        """
+
+        return 'M\t%s\t%s\n' % (message_id, task_id)
+
+    @classmethod
+    def decode_task(cls, record):
+        """Decode a task submission record
+
+        Keyword arguments:
+        record -- The Q record
+
+        Returns:
+            List [name, plugin, params, topics, dependencies, delivery,
+                  delivery_key, priority, tenant, timeout, retries]
+        """
+
+        fields = record.split('\t', 13)
+        params = fields[13]
+        if params == '{}':
+            params = {}
+        else:
+            params = json.loads(params)
+
+        return [
+            cls.__unescape(fields[3]),
+            cls.__unescape(fields[4]),
+            params,
+            cls.__decode_list(fields[5]),
+            cls.__decode_list(fields[6]),
+            None if fields[7] == cls.EMPTY else int(fields[7]),
+            None if fields[8] == cls.EMPTY else cls.__decode_key(fields[8]),
+            int(fields[9]),
+            cls.__unescape(fields[10]),
+            None if fields[11] == cls.EMPTY else float(fields[11]),
+            None if fields[12] == cls.EMPTY else int(fields[12])
+        ]
+
+    def apply(self, data):
+        """Apply the journal records to the state
+
+        The records are applied in order. A malformed record is skipped, as is
+        the record which isn't terminated by a newline since that is the
+        partially written tail left behind by a crash.
+
+        Keyword arguments:
+        data -- The journal contents
+
+        Returns:
+            Integer The number of records applied
+        """
+
+        tasks = self.tasks
+        statuses = self.statuses
+        message_map = self.message_map
+        records = data.split('\n')
+        #The last element is either empty or the partially written record
+        records.pop()
+        count = 0
+
+        for record in records:
+            try:
+                end = record.index('\t', 2)
+                kind = record[0]
+                if kind == 'S':
+                    statuses[record[2:end]] = record[end + 1:]
+                elif kind == 'M':
+                    message_map[record[2:end]] = record[end + 1:]
+                elif kind == 'Q':
+                    task_id = record[2:end]
+                    tasks[task_id] = record
+                    statuses[task_id] = record[end + 1:record.index('\t', end + 1)]
+                else:
+                    continue
+            except ValueError:
+                continue
+            count = count + 1
+
+        return count
+
+    @classmethod
+    def __escape(cls, value):
+        """Escape a string field so that it can't break the record"""
+
+        return value.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n')
+
+    @classmethod
+    def __unescape(cls, value):
+        """Reverse the escaping done by __escape"""
+
+        if '\\' not in value:
+            return value
+        return cls.ESCAPE_PATTERN.sub(lambda match: cls.ESCAPES[match.group(1)], value)
+
+    @classmethod
+    def __encode_list(cls, values):
+        """Encode a list field"""
+
+        if not values:
+            return cls.EMPTY
+        return json.dumps(values)
+
+    @classmethod
+    def __decode_list(cls, value):
+        """Decode a list field"""
+
+        if value == cls.EMPTY:
+            return []
+        if value.startswith('['):
+            return json.loads(value)
+        return value.split(',')
+
+    @classmethod
+    def __decode_key(cls, value):
+        """Decode the delivery key, written escaped by the earlier versions"""
+
+        try:
+            return json.loads(value)
+        except ValueError:
+            return cls.__unescape(value)
@@ -0,0 +1,2 @@
+from memory_transport import MemorySocketHandler
+from structures import FakeClient, VirtualClock
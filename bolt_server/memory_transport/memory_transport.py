@@ -0,0 +1,358 @@
+'''
+File: memory_transport.py
+Description: In-memory transport with scripted clients and a virtual clock
+Date: 19/10/2026
+Author: Saurabh Badhwar <sbadhwar@redhat.com>
+'''
+from structures import VirtualClock
+from bolt_server.socket_handler import ClientList, ClientSelector, LoadTable, RateLimiter
+
+class MemorySocketHandler(object):
+    """Deliver the messages to scripted clients inside the process
+
+    Provides the same interface as the SocketHandler without any sockets or
+    threads. The messages are handed to FakeClient objects, whose replies are
+    handled once the virtual clock has been advanced past their latency, so a
+    run with the same clients and the same inputs always behaves the same.
+    The clients are selected by the same ClientList and ClientSelector
+    structures the SocketHandler uses, and the rate limits are paced on the
+    virtual clock.
+    """
+
+    MESSAGE_DELIMITER = '\n'
+
+    #send_many reports the names of the clients every message was sent to
+    REPORTS_RECIPIENTS = True
+
+    def __init__(self, clock=None):
+        """Initialize the in-memory transport
+
+        Keyword arguments:
+        clock -- The VirtualClock the replies are scheduled on
+                 (Default: A new VirtualClock)
+        """
+
+        if clock is None:
+            clock = VirtualClock()
+
+        self.clock = clock
+        self.client_list = ClientList()
+        self.client_selector = ClientSelector(LoadTable(clock))
+        self.topic_delivery = {}
+        self.topic_listeners = []
+        self.listen = True
+        self.message_handler = None
+        self.message_count = 0
+        self.rate_limiter = RateLimiter(clock)
+        self.release_scheduled = False
+
+    def add_client(self, client):
+        """Connect a fake client
+
+        Keyword arguments:
+        client -- The FakeClient to be connected
+        """
+
+        self.client_list.set_client_name(client, client.name)
+        for topic in client.topics:
+            self.client_list.add_client(topic, client)
+            if len(self.client_list.get_clients(topic)) == 1:
+                self.__notify_topic_listeners(topic, True)
+
+    def remove_client(self, client):
+        """Disconnect a fake client
+
+        The replies the client has already scheduled are still handled.
+
+        Keyword arguments:
+        client -- The FakeClient to be disconnected
+        """
+
+        self.client_list.remove_client(client)
+        self.client_selector.remove_client(client)
+        for topic in client.topics:
+            if self.client_list.get_clients(topic) == []:
+                self.__notify_topic_listeners(topic, False)
+
+    def register_topic_listener(self, listener):
+        """Register a listener for the topic availability changes
+
+        Keyword arguments:
+        listener -- The callable to be notified as listener(topic, active)
+        """
+
+        self.topic_listeners.append(listener)
+
+    def register_handler(self, message_handler):
+        """Register the handler of the client replies
+
+        Keyword arguments:
+        message_handler -- The message handling callable
+        """
+
+        self.message_handler = message_handler
+
+    def handle(self, message):
+        """Handle a client reply
+
+        Keyword arguments:
+        message -- The reply to be processed
+        """
+
+        self.message_handler(message)
+
+    def stop_listening(self):
+        """Stop delivering the client replies"""
+
+        self.listen = False
+
+    def set_topic_delivery(self, topic, delivery):
+        """Set the default delivery mode for a topic
+
+        Keyword arguments:
+        topic -- The topic to set the delivery mode for
+        delivery -- One of the ClientSelector.DELIVERY_* modes
+        """
+
+        self.topic_delivery[topic] = delivery
+
+    def get_topic_delivery(self, topic):
+        """Get the default delivery mode of a topic
+
+        Returns:
+            Integer The delivery mode
+        """
+
+        return self.topic_delivery.get(topic, ClientSelector.DELIVERY_BROADCAST)
+
+    def send_message(self, topic, message, delivery=None, delivery_key=None):
+        """Send a message to the clients subscribed to a topic
+
+        Keyword arguments:
+        topic -- The topic to which the message should be sent
+        message -- The JSON formatted message
+        delivery -- The delivery mode for the message, overrides the topic
+                    delivery mode (Default: None)
+        delivery_key -- The key used by the consistent hash delivery
+                        (Default: None)
+
+        Raises:
+            RuntimeError if the specified topic doesn't exist
+        """
+
+        if not self.__admit_topic(topic, message, delivery, delivery_key):
+            return
+        for client in self.__get_recipients(topic, delivery, delivery_key):
+            self.__send(client, message)
+
+    def send_many(self, messages):
+        """Send a batch of messages
+
+        Keyword arguments:
+        messages -- The list of (topic, message, delivery, delivery_key)
+
+        Returns:
+            List with the names of the clients each message was sent to, None
+            for the messages whose topic doesn't exist, True for the messages
+            queued by the rate limit of their topic
+        """
+
+        sent = []
+        for topic, message, delivery, delivery_key in messages:
+            try:
+                if not self.__admit_topic(topic, message, delivery, delivery_key):
+                    sent.append(True)
+                    continue
+                clients = self.__get_recipients(topic, delivery, delivery_key)
+            except RuntimeError:
+                sent.append(None)
+                continue
+
+            for client in clients:
+                self.__send(client, message)
+            sent.append([client.name for client in clients])
+        return sent
+
+    def broadcast(self, message):
+        """Broadcast a message to all the connected clients"""
+
+        for topic in self.client_list.get_topics():
+            for client in list(self.client_list.get_clients(topic)):
+                self.__deliver(client, message)
+
+    def set_topic_rate(self, topic, rate, burst=None):
+        """Limit the rate of the messages sent on a topic
+
+        Keyword arguments:
+        topic -- The topic to limit
+        rate -- The number of messages per second, 0 to remove the limit
+        burst -- The number of messages which can be sent at once
+                 (Default: The rate, at least 1)
+        """
+
+        self.rate_limiter.set_rate(('topic', topic), rate, burst)
+        self.__schedule_release()
+
+    def set_client_rate(self, client_name, rate, burst=None):
+        """Limit the rate of the messages sent to a client
+
+        Keyword arguments:
+        client_name -- The name of the client
+        rate -- The number of messages per second, 0 to remove the limit
+        burst -- The number of messages which can be sent at once
+                 (Default: The rate, at least 1)
+        """
+
+        self.rate_limiter.set_rate(('client', client_name), rate, burst)
+        self.__schedule_release()
+
+    def report_load(self, client_name, inflight, cpu=None, capacity=None):
+        """Record the load reported by a client
+
+        The load is used by the least loaded delivery.
+
+        Keyword arguments:
+        client_name -- The name of the client
+        inflight -- The number of tasks the client is running
+        cpu -- The CPU load of the client (Default: None)
+        capacity -- The number of tasks the client can run at once
+                    (Default: None)
+        """
+
+        self.client_selector.report_load(client_name, inflight, cpu, capacity)
+
+    def get_headroom(self, topic, delivery=None):
+        """Get the number of messages the clients of a topic can take
+
+        Only the least loaded delivery is bound by the capacity of the
+        clients, the other delivery modes have no headroom limit.
+
+        Keyword arguments:
+        topic -- The topic the messages would be sent to
+        delivery -- The delivery mode of the messages, None for the delivery
+                    mode of the topic (Default: None)
+
+        Returns:
+            Integer
+            None if there is no limit
+        """
+
+        if delivery is None:
+            delivery = self.get_topic_delivery(topic)
+        if delivery != ClientSelector.DELIVERY_LEAST_LOADED:
+            return None
+        return self.client_selector.get_headroom(self.client_list.match_clients(topic),
+                                                 self.client_list.client_names)
+
+    def __admit_topic(self, topic, message, delivery, delivery_key):
+        """Check a message against the rate limit of its topic
+
+        Raises:
+            RuntimeError if the topic of a queued message doesn't exist
+
+        Returns:
+            Bool False if the message was queued
+        """
+
+        key = ('topic', topic)
+        if not self.rate_limiter.is_limited(key):
+            return True
+        if not self.client_list.is_topic(topic) and self.client_list.match_clients(topic) == []:
+            raise RuntimeError("The specified topic doesn't exist")
+        if self.rate_limiter.admit(key, (topic, message, delivery, delivery_key)):
+            return True
+        self.__schedule_release()
+        return False
+
+    def __send(self, client, message):
+        """Deliver a message to a client, unless its rate limit queues it"""
+
+        key = ('client', client.name)
+        if not self.rate_limiter.is_limited(key) or self.rate_limiter.admit(key, (client, message)):
+            self.__deliver(client, message)
+        else:
+            self.__schedule_release()
+
+    def __schedule_release(self):
+        """Release the queued messages on the clock, unless scheduled"""
+
+        if not self.release_scheduled:
+            self.release_scheduled = True
+            self.clock.schedule(0, self.__release)
+
+    def __release(self):
+        """Send the queued messages due and schedule the next release"""
+
+        self.release_scheduled = False
+        released, delay = self.rate_limiter.release()
+        for key, message, queued in released:
+            if key[0] == 'client':
+                self.__deliver(*message)
+                continue
+            topic, message, delivery, delivery_key = message
+            try:
+                clients = self.__get_recipients(topic, delivery, delivery_key)
+            except RuntimeError:
+                continue
+            for client in clients:
+                self.__send(client, message)
+
+        if delay is not None and not self.release_scheduled:
+            self.release_scheduled = True
+            self.clock.schedule(delay, self.__release)
+
+    def __deliver(self, client, message):
+        """Hand a message to a client and schedule its reply
+
+        Keyword arguments:
+        client -- The FakeClient
+        message -- The JSON formatted message
+        """
+
+        self.message_count = self.message_count + 1
+        self.client_selector.message_sent(client)
+        reply = client.receive(message, self.clock())
+        if reply is None:
+            return
+
+        delay, message = reply
+
+        def handle_reply():
+            if self.listen:
+                load = client.get_load(self.clock())
+                if load is not None:
+                    message['load'] = load
+                message['client'] = client.name
+                self.client_selector.message_received(client)
+                self.handle(message)
+
+        self.clock.schedule(delay, handle_reply)
+
+    def __get_recipients(self, topic, delivery, delivery_key):
+        """Get the clients a message on the topic should be sent to
+
+        Raises:
+            RuntimeError if the specified topic doesn't exist
+
+        Returns:
+            List of clients
+        """
+
+        clients = self.client_list.match_clients(topic)
+        if clients == [] and not self.client_list.is_topic(topic):
+            raise RuntimeError("The specified topic doesn't exist")
+
+        if delivery is None:
+            delivery = self.get_topic_delivery(topic)
+
+        if delivery != ClientSelector.DELIVERY_BROADCAST and clients != []:
+            clients = [self.client_selector.select(topic, clients, delivery, delivery_key,
+                                                   self.client_list.client_names)]
+
+        return list(clients)
+
+    def __notify_topic_listeners(self, topic, active):
+        """Notify the topic listeners about a change in topic availability"""
+
+        for listener in self.topic_listeners:
+            listener(topic, active)
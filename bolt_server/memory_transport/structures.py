@@ -0,0 +1,198 @@
+'''
+File: structures.py
+Description: Virtual clock and scripted clients of the in-memory transport
+Date: 19/10/2026
+Author: Saurabh Badhwar <sbadhwar@redhat.com>
+'''
+import heapq
+import json
+
+class VirtualClock(object):
+    """A clock which only moves when it is advanced
+
+    The callbacks scheduled on the clock run in the order of their due time,
+    and in the order they were scheduled for the same due time, while the
+    clock is advanced. The clock can be called to get the current time, so
+    that it can stand in for time.time (e.g. as ExecutionEngine.clock).
+
+    The event structure looks like:
+    events = [(due, sequence, callback)]
+    """
+
+    def __init__(self, start=0.0):
+        """Initialize the clock
+
+        Keyword arguments:
+        start -- The initial time (Default: 0.0)
+        """
+
+        self.time = start
+        self.events = []
+        self.sequence = 0
+
+    def __call__(self):
+        """Get the current time
+
+        Returns: Float
+        """
+
+        return self.time
+
+    def schedule(self, delay, callback):
+        """Schedule a callback
+
+        Keyword arguments:
+        delay -- The time in seconds after which the callback is due
+        callback -- The callable to be run without arguments
+        """
+
+        self.sequence = self.sequence + 1
+        heapq.heappush(self.events, (self.time + max(0.0, delay), self.sequence, callback))
+
+    def get_next(self):
+        """Get the due time of the next callback
+
+        Returns:
+            Float
+            None if no callback is scheduled
+        """
+
+        if self.events == []:
+            return None
+        return self.events[0][0]
+
+    def advance(self, seconds):
+        """Move the clock forward, running the callbacks which become due
+
+        Keyword arguments:
+        seconds -- The time to move the clock by
+
+        Returns:
+            Integer The number of callbacks run
+        """
+
+        return self.advance_to(self.time + seconds)
+
+    def advance_to(self, when):
+        """Move the clock to a time, running the callbacks due until then
+
+        The callbacks see the clock set to their due time and may schedule
+        further callbacks, which run as well if they are due in time.
+
+        Keyword arguments:
+        when -- The time to move the clock to
+
+        Returns:
+            Integer The number of callbacks run
+        """
+
+        count = 0
+        while self.events and self.events[0][0] <= when:
+            due, sequence, callback = heapq.heappop(self.events)
+            self.time = max(self.time, due)
+            callback()
+            count = count + 1
+        self.time = max(self.time, when)
+        return count
+
+    def run_next(self):
+        """Move the clock to the next callback and run the callbacks due then
+
+        Returns:
+            Integer The number of callbacks run
+        """
+
+        if self.events == []:
+            return 0
+        return self.advance_to(self.events[0][0])
+
+class FakeClient(object):
+    """A scripted client of the in-memory transport
+
+    The client records the messages it receives and replies to them through
+    its responder, after its latency has passed on the virtual clock. A client
+    with a capacity runs that many messages at once, the others wait for a
+    free slot, and its replies carry a load report.
+    """
+
+    def __init__(self, name, topics, responder=None, latency=0.0, capacity=None):
+        """Initialize the fake client
+
+        Keyword arguments:
+        name -- The name of the client
+        topics -- The topics the client subscribes to
+        responder -- The callable getting the payload of a received message
+                     and returning the result to reply with, None to not
+                     reply. None replies with the payload (Default: None)
+        latency -- The time in seconds the client takes to reply, or a
+                   callable getting the payload and returning it
+                   (Default: 0.0)
+        capacity -- The number of messages the client runs at once, None for
+                    no limit and no load reports (Default: None)
+
+        Raises:
+            ValueError if the capacity is less than one
+        """
+
+        if capacity is not None and capacity < 1:
+            raise ValueError("The capacity of a client should be at least one")
+
+        self.name = name
+        self.topics = topics
+        self.responder = responder
+        self.latency = latency
+        self.received = []
+        self.capacity = capacity
+        #The times the slots become free and the messages being run finish
+        self.slots = [0.0] * (capacity or 0)
+        self.running = []
+
+    def receive(self, message, now=0.0):
+        """Receive a message sent by the transport
+
+        Keyword arguments:
+        message -- The JSON formatted message
+        now -- The current time (Default: 0.0)
+
+        Returns:
+            Tuple (delay, reply) with the reply to be handled by the transport
+            after the delay
+            None if the client doesn't reply
+        """
+
+        self.received.append(message)
+        packet = json.loads(message)
+        payload = packet.get('payload')
+
+        if self.responder is None:
+            result = payload
+        else:
+            result = self.responder(payload)
+            if result is None:
+                return None
+
+        delay = self.latency(payload) if callable(self.latency) else self.latency
+        if self.capacity is not None:
+            finish = max(now, heapq.heappop(self.slots)) + delay
+            heapq.heappush(self.slots, finish)
+            heapq.heappush(self.running, finish)
+            delay = finish - now
+        return (delay, {'id': packet.get('id'), 'result': result, 'client': self.name})
+
+    def get_load(self, now):
+        """Get the load report of the client
+
+        Keyword arguments:
+        now -- The current time
+
+        Returns:
+            Dict {"inflight": <messages being run or waiting>, "capacity":
+            <capacity>}
+            None if the client has no capacity
+        """
+
+        if self.capacity is None:
+            return None
+        while self.running and self.running[0] <= now:
+            heapq.heappop(self.running)
+        return {'inflight': len(self.running), 'capacity': self.capacity}
@@ -4,7 +4,9 @@ Description: Message dispatch handler
 Date: 29/09/2017
 Author: Saurabh Badhwar <sbadhwar@redhat.com>
 '''
-from structures import Message, MessagePacket, MessageQueue
+from structures import Message, MessageQueue
+from bolt_server.metrics import get_registry
+from bolt_server.tracing import get_tracer
 
 class MessageDispatcher(object):
     """Handle the dispatch of the message from the bolt server
@@ -33,6 +35,13 @@ class MessageDispatcher(object):
         #Initialize the Message Queue
         self.message_queue = MessageQueue()
 
+        metrics = get_registry()
+        self.metric_sent = metrics.counter('bolt_dispatcher_messages_total', 'Messages sent by the dispatcher')
+        self.metric_send_errors = metrics.counter('bolt_dispatcher_send_errors_total',
+                                                  'Messages the dispatcher failed to send')
+        self.count_sent = self.metric_sent.increment
+        self.tracer = get_tracer()
+
         #Register a message handler with Socket server
         self.socket_server.register_handler(self.__generic_handler)
 
@@ -88,16 +97,86 @@ class MessageDispatcher(object):
         message_name -- The name of the message to be removed
         """
 
-        if message_name in self.message_register.keys():
+        if message_name in self.message_register:
             self.message_store.remove_message(message_name)
             del self.message_register[message_name]
 
-    def send_message(self, message_name, params={}):
+    def set_topic_delivery(self, topic, delivery):
+        """Set the default delivery mode for a topic
+
+        Keyword arguments:
+        topic -- The topic to set the delivery mode for
+        delivery -- One of the ClientSelector.DELIVERY_* modes
+        """
+
+        self.socket_server.set_topic_delivery(topic, delivery)
+
+    def set_topic_rate(self, topic, rate, burst=None):
+        """Limit the rate of the messages sent on a topic
+
+        The messages over the limit are queued by the socket server.
+
+        Keyword arguments:
+        topic -- The topic to limit
+        rate -- The number of messages per second, 0 to remove the limit
+        burst -- The number of messages which can be sent at once
+                 (Default: The rate, at least 1)
+        """
+
+        self.socket_server.set_topic_rate(topic, rate, burst)
+
+    def set_client_rate(self, client_name, rate, burst=None):
+        """Limit the rate of the messages sent to a client
+
+        The messages over the limit are queued by the socket server.
+
+        Keyword arguments:
+        client_name -- The name of the client
+        rate -- The number of messages per second, 0 to remove the limit
+        burst -- The number of messages which can be sent at once
+                 (Default: The rate, at least 1)
+        """
+
+        self.socket_server.set_client_rate(client_name, rate, burst)
+
+    def report_load(self, client_name, inflight, cpu=None, capacity=None):
+        """Record the load reported by a client
+
+        Keyword arguments:
+        client_name -- The name of the client
+        inflight -- The number of tasks the client is running
+        cpu -- The CPU load of the client (Default: None)
+        capacity -- The number of tasks the client can run at once
+                    (Default: None)
+        """
+
+        self.socket_server.report_load(client_name, inflight, cpu, capacity)
+
+    def get_headroom(self, topic, delivery=None):
+        """Get the number of messages the clients of a topic can take
+
+        Keyword arguments:
+        topic -- The topic the messages would be sent to
+        delivery -- The delivery mode of the messages, None for the delivery
+                    mode of the topic (Default: None)
+
+        Returns:
+            Integer
+            None if there is no limit
+        """
+
+        return self.socket_server.get_headroom(topic, delivery)
+
+    def send_message(self, message_name, params={}, delivery=None, delivery_key=None):
         """Send a new message
 
         Keyword arguments:
         message_name -- The name of the message to be sent
         params -- The parameters to be added to the message
+        delivery -- The delivery mode of the message, None to use the
+                    delivery mode of the topic (Default: None)
+        delivery_key -- The key used by the consistent hash delivery
+                        (Default: None)
 
         Raises:
             KeyError if the params provided do not match message structure
@@ -107,36 +186,123 @@ class MessageDispatcher(object):
             Integer
         """
 
-        message_structure = self.__get_message_structure(message_name)
-        for key in params.keys():
-            if key not in message_structure.keys():
-                raise KeyError("Parameter mismatch in message structure and provided params")
-            else:
-                message_structure[key] = params[key]
+        message_schema = self.message_store.get_schema(message_name)
+        message_schema.validate(params)
 
-        message_packet = MessagePacket(message_structure)
+        mid, packet = message_schema.build(params)
         try:
             for topic in self.message_register[message_name]:
-                mid, packet = message_packet.get_packet()
-                self.socket_server.send_message(topic, packet)
+                self.socket_server.send_message(topic, packet, delivery, delivery_key)
                 self.message_queue.queue(mid)
+            self.count_sent()
             return mid
         except RuntimeError:
+            self.metric_send_errors.inc()
             raise RuntimeError("Unable to send the message across the topics")
             pass
 
-    def __get_message_structure(self, message_name):
-        """Get the message structure
+    def send_many(self, messages, trace_ids=None):
+        """Send a batch of messages
+
+        The whole batch is validated before anything is sent, and the messages
+        are handed over to the socket server at once so that it can batch the
+        writes to the clients.
+
+        Keyword arguments:
+        messages -- The list of (message_name, params, delivery, delivery_key,
+                    topics), with topics set to None the message goes to its
+                    registered topics
+        trace_ids -- The ids the serialization and the send of every message
+                     are traced under, None to not trace them (Default: None)
+
+        Raises:
+            KeyError if the params provided do not match message structure
+
+        Returns:
+            List of message ids, None for the messages which couldn't be sent
+            to all of their topics
+        """
+
+        schemas = {}
+        for message_name, params, delivery, delivery_key, topics in messages:
+            if message_name not in schemas:
+                schemas[message_name] = self.message_store.get_schema(message_name)
+            schemas[message_name].validate(params)
+
+        tracing = trace_ids is not None and self.tracer.enabled
+        frames = []
+        owners = []
+        message_ids = []
+        for index, (message_name, params, delivery, delivery_key, topics) in enumerate(messages):
+            if tracing:
+                start = self.tracer.now()
+                mid, packet = schemas[message_name].build(params)
+                self.tracer.record(trace_ids[index], 'serialize', start, self.tracer.now(), {'message_id': mid})
+            else:
+                mid, packet = schemas[message_name].build(params)
+            if topics is None:
+                topics = self.message_register[message_name]
+            for topic in topics:
+                frames.append((topic, packet, delivery, delivery_key))
+                owners.append(index)
+            message_ids.append(mid)
+
+        #The names of the clients every message was sent to, None once the
+        #socket server can't tell them
+        recipients = [[] for mid in message_ids]
+        start = self.tracer.now() if tracing else None
+        results = self.socket_server.send_many(frames)
+        if tracing:
+            end = self.tracer.now()
+            for trace_id in trace_ids:
+                self.tracer.record(trace_id, 'send', start, end, {'batch': len(messages)})
+
+        for index, sent in zip(owners, results):
+            if sent is None:
+                message_ids[index] = None
+            elif sent is True or recipients[index] is None:
+                recipients[index] = None
+            else:
+                recipients[index].extend(sent)
+
+        sent_count = 0
+        for mid, names in zip(message_ids, recipients):
+            if mid is not None:
+                self.message_queue.queue(mid, names)
+                sent_count = sent_count + 1
+        self.metric_sent.inc(sent_count)
+        self.metric_send_errors.inc(len(message_ids) - sent_count)
+        return message_ids
+
+    def get_recipients(self, message_id):
+        """Get the clients a message sent through send_many was delivered to
 
         Keyword arguments:
-        message_name -- The name of the message whose structure needs to be
-                        retrieved
+        message_id -- The id of the message
 
         Returns:
-            Mixed The message structure
+            List of client names
+            None if the recipients are not known
+        """
+
+        return self.message_queue.get_recipients(message_id)
+
+    def reports_recipients(self):
+        """Check if the socket server reports the clients the messages reach
+
+        Returns: Bool
+        """
+
+        return self.socket_server.REPORTS_RECIPIENTS
+
+    def forget_message(self, message_id):
+        """Stop tracking a message whose replies are no longer awaited
+
+        Keyword arguments:
+        message_id -- The id of the message
         """
 
-        return self.message_store.get_message(message_name)
+        self.message_queue.forget(message_id)
 
     def __generic_handler(self, message):
         """Generic message handler
@@ -23,8 +23,7 @@ class Message(object):
         """Initialize the Message Structure"""
 
         self.messages = {}
-        self.message_count = 0
-        self.error_count = 0
+        self.schemas = {}
 
     def add_message(self, message_name, message_structure):
         """Add a new message to the message structure
@@ -37,10 +36,11 @@ class Message(object):
             RuntimeError if message_name already exists
         """
 
-        if message_name in self.messages.keys():
+        if message_name in self.messages:
             raise RuntimeError("The specified message already exists")
 
         self.messages[message_name] = message_structure
+        self.schemas[message_name] = MessageSchema(message_structure)
 
     def get_message(self, message_name):
         """Get the message structure associated with the name
@@ -55,11 +55,29 @@ class Message(object):
             Mixed The message structure
         """
 
-        if message_name not in self.messages.keys():
+        if message_name not in self.messages:
             raise KeyError("The requested message structure was not found")
 
         return self.messages[message_name]
 
+    def get_schema(self, message_name):
+        """Get the compiled schema of the message
+
+        Keyword arguments:
+        message_name -- The name of the message whose schema is requested
+
+        Raises:
+            KeyError when the message is not found
+
+        Returns:
+            MessageSchema
+        """
+
+        if message_name not in self.schemas:
+            raise KeyError("The requested message structure was not found")
+
+        return self.schemas[message_name]
+
     def get_message_list(self):
         """Get all the registered messages
 
@@ -76,36 +94,69 @@ class Message(object):
         message_name -- The name of the message to be removed
         """
 
-        if message_name in self.messages.keys():
+        if message_name in self.messages:
             del self.messages[message_name]
+            del self.schemas[message_name]
 
-class MessagePacket(object):
-    """The message pakcet Structure for the Bolt Server
-
-    Encapsulates the message along with a unique recognizable id so as to manage
-    the message lifecycle
+class MessageSchema(object):
+    """The message structure compiled for the validation and the packet building
 
-    Message Packet: {
-        identifier: <unique_identifier>,
-        message: Message
-    }
+    Every field of the structure is JSON encoded along with its default value
+    once, when the schema is compiled. Building a packet only encodes the
+    fields set by the params and joins them with the encoded defaults of the
+    rest, leaving the structure itself untouched. The message id is the
+    SHA256 digest of the encoded payload.
     """
 
-    def __init__(self, message):
-        """Initialize the Message Packet"""
+    def __init__(self, message_structure):
+        """Compile the message structure
+
+        Keyword arguments:
+        message_structure -- The dict holding the fields of the message along
+                             with their default values
+        """
+
+        self.fields = frozenset(message_structure.keys())
+        self.index = {}
+        self.encoded_names = {}
+        self.encoded_defaults = []
+        for position, (name, value) in enumerate(message_structure.iteritems()):
+            self.index[name] = position
+            self.encoded_names[name] = json.dumps(name) + ': '
+            self.encoded_defaults.append(self.encoded_names[name] + json.dumps(value))
+
+    def validate(self, params):
+        """Validate the params against the structure
+
+        Keyword arguments:
+        params -- The dict of the params for the message
+
+        Raises:
+            KeyError if the params provided do not match message structure
+        """
+
+        if not params.viewkeys() <= self.fields:
+            raise KeyError("Parameter mismatch in message structure and provided params")
 
-        self.message_packet = {}
-        self.message_digest = hashlib.sha256(str(message)).hexdigest()
-        self.message_packet['id'] = self.message_digest
-        self.message_packet['payload'] = message
+    def build(self, params):
+        """Build a new packet for the message
 
-    def get_packet(self):
-        """Get the JSON formatted packet which can be transmitted
+        Keyword arguments:
+        params -- The dict of the validated params for the message
 
-        Returns: JSON
+        Returns:
+            Tuple (message_id, JSON formatted packet)
         """
 
-        return (self.message_digest, json.dumps(self.message_packet))
+        encoded = list(self.encoded_defaults)
+        index = self.index
+        encoded_names = self.encoded_names
+        for name, value in params.iteritems():
+            encoded[index[name]] = encoded_names[name] + json.dumps(value)
+
+        payload = '{' + ', '.join(encoded) + '}'
+        message_id = hashlib.sha256(payload).hexdigest()
+        return (message_id, '{"id": "' + message_id + '", "payload": ' + payload + '}')
 
 class MessageQueue(object):
     """We use a message queue to track the responses received for the message
@@ -118,15 +169,45 @@ class MessageQueue(object):
         """Initialize the message queue"""
 
         self.message_queue = {}
+        self.recipients = {}
 
-    def queue(self, message_identifier):
+    def queue(self, message_identifier, recipients=None):
         """Queue a newly sent message
 
         Keyword arguments:
         message_identifier -- The unique identifier pertaining to message
+        recipients -- The names of the clients the message was delivered to,
+                      None if not known (Default: None)
         """
 
         self.message_queue[message_identifier] = 'Awaited'
+        if recipients is not None:
+            self.recipients[message_identifier] = recipients
+        else:
+            self.recipients.pop(message_identifier, None)
+
+    def get_recipients(self, message_identifier):
+        """Get the clients the message was delivered to
+
+        Keyword arguments:
+        message_identifier -- The identifier of the message
+
+        Returns:
+            List of client names
+            None if the recipients are not known
+        """
+
+        return self.recipients.get(message_identifier)
+
+    def forget(self, message_identifier):
+        """Stop tracking a message whose replies are no longer awaited
+
+        Keyword arguments:
+        message_identifier -- The identifier of the message
+        """
+
+        self.message_queue.pop(message_identifier, None)
+        self.recipients.pop(message_identifier, None)
 
     def update_status(self, message_identifier, status):
         """Update the status of a sent message
@@ -139,7 +220,7 @@ class MessageQueue(object):
             KeyError if the message is not present in the queue
         """
 
-        if message_identifier not in self.message_queue.keys():
+        if message_identifier not in self.message_queue:
             raise KeyError("Cannot update status for an inexistant message")
 
         self.message_queue[message_identifier] = status
@@ -0,0 +1,2 @@
+from metrics import MetricsRegistry, MetricsServer, get_registry, set_registry
+from structures import Counter, Gauge, Histogram
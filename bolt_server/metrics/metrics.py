@@ -0,0 +1,305 @@
+'''
+File: metrics.py
+Description: Metrics registry and the Prometheus stats endpoint
+Date: 19/10/2026
+Author: Saurabh Badhwar <sbadhwar@redhat.com>
+'''
+from structures import Counter, Gauge, Histogram, NullMetric
+from bolt_server.profiler import get_profiler
+import BaseHTTPServer
+import SocketServer
+import collections
+import os
+import threading
+import urlparse
+
+class MetricsRegistry(object):
+    """Keep the metrics of the bolt server
+
+    The metrics are identified by their name and labels. The components get
+    their metrics from the registry once, while initializing, and update them
+    directly afterwards, so a metric update on the hot paths only takes the
+    lock of its own metric.
+
+    The metrics kept outside the registry, like those of the shard processes,
+    are rendered along with its own through the collectors added to it.
+
+    The general structure looks like:
+    metrics = {name: [type, help, {labels: metric}]}
+    """
+
+    CONTENT_TYPE = 'text/plain; version=0.0.4'
+
+    def __init__(self, enabled=True):
+        """Initialize the metrics registry
+
+        Keyword arguments:
+        enabled -- Keep the metrics, with False every metric returned by the
+                   registry ignores its updates (Default: True)
+        """
+
+        self.enabled = enabled
+        self.metrics = {}
+        self.collectors = []
+        self.lock = threading.Lock()
+        self.null_metric = NullMetric()
+
+    def counter(self, name, help_text, labels=None):
+        """Get a counter, creating it if needed
+
+        Keyword arguments:
+        name -- The name of the metric
+        help_text -- The description of the metric
+        labels -- The dict of the label names and values (Default: None)
+
+        Raises:
+            RuntimeError if the name is used by a metric of another type
+
+        Returns: Counter
+        """
+
+        return self.__get_metric(Counter, name, help_text, labels)
+
+    def gauge(self, name, help_text, labels=None, function=None):
+        """Get a gauge, creating it if needed
+
+        Keyword arguments:
+        name -- The name of the metric
+        help_text -- The description of the metric
+        labels -- The dict of the label names and values (Default: None)
+        function -- The callable returning the value of the gauge, replaces the
+                    function of an existing gauge (Default: None)
+
+        Raises:
+            RuntimeError if the name is used by a metric of another type
+
+        Returns: Gauge
+        """
+
+        gauge = self.__get_metric(Gauge, name, help_text, labels)
+        if function is not None and gauge is not self.null_metric:
+            gauge.function = function
+        return gauge
+
+    def histogram(self, name, help_text, labels=None):
+        """Get a histogram, creating it if needed
+
+        Keyword arguments:
+        name -- The name of the metric
+        help_text -- The description of the metric
+        labels -- The dict of the label names and values (Default: None)
+
+        Raises:
+            RuntimeError if the name is used by a metric of another type
+
+        Returns: Histogram
+        """
+
+        return self.__get_metric(Histogram, name, help_text, labels)
+
+    def add_collector(self, collector):
+        """Add a source of the metrics kept outside the registry
+
+        Keyword arguments:
+        collector -- The callable returning the metrics in the format of
+                     collect, called on every render
+        """
+
+        with self.lock:
+            self.collectors.append(collector)
+
+    def collect(self):
+        """Get the samples of the metrics kept by the registry
+
+        Returns:
+            List of (name, type, help, [(labels, [(suffix, extra labels,
+            value)])]) sorted by the name, the labels being tuples of the
+            (name, value) pairs
+        """
+
+        with self.lock:
+            metrics = sorted((name, metric_type, help_text, sorted(children.items()))
+                             for name, (metric_type, help_text, children) in self.metrics.items())
+
+        return [(name, metric_type.TYPE, help_text, [(labels, metric.get_samples()) for labels, metric in children])
+                for name, metric_type, help_text, children in metrics]
+
+    def render(self):
+        """Render the metrics in the Prometheus text format
+
+        The samples given by the collectors are rendered under the metrics
+        of the same name.
+
+        Returns: String
+        """
+
+        families = self.collect()
+        with self.lock:
+            collectors = list(self.collectors)
+        if collectors != []:
+            merged = collections.OrderedDict()
+            for collected in [families] + [collector() for collector in collectors]:
+                for name, metric_type, help_text, children in collected:
+                    if name not in merged:
+                        merged[name] = (name, metric_type, help_text, [])
+                    merged[name][3].extend(children)
+            families = sorted(merged.values())
+
+        lines = []
+        for name, metric_type, help_text, children in families:
+            lines.append('# HELP %s %s' % (name, help_text.replace('\\', '\\\\').replace('\n', '\\n')))
+            lines.append('# TYPE %s %s' % (name, metric_type))
+            for labels, samples in children:
+                for suffix, extra_labels, value in samples:
+                    lines.append('%s%s%s %s' % (name, suffix, self.__format_labels(labels + extra_labels),
+                                                self.__format_value(value)))
+        lines.append('')
+        return '\n'.join(lines)
+
+    def __get_metric(self, metric_type, name, help_text, labels):
+        """Get a metric, creating it if needed
+
+        Returns: The metric
+        """
+
+        if not self.enabled:
+            return self.null_metric
+
+        labels = tuple(sorted((labels or {}).items()))
+        with self.lock:
+            if name not in self.metrics:
+                self.metrics[name] = [metric_type, help_text, {}]
+            elif self.metrics[name][0] is not metric_type:
+                raise RuntimeError("The metric name is already used by a metric of another type")
+
+            children = self.metrics[name][2]
+            if labels not in children:
+                children[labels] = metric_type()
+            return children[labels]
+
+    def __format_labels(self, labels):
+        """Format the labels of a sample
+
+        Returns: String
+        """
+
+        if labels == ():
+            return ''
+        return '{%s}' % ','.join('%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"')
+                                                 .replace('\n', '\\n')) for name, value in labels)
+
+    def __format_value(self, value):
+        """Format the value of a sample
+
+        Returns: String
+        """
+
+        if isinstance(value, float):
+            return repr(value)
+        return str(value)
+
+class MetricsServer(object):
+    """Serve the metrics over HTTP in the Prometheus text format
+
+    The metrics are served on the /metrics path by a daemon thread. The
+    /profile path samples the stacks of the server for a while
+    (?seconds=N, 10 by default) and answers with the folded stacks, or with
+    the stacks sampled so far if the profiler is already running.
+    """
+
+    def __init__(self, registry=None, host=None, port=None):
+        """Start the metrics server
+
+        Keyword arguments:
+        registry -- The MetricsRegistry to be served (Default: The registry
+                    returned by get_registry)
+        host -- The address to listen on (Default: BOLT_METRICS_HOST or
+                '127.0.0.1')
+        port -- The port to listen on (Default: BOLT_METRICS_PORT or 9200)
+        """
+
+        if registry is None:
+            registry = get_registry()
+        if host is None:
+            host = os.getenv('BOLT_METRICS_HOST', '127.0.0.1')
+        if port is None:
+            port = int(os.getenv('BOLT_METRICS_PORT', 9200))
+
+        class MetricsRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+            """Answer the scrapes of the metrics"""
+
+            def do_GET(self):
+                """Send the rendered metrics or the profile"""
+
+                path, query = (self.path.split('?', 1) + [''])[:2]
+                if path == '/metrics':
+                    body = registry.render()
+                    content_type = MetricsRegistry.CONTENT_TYPE
+                elif path == '/profile':
+                    try:
+                        seconds = float(urlparse.parse_qs(query).get('seconds', ['10'])[0])
+                        folded = get_profiler().profile(seconds)
+                    except ValueError:
+                        self.send_error(400)
+                        return
+                    body = ''.join(line + '\n' for line in folded)
+                    content_type = 'text/plain'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                """Keep the scrapes out of the server output"""
+
+        self.registry = registry
+        #A profile request holds its thread while sampling, the scrapes are
+        #answered by threads of their own
+        class MetricsHTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+            daemon_threads = True
+
+        self.http_server = MetricsHTTPServer((host, port), MetricsRequestHandler)
+        self.server_thread = threading.Thread(target=self.http_server.serve_forever, name='bolt-metrics')
+        self.server_thread.daemon = True
+        self.server_thread.start()
+
+    def get_port(self):
+        """Get the port the server listens on
+
+        Returns: Integer
+        """
+
+        return self.http_server.server_address[1]
+
+    def stop(self):
+        """Stop serving the metrics"""
+
+        self.http_server.shutdown()
+        self.http_server.server_close()
+
+#The registry of the process, BOLT_METRICS=0 disables the metrics
+registry = MetricsRegistry(os.getenv('BOLT_METRICS', '1') != '0')
+
+def get_registry():
+    """Get the metrics registry of the process
+
+    Returns: MetricsRegistry
+    """
+
+    return registry
+
+def set_registry(metrics_registry):
+    """Replace the metrics registry of the process
+
+    Only the components initialized afterwards use the new registry.
+
+    Keyword arguments:
+    metrics_registry -- The MetricsRegistry to be used
+    """
+
+    global registry
+    registry = metrics_registry
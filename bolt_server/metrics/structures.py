@@ -0,0 +1,242 @@
+'''
+File: structures.py
+Description: Metric types kept by the metrics registry
+Date: 19/10/2026
+Author: Saurabh Badhwar <sbadhwar@redhat.com>
+'''
+import math
+import threading
+
+class Counter(object):
+    """A value which only goes up, e.g. the number of messages sent
+
+    The hot paths keep the increment method of the counter and call it
+    directly, which costs a function call and an uncontended lock.
+    """
+
+    TYPE = 'counter'
+
+    def __init__(self):
+        """Initialize the counter"""
+
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def increment(self):
+        """Increase the counter by one"""
+
+        with self.lock:
+            self.value = self.value + 1
+
+    def inc(self, value=1):
+        """Increase the counter
+
+        Keyword arguments:
+        value -- The amount to increase the counter by (Default: 1)
+        """
+
+        with self.lock:
+            self.value = self.value + value
+
+    def get_value(self):
+        """Get the value of the counter
+
+        Returns: Number
+        """
+
+        return self.value
+
+    def get_samples(self):
+        """Get the samples to be exported
+
+        Returns:
+            List of (suffix, extra labels, value)
+        """
+
+        return [('', (), self.get_value())]
+
+class Gauge(object):
+    """A value which can go up and down, e.g. the number of connected clients
+
+    The gauge can also be backed by a function, which is called to get the
+    value whenever the gauge is exported.
+    """
+
+    TYPE = 'gauge'
+
+    def __init__(self, function=None):
+        """Initialize the gauge
+
+        Keyword arguments:
+        function -- The callable returning the value of the gauge
+                    (Default: None)
+        """
+
+        self.value = 0
+        self.function = function
+        self.lock = threading.Lock()
+
+    def set(self, value):
+        """Set the gauge to a value"""
+
+        self.value = value
+
+    def inc(self, value=1):
+        """Increase the gauge
+
+        Keyword arguments:
+        value -- The amount to increase the gauge by, negative to decrease it
+                 (Default: 1)
+        """
+
+        with self.lock:
+            self.value = self.value + value
+
+    def dec(self, value=1):
+        """Decrease the gauge
+
+        Keyword arguments:
+        value -- The amount to decrease the gauge by (Default: 1)
+        """
+
+        self.inc(-value)
+
+    def get_samples(self):
+        """Get the samples to be exported
+
+        Returns:
+            List of (suffix, extra labels, value)
+        """
+
+        if self.function is not None:
+            return [('', (), self.function())]
+        return [('', (), self.value)]
+
+class Histogram(object):
+    """A distribution of the observed values, e.g. the handler latencies
+
+    The values are counted in log linear buckets in the manner of the HDR
+    histograms: every power of two range is split into a fixed number of
+    equally wide sub buckets, hence the relative error of the bucket bounds
+    stays the same for the microsecond and the minute long values while the
+    buckets are only allocated for the ranges actually observed. The bucket of
+    a value is found from its binary exponent and mantissa without searching
+    through the bucket bounds.
+
+    The general structure looks like:
+    buckets: {(exponent, sub_bucket): count}
+    """
+
+    TYPE = 'histogram'
+
+    #The number of sub buckets of every power of two range
+    SUB_BUCKETS = 4
+
+    def __init__(self):
+        """Initialize the histogram"""
+
+        self.buckets = {}
+        self.count = 0
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        """Count an observed value
+
+        Keyword arguments:
+        value -- The observed value, the values below 0 are counted as 0
+        """
+
+        if value > 0:
+            mantissa, exponent = math.frexp(value)
+            bucket = (exponent, int((mantissa - 0.5) * 2 * self.SUB_BUCKETS))
+        else:
+            bucket = (None, 0)
+
+        with self.lock:
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+            self.count = self.count + 1
+            self.sum = self.sum + value
+
+    @classmethod
+    def get_bound(cls, bucket):
+        """Get the upper bound of a bucket
+
+        Keyword arguments:
+        bucket -- The (exponent, sub_bucket) of the bucket
+
+        Returns: Float
+        """
+
+        exponent, sub_bucket = bucket
+        if exponent is None:
+            return 0.0
+        return math.ldexp(0.5 + (sub_bucket + 1) / (2.0 * cls.SUB_BUCKETS), exponent)
+
+    def get_percentile(self, percentile):
+        """Get the upper bound of the bucket holding a percentile
+
+        Keyword arguments:
+        percentile -- The percentile between 0 and 100
+
+        Returns:
+            Float
+            None if nothing has been observed
+        """
+
+        with self.lock:
+            buckets = sorted(self.buckets.items())
+            count = self.count
+        if count == 0:
+            return None
+
+        rank = max(1, int(math.ceil(count * percentile / 100.0)))
+        seen = 0
+        for bucket, bucket_count in buckets:
+            seen = seen + bucket_count
+            if seen >= rank:
+                return self.get_bound(bucket)
+        return self.get_bound(buckets[-1][0])
+
+    def get_samples(self):
+        """Get the samples to be exported
+
+        The buckets are exported cumulatively as the Prometheus histograms
+        expect them.
+
+        Returns:
+            List of (suffix, extra labels, value)
+        """
+
+        with self.lock:
+            buckets = sorted(self.buckets.items())
+            count = self.count
+            total = self.sum
+
+        samples = []
+        seen = 0
+        for bucket, bucket_count in buckets:
+            seen = seen + bucket_count
+            samples.append(('_bucket', (('le', repr(self.get_bound(bucket))),), seen))
+        samples.append(('_bucket', (('le', '+Inf'),), count))
+        samples.append(('_sum', (), total))
+        samples.append(('_count', (), count))
+        return samples
+
+class NullMetric(object):
+    """A metric ignoring every update, used while the metrics are disabled"""
+
+    def inc(self, value=1):
+        """Ignore the update"""
+
+    def increment(self):
+        """Ignore the update"""
+
+    def dec(self, value=1):
+        """Ignore the update"""
+
+    def set(self, value):
+        """Ignore the update"""
+
+    def observe(self, value):
+        """Ignore the update"""
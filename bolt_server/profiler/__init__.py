@@ -0,0 +1,2 @@
+from profiler import SamplingProfiler, get_profiler
+from structures import FoldedStacks
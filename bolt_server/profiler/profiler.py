@@ -0,0 +1,254 @@
+'''
+File: profiler.py
+Description: Sampling profiler which can be toggled while the server runs
+Date: 19/10/2026
+Author: Saurabh Badhwar <sbadhwar@redhat.com>
+'''
+from structures import FoldedStacks
+import math
+import os
+import signal
+import sys
+import threading
+import time
+
+class SamplingProfiler(object):
+    """Sample the stacks of all the threads of the process
+
+    While running, a daemon thread wakes up every interval and records the
+    stack of every other thread (the socket receivers, the engine and the
+    plugin handlers running on them), as given by sys._current_frames. The
+    samples are aggregated as folded stacks, with the thread name as the root
+    frame, which the flamegraph tools (flamegraph.pl, speedscope, inferno)
+    read as they are.
+
+    The profiler costs nothing while stopped and can be toggled at runtime
+    through a signal, writing the folded stacks to a file when it stops.
+    """
+
+    #The longest time in seconds a single profile call samples for
+    MAX_PROFILE_SECONDS = 300.0
+
+    def __init__(self, interval=None, output=None):
+        """Initialize the profiler
+
+        Keyword arguments:
+        interval -- The time in seconds between the samples
+                    (Default: BOLT_PROFILE_INTERVAL or 0.01)
+        output -- The path the folded stacks are written to when the profiler
+                  is stopped by the signal, formatted with the process id and
+                  the time (Default: BOLT_PROFILE_OUTPUT or
+                  'bolt-profile-%(pid)d-%(time)d.folded')
+        """
+
+        if interval is None:
+            interval = float(os.getenv('BOLT_PROFILE_INTERVAL', 0.01))
+        if output is None:
+            output = os.getenv('BOLT_PROFILE_OUTPUT', 'bolt-profile-%(pid)d-%(time)d.folded')
+
+        self.interval = interval
+        self.output = output
+        self.stacks = FoldedStacks()
+        self.lock = threading.Lock()
+        self.sampler_thread = None
+        self.running = threading.Event()
+        #The time spent taking the samples and the time profiled, in seconds
+        self.sample_time = 0.0
+        self.start_time = None
+        self.duration = 0.0
+
+    def start(self):
+        """Start sampling, continuing the aggregate of the previous runs
+
+        Returns:
+            Bool False if the profiler is already running
+        """
+
+        with self.lock:
+            if self.running.is_set():
+                return False
+            self.running.set()
+            self.start_time = time.time()
+            self.sampler_thread = threading.Thread(target=self.__sample, name='bolt-profiler')
+            self.sampler_thread.daemon = True
+            self.sampler_thread.start()
+        return True
+
+    def stop(self):
+        """Stop sampling
+
+        Returns:
+            Bool False if the profiler isn't running
+        """
+
+        with self.lock:
+            if not self.running.is_set():
+                return False
+            self.running.clear()
+            sampler_thread = self.sampler_thread
+            self.sampler_thread = None
+            self.duration = self.duration + time.time() - self.start_time
+
+        if sampler_thread is not threading.current_thread():
+            sampler_thread.join()
+        return True
+
+    def is_running(self):
+        """Check if the profiler is sampling
+
+        Returns: Bool
+        """
+
+        return self.running.is_set()
+
+    def reset(self):
+        """Discard the samples taken so far"""
+
+        with self.lock:
+            self.stacks = FoldedStacks()
+            self.sample_time = 0.0
+            self.duration = 0.0
+            if self.running.is_set():
+                self.start_time = time.time()
+
+    def toggle(self):
+        """Start the profiler if it is stopped, otherwise stop it and write
+        the folded stacks to the output path
+
+        Returns:
+            String The path the stacks were written to
+            None if the profiler was started
+        """
+
+        if self.start():
+            return None
+
+        self.stop()
+        path = self.output % {'pid': os.getpid(), 'time': time.time()}
+        self.dump(path)
+        self.reset()
+        return path
+
+    def install_signal(self, signal_number=None):
+        """Toggle the profiler whenever the process receives a signal
+
+        Has to be called from the main thread.
+
+        Keyword arguments:
+        signal_number -- The signal toggling the profiler
+                         (Default: BOLT_PROFILE_SIGNAL or SIGUSR2)
+
+        Raises:
+            ValueError if not called from the main thread
+        """
+
+        if signal_number is None:
+            signal_number = int(os.getenv('BOLT_PROFILE_SIGNAL', signal.SIGUSR2))
+
+        #The stacks are written from a thread, the main thread can be
+        #interrupted while holding a lock the writing needs
+        def toggle_profiler(signum, frame):
+            thread = threading.Thread(target=self.toggle, name='bolt-profiler-toggle')
+            thread.daemon = True
+            thread.start()
+
+        signal.signal(signal_number, toggle_profiler)
+
+    def profile(self, seconds):
+        """Profile the process for a while, unless the profiler is running
+
+        Keyword arguments:
+        seconds -- The time to sample for, kept between 0 and
+                   MAX_PROFILE_SECONDS
+
+        Raises:
+            ValueError if the time is not a finite number
+
+        Returns:
+            List of the folded stack lines
+        """
+
+        if math.isnan(seconds) or math.isinf(seconds):
+            raise ValueError("The profiling time should be a finite number")
+        seconds = min(max(seconds, 0.0), self.MAX_PROFILE_SECONDS)
+
+        if not self.start():
+            return self.get_folded()
+
+        try:
+            time.sleep(seconds)
+        finally:
+            self.stop()
+        folded = self.get_folded()
+        self.reset()
+        return folded
+
+    def get_folded(self):
+        """Get the aggregated samples as folded stacks
+
+        Returns:
+            List of lines, the most sampled stacks first
+        """
+
+        with self.lock:
+            return self.stacks.get_folded()
+
+    def get_stats(self):
+        """Get the sample count and the sampling overhead
+
+        Returns:
+            Dict {samples, seconds, sample_seconds, overhead} with the
+            overhead as the share of the profiled time spent sampling
+        """
+
+        with self.lock:
+            seconds = self.duration
+            if self.running.is_set():
+                seconds = seconds + time.time() - self.start_time
+            return {
+                'samples': self.stacks.samples,
+                'seconds': seconds,
+                'sample_seconds': self.sample_time,
+                'overhead': self.sample_time / seconds if seconds > 0 else 0.0
+            }
+
+    def dump(self, path):
+        """Write the folded stacks to a file
+
+        The stacks are written to a temporary file first, so the file is only
+        seen complete.
+
+        Keyword arguments:
+        path -- The path of the file
+        """
+
+        folded = self.get_folded()
+        with open(path + '.tmp', 'w') as output:
+            for line in folded:
+                output.write(line + '\n')
+        os.rename(path + '.tmp', path)
+
+    def __sample(self):
+        """Take the samples until the profiler is stopped"""
+
+        sampler_id = threading.current_thread().ident
+        while self.running.is_set():
+            time.sleep(self.interval)
+            start = time.time()
+            names = dict((thread.ident, thread.name) for thread in threading.enumerate())
+            with self.lock:
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id != sampler_id:
+                        self.stacks.add(names.get(thread_id, 'thread-%d' % thread_id), frame)
+                self.sample_time = self.sample_time + time.time() - start
+
+#The profiler of the process
+profiler = SamplingProfiler()
+
+def get_profiler():
+    """Get the sampling profiler of the process
+
+    Returns: SamplingProfiler
+    """
+
+    return profiler
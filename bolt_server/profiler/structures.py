@@ -0,0 +1,83 @@
+'''
+File: structures.py
+Description: Structures used by the sampling profiler
+Date: 19/10/2026
+Author: Saurabh Badhwar <sbadhwar@redhat.com>
+'''
+import os
+
+class FoldedStacks(object):
+    """Aggregate the sampled stacks of the threads
+
+    The stacks are kept as the tuples of their code objects, outermost first,
+    with the name of the thread as the root, and counted every time they are
+    sampled. The code objects are only formatted as frame names when the
+    stacks are read, so adding a sample costs the walk of the frames.
+
+    The general structure looks like:
+    stacks = {(thread_name, code, ...): count}
+    """
+
+    def __init__(self, max_depth=128):
+        """Initialize the stack aggregate
+
+        Keyword arguments:
+        max_depth -- The number of innermost frames kept of a stack
+                     (Default: 128)
+        """
+
+        self.max_depth = max_depth
+        self.stacks = {}
+        self.samples = 0
+        #The formatted frame names, {code: name}
+        self.names = {}
+
+    def add(self, thread_name, frame):
+        """Add a sampled stack
+
+        Keyword arguments:
+        thread_name -- The name of the sampled thread
+        frame -- The innermost frame of the thread
+        """
+
+        codes = []
+        while frame is not None and len(codes) < self.max_depth:
+            codes.append(frame.f_code)
+            frame = frame.f_back
+        codes.append(thread_name)
+        codes.reverse()
+
+        stack = tuple(codes)
+        self.stacks[stack] = self.stacks.get(stack, 0) + 1
+        self.samples = self.samples + 1
+
+    def get_folded(self):
+        """Get the stacks in the folded format used by the flamegraph tools
+
+        Every line holds the frames of a stack separated by semicolons, and
+        the number of times it was sampled.
+
+        Returns:
+            List of lines, the most sampled stacks first
+        """
+
+        folded = {}
+        for stack, count in self.stacks.items():
+            line = ';'.join([stack[0].replace(';', ':')] + [self.__get_name(code) for code in stack[1:]])
+            folded[line] = folded.get(line, 0) + count
+        return ['%s %d' % (line, count) for line, count in
+                sorted(folded.iteritems(), key=lambda item: (-item[1], item[0]))]
+
+    def __get_name(self, code):
+        """Get the frame name of a code object
+
+        Returns:
+            String function (file:line)
+        """
+
+        name = self.names.get(code)
+        if name is None:
+            name = '%s (%s:%d)' % (code.co_name, os.path.basename(code.co_filename), code.co_firstlineno)
+            name = name.replace(';', ':')
+            self.names[code] = name
+        return name
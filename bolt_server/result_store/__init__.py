@@ -0,0 +1,2 @@
+from result_store import ResultStore
+from structures import ResultIndex
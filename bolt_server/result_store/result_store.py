@@ -0,0 +1,239 @@
+'''
+File: result_store.py
+Description: Append only store for the task results
+Date: 19/10/2026
+Author: Saurabh Badhwar <sbadhwar@redhat.com>
+'''
+from structures import ResultIndex
+import json
+import mmap
+import os
+import threading
+import time
+
+class ResultStore(object):
+    """Append only store for the results sent by the clients
+
+    The results are appended to the segment files as length prefixed
+    records and a new segment is started once the current one grows over the
+    segment size. The segments are read through mmap, so the queries only copy
+    the results they return instead of loading the segments into the memory.
+    The index is rebuilt from the segments when the store is opened, and a
+    partially written record at the end of the last segment is dropped. The
+    index keeps the newest results up to its size, the older results stay in
+    the segments but are no longer returned by the queries.
+
+    The store directory contains the segment files segment-<number>.log
+    """
+
+    SEGMENT_FORMAT = 'segment-%08d.log'
+
+    def __init__(self, store_dir=None, segment_size=None, index_size=None):
+        """Initialize the result store
+
+        Keyword arguments:
+        store_dir -- The directory to keep the segments in
+                     (Default: BOLT_RESULT_STORE_DIR or 'bolt_results')
+        segment_size -- The size in bytes after which a new segment is started
+                        (Default: BOLT_RESULT_STORE_SEGMENT_SIZE or 67108864)
+        index_size -- The number of results kept in the index
+                      (Default: BOLT_RESULT_STORE_INDEX_SIZE or 1000000)
+        """
+
+        if store_dir is None:
+            store_dir = os.getenv('BOLT_RESULT_STORE_DIR', 'bolt_results')
+        if segment_size is None:
+            segment_size = int(os.getenv('BOLT_RESULT_STORE_SEGMENT_SIZE', 67108864))
+        if index_size is None:
+            index_size = int(os.getenv('BOLT_RESULT_STORE_INDEX_SIZE', 1000000))
+
+        self.store_dir = store_dir
+        self.segment_size = segment_size
+        self.index = ResultIndex(index_size)
+        self.lock = threading.Lock()
+        #The mmap of every segment along with the mapped length
+        self.maps = {}
+        self.unflushed = False
+
+        if not os.path.isdir(store_dir):
+            os.makedirs(store_dir)
+
+        segments = sorted(int(name[8:16]) for name in os.listdir(store_dir)
+                          if name.startswith('segment-') and name.endswith('.log'))
+        for segment in segments:
+            self.__load_segment(segment, segment == segments[-1])
+
+        self.segment = segments[-1] if segments != [] else 0
+        self.segment_file = open(self.__get_path(self.segment), 'ab')
+        self.segment_offset = self.segment_file.tell()
+
+    def append(self, task_id, client, result, timestamp=None):
+        """Append a result to the store
+
+        Keyword arguments:
+        task_id -- The id of the task the result belongs to
+        client -- The name of the client which sent the result, None if not
+                  known
+        result -- The JSON serializable result
+        timestamp -- The time the result was received at (Default: Now)
+        """
+
+        if client is None:
+            client = ''
+        payload = json.dumps(result)
+
+        with self.lock:
+            #Taken under the lock, so that the results are stored in the time order
+            if timestamp is None:
+                timestamp = time.time()
+            record = ResultIndex.encode(timestamp, str(task_id), str(client), payload)
+            if self.segment_offset > 0 and self.segment_offset + len(record) > self.segment_size:
+                self.__start_segment()
+
+            self.segment_file.write(record)
+            self.index.add((self.segment, self.segment_offset), timestamp, str(task_id), str(client))
+            self.segment_offset = self.segment_offset + len(record)
+            self.unflushed = True
+
+    def get_task_results(self, task_id):
+        """Stream the results of a task
+
+        Keyword arguments:
+        task_id -- The id of the task
+
+        Returns:
+            Generator of (timestamp, task_id, client, result)
+        """
+
+        with self.lock:
+            locations = self.index.get_task(task_id)
+        return self.__read(locations)
+
+    def get_client_results(self, client):
+        """Stream the results sent by a client
+
+        Keyword arguments:
+        client -- The name of the client
+
+        Returns:
+            Generator of (timestamp, task_id, client, result)
+        """
+
+        with self.lock:
+            locations = self.index.get_client(client)
+        return self.__read(locations)
+
+    def get_results(self, start, end):
+        """Stream the results stored within a time range
+
+        Keyword arguments:
+        start -- The start of the range, inclusive
+        end -- The end of the range, exclusive
+
+        Returns:
+            Generator of (timestamp, task_id, client, result)
+        """
+
+        with self.lock:
+            locations = self.index.get_range(start, end)
+        return self.__read(locations)
+
+    def close(self):
+        """Close the segments"""
+
+        with self.lock:
+            self.segment_file.close()
+            for segment_map, length in self.maps.values():
+                segment_map.close()
+            self.maps = {}
+
+    def __read(self, locations):
+        """Read the results at the locations
+
+        Keyword arguments:
+        locations -- The list of (segment, offset) to read
+
+        Returns:
+            Generator of (timestamp, task_id, client, result)
+        """
+
+        for segment, offset in locations:
+            with self.lock:
+                segment_map = self.__get_map(segment, offset)
+                timestamp, task_id, client, payload_start, record_end = \
+                    ResultIndex.decode_header(segment_map, offset)
+                payload = segment_map[payload_start:record_end]
+            yield (timestamp, task_id, client or None, json.loads(payload))
+
+    def __get_map(self, segment, offset):
+        """Get the mmap of a segment covering the offset, the lock must be held
+
+        The mmap of the segment being written to is remapped once the records
+        to be read are past its mapped length.
+
+        Keyword arguments:
+        segment -- The number of the segment
+        offset -- The offset to be covered
+
+        Returns: mmap
+        """
+
+        if segment == self.segment and self.unflushed:
+            self.segment_file.flush()
+            self.unflushed = False
+
+        if segment in self.maps:
+            segment_map, length = self.maps[segment]
+            if offset + ResultIndex.HEADER.size < length:
+                return segment_map
+            segment_map.close()
+
+        with open(self.__get_path(segment), 'rb') as segment_file:
+            length = os.fstat(segment_file.fileno()).st_size
+            segment_map = mmap.mmap(segment_file.fileno(), length, access=mmap.ACCESS_READ)
+        self.maps[segment] = (segment_map, length)
+        return segment_map
+
+    def __start_segment(self):
+        """Start writing to a new segment, the lock must be held"""
+
+        self.segment_file.close()
+        self.segment = self.segment + 1
+        self.segment_file = open(self.__get_path(self.segment), 'ab')
+        self.segment_offset = 0
+        self.unflushed = False
+
+    def __load_segment(self, segment, last):
+        """Index the results of an existing segment
+
+        Keyword arguments:
+        segment -- The number of the segment
+        last -- True for the last segment, whose partially written record is
+                truncated
+        """
+
+        path = self.__get_path(segment)
+        length = os.path.getsize(path)
+        offset = 0
+        if length > 0:
+            with open(path, 'rb') as segment_file:
+                segment_map = mmap.mmap(segment_file.fileno(), length, access=mmap.ACCESS_READ)
+            try:
+                while offset + ResultIndex.HEADER.size <= length:
+                    timestamp, task_id, client, payload_start, record_end = \
+                        ResultIndex.decode_header(segment_map, offset)
+                    if record_end > length:
+                        break
+                    self.index.add((segment, offset), timestamp, task_id, client)
+                    offset = record_end
+            finally:
+                segment_map.close()
+
+        if last and offset < length:
+            with open(path, 'r+b') as segment_file:
+                segment_file.truncate(offset)
+
+    def __get_path(self, segment):
+        """Get the path of a segment file"""
+
+        return os.path.join(self.store_dir, self.SEGMENT_FORMAT % segment)
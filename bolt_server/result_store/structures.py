@@ -0,0 +1,151 @@
+'''
+File: structures.py
+Description: Structures used by the result store
+Date: 19/10/2026
+Author: Saurabh Badhwar <sbadhwar@redhat.com>
+'''
+import bisect
+import collections
+import struct
+
+class ResultIndex(object):
+    """Index of the stored results
+
+    Every result is located by the segment it was written to and the offset
+    of its record in the segment. The locations are indexed by the task id,
+    by the client and by the time the result was stored at.
+
+    Once the index holds more than the maximum number of results, the oldest
+    tenth of them is dropped from the index, the dropped results are no longer
+    returned by the queries.
+
+    The general structure looks like:
+    tasks: {task_id: deque([(segment, offset)])}
+    clients: {client: deque([(segment, offset)])}
+    times: [timestamp], in the time order
+    entries: [((segment, offset), task_id, client)], matching the times
+    """
+
+    #Record header: timestamp, payload length, task id length, client length
+    HEADER = struct.Struct('!dIHH')
+
+    def __init__(self, max_results=None):
+        """Initialize the result index
+
+        Keyword arguments:
+        max_results -- The number of results to be indexed, None for no limit
+                       (Default: None)
+        """
+
+        self.max_results = max_results
+        self.tasks = {}
+        self.clients = {}
+        self.times = []
+        self.entries = []
+
+    def add(self, location, timestamp, task_id, client):
+        """Index a stored result
+
+        Keyword arguments:
+        location -- The (segment, offset) of the result record
+        timestamp -- The time the result was stored at
+        task_id -- The id of the task the result belongs to
+        client -- The name of the client which sent the result
+        """
+
+        if task_id not in self.tasks:
+            self.tasks[task_id] = collections.deque()
+        self.tasks[task_id].append(location)
+
+        if client not in self.clients:
+            self.clients[client] = collections.deque()
+        self.clients[client].append(location)
+
+        #The results stored with an earlier time are inserted in the time order
+        if self.times == [] or timestamp >= self.times[-1]:
+            self.times.append(timestamp)
+            self.entries.append((location, task_id, client))
+        else:
+            position = bisect.bisect_right(self.times, timestamp)
+            self.times.insert(position, timestamp)
+            self.entries.insert(position, (location, task_id, client))
+
+        if self.max_results is not None and len(self.times) > self.max_results:
+            self.__drop(len(self.times) - self.max_results + self.max_results // 10)
+
+    def __drop(self, count):
+        """Drop the oldest results from the index
+
+        Keyword arguments:
+        count -- The number of results to be dropped
+        """
+
+        for location, task_id, client in self.entries[:count]:
+            for locations, key in ((self.tasks, task_id), (self.clients, client)):
+                key_locations = locations[key]
+                if key_locations[0] == location:
+                    key_locations.popleft()
+                else:
+                    key_locations.remove(location)
+                if len(key_locations) == 0:
+                    del locations[key]
+
+        del self.times[:count]
+        del self.entries[:count]
+
+    def get_task(self, task_id):
+        """Get the locations of the results of a task
+
+        Returns: List of locations
+        """
+
+        return list(self.tasks.get(task_id, ()))
+
+    def get_client(self, client):
+        """Get the locations of the results sent by a client
+
+        Returns: List of locations
+        """
+
+        return list(self.clients.get(client, ()))
+
+    def get_range(self, start, end):
+        """Get the locations of the results stored within a time range
+
+        Keyword arguments:
+        start -- The start of the range, inclusive
+        end -- The end of the range, exclusive
+
+        Returns: List of locations
+        """
+
+        return [entry[0] for entry in
+                self.entries[bisect.bisect_left(self.times, start):bisect.bisect_left(self.times, end)]]
+
+    @classmethod
+    def encode(cls, timestamp, task_id, client, payload):
+        """Encode a result record
+
+        Returns: String
+        """
+
+        return cls.HEADER.pack(timestamp, len(payload), len(task_id), len(client)) + task_id + client + payload
+
+    @classmethod
+    def decode_header(cls, buffer, offset):
+        """Decode the header of the record at the offset
+
+        Keyword arguments:
+        buffer -- The buffer (mmap) holding the record
+        offset -- The offset of the record
+
+        Returns:
+            Tuple (timestamp, task_id, client, payload_offset, record_end)
+        """
+
+        timestamp, payload_length, task_id_length, client_length = cls.HEADER.unpack_from(buffer, offset)
+        task_start = offset + cls.HEADER.size
+        client_start = task_start + task_id_length
+        payload_start = client_start + client_length
+        return (timestamp, buffer[task_start:client_start], buffer[client_start:payload_start], payload_start,
+                payload_start + payload_length)
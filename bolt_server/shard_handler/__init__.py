@@ -0,0 +1,2 @@
+from shard_handler import ShardedSocketHandler
+from structures import ControlChannel, ShardTable
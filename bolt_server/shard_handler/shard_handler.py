@@ -0,0 +1,445 @@
+'''
+File: shard_handler.py
+Description: Multi process sharded socket handling interface
+Date: 19/10/2026
+Author: Saurabh Badhwar <sbadhwar@redhat.com>
+'''
+from structures import ControlChannel, ShardTable
+from bolt_server.metrics import MetricsRegistry, get_registry, set_registry
+from bolt_server.socket_handler import SocketHandler, ClientSelector
+import json
+import multiprocessing
+import os
+import socket
+import threading
+import time
+
+class ShardedSocketHandler(object):
+    """Spread the client connections over multiple socket handler processes
+
+    Forks a number of shard processes, each running its own SocketHandler bound
+    to the same port through SO_REUSEPORT, so that the kernel balances the
+    incoming connections among them. The supervisor process talks to every
+    shard over a local control channel and provides the same interface as the
+    SocketHandler, which allows the MessageDispatcher to reach the subscribers
+    held in any of the shards.
+
+    The outbound rate limits are applied by every shard to its own clients. A
+    client is held by a single shard, so its limit holds as set, while the
+    limit of a topic holds per shard: the anycast messages spread over the
+    shards can go up to the number of shards times the limit.
+
+    The metrics of the shards are collected over the control channels on every
+    render of the supervisor registry, and labelled with their shard.
+    """
+
+    #The shards don't report the clients the messages were sent to, so the
+    #replies can't be counted against the recipients
+    REPORTS_RECIPIENTS = False
+
+    #The time to wait for the shards to send their metrics, in seconds
+    METRICS_TIMEOUT = 1.0
+
+    def __init__(self, shards=None):
+        """Initialize the sharded socket handler
+
+        The shard processes are forked during the initialization, hence the
+        handler should be created before starting any other threads.
+
+        Keyword arguments:
+        shards -- The number of shard processes to be started
+                  (Default: BOLT_SERVER_SHARDS or the number of CPUs)
+        """
+
+        if shards is None:
+            shards = int(os.getenv('BOLT_SERVER_SHARDS', multiprocessing.cpu_count()))
+
+        self.shard_count = shards
+        self.shard_table = ShardTable()
+        self.channels = []
+        self.pids = []
+        self.listen = True
+        self.thread_pool = []
+        self.topic_listeners = []
+        self.client_selector = ClientSelector()
+        self.topic_delivery = {}
+        self.shard_metrics = {}
+        self.metrics_request = 0
+        self.metrics_lock = threading.Lock()
+        self.metrics_condition = threading.Condition()
+
+        for shard in range(self.shard_count):
+            self.__start_shard(shard)
+
+        if get_registry().enabled:
+            get_registry().add_collector(self.collect_metrics)
+
+        for shard in range(self.shard_count):
+            receiver_thread = threading.Thread(target=self.__start_receiver, args=(shard,),
+                                               name='bolt-shard-receiver')
+            receiver_thread.daemon = True
+            self.thread_pool.append(receiver_thread)
+            receiver_thread.start()
+
+    def __start_shard(self, shard):
+        """Fork a new shard process
+
+        Keyword arguments:
+        shard -- The index of the shard to be started
+        """
+
+        parent_sock, child_sock = socket.socketpair()
+        pid = os.fork()
+        if pid == 0:
+            parent_sock.close()
+            for channel in self.channels:
+                channel.close()
+            try:
+                self.__run_shard(ControlChannel(child_sock))
+            finally:
+                os._exit(0)
+
+        child_sock.close()
+        self.channels.append(ControlChannel(parent_sock))
+        self.pids.append(pid)
+
+    def __run_shard(self, channel):
+        """Run the shard loop inside the forked process
+
+        Starts a local SocketHandler, forwards the incoming client messages and
+        the topic changes to the supervisor and delivers the messages the
+        supervisor sends to the local clients.
+
+        Keyword arguments:
+        channel -- The control channel connected to the supervisor
+        """
+
+        def forward_message(message):
+            channel.send_frame(ControlChannel.OP_INBOUND, '', message)
+
+        def forward_topic(topic, active):
+            if active:
+                channel.send_frame(ControlChannel.OP_TOPIC_ADD, topic)
+            else:
+                channel.send_frame(ControlChannel.OP_TOPIC_REMOVE, topic)
+
+        #The metrics inherited from the supervisor would be reported twice
+        set_registry(MetricsRegistry(get_registry().enabled))
+
+        #The unix domain socket can't be shared by the shards
+        socket_handler = SocketHandler(reuse_port=True, unix_path='')
+        socket_handler.register_handler(forward_message)
+        socket_handler.register_topic_listener(forward_topic)
+
+        while True:
+            frame = channel.recv_frame()
+            if frame is None:
+                break
+
+            op, topic, payload = frame
+            if op == ControlChannel.OP_SEND:
+                try:
+                    socket_handler.send_message(topic, payload)
+                except RuntimeError:
+                    pass
+            elif op == ControlChannel.OP_SEND_ONE:
+                delivery, delivery_key, message = ControlChannel.unpack_delivery(payload)
+                try:
+                    socket_handler.send_message(topic, message, delivery, delivery_key)
+                except RuntimeError:
+                    pass
+            elif op == ControlChannel.OP_BROADCAST:
+                socket_handler.broadcast(payload)
+            elif op == ControlChannel.OP_TOPIC_RATE:
+                socket_handler.set_topic_rate(topic, *json.loads(payload))
+            elif op == ControlChannel.OP_CLIENT_RATE:
+                socket_handler.set_client_rate(topic, *json.loads(payload))
+            elif op == ControlChannel.OP_METRICS:
+                channel.send_frame(ControlChannel.OP_METRICS, topic, json.dumps(get_registry().collect()))
+            elif op == ControlChannel.OP_STOP:
+                socket_handler.stop_listening()
+                break
+
+    def __start_receiver(self, shard):
+        """Receive the frames sent by a shard to the supervisor
+
+        Keyword arguments:
+        shard -- The index of the shard to receive the frames from
+        """
+
+        channel = self.channels[shard]
+        while self.listen:
+            frame = channel.recv_frame()
+            if frame is None:
+                break
+
+            op, topic, payload = frame
+            if op == ControlChannel.OP_INBOUND:
+                self.client_selector.message_received(shard)
+                self.handle(payload)
+            elif op == ControlChannel.OP_TOPIC_ADD:
+                self.shard_table.add_shard(topic, shard)
+                if len(self.shard_table.get_shards(topic)) == 1:
+                    self.__notify_topic_listeners(topic, True)
+            elif op == ControlChannel.OP_TOPIC_REMOVE:
+                self.shard_table.remove_shard(topic, shard)
+                if self.shard_table.get_shards(topic) == []:
+                    self.__notify_topic_listeners(topic, False)
+            elif op == ControlChannel.OP_METRICS:
+                with self.metrics_condition:
+                    #The replies to the requests which timed out are dropped
+                    if topic == str(self.metrics_request):
+                        self.shard_metrics[shard] = payload
+                        self.metrics_condition.notify_all()
+
+        #The subscribers of a shard which went away are gone along with it
+        for topic in self.shard_table.drop_shard(shard):
+            self.__notify_topic_listeners(topic, False)
+
+    def __decode_metrics(self, shard, payload):
+        """Decode the metrics sent by a shard and label them with the shard
+
+        Keyword arguments:
+        shard -- The index of the shard which sent the metrics
+        payload -- The metrics in the format of MetricsRegistry.collect,
+                   encoded as JSON
+
+        Returns:
+            List of the metrics in the format of MetricsRegistry.collect
+        """
+
+        def decode_labels(labels):
+            return tuple((name.encode('utf-8'), value.encode('utf-8')) for name, value in labels)
+
+        metrics = []
+        for name, metric_type, help_text, children in json.loads(payload):
+            children = [(decode_labels(labels) + (('shard', str(shard)),),
+                         [(suffix.encode('utf-8'), decode_labels(extra_labels), value)
+                          for suffix, extra_labels, value in samples])
+                        for labels, samples in children]
+            metrics.append((name.encode('utf-8'), metric_type.encode('utf-8'), help_text.encode('utf-8'), children))
+        return metrics
+
+    def collect_metrics(self):
+        """Collect the metrics of the shard processes
+
+        Asks every shard for its metrics and waits for them up to the
+        METRICS_TIMEOUT, the shards which don't reply in time are left out.
+
+        Returns:
+            List of the metrics in the format of MetricsRegistry.collect
+        """
+
+        with self.metrics_lock:
+            with self.metrics_condition:
+                self.metrics_request = self.metrics_request + 1
+                self.shard_metrics = {}
+                request = str(self.metrics_request)
+
+            for channel in self.channels:
+                try:
+                    channel.send_frame(ControlChannel.OP_METRICS, request)
+                except RuntimeError:
+                    pass
+
+            deadline = time.time() + self.METRICS_TIMEOUT
+            with self.metrics_condition:
+                while len(self.shard_metrics) < self.shard_count and self.listen:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    self.metrics_condition.wait(remaining)
+                shard_metrics = sorted(self.shard_metrics.items())
+
+        metrics = []
+        for shard, payload in shard_metrics:
+            metrics.extend(self.__decode_metrics(shard, payload))
+        return metrics
+
+    def __notify_topic_listeners(self, topic, active):
+        """Notify the topic listeners about a change in topic availability
+
+        Keyword arguments:
+        topic -- The topic whose availability changed
+        active -- True if the topic became available in any shard, False if it
+                  is no longer available in any shard
+        """
+
+        for listener in self.topic_listeners:
+            listener(topic, active)
+
+    def register_topic_listener(self, listener):
+        """Register a listener for the topic availability changes
+
+        Keyword arguments:
+        listener -- The callable to be notified as listener(topic, active)
+        """
+
+        self.topic_listeners.append(listener)
+
+    def register_handler(self, message_handler):
+        """Register a new message handler
+
+        Keyword arguments:
+        message_handler -- The message handling object
+        """
+
+        self.message_handler = message_handler
+
+    def handle(self, message):
+        """Handle the incoming messages forwarded by the shards
+
+        Keyword arguments:
+        message -- The message to be processed
+        """
+
+        self.message_handler(message)
+
+    def get_topics(self):
+        """Get the list of topics which have subscribers in any shard
+
+        Returns: List of topics
+        """
+
+        return self.shard_table.get_topics()
+
+    def set_topic_delivery(self, topic, delivery):
+        """Set the default delivery mode for a topic
+
+        Keyword arguments:
+        topic -- The topic to set the delivery mode for
+        delivery -- One of the ClientSelector.DELIVERY_* modes
+        """
+
+        self.topic_delivery[topic] = delivery
+
+    def report_load(self, client_name, inflight, cpu=None, capacity=None):
+        """Record the load reported by a client
+
+        The shards are selected by their outstanding messages, so the reports
+        are not used.
+
+        Keyword arguments:
+        client_name -- The name of the client
+        inflight -- The number of tasks the client is running
+        cpu -- The CPU load of the client (Default: None)
+        capacity -- The number of tasks the client can run at once
+                    (Default: None)
+        """
+
+        pass
+
+    def get_headroom(self, topic, delivery=None):
+        """Get the number of messages the clients of a topic can take
+
+        Returns:
+            None as the capacity of the clients is not tracked here
+        """
+
+        return None
+
+    def send_message(self, topic, message, delivery=None, delivery_key=None):
+        """Send a new message to the clients subscribed to a particular topic
+
+        The message is forwarded only to the shards holding subscribers for the
+        topic. With an anycast delivery mode a single shard is selected, which
+        then selects a single client out of its own subscribers.
+
+        Keyword arguments:
+        topic -- The topic to which the message should be sent
+        message -- The JSON formatted message that needs to be sent
+        delivery -- The delivery mode for the message (Default: None)
+        delivery_key -- The key used by the consistent hash delivery
+                        (Default: None)
+
+        Raises:
+            RuntimeError if the specified topic doesn't exist
+        """
+
+        shards = self.shard_table.get_shards(topic)
+        if shards == []:
+            raise RuntimeError("The specified topic doesn't exist")
+
+        if delivery is None:
+            delivery = self.topic_delivery.get(topic, ClientSelector.DELIVERY_BROADCAST)
+
+        if delivery == ClientSelector.DELIVERY_BROADCAST:
+            for shard in shards:
+                self.channels[shard].send_frame(ControlChannel.OP_SEND, topic, message)
+            return
+
+        shards.sort()
+        shard = self.client_selector.select(topic, shards, delivery, delivery_key,
+                                            dict((s, str(s)) for s in shards))
+        payload = ControlChannel.pack_delivery(delivery, delivery_key, message)
+        self.channels[shard].send_frame(ControlChannel.OP_SEND_ONE, topic, payload)
+        self.client_selector.message_sent(shard)
+
+    def send_many(self, messages):
+        """Send a batch of messages, forwarding them one by one
+
+        Keyword arguments:
+        messages -- The list of (topic, message, delivery, delivery_key)
+
+        Returns:
+            List with True for the messages which were forwarded, as the
+            recipients are not known here, and None for the messages whose
+            topic doesn't exist
+        """
+
+        sent = []
+        for topic, message, delivery, delivery_key in messages:
+            try:
+                self.send_message(topic, message, delivery, delivery_key)
+                sent.append(True)
+            except RuntimeError:
+                sent.append(None)
+        return sent
+
+    def set_topic_rate(self, topic, rate, burst=None):
+        """Limit the rate of the messages sent on a topic by every shard
+
+        Keyword arguments:
+        topic -- The topic to limit, as the messages are sent on it
+        rate -- The number of messages per second, 0 to remove the limit
+        burst -- The number of messages which can be sent at once
+                 (Default: The rate, at least 1)
+        """
+
+        for channel in self.channels:
+            channel.send_frame(ControlChannel.OP_TOPIC_RATE, topic, json.dumps([rate, burst]))
+
+    def set_client_rate(self, client_name, rate, burst=None):
+        """Limit the rate of the writes to a client in whichever shard holds it
+
+        Keyword arguments:
+        client_name -- The name the client sends in its handshake
+        rate -- The number of writes per second, 0 to remove the limit
+        burst -- The number of writes which can be sent at once
+                 (Default: The rate, at least 1)
+        """
+
+        for channel in self.channels:
+            channel.send_frame(ControlChannel.OP_CLIENT_RATE, client_name, json.dumps([rate, burst]))
+
+    def broadcast(self, message):
+        """Broadcast a message to all the connected clients across the shards"""
+
+        for channel in self.channels:
+            channel.send_frame(ControlChannel.OP_BROADCAST, '', message)
+
+    def stop_listening(self):
+        """Stop the shard processes so as to prepare for shutdown"""
+
+        self.listen = False
+        for channel in self.channels:
+            try:
+                channel.send_frame(ControlChannel.OP_STOP)
+            except RuntimeError:
+                pass
+
+        for pid in self.pids:
+            try:
+                os.waitpid(pid, 0)
+            except OSError:
+                pass
@@ -0,0 +1,242 @@
+'''
+File: structures.py
+Description: Structures used by the sharded socket handler
+Date: 19/10/2026
+Author: Saurabh Badhwar <sbadhwar@redhat.com>
+'''
+from bolt_server.socket_handler import TopicTrie
+import socket
+import struct
+import threading
+
+class ControlChannel(object):
+    """Local control channel between the shard supervisor and the shards
+
+    Wraps a connected stream socket (usually one end of a socketpair) and
+    exchanges length prefixed frames over it.
+
+    Frame: [op (1 byte)][topic length (2 bytes)][payload length (4 bytes)]
+           [topic][payload]
+    """
+
+    OP_SEND = 'S'
+    OP_SEND_ONE = 'O'
+    OP_BROADCAST = 'B'
+    OP_INBOUND = 'I'
+    OP_TOPIC_ADD = 'A'
+    OP_TOPIC_REMOVE = 'R'
+    OP_STOP = 'X'
+    OP_HELLO = 'H'
+    OP_TOPIC_RATE = 'T'
+    OP_CLIENT_RATE = 'C'
+    OP_METRICS = 'M'
+
+    HEADER = struct.Struct('!cHI')
+    DELIVERY_HEADER = struct.Struct('!BH')
+
+    def __init__(self, sock):
+        """Initialize the control channel
+
+        Keyword arguments:
+        sock -- The connected socket object to be used for the channel
+        """
+
+        self.sock = sock
+        self.send_lock = threading.Lock()
+
+    def send_frame(self, op, topic='', payload=''):
+        """Send a new frame over the channel
+
+        Keyword arguments:
+        op -- The operation code of the frame
+        topic -- The topic the frame is associated with (Default: '')
+        payload -- The frame payload (Default: '')
+
+        Raises:
+            RuntimeError if the channel is closed
+        """
+
+        frame = self.HEADER.pack(op, len(topic), len(payload)) + topic + payload
+        try:
+            with self.send_lock:
+                self.sock.sendall(frame)
+        except socket.error:
+            raise RuntimeError("The control channel is closed")
+
+    def recv_frame(self):
+        """Receive the next frame from the channel
+
+        Returns:
+            Tuple (op, topic, payload) on success
+            None if the channel has been closed
+        """
+
+        header = self.__recv_exact(self.HEADER.size)
+        if header is None:
+            return None
+
+        op, topic_len, payload_len = self.HEADER.unpack(header)
+        body = self.__recv_exact(topic_len + payload_len)
+        if body is None:
+            return None
+
+        return (op, body[:topic_len], body[topic_len:])
+
+    @classmethod
+    def pack_delivery(cls, delivery, delivery_key, message):
+        """Pack the delivery options along with the message into a payload
+
+        Keyword arguments:
+        delivery -- The delivery mode of the message
+        delivery_key -- The key used by the consistent hash delivery
+        message -- The message to be delivered
+
+        Returns: String
+        """
+
+        if delivery_key is None:
+            delivery_key = ''
+        delivery_key = str(delivery_key)
+        return cls.DELIVERY_HEADER.pack(delivery, len(delivery_key)) + delivery_key + message
+
+    @classmethod
+    def unpack_delivery(cls, payload):
+        """Unpack a payload created by pack_delivery
+
+        Keyword arguments:
+        payload -- The payload to be unpacked
+
+        Returns:
+            Tuple (delivery, delivery_key, message)
+        """
+
+        delivery, key_len = cls.DELIVERY_HEADER.unpack(payload[:cls.DELIVERY_HEADER.size])
+        offset = cls.DELIVERY_HEADER.size
+        delivery_key = payload[offset:offset + key_len]
+        if delivery_key == '':
+            delivery_key = None
+        return (delivery, delivery_key, payload[offset + key_len:])
+
+    def close(self):
+        """Close the control channel"""
+
+        try:
+            self.sock.close()
+        except socket.error:
+            pass
+
+    def __recv_exact(self, size):
+        """Receive exactly the requested number of bytes
+
+        Keyword arguments:
+        size -- The number of bytes to be received
+
+        Returns:
+            String on success
+            None if the channel got closed
+        """
+
+        chunks = []
+        while size > 0:
+            try:
+                chunk = self.sock.recv(size)
+            except socket.error:
+                return None
+            if not chunk:
+                return None
+            chunks.append(chunk)
+            size = size - len(chunk)
+
+        return ''.join(chunks)
+
+class ShardTable(object):
+    """Track which shards hold the subscribers for a topic
+
+    The general structure looks like:
+    shard_table: {'topic': set([shard_index])}
+
+    The topics advertised with wildcard levels are also indexed in a TopicTrie.
+    """
+
+    def __init__(self):
+        """Initialize the shard table"""
+
+        self.shard_table = {}
+        self.topic_trie = TopicTrie()
+        self.lock = threading.Lock()
+
+    def add_shard(self, topic, shard):
+        """Record that a shard holds subscribers for the topic
+
+        Keyword arguments:
+        topic -- The topic which became available on the shard
+        shard -- The index of the shard
+        """
+
+        with self.lock:
+            self.shard_table.setdefault(topic, set()).add(shard)
+            if TopicTrie.is_pattern(topic):
+                self.topic_trie.add(topic, shard)
+
+    def remove_shard(self, topic, shard):
+        """Remove the shard from the topic
+
+        Keyword arguments:
+        topic -- The topic to remove the shard from
+        shard -- The index of the shard
+        """
+
+        with self.lock:
+            if topic in self.shard_table:
+                self.shard_table[topic].discard(shard)
+                self.topic_trie.remove(topic, shard)
+                if not self.shard_table[topic]:
+                    del self.shard_table[topic]
+
+    def drop_shard(self, shard):
+        """Remove the shard from all the topics it is present in
+
+        Keyword arguments:
+        shard -- The index of the shard
+
+        Returns:
+            List of the topics no longer held by any shard
+        """
+
+        removed = []
+        with self.lock:
+            for topic in self.shard_table.keys():
+                self.shard_table[topic].discard(shard)
+                self.topic_trie.remove(topic, shard)
+                if not self.shard_table[topic]:
+                    del self.shard_table[topic]
+                    removed.append(topic)
+        return removed
+
+    def get_shards(self, topic):
+        """Get the shards holding the subscribers for the topic
+
+        Includes the shards holding the subscription patterns which match the
+        topic.
+
+        Keyword arguments:
+        topic -- The topic to look up
+
+        Returns:
+            List of shard indexes
+        """
+
+        with self.lock:
+            shards = set(self.shard_table.get(topic, ()))
+        if self.topic_trie.pattern_count != 0:
+            shards.update(self.topic_trie.match(topic))
+        return list(shards)
+
+    def get_topics(self):
+        """Get the list of topics available across the shards
+
+        Returns: List of topics
+        """
+
+        with self.lock:
+            return self.shard_table.keys()
@@ -1 +1,2 @@
 from socket_handler import SocketHandler
+from structures import ClientList, ClientSelector, ClientSession, LoadTable, RateLimiter, TokenBucket, TopicTrie
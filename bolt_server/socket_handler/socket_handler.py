@@ -4,77 +4,631 @@ Description: Defines the socket handling interface
 Date: 26/09/2017
 Author: Saurabh Badhwar <sbadhwar@redhat.com>
 '''
-from structures import ClientList
+from structures import ClientList, ClientSelector, ClientSession, LoadTable, RateLimiter, TokenBucket
+from bolt_server.metrics import get_registry
+from bolt_server.capture import CaptureWriter
+import errno
+import json
 import os
+import random
+import select
 import socket
+import stat
 import threading
+import time
 
 class SocketHandler(object):
     """Implement the socket handler interface for client handling
 
     Builds upon the python sockets to implement a multithreaded interface for
     handling the socket connections
+
+    Every message sent to the clients is terminated by a newline, which lets
+    the clients split a batch of messages received at once.
+
+    Besides the TCP port, the handler can listen on a unix domain socket for
+    the clients running on the same host. Such clients skip the TCP loopback
+    stack while using the same handshake and framing, and are handled the same
+    as the TCP clients once connected.
+
+    The clients are identified across the connections by the hostname they
+    send in the handshake. When a client disconnects, its session is kept for
+    a grace period in place of the connection, holding the messages sent to
+    the client meanwhile. A client reconnecting with the same hostname within
+    the grace period gets the missed messages replayed, otherwise the session
+    expires and the messages are dropped.
+
+    The traffic can be captured to a file for replaying it later: the client
+    handshakes, every read from and every write to the clients, and the
+    disconnects are recorded with their time.
+
+    The listeners never block on a single client: the handshakes are awaited
+    alongside the new connections and the clients which don't send theirs in
+    time are dropped. The new connections can be limited in rate and in
+    number. A connection over the limits is shed, it gets a JSON message
+    with the time in seconds to reconnect after and is closed:
+    {"retry_after": seconds}
+    While the accept rate is limited, the shed clients are given the
+    successive slots at that rate, so a reconnect storm gets spread out
+    instead of coming back at once. When the process runs out of file
+    descriptors, the listener stops accepting for a moment instead of
+    spinning on the failing accepts.
+
+    The outbound messages can be rate limited per topic and per client. The
+    messages over a limit are queued and sent by a pacer thread as the limit
+    allows, so a burst on a bulk topic doesn't hold up the other topics.
     """
 
-    def __init__(self):
+    #The number of connections accepted at once before the handshakes are read
+    ACCEPT_BATCH = 64
+
+    #The seconds the accepts are paused for once the file descriptors run out
+    ACCEPT_BACKOFF = 0.5
+
+    MESSAGE_DELIMITER = '\n'
+
+    #send_many reports the names of the clients every message was sent to
+    REPORTS_RECIPIENTS = True
+
+    def __init__(self, reuse_port=False, unix_path=None):
         """SocketHandler constructor object
 
         Initializes the required components for socket handling
 
         Keyword arguments:
-        handler -- The message handler object
+        reuse_port -- Bind the listening socket with SO_REUSEPORT so that
+                      multiple processes can share the same port (Default: False)
+        unix_path -- The path of the unix domain socket to listen on for the
+                     local clients, an empty path to not listen on one
+                     (Default: BOLT_SERVER_UNIX_SOCKET or '')
         """
 
+        if unix_path is None:
+            unix_path = os.getenv('BOLT_SERVER_UNIX_SOCKET', '')
+
         self.client_list = ClientList()
         self.host = os.getenv('BOLT_SERVER_HOST', '127.0.0.1')
         self.port = int(os.getenv('BOLT_SERVER_PORT', 5200))
-        self.queue_size = os.getenv('BOLT_SERVER_CONNECTION_WAIT_QUEUE', 100)
+        self.queue_size = int(os.getenv('BOLT_SERVER_CONNECTION_WAIT_QUEUE', 100))
+        self.reuse_port = reuse_port
+        self.unix_path = unix_path
         self.listen = True
         self.thread_pool = []
-        self.server_thread = threading.Thread(target=self.__setup_socket_server)
+        self.topic_listeners = []
+        #The load reports are used for BOLT_LOAD_REPORT_AGE seconds, the
+        #clients which don't report their capacity are assumed to run
+        #BOLT_CLIENT_CAPACITY tasks at once, 0 for no limit
+        self.client_selector = ClientSelector(LoadTable(max_age=float(os.getenv('BOLT_LOAD_REPORT_AGE', 30)),
+                                                        capacity=int(os.getenv('BOLT_CLIENT_CAPACITY', 0))))
+        #Per topic delivery modes, topics not listed here are broadcasted
+        self.topic_delivery = {}
+        #The time in seconds the session of a disconnected client is kept for,
+        #0 to drop the clients on disconnect
+        self.session_grace = float(os.getenv('BOLT_SESSION_GRACE', 30))
+        #The maximum number of writes kept for a disconnected client
+        self.session_outbox = int(os.getenv('BOLT_SESSION_OUTBOX', 1000))
+        #The sessions of the disconnected clients by their name
+        self.sessions = {}
+        self.session_lock = threading.RLock()
+        #The name and the topics of the connected clients
+        self.client_topics = {}
+        #The connections of the connected clients by their name
+        self.client_conns = {}
+        #The locks serializing the writes to every connected client, as the
+        #messages, the pacer and the session replays write from their threads
+        self.write_locks = {}
+        #The admission control of the new connections, 0 disables a limit
+        self.max_connections = int(os.getenv('BOLT_MAX_CONNECTIONS', 0))
+        self.handshake_timeout = float(os.getenv('BOLT_HANDSHAKE_TIMEOUT', 5))
+        self.retry_after = float(os.getenv('BOLT_RETRY_AFTER', 1))
+        self.accept_rate = float(os.getenv('BOLT_ACCEPT_RATE', 0))
+        self.accept_bucket = None
+        if self.accept_rate > 0:
+            self.accept_bucket = TokenBucket(self.accept_rate, float(os.getenv('BOLT_ACCEPT_BURST', 0)))
+        self.admission_lock = threading.Lock()
+        #The time the last shed client was told to reconnect at
+        self.retry_slot = 0.0
+        #The connections awaited for their handshake on all the listeners
+        self.handshaking = set()
+
+        #The outbound rate limits keyed by ('topic', topic) and
+        #('client', hostname), BOLT_CLIENT_RATE limits every client
+        self.rate_limiter = RateLimiter()
+        self.client_rate = float(os.getenv('BOLT_CLIENT_RATE', 0))
+        self.client_burst = float(os.getenv('BOLT_CLIENT_BURST', 0))
+        self.pacer_thread = None
+
+        #The CaptureWriter recording the traffic, BOLT_CAPTURE_FILE to capture
+        #from the start
+        self.capture = None
+        if os.getenv('BOLT_CAPTURE_FILE', '') != '':
+            self.capture = CaptureWriter(os.getenv('BOLT_CAPTURE_FILE'))
+
+        #The increment methods of the counters updated on the hot paths
+        metrics = get_registry()
+        self.count_accepted = metrics.counter('bolt_socket_accepted_total', 'Client connections accepted').increment
+        self.count_received = metrics.counter('bolt_socket_received_total', 'Reads received from the clients').increment
+        self.count_sent = metrics.counter('bolt_socket_sent_total', 'Writes sent to the clients').increment
+        self.count_send_errors = metrics.counter('bolt_socket_send_errors_total',
+                                                 'Failed writes to the clients').increment
+        self.count_shed = dict((reason, metrics.counter('bolt_socket_shed_total', 'Connections shed',
+                                                        {'reason': reason}).increment)
+                               for reason in ('rate', 'connections'))
+        self.count_accept_backoffs = metrics.counter('bolt_socket_accept_backoffs_total',
+                                                     'Accepts paused as the file descriptors ran out').increment
+        self.count_handshake_failures = dict(
+            (reason, metrics.counter('bolt_socket_handshake_failures_total', 'Connections dropped in the handshake',
+                                     {'reason': reason}).increment)
+            for reason in ('timeout', 'invalid'))
+        metrics.gauge('bolt_socket_handshakes', 'Connections awaiting their handshake',
+                      function=lambda: len(self.handshaking))
+        self.count_throttled = dict((kind, metrics.counter('bolt_socket_throttled_total',
+                                                           'Messages queued by the rate limits',
+                                                           {'limit': kind}).increment)
+                                    for kind in ('topic', 'client'))
+        self.throttle_delay = dict((kind, metrics.histogram('bolt_socket_throttle_delay_seconds',
+                                                            'Time the messages were queued by the rate limits',
+                                                            {'limit': kind}))
+                                   for kind in ('topic', 'client'))
+        metrics.gauge('bolt_socket_throttle_queued', 'Messages queued by the rate limits',
+                      function=lambda: self.rate_limiter.queued)
+        metrics.gauge('bolt_socket_clients', 'Connected clients', function=lambda: len(self.client_topics))
+        metrics.gauge('bolt_socket_sessions', 'Sessions of the disconnected clients',
+                      function=lambda: len(self.sessions))
+
+        self.server_thread = threading.Thread(target=self.__setup_socket_server, name='bolt-listener')
         self.server_thread.daemon = True
         self.server_thread.start()
+        if self.unix_path != '':
+            self.unix_thread = threading.Thread(target=self.__setup_unix_server, name='bolt-unix-listener')
+            self.unix_thread.daemon = True
+            self.unix_thread.start()
+        if self.client_rate > 0:
+            self.__start_pacer()
 
     def __setup_socket_server(self):
         """Setup the socket server to handle the connection requests."""
 
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        #The shed and the timed out connections are closed by the server,
+        #their TIME_WAIT shouldn't keep a restarted server from binding
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if self.reuse_port:
+            if not hasattr(socket, 'SO_REUSEPORT'):
+                raise RuntimeError("SO_REUSEPORT is not supported on this platform")
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
         self.socket.bind((self.host, self.port))
         self.socket.listen(self.queue_size)
-        self.__start_listner()
+        self.__start_listner(self.socket)
+
+    def __setup_unix_server(self):
+        """Setup the unix domain socket server for the local clients
+
+        A socket file left behind by a previous run is replaced.
+        """
 
-    def __start_listner(self):
+        if os.path.exists(self.unix_path):
+            if not stat.S_ISSOCK(os.stat(self.unix_path).st_mode):
+                raise RuntimeError("The unix socket path exists and is not a socket")
+            os.unlink(self.unix_path)
+
+        self.unix_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.unix_socket.bind(self.unix_path)
+        self.unix_socket.listen(self.queue_size)
+        self.__start_listner(self.unix_socket)
+
+    def __start_listner(self, listen_socket):
         """Start listening for the client connections
 
-        Starts accepting the connections on the port and assigns them to client
-        list and moves forward to the next connection.
+        Accepts the connections on the socket and waits for their handshakes
+        in the same loop, the clients which sent their handshake are assigned
+        to the client list.
+
+        Keyword arguments:
+        listen_socket -- The listening socket to accept the connections on
         """
 
+        listen_socket.setblocking(False)
+        poller = select.poll()
+        poller.register(listen_socket.fileno(), select.POLLIN)
+        #The connections awaiting their handshake, {fileno: (conn, deadline)}
+        handshakes = {}
+        #The time to resume accepting at while the accepts are paused
+        resume_at = None
         while self.listen:
-            conn, addr = self.socket.accept()
+            if resume_at is not None and resume_at <= time.time():
+                poller.register(listen_socket.fileno(), select.POLLIN)
+                resume_at = None
+            timeout = 500
+            deadlines = [deadline for conn, deadline in handshakes.itervalues()]
+            if resume_at is not None:
+                deadlines.append(resume_at)
+            if deadlines:
+                timeout = max(0, min(timeout, int((min(deadlines) - time.time()) * 1000) + 1))
+            try:
+                events = poller.poll(timeout)
+            except select.error as e:
+                if e.args[0] == errno.EINTR:
+                    continue
+                raise
+
+            for fileno, event in events:
+                if fileno == listen_socket.fileno():
+                    admitted, exhausted = self.__accept(listen_socket)
+                    for conn in admitted:
+                        handshakes[conn.fileno()] = (conn, time.time() + self.handshake_timeout)
+                        poller.register(conn.fileno(), select.POLLIN)
+                    if exhausted:
+                        #The pending connections stay in the backlog until
+                        #some descriptors are freed
+                        self.count_accept_backoffs()
+                        poller.unregister(fileno)
+                        resume_at = time.time() + self.ACCEPT_BACKOFF
+                elif fileno in handshakes:
+                    conn = handshakes.pop(fileno)[0]
+                    poller.unregister(fileno)
+                    self.__handshake(conn)
+
+            now = time.time()
+            for fileno, (conn, deadline) in handshakes.items():
+                if deadline <= now:
+                    del handshakes[fileno]
+                    poller.unregister(fileno)
+                    with self.admission_lock:
+                        self.handshaking.discard(conn)
+                    self.count_handshake_failures['timeout']()
+                    conn.close()
+
+    def __accept(self, listen_socket):
+        """Accept the pending connections which are admitted
+
+        The connections over the limits are shed.
+
+        Keyword arguments:
+        listen_socket -- The listening socket to accept the connections on
+
+        Returns:
+            Tuple of the list of the admitted connections and whether the
+            file descriptors ran out
+        """
+
+        admitted = []
+        for attempt in range(self.ACCEPT_BATCH):
+            try:
+                conn, addr = listen_socket.accept()
+            except socket.error as e:
+                return admitted, e.args[0] in (errno.EMFILE, errno.ENFILE)
+
+            conn.setblocking(True)
+            self.count_accepted()
+            retry_after = self.__admit(conn, time.time())
+            if retry_after is None:
+                admitted.append(conn)
+                continue
+            try:
+                conn.sendall(json.dumps({'retry_after': round(retry_after, 3)}) + self.MESSAGE_DELIMITER)
+            except socket.error:
+                pass
+            conn.close()
+        return admitted, False
+
+    def __admit(self, conn, now):
+        """Check a new connection against the admission limits
+
+        An admitted connection is counted against the limit at once, so the
+        connections accepted together can't go over it.
+
+        Keyword arguments:
+        conn -- The new connection
+        now -- The current time
+
+        Returns:
+            None if the connection is admitted
+            Float seconds the client should reconnect after if it is shed
+        """
+
+        with self.admission_lock:
+            if self.max_connections > 0 and \
+                    len(self.client_topics) + len(self.handshaking) >= self.max_connections:
+                reason = 'connections'
+            elif self.accept_bucket is not None and not self.accept_bucket.consume(now):
+                reason = 'rate'
+            else:
+                self.handshaking.add(conn)
+                return None
+
+            self.count_shed[reason]()
+            if self.accept_bucket is None:
+                return self.retry_after * (1 + random.random())
+            #Hand out the slots at the accept rate, starting once the bucket
+            #has refilled
+            slot = max(now + self.accept_bucket.get_delay(now), self.retry_slot)
+            self.retry_slot = slot + 1.0 / self.accept_rate
+            return max(self.retry_after, slot - now)
+
+    def __handshake(self, conn):
+        """Read the handshake of a connection and assign the client
+
+        The handshake looks like 'topic1,topic2:hostname', a connection
+        closed or sending anything else is dropped.
+
+        Keyword arguments:
+        conn -- The connection which has sent its handshake
+        """
+
+        try:
             handshake = conn.recv(32000)
-            topic, hostname = handshake.split(':')
-            for t in topic.split(','):
-                self.client_list.add_client(t, conn)
-                receiver_thread = threading.Thread(target=self.__start_receiver, args=(conn,))
-                receiver_thread.daemon = True
-                self.thread_pool.append(receiver_thread)
-                receiver_thread.start()
+        except socket.error:
+            handshake = ''
+        if handshake.count(':') != 1:
+            with self.admission_lock:
+                self.handshaking.discard(conn)
+            self.count_handshake_failures['invalid']()
+            conn.close()
+            return
+
+        topic, hostname = handshake.split(':')
+        topics = topic.split(',')
+        if self.capture is not None:
+            self.capture.connect(conn, handshake)
+        self.expire_sessions()
+        self.__attach_client(conn, hostname, topics)
+        #Only dropped from the handshakes once counted as a client, so the
+        #connection is always counted against the connection limit
+        self.handshaking.discard(conn)
+        receiver_thread = threading.Thread(target=self.__start_receiver, args=(conn, hostname, topics),
+                                           name='bolt-receiver')
+        receiver_thread.daemon = True
+        self.thread_pool.append(receiver_thread)
+        receiver_thread.start()
 
 
-    def __start_receiver(self, conn):
+    def __start_receiver(self, conn, hostname, topics):
         """Start the connection receiver
 
-        Start receiving the messages from the connected clients
+        Start receiving the messages from the connected clients. Once the
+        client disconnects, it is removed from the topics it subscribed to.
+
+        The clients can terminate their messages by a newline, which lets them
+        send several messages at once. A read without any newline is handled
+        as a single message.
+
+        The JSON object messages are stamped with the name of the client from
+        its handshake, overriding any name the client put in them.
+
         Keyword arguments:
         conn -- The connection object on which to listen
+        hostname -- The name of the client from the handshake
+        topics -- The topics the client subscribed to during the handshake
         """
 
+        #The start of a newline terminated message split across the reads
+        pending = ''
         while self.listen:
-            message = conn.recv(32000)
+            try:
+                message = conn.recv(32000)
+            except socket.error:
+                break
             if not message:
                 break
-            self.handle(message)
+            if self.capture is not None:
+                self.capture.inbound(conn, message)
+
+            if pending == '' and self.MESSAGE_DELIMITER not in message:
+                messages = [message]
+            else:
+                messages = (pending + message).split(self.MESSAGE_DELIMITER)
+                pending = messages.pop()
+
+            for message in messages:
+                if message != '':
+                    self.count_received()
+                    self.client_selector.message_received(conn)
+                    self.handle(self.__stamp_client(message, hostname))
+
+        if self.capture is not None:
+            self.capture.disconnect(conn)
+        self.__detach_client(conn)
+
+    def __stamp_client(self, message, hostname):
+        """Set the name of the sending client inside a message
+
+        Keyword arguments:
+        message -- The JSON formatted message received from the client
+        hostname -- The name of the client from the handshake
+
+        Returns:
+            String The message with the client name, the messages which
+            aren't JSON objects are returned as they are
+        """
+
+        try:
+            payload = json.loads(message)
+        except ValueError:
+            return message
+        if not isinstance(payload, dict):
+            return message
+        payload['client'] = hostname
+        return json.dumps(payload)
+
+    def __attach_client(self, conn, hostname, topics):
+        """Add a newly connected client to its topics
+
+        A client with a session left from its previous connection takes the
+        place of the session and gets the messages held by it.
+
+        Keyword arguments:
+        conn -- The connection of the client
+        hostname -- The name of the client from the handshake
+        topics -- The topics the client subscribed to
+        """
+
+        self.client_list.set_client_name(conn, hostname)
+        self.write_locks[conn] = threading.Lock()
+        self.client_topics[conn] = (hostname, topics)
+        if self.client_rate > 0 and not self.rate_limiter.is_limited(('client', hostname)):
+            self.rate_limiter.set_rate(('client', hostname), self.client_rate, self.client_burst)
+        with self.session_lock:
+            self.client_conns.setdefault(hostname, set()).add(conn)
+            session = self.sessions.pop(hostname, None)
+            if session is not None:
+                #The outbox is replayed before the connection can be reached
+                #through its topics, the writes to the session meanwhile are
+                #forwarded after it
+                try:
+                    session.resume(conn, self.write_locks[conn])
+                except socket.error:
+                    pass
+                self.client_list.replace_client(session, conn, topics)
+                self.client_selector.remove_client(session)
+
+        for t in topics:
+            if self.client_list.add_client(t, conn) and len(self.client_list.get_clients(t)) == 1:
+                self.__notify_topic_listeners(t, True)
+        if session is not None:
+            for t in session.topics:
+                if self.client_list.get_clients(t) == []:
+                    self.__notify_topic_listeners(t, False)
+
+    def __detach_client(self, conn):
+        """Remove a disconnected client from its topics
+
+        With a grace period set, a session takes the place of the client in its
+        topics until the client reconnects or the session expires.
+
+        Keyword arguments:
+        conn -- The connection of the client
+
+        Returns:
+            ClientSession of the client
+            None if the client isn't connected or its session isn't kept
+        """
+
+        if conn not in self.client_topics:
+            return None
+        hostname, topics = self.client_topics.pop(conn)
+
+        session = None
+        with self.session_lock:
+            conns = self.client_conns[hostname]
+            conns.discard(conn)
+            if not conns:
+                del self.client_conns[hostname]
+            #A client which has already reconnected doesn't need a session
+            if self.session_grace > 0 and hostname not in self.sessions and hostname not in self.client_conns:
+                session = ClientSession(hostname, topics, time.time(), self.session_outbox)
+                self.client_list.set_client_name(session, hostname)
+                for t in topics:
+                    self.client_list.add_client(t, session)
+                self.sessions[hostname] = session
+
+            self.client_list.remove_client(conn)
+        self.client_selector.remove_client(conn)
+        self.write_locks.pop(conn, None)
+        for t in topics:
+            if self.client_list.get_clients(t) == []:
+                self.__notify_topic_listeners(t, False)
+
+        self.expire_sessions()
+        return session
+
+    def __remove_session(self, session):
+        """Remove a session from the topics of its client
+
+        Keyword arguments:
+        session -- The ClientSession to be removed
+        """
+
+        self.client_list.remove_client(session)
+        self.client_selector.remove_client(session)
+        for t in session.topics:
+            if self.client_list.get_clients(t) == []:
+                self.__notify_topic_listeners(t, False)
+
+    def expire_sessions(self):
+        """Drop the sessions of the clients which didn't reconnect in time"""
+
+        now = time.time()
+        expired = []
+        with self.session_lock:
+            for hostname, session in self.sessions.items():
+                if session.is_expired(now, self.session_grace):
+                    del self.sessions[hostname]
+                    session.expire()
+                    expired.append(session)
+        for session in expired:
+            self.__remove_session(session)
+
+    def __write(self, client, data):
+        """Write the data to a client
+
+        A client whose connection fails is detached and the data is kept in its
+        session.
+
+        Keyword arguments:
+        client -- The connection of the client, or its session
+        data -- The data to be written
+
+        Raises:
+            socket.error if the write fails and the session isn't kept
+        """
+
+        #The sessions serialize their writes themselves
+        write_lock = self.write_locks.get(client)
+        try:
+            if write_lock is None:
+                client.sendall(data)
+            else:
+                with write_lock:
+                    #The write is recorded ahead so that it precedes the reply
+                    #it causes
+                    if self.capture is not None:
+                        self.capture.outbound(client, data)
+                    client.sendall(data)
+        except socket.error:
+            self.count_send_errors()
+            session = self.__detach_client(client)
+            if session is None:
+                raise
+            session.sendall(data)
+        self.count_sent()
+
+    def set_capture(self, capture):
+        """Start or stop capturing the traffic
+
+        Keyword arguments:
+        capture -- The CaptureWriter to record the traffic to, None to stop
+                   capturing. The writer replaced is closed.
+        """
+
+        previous = self.capture
+        self.capture = capture
+        if previous is not None and previous is not capture:
+            previous.close()
+
+    def __notify_topic_listeners(self, topic, active):
+        """Notify the topic listeners about a change in topic availability
+
+        Keyword arguments:
+        topic -- The topic whose availability changed
+        active -- True if the topic gained its first client, False if it lost
+                  its last client
+        """
+
+        for listener in self.topic_listeners:
+            listener(topic, active)
+
+    def register_topic_listener(self, listener):
+        """Register a listener for the topic availability changes
+
+        The listener is called as listener(topic, active) whenever a topic gets
+        its first subscriber or loses its last one.
+
+        Keyword arguments:
+        listener -- The callable to be notified
+        """
+
+        self.topic_listeners.append(listener)
 
     def register_handler(self, message_handler):
         """Register a new message handler
@@ -101,26 +655,288 @@ class SocketHandler(object):
         """Stop listening on the server so as to prepare for shutdown"""
 
         self.listen = False
+        if self.capture is not None:
+            self.capture.flush()
+
+    def set_topic_delivery(self, topic, delivery):
+        """Set the default delivery mode for a topic
+
+        Keyword arguments:
+        topic -- The topic to set the delivery mode for
+        delivery -- One of the ClientSelector.DELIVERY_* modes
+        """
+
+        self.topic_delivery[topic] = delivery
+
+    def get_topic_delivery(self, topic):
+        """Get the default delivery mode of a topic
+
+        Keyword arguments:
+        topic -- The topic to get the delivery mode for
+
+        Returns:
+            Integer The delivery mode
+        """
 
-    def send_message(self, topic, message):
+        return self.topic_delivery.get(topic, ClientSelector.DELIVERY_BROADCAST)
+
+    def send_message(self, topic, message, delivery=None, delivery_key=None):
         """Send a new message to the clients subscribed to a particular topic
 
+        By default the message is delivered to every client on the topic,
+        including the clients whose subscription patterns match the topic. With
+        an anycast delivery mode only a single client is selected.
+
         Keyword arguments:
         topic -- The topic to which the message should be sent
         message -- The JSON formatted message that needs to be sent
+        delivery -- The delivery mode for the message, overrides the topic
+                    delivery mode (Default: None)
+        delivery_key -- The key used by the consistent hash delivery
+                        (Default: None)
+
+        A message over the rate limit of the topic is queued, the clients it
+        is sent to are selected once it is released.
 
         Raises:
             RuntimeError if the specified topic doesn't exis
         """
 
-        if not self.client_list.is_topic(topic):
+        if self.sessions:
+            self.expire_sessions()
+
+        limited = self.rate_limiter.is_active()
+        if limited and not self.__admit_topic(topic, message, delivery, delivery_key):
+            return
+
+        for client in list(self.__get_recipients(topic, delivery, delivery_key)):
+            self.client_selector.message_sent(client)
+            if not limited or self.__admit_client(client, message + self.MESSAGE_DELIMITER):
+                self.__write(client, message + self.MESSAGE_DELIMITER)
+
+    def send_many(self, messages):
+        """Send a batch of messages with a single write per client
+
+        The messages meant for the same client are joined together and written
+        to the client at once.
+
+        Keyword arguments:
+        messages -- The list of (topic, message, delivery, delivery_key)
+
+        Returns:
+            List with the names of the clients each message was sent to, None
+            for the messages whose topic doesn't exist, True for the messages
+            queued by the rate limit of their topic
+        """
+
+        if self.sessions:
+            self.expire_sessions()
+
+        limited = self.rate_limiter.is_active()
+        buffers = {}
+        sent = []
+        for topic, message, delivery, delivery_key in messages:
+            try:
+                if limited and not self.__admit_topic(topic, message, delivery, delivery_key):
+                    sent.append(True)
+                    continue
+                clients = self.__get_recipients(topic, delivery, delivery_key)
+            except RuntimeError:
+                sent.append(None)
+                continue
+
+            for client in clients:
+                self.client_selector.message_sent(client)
+                if limited and not self.__admit_client(client, message + self.MESSAGE_DELIMITER):
+                    continue
+                if client not in buffers:
+                    buffers[client] = []
+                buffers[client].append(message)
+            sent.append([self.client_list.get_client_name(client) for client in clients])
+
+        for client, buffer in buffers.iteritems():
+            buffer.append('')
+            try:
+                self.__write(client, self.MESSAGE_DELIMITER.join(buffer))
+            except socket.error:
+                pass
+
+        return sent
+
+    def set_topic_rate(self, topic, rate, burst=None):
+        """Limit the rate of the messages sent on a topic
+
+        Keyword arguments:
+        topic -- The topic to limit, as the messages are sent on it
+        rate -- The number of messages per second, 0 to remove the limit
+        burst -- The number of messages which can be sent at once
+                 (Default: The rate, at least 1)
+        """
+
+        self.rate_limiter.set_rate(('topic', topic), rate, burst)
+        self.__start_pacer()
+
+    def set_client_rate(self, client_name, rate, burst=None):
+        """Limit the rate of the writes to a client
+
+        The limit applies to the client across its connections, a client
+        without a limit of its own gets the BOLT_CLIENT_RATE limit.
+
+        Keyword arguments:
+        client_name -- The name the client sends in its handshake
+        rate -- The number of writes per second, 0 to remove the limit
+        burst -- The number of writes which can be sent at once
+                 (Default: The rate, at least 1)
+        """
+
+        self.rate_limiter.set_rate(('client', client_name), rate, burst)
+        self.__start_pacer()
+
+    def report_load(self, client_name, inflight, cpu=None, capacity=None):
+        """Record the load reported by a client
+
+        The load is used by the least loaded delivery.
+
+        Keyword arguments:
+        client_name -- The name the client sends in its handshake
+        inflight -- The number of tasks the client is running
+        cpu -- The CPU load of the client (Default: None)
+        capacity -- The number of tasks the client can run at once
+                    (Default: None)
+        """
+
+        self.client_selector.report_load(client_name, inflight, cpu, capacity)
+
+    def get_headroom(self, topic, delivery=None):
+        """Get the number of messages the clients of a topic can take
+
+        Only the least loaded delivery is bound by the capacity of the
+        clients, the other delivery modes have no headroom limit.
+
+        Keyword arguments:
+        topic -- The topic the messages would be sent to
+        delivery -- The delivery mode of the messages, None for the delivery
+                    mode of the topic (Default: None)
+
+        Returns:
+            Integer
+            None if there is no limit
+        """
+
+        if delivery is None:
+            delivery = self.get_topic_delivery(topic)
+        if delivery != ClientSelector.DELIVERY_LEAST_LOADED:
+            return None
+        return self.client_selector.get_headroom(self.client_list.match_clients(topic),
+                                                 self.client_list.client_names)
+
+    def __admit_topic(self, topic, message, delivery, delivery_key):
+        """Check a message against the rate limit of its topic
+
+        Raises:
+            RuntimeError if the topic of a queued message doesn't exist
+
+        Returns:
+            Bool False if the message was queued
+        """
+
+        key = ('topic', topic)
+        if not self.rate_limiter.is_limited(key):
+            return True
+        if not self.client_list.is_topic(topic) and self.client_list.match_clients(topic) == []:
             raise RuntimeError("The specified topic doesn't exist")
-        for client in self.client_list.get_clients(topic):
-            client.sendall(message)
+        if self.rate_limiter.admit(key, (topic, message, delivery, delivery_key)):
+            return True
+        self.count_throttled['topic']()
+        return False
+
+    def __admit_client(self, client, data):
+        """Check a write against the rate limit of its client
+
+        Returns:
+            Bool False if the write was queued
+        """
+
+        key = ('client', self.client_list.get_client_name(client))
+        if not self.rate_limiter.is_limited(key) or self.rate_limiter.admit(key, (client, data)):
+            return True
+        self.count_throttled['client']()
+        return False
+
+    def __start_pacer(self):
+        """Start the thread sending the queued messages, unless running"""
+
+        with self.admission_lock:
+            if self.pacer_thread is not None:
+                return
+            self.pacer_thread = threading.Thread(target=self.__pace, name='bolt-pacer')
+            self.pacer_thread.daemon = True
+            self.pacer_thread.start()
+
+    def __pace(self):
+        """Send the queued messages as the rate limits allow"""
+
+        while self.listen:
+            for key, message, delay in self.rate_limiter.wait_release(0.5):
+                self.throttle_delay[key[0]].observe(delay)
+                if key[0] == 'client':
+                    client, data = message
+                    try:
+                        self.__write(client, data)
+                    except socket.error:
+                        pass
+                    continue
+
+                topic, message, delivery, delivery_key = message
+                try:
+                    clients = list(self.__get_recipients(topic, delivery, delivery_key))
+                except RuntimeError:
+                    self.count_send_errors()
+                    continue
+                for client in clients:
+                    self.client_selector.message_sent(client)
+                    if self.__admit_client(client, message + self.MESSAGE_DELIMITER):
+                        try:
+                            self.__write(client, message + self.MESSAGE_DELIMITER)
+                        except socket.error:
+                            pass
+
+    def __get_recipients(self, topic, delivery, delivery_key):
+        """Get the clients a message on the topic should be sent to
+
+        Keyword arguments:
+        topic -- The topic to which the message should be sent
+        delivery -- The delivery mode for the message, None for the topic
+                    delivery mode
+        delivery_key -- The key used by the consistent hash delivery
+
+        Raises:
+            RuntimeError if the specified topic doesn't exist
+
+        Returns:
+            List of clients
+        """
+
+        clients = self.client_list.match_clients(topic)
+        if clients == [] and not self.client_list.is_topic(topic):
+            raise RuntimeError("The specified topic doesn't exist")
+
+        if delivery is None:
+            delivery = self.get_topic_delivery(topic)
+
+        if delivery != ClientSelector.DELIVERY_BROADCAST and clients != []:
+            #The sessions only hold the messages when no client is connected
+            connected = [client for client in clients if not isinstance(client, ClientSession)]
+            if connected != []:
+                clients = connected
+            clients = [self.client_selector.select(topic, clients, delivery, delivery_key,
+                                                   self.client_list.client_names)]
+
+        return clients
 
     def broadcast(self, message):
         """Broadcast a message to all the connected clients"""
 
         for topic in self.client_list.get_topics():
-            for client in self.client_list.get_clients(topic):
-                client.sendall(message)
+            for client in list(self.client_list.get_clients(topic)):
+                self.__write(client, message + self.MESSAGE_DELIMITER)
@@ -4,15 +4,22 @@ Description: Defines the structures used by socket handler
 Date: 26/09/2017
 Author: Saurabh Badhwar <sbadhwar@redhat.com>
 '''
+import bisect
+import collections
+import hashlib
+import threading
+import time
 
 class ClientList(object):
     """ClientList structure. Used for holding the connected clients list
 
     The general structure looks like:
     client_list: {'topic': [clients]}
-    """
 
-    client_list = {}    #Initialize the client list
+    The topics can be subscription patterns with wildcard levels (see
+    TopicTrie), such subscriptions are additionally indexed in a topic trie so
+    that the clients for a published topic can be matched quickly.
+    """
 
     def __init__(self):
         """ClientList constructor
@@ -20,8 +27,10 @@ class ClientList(object):
         Initializes the ClientList for use in the socket handler
         """
 
+        self.client_list = {}    #Initialize the client list
         self.topic_count = 0
-        self.error_count = 0
+        self.client_names = {}
+        self.topic_trie = TopicTrie()
 
     def add_topic(self, topic):
         """Add a new topic to the client list
@@ -59,8 +68,33 @@ class ClientList(object):
             return False
 
         self.client_list[topic].append(client)
+        if TopicTrie.is_pattern(topic):
+            self.topic_trie.add(topic, client)
         return True
 
+    def set_client_name(self, client, name):
+        """Set the name the client identified itself with
+
+        Keyword arguments:
+        client -- The callable socket object for the client
+        name -- The name of the client (hostname from the handshake)
+        """
+
+        self.client_names[client] = name
+
+    def get_client_name(self, client):
+        """Get the name of the client
+
+        Keyword arguments:
+        client -- The callable socket object for the client
+
+        Returns:
+            String on Success
+            None if the client name is not known
+        """
+
+        return self.client_names.get(client)
+
     def get_topics(self):
         """Get the list of topics
 
@@ -85,6 +119,35 @@ class ClientList(object):
 
         return self.client_list[topic]
 
+    def match_clients(self, topic):
+        """Return the clients which should receive a message for the topic
+
+        Includes the clients subscribed to the exact topic as well as the
+        clients whose subscription patterns match the topic.
+
+        Keyword arguments:
+        topic -- The topic being published to
+
+        Returns:
+            List of clients
+        """
+
+        clients = self.client_list.get(topic, [])
+        if self.topic_trie.pattern_count == 0:
+            return clients
+
+        matched = self.topic_trie.match(topic)
+        if matched == []:
+            return clients
+
+        clients = list(clients)
+        seen = set(clients)
+        for client in matched:
+            if client not in seen:
+                seen.add(client)
+                clients.append(client)
+        return clients
+
     def is_topic(self, topic):
         """Check if a topic is present in the client list or not
 
@@ -115,11 +178,49 @@ class ClientList(object):
             for t in self.client_list:
                 if client in self.client_list[t]:
                     self.client_list[t].remove(client)
+                    self.topic_trie.remove(t, client)
+            if client in self.client_names:
+                del self.client_names[client]
         else:
             self.client_list[topic].remove(client)
+            self.topic_trie.remove(topic, client)
 
         return True
 
+    def replace_client(self, client, replacement, topics):
+        """Put a client in the place of another one
+
+        The replacement takes the place of the client inside the given topics,
+        so these are never seen without either of them. The client is removed
+        from its other topics.
+
+        Keyword arguments:
+        client -- The client to be replaced
+        replacement -- The client taking its place
+        topics -- The topics the replacement is subscribed to
+
+        Returns:
+            List of the topics the client was replaced in
+        """
+
+        replaced = []
+        for t in self.client_list:
+            clients = self.client_list[t]
+            if client not in clients:
+                continue
+            if t in topics and replacement not in clients:
+                clients[clients.index(client)] = replacement
+                if TopicTrie.is_pattern(t):
+                    self.topic_trie.add(t, replacement)
+                replaced.append(t)
+            else:
+                clients.remove(client)
+            self.topic_trie.remove(t, client)
+        if client in self.client_names:
+            del self.client_names[client]
+
+        return replaced
+
     def remove_topic(self, topic, force=False):
         """Removes the mentioned topics from the client list
 
@@ -144,6 +245,797 @@ class ClientList(object):
             if len(self.client_list[topic]) != 0 and force==False:
                 raise RuntimeError("Can't remove a topic with active clients")
             else:
+                for client in self.client_list[topic]:
+                    self.topic_trie.remove(topic, client)
                 del self.client_list[topic]
 
         return True
+
+class ClientSession(object):
+    """The session of a disconnected client awaiting its reconnect
+
+    The session stands in for the connection of the client inside the client
+    list, so the messages sent to the client while it is away are kept in the
+    outbox of the session instead of being lost. The outbox holds a bounded
+    number of writes, dropping the oldest ones once full. When the client
+    reconnects, the outbox is replayed to the new connection and the later
+    writes to the session are forwarded to it.
+    """
+
+    def __init__(self, name, topics, detached_at, max_writes):
+        """Initialize the client session
+
+        Keyword arguments:
+        name -- The name of the client (hostname from the handshake)
+        topics -- The topics the client was subscribed to
+        detached_at -- The time the client disconnected at
+        max_writes -- The maximum number of writes kept in the outbox
+        """
+
+        self.name = name
+        self.topics = topics
+        self.detached_at = detached_at
+        self.outbox = collections.deque(maxlen=max_writes)
+        self.dropped = 0
+        self.conn = None
+        self.write_lock = None
+        self.expired = False
+        self.lock = threading.Lock()
+
+    def sendall(self, data):
+        """Keep the data in the outbox, or forward it once resumed
+
+        Keyword arguments:
+        data -- The data to be sent to the client
+        """
+
+        with self.lock:
+            if self.conn is not None:
+                with self.write_lock:
+                    self.conn.sendall(data)
+            elif self.expired:
+                self.dropped = self.dropped + 1
+            else:
+                if len(self.outbox) == self.outbox.maxlen:
+                    self.dropped = self.dropped + 1
+                self.outbox.append(data)
+
+    def resume(self, conn, write_lock=None):
+        """Replay the outbox to the new connection of the client
+
+        Keyword arguments:
+        conn -- The new connection of the client
+        write_lock -- The lock serializing the writes to the connection, taken
+                      by the writes forwarded to it (Default: A lock of its own)
+
+        Returns:
+            Integer The number of writes replayed
+        """
+
+        with self.lock:
+            replayed = len(self.outbox)
+            data = ''.join(self.outbox)
+            self.outbox.clear()
+            self.conn = conn
+            self.write_lock = write_lock if write_lock is not None else threading.Lock()
+            if data != '':
+                with self.write_lock:
+                    conn.sendall(data)
+        return replayed
+
+    def expire(self):
+        """Drop the outbox once the client didn't reconnect in time"""
+
+        with self.lock:
+            self.dropped = self.dropped + len(self.outbox)
+            self.outbox.clear()
+            self.expired = True
+
+    def is_expired(self, now, grace):
+        """Check if the client failed to reconnect within the grace period
+
+        Keyword arguments:
+        now -- The current time
+        grace -- The time in seconds the session is kept for
+
+        Returns: Bool
+        """
+
+        return self.conn is None and now - self.detached_at > grace
+
+class TokenBucket(object):
+    """Limit the rate of events while allowing bursts
+
+    The bucket holds up to burst tokens and is refilled at the rate of tokens
+    per second, every event takes a token. The bucket isn't locked, the users
+    sharing a bucket across the threads lock around it.
+    """
+
+    #The shortfall in tokens ignored, so that waiting for the delay given by
+    #get_delay always yields the tokens despite the float rounding
+    TOLERANCE = 1e-9
+
+    def __init__(self, rate, burst=None, now=None):
+        """Initialize a full bucket
+
+        Keyword arguments:
+        rate -- The number of tokens added per second
+        burst -- The number of tokens the bucket holds (Default: The rate,
+                 at least 1)
+        now -- The current time (Default: time.time())
+        """
+
+        if burst is None or burst <= 0:
+            burst = max(1.0, rate)
+
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = self.burst
+        self.updated = time.time() if now is None else now
+
+    def consume(self, now, tokens=1):
+        """Take tokens from the bucket if it holds enough of them
+
+        Keyword arguments:
+        now -- The current time
+        tokens -- The number of tokens to take (Default: 1)
+
+        Returns:
+            Bool False if the bucket doesn't hold enough tokens
+        """
+
+        self.__refill(now)
+        if self.tokens < tokens - self.TOLERANCE:
+            return False
+        self.tokens = self.tokens - tokens
+        return True
+
+    def get_delay(self, now, tokens=1):
+        """Get the time until the bucket holds enough tokens
+
+        Keyword arguments:
+        now -- The current time
+        tokens -- The number of tokens needed (Default: 1)
+
+        Returns:
+            Float seconds
+        """
+
+        self.__refill(now)
+        if self.tokens >= tokens - self.TOLERANCE:
+            return 0.0
+        return (tokens - self.tokens) / self.rate
+
+    def __refill(self, now):
+        """Add the tokens accrued since the last update"""
+
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+class RateLimiter(object):
+    """Pace the messages sent under the rate limits
+
+    The limits are token buckets kept by a key, like a topic or the name of a
+    client. A message under a limit is sent at once while its bucket holds a
+    token, otherwise it is queued behind the messages already waiting under
+    the same limit and released in order as the bucket refills, so the excess
+    traffic is delayed rather than dropped. The messages under the different
+    limits don't wait for each other.
+
+    The general structure looks like:
+    buckets = {key: TokenBucket}
+    queues = {key: deque([(queued_at, message)])}
+    """
+
+    def __init__(self, clock=time.time):
+        """Initialize the rate limiter
+
+        Keyword arguments:
+        clock -- The callable returning the current time (Default: time.time)
+        """
+
+        self.clock = clock
+        self.buckets = {}
+        self.queues = {}
+        self.queued = 0
+        self.condition = threading.Condition()
+
+    def set_rate(self, key, rate, burst=None):
+        """Set or remove a rate limit
+
+        The messages queued under a removed limit are released at once.
+
+        Keyword arguments:
+        key -- The key of the limit
+        rate -- The number of messages per second, 0 or None to remove the
+                limit
+        burst -- The number of messages which can be sent at once
+                 (Default: The rate, at least 1)
+        """
+
+        with self.condition:
+            if rate is None or rate <= 0:
+                self.buckets.pop(key, None)
+            else:
+                self.buckets[key] = TokenBucket(rate, burst, self.clock())
+            self.condition.notify()
+
+    def is_active(self):
+        """Check if any limit is set or any message is queued
+
+        Returns: Bool
+        """
+
+        return bool(self.buckets or self.queues)
+
+    def is_limited(self, key):
+        """Check if the messages under a key have to go through the limiter
+
+        Returns: Bool
+        """
+
+        return key in self.buckets or key in self.queues
+
+    def admit(self, key, message):
+        """Take a token for a message or queue it
+
+        Keyword arguments:
+        key -- The key of the limit the message is under
+        message -- The message, kept as it is while queued
+
+        Returns:
+            Bool True if the message can be sent now, False if it was queued
+        """
+
+        with self.condition:
+            now = self.clock()
+            bucket = self.buckets.get(key)
+            if key not in self.queues and (bucket is None or bucket.consume(now)):
+                return True
+
+            if key not in self.queues:
+                self.queues[key] = collections.deque()
+            self.queues[key].append((now, message))
+            self.queued = self.queued + 1
+            self.condition.notify()
+            return False
+
+    def release(self):
+        """Take the queued messages which can be sent by now
+
+        Returns:
+            Tuple (released, delay) with the list of the (key, message, seconds
+            the message was queued for) released and the seconds until the
+            next message can be released, None if nothing is queued
+        """
+
+        with self.condition:
+            return self.__release(self.clock())
+
+    def wait_release(self, timeout):
+        """Wait for the queued messages to become due and take them
+
+        Keyword arguments:
+        timeout -- The longest time in seconds to wait for
+
+        Returns:
+            List of the (key, message, seconds the message was queued for)
+        """
+
+        with self.condition:
+            released, delay = self.__release(self.clock())
+            if released == []:
+                self.condition.wait(timeout if delay is None else min(delay, timeout))
+                released, delay = self.__release(self.clock())
+            return released
+
+    def __release(self, now):
+        """Take the messages due, with the condition held"""
+
+        released = []
+        next_delay = None
+        for key, queue in self.queues.items():
+            bucket = self.buckets.get(key)
+            while queue and (bucket is None or bucket.consume(now)):
+                queued_at, message = queue.popleft()
+                released.append((key, message, now - queued_at))
+            if queue:
+                delay = bucket.get_delay(now)
+                next_delay = delay if next_delay is None else min(next_delay, delay)
+            else:
+                del self.queues[key]
+
+        self.queued = self.queued - len(released)
+        return released, next_delay
+
+class LoadTable(object):
+    """Keep the load the clients report on their replies
+
+    A report carries the number of tasks the client is running, its CPU load
+    and the number of tasks it can run at once. The messages sent to the
+    client since its last report are added to the reported tasks, so the
+    estimate stays current between the reports. The reports older than the
+    maximum age are dropped, the clients with no report are left to the
+    caller to estimate.
+
+    The general structure looks like:
+    loads = {name: [inflight, cpu, capacity, reported_at, sent]}
+    """
+
+    def __init__(self, clock=time.time, max_age=30.0, capacity=0):
+        """Initialize the load table
+
+        Keyword arguments:
+        clock -- The callable returning the current time (Default: time.time)
+        max_age -- The time in seconds a report is used for (Default: 30.0)
+        capacity -- The capacity assumed for the clients which don't report
+                    one, 0 for no limit (Default: 0)
+        """
+
+        self.clock = clock
+        self.max_age = max_age
+        self.capacity = capacity
+        self.loads = {}
+
+    def report(self, name, inflight, cpu=None, capacity=None):
+        """Record the load reported by a client
+
+        Keyword arguments:
+        name -- The name of the client
+        inflight -- The number of tasks the client is running
+        cpu -- The CPU load of the client (Default: None)
+        capacity -- The number of tasks the client can run at once
+                    (Default: None)
+        """
+
+        self.loads[name] = [max(0, inflight), cpu, capacity, self.clock(), 0]
+
+    def message_sent(self, name):
+        """Count a message sent to a reporting client
+
+        Keyword arguments:
+        name -- The name of the client
+        """
+
+        load = self.loads.get(name)
+        if load is not None:
+            load[4] = load[4] + 1
+
+    def get_load(self, name):
+        """Get the estimated load of a client
+
+        Keyword arguments:
+        name -- The name of the client
+
+        Returns:
+            Tuple (inflight, cpu, capacity) with the capacity None if unknown
+            None if the client has no current report
+        """
+
+        load = self.loads.get(name)
+        if load is None:
+            return None
+        if self.clock() - load[3] > self.max_age:
+            del self.loads[name]
+            return None
+        return (load[0] + load[4], load[1], load[2] or self.capacity or None)
+
+    def remove(self, name):
+        """Forget the load of a client
+
+        Keyword arguments:
+        name -- The name of the client
+        """
+
+        self.loads.pop(name, None)
+
+class ClientSelector(object):
+    """Select a single client out of the subscribers of a topic
+
+    Used for the anycast delivery of the messages where a message needs to be
+    handled by any one of a pool of equivalent clients.
+
+    The selection can be made in a round robin fashion, by picking the client
+    with the least outstanding messages, by picking the client with the most
+    spare capacity as per the load it reports (see LoadTable) or by consistent
+    hashing on a key so that the messages with the same key land on the same
+    client.
+    """
+
+    DELIVERY_BROADCAST = 0
+    DELIVERY_ROUND_ROBIN = 1
+    DELIVERY_LEAST_OUTSTANDING = 2
+    DELIVERY_CONSISTENT_HASH = 3
+    DELIVERY_LEAST_LOADED = 4
+
+    #Number of virtual nodes per client on the hash ring
+    HASH_REPLICAS = 64
+
+    def __init__(self, load_table=None):
+        """Initialize the client selector
+
+        Keyword arguments:
+        load_table -- The LoadTable keeping the reported client load
+                      (Default: A new LoadTable)
+        """
+
+        if load_table is None:
+            load_table = LoadTable()
+
+        self.load_table = load_table
+        self.round_robin = {}
+        self.outstanding = {}
+        self.hash_rings = {}
+        self.lock = threading.Lock()
+
+    def select(self, topic, clients, mode, key=None, names=None):
+        """Select a client for the delivery
+
+        Keyword arguments:
+        topic -- The topic the message is being sent to
+        clients -- The list of clients subscribed to the topic
+        mode -- The delivery mode to be used for the selection
+        key -- The key used for the consistent hashing (Default: None)
+        names -- Mapping of the clients to their stable names used for the
+                 consistent hashing and the load reports (Default: None)
+
+        Raises:
+            RuntimeError if there are no clients or the mode is unknown
+
+        Returns:
+            The selected client
+        """
+
+        if not clients:
+            raise RuntimeError("No clients available for the delivery")
+
+        with self.lock:
+            if mode == self.DELIVERY_ROUND_ROBIN:
+                index = self.round_robin.get(topic, 0)
+                self.round_robin[topic] = index + 1
+                return clients[index % len(clients)]
+            elif mode == self.DELIVERY_LEAST_OUTSTANDING:
+                return min(clients, key=lambda client: self.outstanding.get(client, 0))
+            elif mode == self.DELIVERY_CONSISTENT_HASH:
+                return self.__select_hashed(topic, clients, key, names)
+            elif mode == self.DELIVERY_LEAST_LOADED:
+                return self.__select_least_loaded(clients, names)
+
+        raise RuntimeError("Unknown delivery mode")
+
+    def message_sent(self, client):
+        """Record a message sent to the client
+
+        Keyword arguments:
+        client -- The client the message was sent to
+        """
+
+        with self.lock:
+            self.outstanding[client] = self.outstanding.get(client, 0) + 1
+
+    def message_received(self, client):
+        """Record a message received from the client
+
+        Keyword arguments:
+        client -- The client the message was received from
+        """
+
+        with self.lock:
+            if self.outstanding.get(client, 0) > 0:
+                self.outstanding[client] = self.outstanding[client] - 1
+
+    def get_outstanding(self, client):
+        """Get the number of outstanding messages for the client
+
+        Keyword arguments:
+        client -- The client to get the count for
+
+        Returns: Integer
+        """
+
+        return self.outstanding.get(client, 0)
+
+    def remove_client(self, client):
+        """Forget the state kept for the client
+
+        Keyword arguments:
+        client -- The client to be removed
+        """
+
+        with self.lock:
+            if client in self.outstanding:
+                del self.outstanding[client]
+
+    def report_load(self, name, inflight, cpu=None, capacity=None):
+        """Record the load reported by a client
+
+        Keyword arguments:
+        name -- The name of the client
+        inflight -- The number of tasks the client is running
+        cpu -- The CPU load of the client (Default: None)
+        capacity -- The number of tasks the client can run at once
+                    (Default: None)
+        """
+
+        with self.lock:
+            self.load_table.report(name, inflight, cpu, capacity)
+
+    def get_headroom(self, clients, names=None):
+        """Get the number of messages the clients can take before they are full
+
+        Keyword arguments:
+        clients -- The list of clients
+        names -- Mapping of the clients to their names (Default: None)
+
+        Returns:
+            Integer
+            None if the capacity of any of the clients is not known
+        """
+
+        headroom = 0
+        with self.lock:
+            for client in clients:
+                inflight, cpu, capacity = self.__get_load(client, names or {})
+                if capacity is None:
+                    return None
+                headroom = headroom + max(0, capacity - inflight)
+        return headroom
+
+    def __get_load(self, client, names):
+        """Get the load of a client
+
+        The clients without a current report are estimated by their
+        outstanding messages.
+
+        Returns:
+            Tuple (inflight, cpu, capacity)
+        """
+
+        name = names.get(client)
+        load = self.load_table.get_load(name) if name is not None else None
+        if load is None:
+            return (self.outstanding.get(client, 0), None, self.load_table.capacity or None)
+        return load
+
+    def __select_least_loaded(self, clients, names):
+        """Select the client with the most spare capacity
+
+        The clients are ranked by the share of their capacity the message
+        would take them to, and by their CPU load on a tie.
+
+        Keyword arguments:
+        clients -- The list of clients subscribed to the topic
+        names -- Mapping of the clients to their names
+
+        Returns:
+            The selected client
+        """
+
+        if names is None:
+            names = {}
+
+        def get_score(client):
+            inflight, cpu, capacity = self.__get_load(client, names)
+            return (float(inflight + 1) / (capacity or 1), cpu or 0.0)
+
+        client = min(clients, key=get_score)
+        if client in names:
+            self.load_table.message_sent(names[client])
+        return client
+
+    def __select_hashed(self, topic, clients, key, names):
+        """Select the client owning the key on the hash ring of the topic
+
+        The ring is rebuilt only when the set of clients changes.
+
+        Keyword arguments:
+        topic -- The topic the message is being sent to
+        clients -- The list of clients subscribed to the topic
+        key -- The key to be hashed
+        names -- Mapping of the clients to their stable names
+
+        Returns:
+            The selected client
+        """
+
+        if names is None:
+            names = {}
+
+        members = frozenset(clients)
+        ring = self.hash_rings.get(topic)
+        if ring is None or ring[0] != members:
+            points = []
+            for client in clients:
+                name = str(names.get(client, id(client)))
+                for replica in range(self.HASH_REPLICAS):
+                    points.append((self.__hash('%s#%d' % (name, replica)), client))
+            points.sort(key=lambda point: point[0])
+            ring = (members, [point[0] for point in points], [point[1] for point in points])
+            self.hash_rings[topic] = ring
+
+        index = bisect.bisect(ring[1], self.__hash(str(key))) % len(ring[1])
+        return ring[2][index]
+
+    def __hash(self, value):
+        """Hash the value onto the ring
+
+        Keyword arguments:
+        value -- The string to be hashed
+
+        Returns: Integer
+        """
+
+        return int(hashlib.md5(value).hexdigest()[:8], 16)
+
+class TopicTrie(object):
+    """Match the hierarchical topics against the wildcard subscriptions
+
+    Topics are made of levels separated by a '.', for example
+    'rhel8.x86_64.web'. A subscription pattern can use '*' to match exactly one
+    level and '#' to match zero or more levels, e.g. 'rhel8.x86_64.*' or
+    'dc1.#'.
+
+    The patterns are stored in a trie keyed by the level, hence the cost of
+    matching a topic depends on the number of levels in the topic and the
+    wildcards present along its path instead of the number of subscriptions.
+    The results are memoized per topic until the subscriptions change.
+
+    The node structure looks like:
+    node = [{level: node}, [members], set([members])]
+    """
+
+    SEPARATOR = '.'
+    WILDCARD_ONE = '*'
+    WILDCARD_MANY = '#'
+
+    #Maximum number of memoized topic matches
+    CACHE_SIZE = 10000
+
+    def __init__(self):
+        """Initialize the topic trie"""
+
+        self.root = [{}, [], set()]
+        self.pattern_count = 0
+        self.match_cache = {}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def is_pattern(cls, topic):
+        """Check if the topic contains wildcard levels
+
+        Keyword arguments:
+        topic -- The topic to be checked
+
+        Returns: Bool
+        """
+
+        for level in topic.split(cls.SEPARATOR):
+            if level == cls.WILDCARD_ONE or level == cls.WILDCARD_MANY:
+                return True
+        return False
+
+    def add(self, pattern, member):
+        """Add a new member for the subscription pattern
+
+        Keyword arguments:
+        pattern -- The subscription pattern
+        member -- The member subscribed to the pattern
+
+        Returns:
+            True on success
+            False if the member is already subscribed to the pattern
+        """
+
+        with self.lock:
+            node = self.root
+            for level in pattern.split(self.SEPARATOR):
+                node = node[0].setdefault(level, [{}, [], set()])
+
+            if member in node[2]:
+                return False
+
+            node[1].append(member)
+            node[2].add(member)
+            self.pattern_count = self.pattern_count + 1
+            self.match_cache = {}
+        return True
+
+    def remove(self, pattern, member):
+        """Remove the member from the subscription pattern
+
+        Keyword arguments:
+        pattern -- The subscription pattern
+        member -- The member to be removed
+
+        Returns: Bool
+        """
+
+        with self.lock:
+            path = [self.root]
+            levels = pattern.split(self.SEPARATOR)
+            for level in levels:
+                if level not in path[-1][0]:
+                    return False
+                path.append(path[-1][0][level])
+
+            if member not in path[-1][2]:
+                return False
+
+            path[-1][1].remove(member)
+            path[-1][2].discard(member)
+            self.pattern_count = self.pattern_count - 1
+            self.match_cache = {}
+
+            #Prune the empty branches
+            for index in range(len(levels) - 1, -1, -1):
+                node = path[index + 1]
+                if node[0] or node[1]:
+                    break
+                del path[index][0][levels[index]]
+        return True
+
+    def match(self, topic):
+        """Get the members whose patterns match the topic
+
+        Keyword arguments:
+        topic -- The topic to be matched
+
+        Returns:
+            List of members
+        """
+
+        cached = self.match_cache.get(topic)
+        if cached is not None:
+            return cached
+
+        with self.lock:
+            matched = []
+            self.__match(self.root, topic.split(self.SEPARATOR), 0, matched)
+            if len(matched) == 0:
+                members = []
+            elif len(matched) == 1:
+                members = list(matched[0][1])
+            else:
+                members = []
+                seen = set()
+                for node in matched:
+                    for member in node[1]:
+                        if member not in seen:
+                            seen.add(member)
+                            members.append(member)
+            if len(self.match_cache) >= self.CACHE_SIZE:
+                self.match_cache = {}
+            self.match_cache[topic] = members
+        return members
+
+    def __match(self, node, levels, index, matched):
+        """Walk the trie collecting the nodes matching the topic levels
+
+        Keyword arguments:
+        node -- The trie node to start from
+        levels -- The levels of the topic being matched
+        index -- The index of the level to be matched next
+        matched -- The list collecting the matched nodes
+        """
+
+        children = node[0]
+        many = children.get(self.WILDCARD_MANY)
+        if many is not None:
+            #'#' can swallow any number of the remaining levels
+            for skip in range(index, len(levels) + 1):
+                self.__match(many, levels, skip, matched)
+
+        if index == len(levels):
+            #'#' can reach the same node over multiple paths
+            if node[1] and not [n for n in matched if n is node]:
+                matched.append(node)
+            return
+
+        exact = children.get(levels[index])
+        if exact is not None:
+            self.__match(exact, levels, index + 1, matched)
+
+        one = children.get(self.WILDCARD_ONE)
+        if one is not None:
+            self.__match(one, levels, index + 1, matched)
@@ -0,0 +1,2 @@
+from tracing import Tracer, get_tracer, set_tracer
+from structures import Span
@@ -0,0 +1,81 @@
+'''
+File: structures.py
+Description: Structures used by the task tracer
+Date: 19/10/2026
+Author: Saurabh Badhwar <sbadhwar@redhat.com>
+'''
+import ctypes
+import ctypes.util
+import time
+
+class Span(object):
+    """A stage of the lifecycle of a task
+
+    The start and the end of the span are monotonic timestamps in seconds.
+    """
+
+    def __init__(self, trace_id, name, start, end, attributes=None):
+        """Initialize the span
+
+        Keyword arguments:
+        trace_id -- The id of the traced task
+        name -- The name of the stage
+        start -- The monotonic time the stage started at
+        end -- The monotonic time the stage ended at
+        attributes -- The dict of additional details (Default: None)
+        """
+
+        self.trace_id = trace_id
+        self.name = name
+        self.start = start
+        self.end = end
+        self.attributes = attributes or {}
+
+    def get_duration(self):
+        """Get the duration of the span in seconds
+
+        Returns: Float
+        """
+
+        return self.end - self.start
+
+class MonotonicClock(object):
+    """Read the monotonic clock of the system
+
+    Uses clock_gettime(CLOCK_MONOTONIC) through ctypes as the python 2 time
+    module has no monotonic clock, falling back to time.time where it isn't
+    available.
+    """
+
+    CLOCK_MONOTONIC = 1
+
+    class Timespec(ctypes.Structure):
+        """The struct timespec filled by clock_gettime"""
+
+        _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+    def __init__(self):
+        """Initialize the clock"""
+
+        self.timespec = self.Timespec()
+        self.clock_gettime = None
+        try:
+            library = ctypes.CDLL(ctypes.util.find_library('rt') or ctypes.util.find_library('c'))
+            self.clock_gettime = library.clock_gettime
+            self.clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(self.Timespec)]
+            if self.clock_gettime(self.CLOCK_MONOTONIC, ctypes.byref(self.timespec)) != 0:
+                self.clock_gettime = None
+        except (OSError, AttributeError, TypeError):
+            self.clock_gettime = None
+
+    def now(self):
+        """Get the monotonic time in seconds
+
+        Returns: Float
+        """
+
+        if self.clock_gettime is None:
+            return time.time()
+        timespec = self.Timespec()
+        self.clock_gettime(self.CLOCK_MONOTONIC, ctypes.byref(timespec))
+        return timespec.tv_sec + timespec.tv_nsec * 1e-9
@@ -0,0 +1,315 @@
+'''
+File: tracing.py
+Description: Trace the lifecycle stages of the tasks
+Date: 19/10/2026
+Author: Saurabh Badhwar <sbadhwar@redhat.com>
+'''
+from structures import MonotonicClock, Span
+import collections
+import hashlib
+import json
+import os
+import threading
+import time
+
+class Tracer(object):
+    """Record the spans of the task lifecycle stages
+
+    The components record a span for every stage a task goes through, keyed
+    by the task id: the wait in the task queue, the dependency and schedule
+    waits, the message serialization, the socket send, the agent execution
+    and the plugin handler. A stage can be recorded at once, or begun and
+    ended at different places, in which case it stays open in between.
+
+    The finished spans are kept in a bounded buffer, dropping the oldest ones,
+    and can be exported as a Chrome trace-event file (chrome://tracing,
+    Perfetto) or as OpenTelemetry style JSON.
+    """
+
+    def __init__(self, enabled=None, max_spans=None):
+        """Initialize the tracer
+
+        Keyword arguments:
+        enabled -- Record the spans (Default: BOLT_TRACE or False)
+        max_spans -- The number of finished spans kept, also bounding the
+                     number of traces with open spans
+                     (Default: BOLT_TRACE_SPANS or 10000)
+        """
+
+        if enabled is None:
+            enabled = os.getenv('BOLT_TRACE', '0') != '0'
+        if max_spans is None:
+            max_spans = int(os.getenv('BOLT_TRACE_SPANS', 10000))
+
+        self.enabled = enabled
+        self.max_spans = max_spans
+        self.clock = MonotonicClock()
+        #The wall clock time matching the monotonic time 0
+        self.epoch = time.time() - self.clock.now()
+        self.spans = collections.deque(maxlen=max_spans)
+        #The open spans by the trace, {trace_id: {name: (start, attributes)}}
+        self.open_spans = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def now(self):
+        """Get the monotonic time used for the spans
+
+        Returns: Float
+        """
+
+        return self.clock.now()
+
+    def begin(self, trace_id, name, start=None, attributes=None):
+        """Begin a span, replacing an open span with the same name
+
+        Keyword arguments:
+        trace_id -- The id of the traced task
+        name -- The name of the stage
+        start -- The monotonic start time (Default: Now)
+        attributes -- The dict of additional details (Default: None)
+        """
+
+        if not self.enabled:
+            return
+        if start is None:
+            start = self.clock.now()
+
+        with self.lock:
+            if trace_id not in self.open_spans:
+                if len(self.open_spans) >= self.max_spans:
+                    self.open_spans.popitem(last=False)
+                self.open_spans[trace_id] = {}
+            self.open_spans[trace_id][name] = (start, attributes)
+
+    def end(self, trace_id, name, end=None, attributes=None):
+        """End an open span
+
+        Keyword arguments:
+        trace_id -- The id of the traced task
+        name -- The name of the stage
+        end -- The monotonic end time (Default: Now)
+        attributes -- The dict of additional details, merged with the details
+                      given to begin (Default: None)
+
+        Returns:
+            Span
+            None if the span isn't open
+        """
+
+        if not self.enabled:
+            return None
+        if end is None:
+            end = self.clock.now()
+
+        with self.lock:
+            trace = self.open_spans.get(trace_id)
+            if trace is None or name not in trace:
+                return None
+            start, begin_attributes = trace.pop(name)
+            if trace == {}:
+                del self.open_spans[trace_id]
+
+        if begin_attributes is not None:
+            begin_attributes = dict(begin_attributes)
+            begin_attributes.update(attributes or {})
+            attributes = begin_attributes
+        return self.record(trace_id, name, start, end, attributes)
+
+    def record(self, trace_id, name, start, end, attributes=None):
+        """Record a finished span
+
+        Keyword arguments:
+        trace_id -- The id of the traced task
+        name -- The name of the stage
+        start -- The monotonic start time
+        end -- The monotonic end time
+        attributes -- The dict of additional details (Default: None)
+
+        Returns:
+            Span
+            None if the tracer is disabled
+        """
+
+        if not self.enabled:
+            return None
+
+        span = Span(trace_id, name, start, end, attributes)
+        self.spans.append(span)
+        return span
+
+    def close(self, trace_id, attributes=None):
+        """End all the open spans of a trace
+
+        Keyword arguments:
+        trace_id -- The id of the traced task
+        attributes -- The dict of additional details for the ended spans
+                      (Default: None)
+        """
+
+        if not self.enabled:
+            return
+
+        with self.lock:
+            names = self.open_spans.get(trace_id, {}).keys()
+        end = self.clock.now()
+        for name in names:
+            self.end(trace_id, name, end, attributes)
+
+    def get_spans(self, trace_id=None):
+        """Get the finished spans
+
+        Keyword arguments:
+        trace_id -- The id of the task to get the spans of, None for all the
+                    spans (Default: None)
+
+        Returns:
+            List of Span, in the order they finished
+        """
+
+        return [span for span in list(self.spans) if trace_id is None or span.trace_id == trace_id]
+
+    def get_summary(self):
+        """Get the duration percentiles of every stage
+
+        Returns:
+            Dict {name: {count, p50, p99}} with the durations in seconds
+        """
+
+        durations = collections.defaultdict(list)
+        for span in list(self.spans):
+            durations[span.name].append(span.get_duration())
+
+        summary = {}
+        for name, values in durations.iteritems():
+            values.sort()
+            summary[name] = {
+                'count': len(values),
+                'p50': values[len(values) // 2],
+                'p99': values[min(len(values) - 1, int(len(values) * 0.99))]
+            }
+        return summary
+
+    def get_chrome_trace(self):
+        """Get the spans in the Chrome trace-event format
+
+        Every task gets its own track, named after the task id.
+
+        Returns: Dict
+        """
+
+        tracks = {}
+        events = []
+        for span in list(self.spans):
+            if span.trace_id not in tracks:
+                tracks[span.trace_id] = len(tracks) + 1
+                events.append({'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': tracks[span.trace_id],
+                               'args': {'name': str(span.trace_id)}})
+
+            args = dict(span.attributes)
+            args['task_id'] = span.trace_id
+            events.append({
+                'name': span.name,
+                'cat': 'task',
+                'ph': 'X',
+                'ts': int(span.start * 1e6),
+                'dur': int(span.get_duration() * 1e6),
+                'pid': 1,
+                'tid': tracks[span.trace_id],
+                'args': args
+            })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def get_otel_trace(self):
+        """Get the spans in the OpenTelemetry JSON format
+
+        Every task is a trace with a root span covering its stages, the stages
+        are the children of the root span.
+
+        Returns: Dict
+        """
+
+        traces = collections.OrderedDict()
+        for span in list(self.spans):
+            traces.setdefault(span.trace_id, []).append(span)
+
+        otel_spans = []
+        for trace_id, spans in traces.iteritems():
+            otel_trace_id = hashlib.md5(str(trace_id)).hexdigest()
+            root_id = otel_trace_id[:16]
+            otel_spans.append(self.__get_otel_span(otel_trace_id, root_id, None, 'task',
+                                                   min(span.start for span in spans),
+                                                   max(span.end for span in spans), {'task_id': trace_id}))
+            for index, span in enumerate(spans):
+                span_id = hashlib.md5('%s:%d' % (trace_id, index)).hexdigest()[:16]
+                otel_spans.append(self.__get_otel_span(otel_trace_id, span_id, root_id, span.name,
+                                                       span.start, span.end, span.attributes))
+
+        return {
+            'resourceSpans': [{
+                'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': 'bolt_server'}}]},
+                'scopeSpans': [{'scope': {'name': 'bolt_server.tracing'}, 'spans': otel_spans}]
+            }]
+        }
+
+    def export_chrome(self, path):
+        """Write the spans to a Chrome trace-event JSON file
+
+        Keyword arguments:
+        path -- The path of the file
+        """
+
+        with open(path, 'w') as trace_file:
+            json.dump(self.get_chrome_trace(), trace_file)
+
+    def export_otel(self, path):
+        """Write the spans to an OpenTelemetry JSON file
+
+        Keyword arguments:
+        path -- The path of the file
+        """
+
+        with open(path, 'w') as trace_file:
+            json.dump(self.get_otel_trace(), trace_file)
+
+    def __get_otel_span(self, trace_id, span_id, parent_id, name, start, end, attributes):
+        """Build an OpenTelemetry span
+
+        Returns: Dict
+        """
+
+        otel_span = {
+            'traceId': trace_id,
+            'spanId': span_id,
+            'name': name,
+            'kind': 1,
+            'startTimeUnixNano': str(int((self.epoch + start) * 1e9)),
+            'endTimeUnixNano': str(int((self.epoch + end) * 1e9)),
+            'attributes': [{'key': key, 'value': {'stringValue': str(value)}}
+                           for key, value in sorted(attributes.items())]
+        }
+        if parent_id is not None:
+            otel_span['parentSpanId'] = parent_id
+        return otel_span
+
+#The tracer of the process, BOLT_TRACE=1 enables the tracing
+tracer = Tracer()
+
+def get_tracer():
+    """Get the tracer of the process
+
+    Returns: Tracer
+    """
+
+    return tracer
+
+def set_tracer(task_tracer):
+    """Replace the tracer of the process
+
+    Only the components initialized afterwards use the new tracer.
+
+    Keyword arguments:
+    task_tracer -- The Tracer to be used
+    """
+
+    global tracer
+    tracer = task_tracer
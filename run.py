@@ -2,6 +2,9 @@ from bolt_server.socket_handler import SocketHandler
 from bolt_server.message_dispatcher import MessageDispatcher
 from bolt_server.plugin_loader import PluginLoader
 from bolt_server.execution_engine import ExecutionEngine
+from bolt_server.profiler import get_profiler
+from bolt_server.metrics import MetricsServer, get_registry
+import os
 
 s = SocketHandler()
 m = MessageDispatcher(s)
@@ -9,6 +12,12 @@ p = PluginLoader()
 p.load_plugins()
 
 e = ExecutionEngine(m, p)
+#kill -USR2 starts the profiler, the next one writes the folded stacks
+get_profiler().install_signal()
+#The metrics are served on BOLT_METRICS_HOST:BOLT_METRICS_PORT/metrics,
+#BOLT_METRICS_SERVER=0 leaves the endpoint off
+if get_registry().enabled and os.getenv('BOLT_METRICS_SERVER', '1') != '0':
+    metrics_server = MetricsServer()
 print "Server started"
 test = raw_input("Enter something to continue:")
 
@@ -8,5 +8,5 @@ from setuptools import setup, find_packages
 setup(
     name='bolt_server',
     version='0.0.1',
-    packages=find_packages(exclude=['docs', 'tests', 'temp'])
+    packages=find_packages(exclude=['docs', 'tests', 'temp', 'benchmarks'])
 )
@@ -0,0 +1,47 @@
+'''
+File: test_aggregation.py
+Description: Test the streaming aggregation of the fan out replies
+Date: 19/10/2026
+Author: Saurabh Badhwar <sbadhwar@redhat.com>
+'''
+from bolt_server.execution_engine import Aggregation
+import pytest
+
+class TestAggregation(object):
+    """Test the reduction of the replies and the quorum"""
+
+    def test_quorum(self):
+        """Test the aggregation completes once the quorum has replied"""
+
+        aggregation = Aggregation(lambda total, result: total + result, 0, ['a', 'b', 'c', 'd'], 0.5)
+        assert aggregation.add(1, 'a')
+        assert not aggregation.add(1, 'a')
+        assert not aggregation.is_complete()
+        assert aggregation.add(2, 'c')
+        assert aggregation.is_complete()
+        assert aggregation.accumulator == 3
+        assert aggregation.get_pending() == ['b', 'd']
+
+    def test_retry(self):
+        """Test a retry keeps the replies and widens the quorum"""
+
+        aggregation = Aggregation(lambda total, result: total + result, 0, ['a', 'b'], 1.0)
+        assert aggregation.add(1, 'a')
+        aggregation.add_recipients(['a', 'c'])
+        assert aggregation.recipients == ['a', 'b', 'c'] and aggregation.required == 3
+        assert aggregation.add(1, 'b') and not aggregation.is_complete()
+        assert aggregation.add(1, 'c') and aggregation.is_complete()
+        assert aggregation.accumulator == 3
+
+        aggregation.add_recipients(None)
+        assert aggregation.get_pending() is None and not aggregation.is_complete()
+
+    def test_unknown_recipients(self):
+        """Test the aggregation without known recipients never completes"""
+
+        aggregation = Aggregation(lambda results, result: results + [result], [])
+        aggregation.add('x')
+        aggregation.add('y')
+        assert aggregation.get_replies() == 2
+        assert aggregation.accumulator == ['x', 'y']
+        assert not aggregation.is_complete()
@@ -0,0 +1,74 @@
+'''
+File: test_capture.py
+Description: Test the traffic capture of the socket handler
+Date: 19/10/2026
+Author: Saurabh Badhwar <sbadhwar@redhat.com>
+'''
+from bolt_server.capture import CaptureWriter, CaptureReader, CaptureRecord
+from bolt_server.socket_handler import SocketHandler
+from test_socket_handler import connect, wait_for
+import os
+import socket
+import pytest
+
+class TestCapture(object):
+    """Test the recording and the reading of the captures"""
+
+    def test_records(self, tmpdir):
+        """Test the records are read back and a torn tail is skipped"""
+
+        path = str(tmpdir.join('capture.bin'))
+        writer = CaptureWriter(path)
+        first, second = object(), object()
+        writer.connect(first, 'Test:first')
+        writer.connect(second, 'Test:second')
+        writer.outbound(first, '{"id": "1"}\n')
+        writer.inbound(first, '{"id": "1", "result": 1}')
+        writer.disconnect(first)
+        writer.close()
+        writer.inbound(second, 'not recorded')
+
+        records = list(CaptureReader(path))
+        assert [(record.kind, record.connection) for record in records] == [
+            (CaptureRecord.CONNECT, 1), (CaptureRecord.CONNECT, 2), (CaptureRecord.OUTBOUND, 1),
+            (CaptureRecord.INBOUND, 1), (CaptureRecord.DISCONNECT, 1)]
+        assert records[1].data == 'Test:second' and records[3].data == '{"id": "1", "result": 1}'
+        assert records[0].time <= records[4].time
+
+        with open(path, 'r+b') as capture_file:
+            capture_file.truncate(os.path.getsize(path) - 1)
+        assert len(list(CaptureReader(path))) == 4
+
+    def test_not_capture(self, tmpdir):
+        """Test a file which isn't a capture is refused"""
+
+        path = tmpdir.join('other.bin')
+        path.write('something else')
+        with pytest.raises(RuntimeError):
+            CaptureReader(str(path))
+
+    def test_socket_handler(self, tmpdir, monkeypatch):
+        """Test the socket handler records the traffic of its clients"""
+
+        path = str(tmpdir.join('capture.bin'))
+        monkeypatch.setenv('BOLT_SERVER_PORT', '5003')
+        monkeypatch.setenv('BOLT_CAPTURE_FILE', path)
+        received = []
+        socket_handler = SocketHandler()
+        socket_handler.register_handler(received.append)
+        ret_code, test_socket = connect(socket.AF_INET, ('127.0.0.1', 5003))
+        test_socket.sendall('Test:Pytest')
+        wait_for(lambda: socket_handler.client_list.get_clients('Test'))
+
+        socket_handler.send_message('Test', '{"id": "1"}')
+        assert test_socket.recv(100) == '{"id": "1"}\n'
+        test_socket.sendall('{"id": "1", "result": 1}\n')
+        wait_for(lambda: received != [])
+        test_socket.close()
+        wait_for(lambda: not socket_handler.client_topics)
+        socket_handler.stop_listening()
+        socket_handler.set_capture(None)
+
+        records = [(record.kind, record.data) for record in CaptureReader(path)]
+        assert records == [(CaptureRecord.CONNECT, 'Test:Pytest'), (CaptureRecord.OUTBOUND, '{"id": "1"}\n'),
+                           (CaptureRecord.INBOUND, '{"id": "1", "result": 1}\n'), (CaptureRecord.DISCONNECT, '')]
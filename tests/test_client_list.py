@@ -0,0 +1,231 @@
+'''
+File: test_client_list.py
+Description: Test the client list and client selection structures
+Date: 19/10/2026
+Author: Saurabh Badhwar <sbadhwar@redhat.com>
+'''
+from bolt_server.socket_handler import ClientList, ClientSelector, ClientSession, LoadTable, RateLimiter, TokenBucket, TopicTrie
+import pytest
+
+class TestClientSelector(object):
+    """Test the anycast client selection"""
+
+    def test_round_robin(self):
+        """Test the round robin selection cycles through the clients"""
+
+        selector = ClientSelector()
+        clients = ['a', 'b', 'c']
+        selected = [selector.select('topic', clients, ClientSelector.DELIVERY_ROUND_ROBIN) for i in range(6)]
+        assert selected == ['a', 'b', 'c', 'a', 'b', 'c']
+
+    def test_least_outstanding(self):
+        """Test the selection of the client with least outstanding messages"""
+
+        selector = ClientSelector()
+        clients = ['a', 'b']
+        selector.message_sent('a')
+        selector.message_sent('a')
+        selector.message_sent('b')
+        assert selector.select('topic', clients, ClientSelector.DELIVERY_LEAST_OUTSTANDING) == 'b'
+        selector.message_received('a')
+        selector.message_received('a')
+        assert selector.select('topic', clients, ClientSelector.DELIVERY_LEAST_OUTSTANDING) == 'a'
+
+    def test_consistent_hash(self):
+        """Test the keys stick to their clients when a client leaves"""
+
+        selector = ClientSelector()
+        clients = ['a', 'b', 'c', 'd']
+        mode = ClientSelector.DELIVERY_CONSISTENT_HASH
+        before = dict((key, selector.select('topic', clients, mode, key)) for key in range(200))
+        assert len(set(before.values())) == 4
+
+        after = dict((key, selector.select('topic', clients[:3], mode, key)) for key in range(200))
+        for key in before:
+            if before[key] != 'd':
+                assert after[key] == before[key]
+
+    def test_least_loaded(self):
+        """Test the selection by the reported load and the headroom"""
+
+        now = [0.0]
+        selector = ClientSelector(LoadTable(lambda: now[0], max_age=10))
+        clients = ['a', 'b', 'c']
+        names = {'a': 'host-a', 'b': 'host-b', 'c': 'host-c'}
+        mode = ClientSelector.DELIVERY_LEAST_LOADED
+        selector.report_load('host-a', 3, 0.5, 4)
+        selector.report_load('host-b', 2, 0.9, 8)
+        selector.report_load('host-c', 1, 0.1, 8)
+
+        #The CPU load breaks the tie between b and c on the second pick
+        assert [selector.select('topic', clients, mode, names=names) for i in range(3)] == ['c', 'c', 'b']
+        assert selector.get_headroom(clients, names) == 1 + 5 + 5
+        assert selector.get_headroom(clients + ['d'], names) is None
+
+        #The stale reports fall back to the outstanding messages
+        now[0] = 11.0
+        selector.message_sent('a')
+        assert selector.select('topic', clients, mode, names=names) == 'b'
+        assert selector.get_headroom(clients, names) is None
+        selector.load_table.capacity = 2
+        assert selector.get_headroom(clients, names) == 1 + 2 + 2
+
+    def test_no_clients(self):
+        """Test the selection fails without any clients"""
+
+        selector = ClientSelector()
+        with pytest.raises(RuntimeError):
+            selector.select('topic', [], ClientSelector.DELIVERY_ROUND_ROBIN)
+
+class TestTopicTrie(object):
+    """Test the wildcard topic matching"""
+
+    def test_wildcards(self):
+        """Test the single and multi level wildcards"""
+
+        trie = TopicTrie()
+        trie.add('rhel8.x86_64.*', 'a')
+        trie.add('dc1.#', 'b')
+        trie.add('*.x86_64.#', 'c')
+        trie.add('rhel8.x86_64.web', 'd')
+
+        assert sorted(trie.match('rhel8.x86_64.web')) == ['a', 'c', 'd']
+        assert trie.match('rhel8.x86_64') == ['c']
+        assert trie.match('rhel8.x86_64.web.db') == ['c']
+        assert trie.match('dc1') == ['b']
+        assert trie.match('dc1.rack4.host2') == ['b']
+        assert trie.match('dc2.rack4') == []
+
+    def test_remove(self):
+        """Test the removal of the subscriptions invalidates the matches"""
+
+        trie = TopicTrie()
+        trie.add('a.*', 'x')
+        assert trie.match('a.b') == ['x']
+        assert trie.remove('a.*', 'x')
+        assert trie.match('a.b') == []
+        assert trie.root[0] == {}
+        assert not trie.remove('a.*', 'x')
+
+class TestClientList(object):
+    """Test the client list"""
+
+    def test_match_clients(self):
+        """Test the exact and pattern subscriptions are both matched"""
+
+        client_list = ClientList()
+        client_list.add_client('dc1.rack1', 'a')
+        client_list.add_client('dc1.*', 'a')
+        client_list.add_client('dc1.#', 'b')
+        client_list.add_client('dc1.*', 'b')
+        client_list.add_client('dc2.rack1', 'c')
+
+        assert client_list.match_clients('dc1.rack1') == ['a', 'b']
+        assert client_list.match_clients('dc2.rack1') == ['c']
+
+        client_list.remove_client('b')
+        assert client_list.match_clients('dc1.rack1') == ['a']
+
+    def test_replace_client(self):
+        """Test a client takes the place of another in its topics"""
+
+        client_list = ClientList()
+        client_list.add_client('dc1.rack1', 'a')
+        client_list.add_client('dc1.rack1', 'b')
+        client_list.add_client('dc1.*', 'a')
+        client_list.add_client('dc2.rack1', 'a')
+        client_list.set_client_name('a', 'host')
+
+        assert sorted(client_list.replace_client('a', 'c', ['dc1.rack1', 'dc1.*'])) == ['dc1.*', 'dc1.rack1']
+        assert client_list.get_clients('dc1.rack1') == ['c', 'b']
+        assert client_list.get_clients('dc2.rack1') == []
+        assert client_list.match_clients('dc1.rack2') == ['c']
+        assert client_list.get_client_name('a') is None
+
+class FakeConnection(object):
+    """Record the data written to a connection"""
+
+    def __init__(self):
+        """Initialize the connection"""
+
+        self.data = []
+
+    def sendall(self, data):
+        """Record the written data"""
+
+        self.data.append(data)
+
+class TestClientSession(object):
+    """Test the outbox of the disconnected clients"""
+
+    def test_resume(self):
+        """Test the outbox is bounded and replayed on resume"""
+
+        session = ClientSession('host', ['topic'], 100.0, 2)
+        session.sendall('a\n')
+        session.sendall('b\n')
+        session.sendall('c\n')
+        assert session.dropped == 1
+        assert not session.is_expired(105.0, 10)
+        assert session.is_expired(111.0, 10)
+
+        conn = FakeConnection()
+        assert session.resume(conn) == 2
+        session.sendall('d\n')
+        assert conn.data == ['b\nc\n', 'd\n']
+        assert not session.is_expired(111.0, 10)
+
+    def test_expire(self):
+        """Test an expired session drops the writes"""
+
+        session = ClientSession('host', ['topic'], 100.0, 10)
+        session.sendall('a\n')
+        session.expire()
+        session.sendall('b\n')
+        assert session.dropped == 2
+        assert list(session.outbox) == []
+
+class TestTokenBucket(object):
+    """Test the rate limiting token bucket"""
+
+    def test_rate(self):
+        """Test the bucket allows the burst and then the rate"""
+
+        bucket = TokenBucket(10, 2, now=0.0)
+        assert bucket.consume(0.0) and bucket.consume(0.0)
+        assert not bucket.consume(0.0)
+        assert bucket.get_delay(0.0) == pytest.approx(0.1)
+        assert bucket.consume(0.1) and not bucket.consume(0.1)
+        assert bucket.get_delay(10.0, 2) == 0.0 and bucket.consume(10.0, 2)
+        assert not bucket.consume(10.0)
+
+class TestRateLimiter(object):
+    """Test the pacing of the rate limited messages"""
+
+    def test_queue(self):
+        """Test the excess messages are queued in order under their limit"""
+
+        now = [0.0]
+        limiter = RateLimiter(lambda: now[0])
+        assert not limiter.is_active()
+        limiter.set_rate('bulk', 10, 1)
+        assert limiter.admit('bulk', 1) and limiter.admit('other', 2)
+        assert not limiter.admit('bulk', 3) and not limiter.admit('bulk', 4)
+        assert limiter.release() == ([], pytest.approx(0.1))
+
+        #The burst bounds the tokens saved up meanwhile
+        now[0] = 0.25
+        released, delay = limiter.release()
+        assert [(key, message, queued) for key, message, queued in released] == [('bulk', 3, 0.25)]
+        assert delay == pytest.approx(0.1)
+        now[0] = 0.35
+        assert [message for key, message, queued in limiter.release()[0]] == [4]
+        assert limiter.queued == 0
+
+        #Removing the limit releases the queued messages at once
+        assert not limiter.admit('bulk', 5)
+        limiter.set_rate('bulk', 0)
+        assert limiter.is_limited('bulk')
+        assert [message for key, message, queued in limiter.wait_release(1)] == [5]
+        assert not limiter.is_limited('bulk')
+        assert not limiter.is_active()
@@ -0,0 +1,244 @@
+'''
+File: test_execution_engine.py
+Description: Test the task handling of the execution engine
+Date: 19/10/2026
+Author: Saurabh Badhwar <sbadhwar@redhat.com>
+'''
+from bolt_server.memory_transport import MemorySocketHandler, FakeClient, VirtualClock
+from bolt_server.message_dispatcher import MessageDispatcher
+from bolt_server.execution_engine import ExecutionEngine
+import json
+import pytest
+import threading
+import time
+
+class RecordingLoader(object):
+    """Serve a single plugin whose executor records the results"""
+
+    def __init__(self):
+        """Initialize the plugin loader"""
+
+        results = self.results = []
+
+        class RecordingExecutor(object):
+            """Record the handled results"""
+
+            def handle(self, result, engine):
+                """Record the result"""
+
+                results.append(result)
+
+        self.executor = RecordingExecutor
+
+    def get_plugin_structure(self, name):
+        """Get the message structure of the plugin"""
+
+        return {'index': 0}
+
+    def get_plugin_executor(self, name):
+        """Get the executor of the plugin"""
+
+        return self.executor
+
+def get_engine(clients, loader):
+    """Get an engine over the in-memory transport
+
+    Keyword arguments:
+    clients -- The fake clients to be connected
+    loader -- The plugin loader
+
+    Returns:
+        Tuple (engine, transport, clock)
+    """
+
+    clock = VirtualClock()
+    transport = MemorySocketHandler(clock)
+    for client in clients:
+        transport.add_client(client)
+    engine = ExecutionEngine(MessageDispatcher(transport), loader)
+    engine.clock = clock
+    return engine, transport, clock
+
+def run_concurrently(function, calls):
+    """Run the calls of a function from a thread each, all at once
+
+    Keyword arguments:
+    function -- The function to be called
+    calls -- The list of the argument tuples, one per thread
+
+    Returns:
+        List of the exceptions raised by the calls
+    """
+
+    errors = []
+    start = threading.Event()
+
+    def call(args):
+        start.wait()
+        try:
+            function(*args)
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=call, args=(args,)) for args in calls]
+    for thread in threads:
+        thread.start()
+    start.set()
+    for thread in threads:
+        thread.join()
+    return errors
+
+class TestExecutionEngine(object):
+    """Test the engine over the in-memory transport"""
+
+    def test_concurrent_aggregation(self):
+        """Test the concurrent fan out replies complete the aggregation once"""
+
+        clients = ['agent%d' % index for index in range(8)]
+        loader = RecordingLoader()
+        engine, transport, clock = get_engine([FakeClient(client, ['topic'], lambda payload: None)
+                                               for client in clients], loader)
+
+        def reducer(total, result):
+            #Let the other replies in while this one is being folded
+            time.sleep(0.001)
+            return total + result
+        engine.set_aggregator('Plugin', reducer, 0)
+
+        for index in range(5):
+            task_id = engine.new_task('task%d' % index, 'Plugin', {'index': index}, ['topic'])
+            assert engine.execute_many([task_id]) == [True]
+            message_id = engine.task_messages[task_id][0]
+            errors = run_concurrently(transport.handle, [(json.dumps({'id': message_id, 'result': 1,
+                                                                      'client': client}),)
+                                                         for client in clients])
+            assert errors == []
+            assert engine.task_queue.get_task_status(task_id) == engine.task_queue.TASK_COMPLETE
+
+        assert loader.results == [len(clients)] * 5
+        assert engine.aggregations == {} and engine.dispatch_times == {}
+
+    def test_coalesced_completion(self):
+        """Test the identical tasks share a dispatch and both complete once"""
+
+        agent = FakeClient('agent', ['topic'], latency=1.0)
+        loader = RecordingLoader()
+        engine, transport, clock = get_engine([agent], loader)
+        engine.coalesce = True
+
+        leader, follower = engine.submit_many([{'task_name': 'task%d' % index, 'plugin_name': 'Plugin',
+                                                'task_params': {'index': 1}, 'task_topics': ['topic']}
+                                               for index in range(2)])
+        assert engine.execute_many([leader, follower]) == [True, True]
+        assert len(agent.received) == 1 and engine.followers == {leader: [follower]}
+        clock.advance(1)
+        assert loader.results == [{'index': 1}]
+
+        #The completion can be reported twice, by a reply and by a deadline
+        assert run_concurrently(engine.update_task, [(leader, engine.task_queue.TASK_COMPLETE)] * 4) == []
+        for task_id in (leader, follower):
+            assert engine.task_queue.get_task_status(task_id) == engine.task_queue.TASK_COMPLETE
+        assert engine.inflight == {} and engine.inflight_keys == {} and engine.followers == {}
+
+    def test_submit_many(self):
+        """Test a batch with an invalid task queues none of its tasks"""
+
+        engine, transport, clock = get_engine([], RecordingLoader())
+        task = {'task_name': 'task', 'plugin_name': 'Plugin', 'task_params': {'index': 1}, 'task_topics': ['a']}
+        with pytest.raises(KeyError):
+            engine.submit_many([task, dict(task, task_params={'unknown': 1})])
+        assert engine.task_queue.get_tasks_by_status(engine.task_queue.TASK_QUEUED) == []
+
+        task_ids = engine.submit_many([task, dict(task, task_name='other')])
+        assert len(set(task_ids)) == 2
+        assert sorted(engine.task_queue.get_tasks_by_status(engine.task_queue.TASK_QUEUED)) == sorted(task_ids)
+
+    def test_execute_many(self):
+        """Test the tasks which can't be sent stay queued and the rest run"""
+
+        agent = FakeClient('agent', ['a'], lambda payload: None)
+        engine, transport, clock = get_engine([agent], RecordingLoader())
+        engine.coalesce = False
+        sent, missing = engine.submit_many([{'task_name': name, 'plugin_name': 'Plugin',
+                                             'task_params': {'index': 1}, 'task_topics': [topic]}
+                                            for name, topic in (('sent', 'a'), ('missing', 'b'))])
+        assert engine.execute_many([sent, missing, 'unknown']) == [True, False, False]
+        assert engine.task_queue.get_task_status(sent) == engine.task_queue.TASK_RUNNING
+        assert engine.task_queue.get_task_status(missing) == engine.task_queue.TASK_QUEUED
+        assert engine.message_map.values() == [sent] and len(agent.received) == 1
+        assert not engine.message_dispatcher.message_exists('Plugin')
+
+    def test_cached_repeat(self):
+        """Test a repeated task is served from the result cache without a dispatch"""
+
+        agent = FakeClient('agent', ['topic'], lambda payload: payload['index'] * 2, 1.0)
+        loader = RecordingLoader()
+        engine, transport, clock = get_engine([agent], loader)
+        engine.coalesce = False
+        engine.set_result_cache('Plugin', 60)
+
+        first = engine.new_task('first', 'Plugin', {'index': 2}, ['topic'])
+        assert engine.execute_many([first]) == [True]
+        clock.advance(1)
+        engine.update_task(first, engine.task_queue.TASK_COMPLETE)
+
+        repeat = engine.new_task('repeat', 'Plugin', {'index': 2}, ['topic'])
+        assert engine.execute_many([repeat]) == [True]
+        assert len(agent.received) == 1 and loader.results == [4, 4]
+        assert engine.task_queue.get_task_status(repeat) == engine.task_queue.TASK_COMPLETE
+        assert repeat not in engine.task_messages
+        assert engine.get_cache_stats()['hits'] == 1
+
+        #The expired results are sent for again
+        clock.advance(60)
+        other = engine.new_task('other', 'Plugin', {'index': 2}, ['topic'])
+        assert engine.execute_many([other]) == [True]
+        assert len(agent.received) == 2
+
+    def test_timeout_retries(self):
+        """Test a task which times out is retried and then halted"""
+
+        agent = FakeClient('agent', ['topic'], lambda payload: None)
+        engine, transport, clock = get_engine([agent], RecordingLoader())
+        engine.task_timeout = 5
+        engine.task_retries = 1
+
+        task_id = engine.new_task('task', 'Plugin', {'index': 1}, ['topic'])
+        engine.cycle_tasks()
+        clock.advance(5)
+        engine.check_deadlines()
+        assert engine.task_queue.get_task_status(task_id) == engine.task_queue.TASK_QUEUED
+
+        #The retry keeps the place of the task in the schedule
+        other = engine.new_task('other', 'Plugin', {'index': 2}, ['topic'])
+        engine.max_running = 1
+        engine.cycle_tasks()
+        assert len(agent.received) == 2 and json.loads(agent.received[1])['payload'] == {'index': 1}
+        engine.max_running = 0
+        assert engine.task_queue.get_task_status(task_id) == engine.task_queue.TASK_RUNNING
+        clock.advance(5)
+        engine.cycle_tasks()
+        assert engine.task_queue.get_task_status(task_id) == engine.task_queue.TASK_HALTED
+        assert len(agent.received) == 3 and task_id not in engine.task_messages
+        assert task_id not in engine.scheduler.sequence
+
+    def test_late_reply(self):
+        """Test a reply arriving after the timeout saves the retry"""
+
+        agent = FakeClient('agent', ['topic'], lambda payload: payload['index'], 7.0)
+        loader = RecordingLoader()
+        engine, transport, clock = get_engine([agent], loader)
+        engine.task_timeout = 5
+        engine.task_retries = 1
+
+        task_id = engine.new_task('task', 'Plugin', {'index': 1}, ['topic'])
+        engine.cycle_tasks()
+        clock.advance(5)
+        engine.check_deadlines()
+        assert engine.task_queue.get_task_status(task_id) == engine.task_queue.TASK_QUEUED
+
+        clock.advance(2)
+        assert loader.results == [1]
+        assert engine.task_queue.get_task_status(task_id) == engine.task_queue.TASK_RUNNING
+        engine.cycle_tasks()
+        assert len(agent.received) == 1
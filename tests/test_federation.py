@@ -0,0 +1,119 @@
+'''
+File: test_federation.py
+Description: Test the federation of the bolt servers
+Date: 19/10/2026
+Author: Saurabh Badhwar <sbadhwar@redhat.com>
+'''
+from bolt_server.federation import FederatedSocketHandler, PeerTable, RouteTable
+from bolt_server.memory_transport import MemorySocketHandler, FakeClient, VirtualClock
+import json
+import time
+
+def wait_for(condition, timeout=5):
+    """Wait for the condition to hold
+
+    Returns: Bool
+    """
+
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+class TestPeerTable(object):
+    """Test the tracking of the peers and their topics"""
+
+    def test_peers(self):
+        """Test the topics of a peer go away along with it"""
+
+        table = PeerTable()
+        assert table.add_peer('a:1', 'channel-a')
+        assert not table.add_peer('a:1', 'other')
+        assert table.add_peer('b:1', 'channel-b')
+        table.add_topic('a:1', 'cpu')
+        table.add_topic('b:1', 'cpu')
+        table.add_topic('b:1', 'dc1.#')
+
+        assert sorted(table.get_peers('cpu')) == [('a:1', 'channel-a'), ('b:1', 'channel-b')]
+        assert table.get_peers('dc1.rack4') == [('b:1', 'channel-b')]
+        assert table.get_channel('a:1') == 'channel-a'
+
+        table.remove_topic('a:1', 'cpu')
+        assert table.get_peers('cpu') == [('b:1', 'channel-b')]
+        table.remove_peer('b:1')
+        assert not table.is_peer('b:1')
+        assert table.get_peers('cpu') == [] and table.get_peers('dc1.rack4') == []
+        assert table.topic_table == {}
+
+class TestRouteTable(object):
+    """Test the routes of the messages delivered on behalf of the peers"""
+
+    def test_origins(self):
+        """Test the same message id from two peers keeps two routes"""
+
+        table = RouteTable()
+        route_a = table.add_route('a:1', 'm1')
+        route_b = table.add_route('b:1', 'm1')
+        assert route_a != route_b
+        assert table.get_route(route_a) == ('a:1', 'm1')
+        assert table.get_route(route_b) == ('b:1', 'm1')
+        assert table.get_route('m1') is None and table.get_route(['m1']) is None
+
+    def test_bound(self):
+        """Test the oldest routes are forgotten first"""
+
+        table = RouteTable(2)
+        routes = [table.add_route('a:1', index) for index in range(3)]
+        assert table.get_route(routes[0]) is None
+        assert table.get_route(routes[2]) == ('a:1', 2)
+
+class TestFederatedSocketHandler(object):
+    """Test the delivery across the federated nodes"""
+
+    def start_node(self, monkeypatch, port, peers):
+        """Start a node over an in-memory transport
+
+        Returns:
+            Tuple (node, transport, received replies)
+        """
+
+        monkeypatch.setenv('BOLT_FEDERATION_PORT', str(port))
+        transport = MemorySocketHandler(VirtualClock())
+        node = FederatedSocketHandler(transport, peers)
+        received = []
+        node.register_handler(received.append)
+        return node, transport, received
+
+    def test_routing(self, monkeypatch):
+        """Test the replies to the same message go back to their own origin"""
+
+        node_ids = ['127.0.0.1:%d' % port for port in (5320, 5321, 5322)]
+        nodes = [self.start_node(monkeypatch, 5320 + index, node_ids) for index in range(3)]
+        try:
+            hub, transport, hub_received = nodes[1]
+            agent = FakeClient('agent', ['fed'], lambda payload: payload['value'])
+            transport.add_client(agent)
+            for index in (0, 2):
+                assert wait_for(lambda: nodes[index][0].get_topics() == ['fed'])
+
+            #The same message id from two origins
+            for index in (0, 2):
+                nodes[index][0].send_message('fed', json.dumps({'id': 'm1', 'payload': {'value': index}}))
+            assert wait_for(lambda: len(agent.received) == 2)
+            assert sorted(json.loads(message)['id'] for message in agent.received) == \
+                ['%s/m1' % node_ids[0], '%s/m1' % node_ids[2]]
+
+            transport.clock.advance(1)
+            for index in (0, 2):
+                assert wait_for(lambda: nodes[index][2] != [])
+                assert [json.loads(message) for message in nodes[index][2]] == \
+                    [{'id': 'm1', 'result': index, 'client': 'agent'}]
+            assert hub_received == []
+
+            transport.remove_client(agent)
+            assert wait_for(lambda: nodes[0][0].get_topics() == [])
+        finally:
+            for node, transport, received in nodes:
+                node.stop_listening()
@@ -0,0 +1,94 @@
+'''
+File: test_journal.py
+Description: Test the task journal and the journal recovery
+Date: 19/10/2026
+Author: Saurabh Badhwar <sbadhwar@redhat.com>
+'''
+from bolt_server.execution_engine import TaskQueue
+from bolt_server.journal import TaskJournal, JournalState
+from bolt_server.execution_engine import ExecutionEngine
+from bolt_server.message_dispatcher import MessageDispatcher
+from bolt_server.memory_transport import MemorySocketHandler
+import pytest
+
+class TestTaskJournal(object):
+    """Test the recording and the replay of the task journal"""
+
+    def test_replay(self, tmpdir):
+        """Test the tasks and their statuses survive a restart"""
+
+        journal = TaskJournal(str(tmpdir), snapshot_records=0)
+        task_queue = TaskQueue(journal)
+        task_id = task_queue.queue_task('check\tdisk', 'Inventory', {'path': '/'}, ['rhel8'], ['dep'], 1, 'host\n1',
+                                        timeout=2.5, retries=3)
+        task_queue.change_task_status(task_id, TaskQueue.TASK_COMPLETE)
+        journal.record_message('message', task_id)
+        journal.close()
+
+        journal = TaskJournal(str(tmpdir), snapshot_records=0)
+        state = journal.replay()
+        restored = TaskQueue()
+        restored.restore_tasks(state.tasks, state.statuses, state.decode_task)
+        assert restored.get_task(task_id)[1:] == ['check\tdisk', 'Inventory', {'path': '/'}, ['rhel8']]
+        assert restored.get_task_delivery(task_id) == (1, 'host\n1')
+        assert restored.get_task_dependency(task_id) == ['dep']
+        assert restored.get_task_limits(task_id) == (2.5, 3)
+        assert restored.get_task_status(task_id) == TaskQueue.TASK_COMPLETE
+        assert state.message_map == {'message': task_id}
+        journal.close()
+
+    def test_list_and_key_types(self):
+        """Test the list values and the delivery key type are kept as they were"""
+
+        record = JournalState.encode_task('t', 'task', 'Inventory', {}, ['a,b', '-'], [], 3, 42, 0, 0, '', None, None)
+        task = JournalState.decode_task(record)
+        assert task[3] == ['a,b', '-'] and task[4] == []
+        assert task[6] == 42
+
+        #The comma separated lists and the escaped keys of the earlier records
+        fields = record.split('\t')
+        fields[5] = 'x,y'
+        fields[8] = 'host\\n1'
+        task = JournalState.decode_task('\t'.join(fields))
+        assert task[3] == ['x', 'y'] and task[6] == 'host\n1'
+
+    def test_partial_record(self):
+        """Test the partially written tail record is ignored"""
+
+        state = JournalState()
+        data = JournalState.encode_status('a', 1) + JournalState.encode_status('a', 2)
+        assert state.apply(data[:-3]) == 1
+        assert state.statuses == {'a': '1'}
+
+    def test_compaction(self, tmpdir):
+        """Test the state is kept across a snapshot"""
+
+        journal = TaskJournal(str(tmpdir), snapshot_records=0)
+        task_queue = TaskQueue(journal)
+        journal.set_snapshot_provider(lambda: {'tasks': task_queue.get_task_records(), 'message_map': {}})
+        task_id = task_queue.queue_task('task', 'Inventory', {}, ['rhel8'])
+        assert journal.compact()
+        task_queue.change_task_status(task_id, TaskQueue.TASK_RUNNING)
+        journal.close()
+
+        state = TaskJournal(str(tmpdir), snapshot_records=0).replay()
+        assert state.statuses == {task_id: str(TaskQueue.TASK_RUNNING)}
+        assert state.decode_task(state.tasks[task_id])[0] == 'task'
+
+    def test_compaction_finished(self, tmpdir):
+        """Test the finished tasks are left out of the snapshot unless needed"""
+
+        journal = TaskJournal(str(tmpdir), snapshot_records=0)
+        engine = ExecutionEngine(MessageDispatcher(MemorySocketHandler()), None, journal=journal)
+        done = engine.new_task('done', 'Inventory', {}, ['rhel8'])
+        needed = engine.new_task('needed', 'Inventory', {}, ['rhel8'])
+        waiting = engine.new_task('waiting', 'Inventory', {}, ['rhel8'], [needed])
+        engine.message_map.update({'m1': done, 'm2': needed})
+        engine.update_task(done, TaskQueue.TASK_COMPLETE)
+        engine.update_task(needed, TaskQueue.TASK_COMPLETE)
+        assert journal.compact()
+        journal.close()
+
+        state = TaskJournal(str(tmpdir), snapshot_records=0).replay()
+        assert sorted(state.tasks.keys()) == sorted([needed, waiting])
+        assert state.message_map == {'m2': needed}
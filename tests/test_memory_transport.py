@@ -0,0 +1,215 @@
+'''
+File: test_memory_transport.py
+Description: Test the in-memory transport with the execution engine
+Date: 19/10/2026
+Author: Saurabh Badhwar <sbadhwar@redhat.com>
+'''
+from bolt_server.memory_transport import MemorySocketHandler, FakeClient, VirtualClock
+from bolt_server.message_dispatcher import MessageDispatcher
+from bolt_server.execution_engine import ExecutionEngine
+from bolt_server.socket_handler import ClientSelector
+from bolt_server.journal import TaskJournal
+import json
+import pytest
+
+class RecordingLoader(object):
+    """Serve a single plugin whose executor records the results"""
+
+    def __init__(self, clock):
+        """Initialize the plugin loader"""
+
+        results = self.results = []
+
+        class RecordingExecutor(object):
+            """Record the handled results with the time"""
+
+            def handle(self, result, engine):
+                """Record the result"""
+
+                results.append((clock(), result))
+
+        self.executor = RecordingExecutor
+
+    def get_plugin_structure(self, name):
+        """Get the message structure of the plugin"""
+
+        return {'index': 0}
+
+    def get_plugin_executor(self, name):
+        """Get the executor of the plugin"""
+
+        return self.executor
+
+class TestMemoryTransport(object):
+    """Test the engine running over the in-memory transport"""
+
+    def test_virtual_clock(self):
+        """Test the callbacks run in the order they are due"""
+
+        clock = VirtualClock()
+        order = []
+        clock.schedule(2, lambda: order.append(('b', clock())))
+        clock.schedule(1, lambda: clock.schedule(0.5, lambda: order.append(('c', clock()))))
+        clock.schedule(1, lambda: order.append(('a', clock())))
+        assert clock.advance(1.5) == 3
+        assert order == [('a', 1.0), ('c', 1.5)]
+        assert clock.run_next() == 1
+        assert order[-1] == ('b', 2.0) and clock.get_next() is None
+
+    def test_engine(self):
+        """Test the tasks are dispatched and the replies handled on the clock"""
+
+        clock = VirtualClock()
+        transport = MemorySocketHandler(clock)
+        transport.add_client(FakeClient('fast', ['topic'], lambda payload: payload['index'], 1.0))
+        transport.add_client(FakeClient('slow', ['topic'], lambda payload: -payload['index'], 3.0))
+        loader = RecordingLoader(clock)
+        engine = ExecutionEngine(MessageDispatcher(transport), loader)
+        engine.clock = clock
+
+        broadcast = engine.new_task('broadcast', 'Plugin', {'index': 1}, ['topic'])
+        anycast = engine.new_task('anycast', 'Plugin', {'index': 2}, ['topic'],
+                                  delivery=ClientSelector.DELIVERY_ROUND_ROBIN)
+        assert engine.execute_many([broadcast, anycast]) == [True, True]
+        assert loader.results == []
+
+        clock.advance(10)
+        assert loader.results == [(1.0, 1), (1.0, 2), (3.0, -1)]
+        assert engine.task_queue.get_task_status(anycast) == engine.task_queue.TASK_RUNNING
+
+    def test_rate_limits(self):
+        """Test the messages over the rate limits are queued, not dropped"""
+
+        clock = VirtualClock()
+        transport = MemorySocketHandler(clock)
+        lab = FakeClient('lab', ['bulk', 'interactive'], lambda payload: None)
+        transport.add_client(lab)
+        transport.set_topic_rate('bulk', 10, 1)
+        transport.set_client_rate('lab', 100, 2)
+
+        for index in range(5):
+            transport.send_message('bulk', '{"id": "bulk%d"}' % index)
+        assert transport.send_many([('interactive', '{"id": "interactive"}', None, None)]) == [['lab']]
+        assert [json.loads(message)['id'] for message in lab.received] == ['bulk0', 'interactive']
+
+        received = []
+        for step in range(5):
+            clock.advance(0.1)
+            received.append(len(lab.received))
+        assert received == [3, 4, 5, 6, 6]
+
+        #The client limit paces the messages allowed by the topic limit
+        transport.set_topic_rate('bulk', 0)
+        transport.send_many([('bulk', '{"id": "burst%d"}' % index, None, None) for index in range(4)])
+        assert len(lab.received) == 8
+        clock.advance(0.01)
+        assert len(lab.received) == 9
+        clock.advance(0.01)
+        assert len(lab.received) == 10 and transport.rate_limiter.queued == 0
+
+    def test_load_reports(self):
+        """Test the least loaded tasks are dispatched within the client capacity"""
+
+        clock = VirtualClock()
+        transport = MemorySocketHandler(clock)
+        #Until they report, the clients are assumed to run one task at once
+        transport.client_selector.load_table.capacity = 1
+        big = FakeClient('big', ['topic'], latency=1.0, capacity=4)
+        small = FakeClient('small', ['topic'], latency=1.0, capacity=1)
+        transport.add_client(big)
+        transport.add_client(small)
+        loader = RecordingLoader(clock)
+        engine = ExecutionEngine(MessageDispatcher(transport), loader)
+        engine.clock = clock
+
+        for index in range(12):
+            engine.new_task('task%d' % index, 'Plugin', {'index': index}, ['topic'],
+                            delivery=ClientSelector.DELIVERY_LEAST_LOADED)
+        waves = []
+        while len(loader.results) < 12:
+            engine.cycle_tasks()
+            waves.append(len(big.received) + len(small.received))
+            clock.run_next()
+
+        #No task waited on a client, every one took the client latency
+        assert waves == [2, 7, 12]
+        assert [result[0] for result in loader.results] == [1.0] * 2 + [2.0] * 5 + [3.0] * 5
+        assert (len(big.received), len(small.received)) == (9, 3)
+        assert transport.client_selector.load_table.get_load('big') == (0, None, 4)
+
+        with pytest.raises(ValueError):
+            FakeClient('none', ['topic'], capacity=0)
+
+    def test_speculation(self):
+        """Test only the first reply of a speculated task is taken"""
+
+        clock = VirtualClock()
+        transport = MemorySocketHandler(clock)
+        transport.add_client(FakeClient('slow', ['topic'], lambda payload: 'slow', 10.0))
+        transport.add_client(FakeClient('fast', ['topic'], lambda payload: 'fast', 1.0))
+        loader = RecordingLoader(clock)
+        engine = ExecutionEngine(MessageDispatcher(transport), loader)
+        engine.clock = clock
+        engine.speculation_factor = 2
+        for sample in range(10):
+            engine.run_times.add('Plugin', 1.0)
+        #A message registered by someone else stays registered
+        engine.message_dispatcher.register_message('Plugin', {'index': 0}, ['topic'])
+
+        task = engine.new_task('task', 'Plugin', {'index': 1}, ['topic'],
+                               delivery=ClientSelector.DELIVERY_ROUND_ROBIN)
+        assert engine.execute_many([task]) == [True]
+        clock.advance(2.5)
+        engine.check_deadlines()
+        assert engine.message_dispatcher.message_exists('Plugin')
+        clock.advance(1)
+        assert loader.results == [(3.5, 'fast')]
+
+        engine.update_task(task, engine.task_queue.TASK_COMPLETE)
+        assert task not in engine.speculated and engine.message_map == {}
+        clock.advance(10)
+        assert loader.results == [(3.5, 'fast')]
+        #The reply of the slow copy isn't kept waiting for a mapping
+        assert engine.early_replies == {}
+
+    def test_headroom_coalesced(self):
+        """Test the coalesced tasks don't take up the client headroom"""
+
+        clock = VirtualClock()
+        transport = MemorySocketHandler(clock)
+        transport.client_selector.load_table.capacity = 1
+        transport.add_client(FakeClient('solo', ['topic'], latency=1.0))
+        engine = ExecutionEngine(MessageDispatcher(transport), RecordingLoader(clock))
+        engine.clock = clock
+        engine.coalesce = True
+
+        tasks = [engine.new_task('task%d' % index, 'Plugin', {'index': index // 3}, ['topic'],
+                                 delivery=ClientSelector.DELIVERY_LEAST_LOADED) for index in range(4)]
+        assert engine.execute_many(tasks) == [True, True, True, False]
+
+    def test_recovered_followers(self, tmpdir):
+        """Test the coalesced followers complete with their recovered leader"""
+
+        clock = VirtualClock()
+        transport = MemorySocketHandler(clock)
+        transport.add_client(FakeClient('agent', ['topic'], latency=10.0))
+        journal = TaskJournal(str(tmpdir), snapshot_records=0)
+        engine = ExecutionEngine(MessageDispatcher(transport), RecordingLoader(clock), journal=journal)
+        engine.coalesce = True
+        leader, follower = [engine.new_task('task%d' % index, 'Plugin', {'index': 1}, ['topic'])
+                            for index in range(2)]
+        assert engine.execute_many([leader, follower]) == [True, True]
+        journal.close()
+
+        transport = MemorySocketHandler(clock)
+        agent = FakeClient('agent', ['topic'], latency=10.0)
+        transport.add_client(agent)
+        journal = TaskJournal(str(tmpdir), snapshot_records=0)
+        engine = ExecutionEngine(MessageDispatcher(transport), RecordingLoader(clock), journal=journal)
+        engine.coalesce = True
+        assert engine.task_queue.get_task_status(follower) == engine.task_queue.TASK_QUEUED
+        assert engine.execute_many([follower]) == [True] and agent.received == []
+
+        engine.update_task(leader, engine.task_queue.TASK_COMPLETE)
+        assert engine.task_queue.get_task_status(follower) == engine.task_queue.TASK_COMPLETE
+        journal.close()
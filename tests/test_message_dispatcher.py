@@ -0,0 +1,55 @@
+'''
+File: test_message_dispatcher.py
+Description: Test the message dispatch over the in-memory transport
+Date: 19/10/2026
+Author: Saurabh Badhwar <sbadhwar@redhat.com>
+'''
+from bolt_server.memory_transport import MemorySocketHandler, FakeClient, VirtualClock
+from bolt_server.message_dispatcher import MessageDispatcher
+import json
+import pytest
+
+class TestMessageDispatcher(object):
+    """Test the batch dispatch of the messages"""
+
+    def get_dispatcher(self):
+        """Get a dispatcher over a transport with two silent clients
+
+        Returns:
+            Tuple (dispatcher, first client, second client)
+        """
+
+        transport = MemorySocketHandler(VirtualClock())
+        first = FakeClient('first', ['a'], lambda payload: None)
+        second = FakeClient('second', ['a', 'b'], lambda payload: None)
+        transport.add_client(first)
+        transport.add_client(second)
+        return MessageDispatcher(transport), first, second
+
+    def test_send_many(self):
+        """Test the messages which can't reach all their topics get no id"""
+
+        dispatcher, first, second = self.get_dispatcher()
+        dispatcher.register_message('Both', {'index': 0}, ['a', 'b'])
+        dispatcher.register_message('Partial', {'index': 0}, ['b', 'missing'])
+
+        message_ids = dispatcher.send_many([('Both', {'index': 1}, None, None, None),
+                                            ('Partial', {'index': 2}, None, None, None),
+                                            ('Partial', {'index': 3}, None, None, ['b'])])
+        assert message_ids[0] is not None and message_ids[1] is None and message_ids[2] is not None
+        assert sorted(dispatcher.get_recipients(message_ids[0])) == ['first', 'second', 'second']
+        assert dispatcher.get_recipients(message_ids[2]) == ['second']
+
+        #The message which failed on a topic still reached the other one
+        assert [json.loads(message)['payload']['index'] for message in second.received] == [1, 1, 2, 3]
+        assert [json.loads(message)['payload']['index'] for message in first.received] == [1]
+
+    def test_send_many_validation(self):
+        """Test nothing is sent once a message of the batch is invalid"""
+
+        dispatcher, first, second = self.get_dispatcher()
+        dispatcher.register_message('Message', {'index': 0}, ['a'])
+        with pytest.raises(KeyError):
+            dispatcher.send_many([('Message', {'index': 1}, None, None, None),
+                                  ('Message', {'unknown': 2}, None, None, None)])
+        assert first.received == [] and second.received == []
@@ -0,0 +1,33 @@
+'''
+File: test_message_schema.py
+Description: Test the compiled message schemas
+Date: 19/10/2026
+Author: Saurabh Badhwar <sbadhwar@redhat.com>
+'''
+from bolt_server.message_dispatcher.structures import MessageSchema
+import json
+import pytest
+
+class TestMessageSchema(object):
+    """Test the validation and the packet building of the message schemas"""
+
+    def test_build(self):
+        """Test every packet is built fresh from the structure defaults"""
+
+        structure = {'path': '/', 'depth': 1, 'tags': []}
+        schema = MessageSchema(structure)
+        first_id, first = schema.build({'path': '/var\n', 'tags': ['a']})
+        second_id, second = schema.build({'depth': 2})
+
+        assert json.loads(first) == {'id': first_id, 'payload': {'path': '/var\n', 'depth': 1, 'tags': ['a']}}
+        assert json.loads(second)['payload'] == {'path': '/', 'depth': 2, 'tags': []}
+        assert first_id != second_id
+        assert structure == {'path': '/', 'depth': 1, 'tags': []}
+
+    def test_validate(self):
+        """Test the params outside of the structure are rejected"""
+
+        schema = MessageSchema({'path': '/'})
+        schema.validate({'path': '/tmp'})
+        with pytest.raises(KeyError):
+            schema.validate({'path': '/tmp', 'mode': 'r'})
@@ -0,0 +1,92 @@
+'''
+File: test_metrics.py
+Description: Test the metrics registry and the metric types
+Date: 19/10/2026
+Author: Saurabh Badhwar <sbadhwar@redhat.com>
+'''
+from bolt_server.metrics import MetricsRegistry, MetricsServer, Histogram
+import pytest
+import urllib2
+
+class TestMetrics(object):
+    """Test the metrics and their Prometheus rendering"""
+
+    def test_histogram(self):
+        """Test the histogram buckets bound the observed values"""
+
+        histogram = Histogram()
+        for value in range(1, 1001):
+            histogram.observe(value / 1000.0)
+        histogram.observe(0)
+
+        assert histogram.count == 1001
+        for percentile in (50, 90, 99):
+            bound = histogram.get_percentile(percentile)
+            assert percentile / 100.0 <= bound <= percentile / 100.0 * 1.25
+        assert Histogram().get_percentile(50) is None
+
+    def test_render(self):
+        """Test the metrics are rendered in the Prometheus text format"""
+
+        registry = MetricsRegistry()
+        registry.counter('sent_total', 'Sent messages', {'topic': 'a"b'}).inc(3)
+        registry.gauge('clients', 'Connected clients', function=lambda: 7)
+        registry.histogram('latency_seconds', 'Latency').observe(0.7)
+        assert registry.counter('sent_total', 'Sent messages', {'topic': 'a"b'}).get_value() == 3
+
+        lines = registry.render().split('\n')
+        assert '# TYPE sent_total counter' in lines
+        assert 'sent_total{topic="a\\"b"} 3' in lines
+        assert 'clients 7' in lines
+        assert 'latency_seconds_bucket{le="0.75"} 1' in lines
+        assert 'latency_seconds_bucket{le="+Inf"} 1' in lines
+        assert 'latency_seconds_count 1' in lines
+
+        with pytest.raises(RuntimeError):
+            registry.gauge('sent_total', 'Sent messages')
+
+    def test_disabled(self):
+        """Test the disabled registry ignores the updates"""
+
+        registry = MetricsRegistry(False)
+        registry.counter('sent_total', 'Sent messages').inc()
+        registry.histogram('latency_seconds', 'Latency').observe(1)
+        assert registry.render() == ''
+
+    def test_collector(self):
+        """Test the collected metrics are rendered along with the registry"""
+
+        registry = MetricsRegistry()
+        registry.counter('sent_total', 'Sent messages', {'topic': 'a'}).inc(2)
+        shard = MetricsRegistry()
+        shard.counter('sent_total', 'Sent messages', {'topic': 'a'}).inc(5)
+        shard.gauge('clients', 'Connected clients', function=lambda: 4)
+        registry.add_collector(lambda: [(name, metric_type, help_text,
+                                         [(labels + (('shard', '0'),), samples) for labels, samples in children])
+                                        for name, metric_type, help_text, children in shard.collect()])
+
+        lines = registry.render().split('\n')
+        assert lines.count('# TYPE sent_total counter') == 1
+        assert 'sent_total{topic="a"} 2' in lines
+        assert 'sent_total{topic="a",shard="0"} 5' in lines
+        assert 'clients{shard="0"} 4' in lines
+
+    def test_server(self):
+        """Test the metrics are scraped over HTTP"""
+
+        registry = MetricsRegistry()
+        counter = registry.counter('sent_total', 'Sent messages')
+        counter.increment()
+        counter.inc(2)
+        server = MetricsServer(registry, '127.0.0.1', 0)
+        try:
+            url = 'http://127.0.0.1:%d' % server.get_port()
+            response = urllib2.urlopen(url + '/metrics', timeout=5)
+            assert response.info()['Content-Type'] == MetricsRegistry.CONTENT_TYPE
+            assert 'sent_total 3' in response.read().split('\n')
+
+            with pytest.raises(urllib2.HTTPError) as error:
+                urllib2.urlopen(url + '/missing', timeout=5)
+            assert error.value.code == 404
+        finally:
+            server.stop()
@@ -0,0 +1,91 @@
+'''
+File: test_profiler.py
+Description: Test the sampling profiler
+Date: 19/10/2026
+Author: Saurabh Badhwar <sbadhwar@redhat.com>
+'''
+from bolt_server.profiler import SamplingProfiler, FoldedStacks
+import os
+import signal
+import sys
+import threading
+import time
+import pytest
+
+def busy_handler(stop):
+    """Spin until stopped"""
+
+    while not stop.is_set():
+        sum(range(100))
+
+class TestProfiler(object):
+    """Test the sampling and the folded stacks"""
+
+    def test_folded_stacks(self):
+        """Test the stacks are rooted at the thread and counted"""
+
+        stacks = FoldedStacks()
+        frame = sys._getframe()
+        stacks.add('main', frame)
+        stacks.add('main', frame)
+        stacks.add('other;thread', frame)
+
+        folded = stacks.get_folded()
+        assert stacks.samples == 3 and len(folded) == 2
+        assert folded[0].startswith('main;') and folded[0].endswith(' 2')
+        assert 'test_folded_stacks (test_profiler.py:' in folded[0]
+        assert folded[1].startswith('other:thread;')
+
+    def test_sampling(self):
+        """Test the threads are sampled while the profiler runs"""
+
+        stop = threading.Event()
+        worker = threading.Thread(target=busy_handler, args=(stop,), name='bolt-receiver')
+        worker.start()
+        profiler = SamplingProfiler(0.001)
+        try:
+            assert profiler.start() and not profiler.start()
+            time.sleep(0.2)
+            assert profiler.stop() and not profiler.stop()
+        finally:
+            stop.set()
+            worker.join()
+
+        folded = profiler.get_folded()
+        assert [line for line in folded if line.startswith('bolt-receiver;') and 'busy_handler' in line] != []
+        assert [line for line in folded if line.startswith('bolt-profiler;')] == []
+        assert profiler.get_stats()['samples'] > 0
+
+    def test_profile_seconds(self):
+        """Test the profiling time is checked and the profiler always stops"""
+
+        profiler = SamplingProfiler(0.001)
+        with pytest.raises(ValueError):
+            profiler.profile(float('inf'))
+        with pytest.raises(ValueError):
+            profiler.profile(float('nan'))
+        assert not profiler.is_running()
+        profiler.profile(-1)
+        assert not profiler.is_running()
+
+    def test_signal(self, tmpdir):
+        """Test the signal toggles the profiler and writes the stacks"""
+
+        output = str(tmpdir.join('profile-%(pid)d.folded'))
+        profiler = SamplingProfiler(0.001, output)
+        profiler.install_signal(signal.SIGUSR2)
+        try:
+            os.kill(os.getpid(), signal.SIGUSR2)
+            deadline = time.time() + 5
+            while not profiler.is_running() and time.time() < deadline:
+                time.sleep(0.01)
+            time.sleep(0.1)
+            os.kill(os.getpid(), signal.SIGUSR2)
+            path = output % {'pid': os.getpid()}
+            while not os.path.exists(path) and time.time() < deadline:
+                time.sleep(0.01)
+        finally:
+            signal.signal(signal.SIGUSR2, signal.SIG_DFL)
+
+        assert not profiler.is_running()
+        assert '\nMainThread;' in '\n' + open(path).read()
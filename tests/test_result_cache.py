@@ -0,0 +1,44 @@
+'''
+File: test_result_cache.py
+Description: Test the result cache of the idempotent tasks
+Date: 19/10/2026
+Author: Saurabh Badhwar <sbadhwar@redhat.com>
+'''
+from bolt_server.execution_engine import ResultCache
+import pytest
+
+class TestResultCache(object):
+    """Test the expiry and the eviction of the cached results"""
+
+    def test_key(self):
+        """Test the key doesn't depend on the parameter and topic order"""
+
+        assert ResultCache.get_key('facts', {'a': 1, 'b': 2}, ['x', 'y']) == \
+            ResultCache.get_key('facts', {'b': 2, 'a': 1}, ['y', 'x'])
+        assert ResultCache.get_key('facts', {'a': 1}, ['x']) != ResultCache.get_key('facts', {'a': 2}, ['x'])
+        assert ResultCache.get_key('facts', {'a': 1}, ['x'], 1) != ResultCache.get_key('facts', {'a': 1}, ['x'])
+
+    def test_expiry(self):
+        """Test the results expire after their time to live"""
+
+        cache = ResultCache()
+        cache.put('key', ['result'], 10, 0)
+        assert cache.get('key', 5) == ['result']
+        assert cache.get('key', 10) is None
+        stats = cache.get_stats()
+        assert (stats['hits'], stats['misses'], stats['expirations'], stats['entries']) == (1, 1, 1, 0)
+
+    def test_eviction(self):
+        """Test the least recently used results are evicted over the limits"""
+
+        cache = ResultCache(max_entries=2, max_size=100)
+        cache.put('a', ['a'], 10, 0)
+        cache.put('b', ['b'], 10, 0)
+        cache.get('a', 0)
+        cache.put('c', ['c'], 10, 0)
+        assert cache.get('b', 0) is None
+        assert cache.get('a', 0) == ['a']
+
+        assert not cache.put('large', ['x' * 100], 10, 0)
+        cache.put('d', ['x' * 95], 10, 0)
+        assert cache.get_stats()['entries'] == 1
@@ -0,0 +1,65 @@
+'''
+File: test_result_store.py
+Description: Test the append only result store
+Date: 19/10/2026
+Author: Saurabh Badhwar <sbadhwar@redhat.com>
+'''
+from bolt_server.result_store import ResultStore
+import os
+import pytest
+
+class TestResultStore(object):
+    """Test the storage and the queries of the results"""
+
+    def test_queries(self, tmpdir):
+        """Test the results are queried by task, client and time"""
+
+        store = ResultStore(str(tmpdir), 100)
+        store.append('task1', 'a', {'value': 1}, 10.0)
+        store.append('task1', 'b', {'value': 2}, 11.0)
+        store.append('task2', 'a', [3], 12.0)
+        store.append('task3', None, 'x' * 200, 13.0)
+
+        assert len(os.listdir(str(tmpdir))) > 1
+        assert list(store.get_task_results('task1')) == [(10.0, 'task1', 'a', {'value': 1}),
+                                                          (11.0, 'task1', 'b', {'value': 2})]
+        assert [result[3] for result in store.get_client_results('a')] == [{'value': 1}, [3]]
+        assert [result[0] for result in store.get_results(11.0, 13.0)] == [11.0, 12.0]
+        assert list(store.get_task_results('task3')) == [(13.0, 'task3', None, 'x' * 200)]
+        assert list(store.get_task_results('missing')) == []
+        store.close()
+
+    def test_reopen(self, tmpdir):
+        """Test the index is rebuilt and a torn record is dropped on open"""
+
+        store = ResultStore(str(tmpdir))
+        store.append('task1', 'a', 1, 10.0)
+        store.append('task2', 'b', 2, 11.0)
+        store.close()
+
+        path = os.path.join(str(tmpdir), ResultStore.SEGMENT_FORMAT % 0)
+        with open(path, 'rb+') as segment:
+            segment.truncate(os.path.getsize(path) - 1)
+
+        store = ResultStore(str(tmpdir))
+        assert list(store.get_task_results('task2')) == []
+        store.append('task3', 'a', 3, 12.0)
+        assert [result[1] for result in store.get_client_results('a')] == ['task1', 'task3']
+        store.close()
+
+    def test_index_bound(self, tmpdir):
+        """Test the index keeps the newest results in the time order"""
+
+        store = ResultStore(str(tmpdir), index_size=10)
+        for index in range(20):
+            store.append('task%d' % (index % 3), 'a', index, float(index))
+        store.append('late', 'b', 'late', 15.5)
+
+        assert [result[0] for result in store.get_results(0.0, 100.0)] == \
+            [12.0, 13.0, 14.0, 15.0, 15.5, 16.0, 17.0, 18.0, 19.0]
+        assert [result[3] for result in store.get_results(15.0, 16.0)] == [15, 'late']
+        assert [result[3] for result in store.get_task_results('task0')] == [12, 15, 18]
+        assert [result[0] for result in store.get_client_results('a')][0] == 12.0
+        assert list(store.get_task_results('task1')) == [(13.0, 'task1', 'a', 13), (16.0, 'task1', 'a', 16),
+                                                          (19.0, 'task1', 'a', 19)]
+        store.close()
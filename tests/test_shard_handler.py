@@ -0,0 +1,148 @@
+'''
+File: test_shard_handler.py
+Description: Test the multi process sharded socket handler
+Date: 19/10/2026
+Author: Saurabh Badhwar <sbadhwar@redhat.com>
+'''
+from bolt_server.shard_handler import ShardedSocketHandler, ControlChannel, ShardTable
+from bolt_server.socket_handler import ClientSelector
+import json
+import os
+import pytest
+import signal
+import socket
+import time
+
+def wait_for(condition, timeout=5):
+    """Wait for the condition to hold
+
+    Returns: Bool
+    """
+
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+def connect(port, topics, name):
+    """Connect a client to the shards once they listen
+
+    Returns: socket
+    """
+
+    for attempt in range(100):
+        client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        if client.connect_ex(('127.0.0.1', port)) == 0:
+            client.sendall('%s:%s' % (','.join(topics), name))
+            return client
+        client.close()
+        time.sleep(0.01)
+    raise RuntimeError("The shards are not listening")
+
+class TestControlChannel(object):
+    """Test the framing of the control channel"""
+
+    def test_frames(self):
+        """Test the frames are received whole and in order"""
+
+        parent, child = socket.socketpair()
+        sender = ControlChannel(parent)
+        receiver = ControlChannel(child)
+
+        sender.send_frame(ControlChannel.OP_SEND, 'topic', 'x' * 100000)
+        sender.send_frame(ControlChannel.OP_STOP)
+        assert receiver.recv_frame() == (ControlChannel.OP_SEND, 'topic', 'x' * 100000)
+        assert receiver.recv_frame() == (ControlChannel.OP_STOP, '', '')
+
+        sender.close()
+        assert receiver.recv_frame() is None
+        with pytest.raises(RuntimeError):
+            sender.send_frame(ControlChannel.OP_SEND, 'topic', 'message')
+        receiver.close()
+
+    def test_delivery(self):
+        """Test the delivery options are packed along with the message"""
+
+        payload = ControlChannel.pack_delivery(ClientSelector.DELIVERY_CONSISTENT_HASH, 42, '{"id": 1}')
+        assert ControlChannel.unpack_delivery(payload) == (ClientSelector.DELIVERY_CONSISTENT_HASH, '42', '{"id": 1}')
+        payload = ControlChannel.pack_delivery(ClientSelector.DELIVERY_ROUND_ROBIN, None, '')
+        assert ControlChannel.unpack_delivery(payload) == (ClientSelector.DELIVERY_ROUND_ROBIN, None, '')
+
+class TestShardTable(object):
+    """Test the tracking of the topics held by the shards"""
+
+    def test_topics(self):
+        """Test the shards are added and removed per topic"""
+
+        table = ShardTable()
+        table.add_shard('cpu', 0)
+        table.add_shard('cpu', 1)
+        table.add_shard('disk', 1)
+        assert sorted(table.get_shards('cpu')) == [0, 1]
+        assert sorted(table.get_topics()) == ['cpu', 'disk']
+
+        table.remove_shard('cpu', 0)
+        assert table.get_shards('cpu') == [1]
+        table.remove_shard('disk', 1)
+        assert table.get_shards('disk') == [] and table.get_topics() == ['cpu']
+
+    def test_patterns(self):
+        """Test the shards holding a matching pattern are included"""
+
+        table = ShardTable()
+        table.add_shard('dc1.#', 0)
+        table.add_shard('dc1.rack4', 1)
+        assert sorted(table.get_shards('dc1.rack4')) == [0, 1]
+        assert table.get_shards('dc1.rack5') == [0]
+        assert table.get_shards('dc2.rack4') == []
+
+        table.remove_shard('dc1.#', 0)
+        assert table.get_shards('dc1.rack5') == []
+
+    def test_drop_shard(self):
+        """Test a shard which went away is removed from all its topics"""
+
+        table = ShardTable()
+        table.add_shard('cpu', 0)
+        table.add_shard('cpu', 1)
+        table.add_shard('dc1.#', 1)
+        assert table.drop_shard(1) == ['dc1.#']
+        assert table.get_shards('cpu') == [0] and table.get_shards('dc1.x') == []
+
+class TestShardedSocketHandler(object):
+    """Test the delivery through the shard processes"""
+
+    def test_round_trip(self, monkeypatch):
+        """Test a message reaches a client held by a shard and is replied"""
+
+        monkeypatch.setenv('BOLT_SERVER_PORT', '5010')
+        received = []
+        topics = []
+        handler = ShardedSocketHandler(2)
+        handler.register_handler(received.append)
+        handler.register_topic_listener(lambda topic, active: topics.append((topic, active)))
+        try:
+            client = connect(5010, ['shard.test'], 'agent')
+            assert wait_for(lambda: handler.get_topics() == ['shard.test'])
+            assert topics == [('shard.test', True)]
+
+            handler.send_message('shard.test', '{"id": "m1"}')
+            client.settimeout(5)
+            assert client.recv(1024).startswith('{"id": "m1"}')
+            client.sendall('{"id": "m1", "result": 1}\n')
+            assert wait_for(lambda: received != [])
+            assert json.loads(received[0]) == {'id': 'm1', 'result': 1, 'client': 'agent'}
+
+            with pytest.raises(RuntimeError):
+                handler.send_message('missing', '{"id": "m2"}')
+
+            #The topics of a shard which died are no longer routed to it
+            shard = handler.shard_table.get_shards('shard.test')[0]
+            os.kill(handler.pids[shard], signal.SIGKILL)
+            assert wait_for(lambda: handler.get_topics() == [])
+            assert topics[-1] == ('shard.test', False)
+            client.close()
+        finally:
+            handler.stop_listening()
@@ -5,30 +5,218 @@ Date: 01/10/2017
 Author: Saurabh Badhwar <sbadhwar@redhat.com>
 '''
 from bolt_server.socket_handler import SocketHandler
+import json
 import os
 import pytest
 import socket
+import time
+
+def connect(family, address):
+    """Connect to the socket handler once it listens
+
+    Returns:
+        Tuple (return code of the last attempt, socket)
+    """
+
+    for attempt in range(100):
+        test_socket = socket.socket(family, socket.SOCK_STREAM)
+        ret_code = test_socket.connect_ex(address)
+        if ret_code == 0:
+            break
+        test_socket.close()
+        time.sleep(0.01)
+    return ret_code, test_socket
+
+def wait_for(condition):
+    """Wait for up to a second for the condition to hold"""
+
+    for attempt in range(100):
+        if condition():
+            return
+        time.sleep(0.01)
 
 class TestSocketHandler(object):
     """Test the execution of Socket Handler"""
 
-    def test_default_socket(self):
+    def test_default_socket(self, monkeypatch):
         """Test the default opening of the SocketHandler"""
 
-        socket_handler = SocketHandler('print')
-        test_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        ret_code = test_socket.connect_ex(('127.0.0.1', 5200))
-        test_socket.sendall('Test: Pytest')
+        monkeypatch.delenv('BOLT_SERVER_PORT', raising=False)
+        socket_handler = SocketHandler()
+        ret_code, test_socket = connect(socket.AF_INET, ('127.0.0.1', 5200))
+        test_socket.sendall('Test:Pytest')
+        wait_for(lambda: socket_handler.client_list.get_clients('Test'))
         socket_handler.stop_listening()
         assert ret_code == 0
+        assert socket_handler.client_list.get_clients('Test') != []
 
-    def test_custom_socket(self):
+    def test_custom_socket(self, monkeypatch):
         """Test SocketHandler for custom port"""
 
-        os.environ['BOLT_SERVER_PORT'] = "5000"
-        socket_handler = SocketHandler('print')
-        test_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        ret_code = test_socket.connect_ex(('127.0.0.1', 5000))
-        test_socket.sendall('Test: Pytest')
+        monkeypatch.setenv('BOLT_SERVER_PORT', '5000')
+        socket_handler = SocketHandler()
+        ret_code, test_socket = connect(socket.AF_INET, ('127.0.0.1', 5000))
+        test_socket.sendall('Test:Pytest')
         socket_handler.stop_listening()
         assert ret_code == 0
+
+    def test_message_framing(self, monkeypatch):
+        """Test the newline terminated messages are split"""
+
+        monkeypatch.setenv('BOLT_SERVER_PORT', '5002')
+        received = []
+        socket_handler = SocketHandler()
+        socket_handler.register_handler(received.append)
+        ret_code, test_socket = connect(socket.AF_INET, ('127.0.0.1', 5002))
+        test_socket.sendall('Test:Pytest')
+        wait_for(lambda: socket_handler.client_list.get_clients('Test'))
+
+        test_socket.sendall('first\nsec')
+        wait_for(lambda: received == ['first'])
+        test_socket.sendall('ond\nthird\n')
+        wait_for(lambda: len(received) == 3)
+        test_socket.sendall('{"id": 1, "client": "spoofed"}\n')
+        wait_for(lambda: len(received) == 4)
+        socket_handler.stop_listening()
+        assert received[:3] == ['first', 'second', 'third']
+        #The replies carry the name from the handshake
+        assert json.loads(received[3]) == {'id': 1, 'client': 'Pytest'}
+
+    def test_unix_socket(self, tmpdir, monkeypatch):
+        """Test the local clients connecting over the unix domain socket"""
+
+        monkeypatch.setenv('BOLT_SERVER_PORT', '5001')
+        unix_path = str(tmpdir.join('bolt.sock'))
+        socket_handler = SocketHandler(unix_path=unix_path)
+        ret_code, test_socket = connect(socket.AF_UNIX, unix_path)
+        test_socket.sendall('Test:Pytest')
+        wait_for(lambda: socket_handler.client_list.get_clients('Test'))
+        socket_handler.send_message('Test', 'ping')
+        assert test_socket.recv(100) == 'ping\n'
+        socket_handler.stop_listening()
+
+    def test_handshake_timeout(self, monkeypatch):
+        """Test a client without a handshake doesn't hold up the others"""
+
+        monkeypatch.setenv('BOLT_SERVER_PORT', '5004')
+        monkeypatch.setenv('BOLT_HANDSHAKE_TIMEOUT', '0.3')
+        socket_handler = SocketHandler()
+        ret_code, silent_socket = connect(socket.AF_INET, ('127.0.0.1', 5004))
+        ret_code, invalid_socket = connect(socket.AF_INET, ('127.0.0.1', 5004))
+        invalid_socket.sendall('invalid')
+        ret_code, test_socket = connect(socket.AF_INET, ('127.0.0.1', 5004))
+        test_socket.sendall('Test:Pytest')
+        wait_for(lambda: socket_handler.client_list.get_clients('Test'))
+        assert socket_handler.client_list.get_clients('Test') != []
+        assert invalid_socket.recv(100) == ''
+
+        silent_socket.settimeout(2)
+        assert silent_socket.recv(100) == ''
+        assert socket_handler.handshaking == set()
+        socket_handler.stop_listening()
+
+    def test_admission(self, monkeypatch):
+        """Test the connections over the limits are shed with a retry hint"""
+
+        monkeypatch.setenv('BOLT_SERVER_PORT', '5005')
+        monkeypatch.setenv('BOLT_MAX_CONNECTIONS', '2')
+        monkeypatch.setenv('BOLT_ACCEPT_RATE', '1')
+        monkeypatch.setenv('BOLT_ACCEPT_BURST', '1')
+        monkeypatch.setenv('BOLT_RETRY_AFTER', '0.5')
+        socket_handler = SocketHandler()
+        ret_code, test_socket = connect(socket.AF_INET, ('127.0.0.1', 5005))
+        test_socket.sendall('Test:Pytest')
+        wait_for(lambda: socket_handler.client_list.get_clients('Test'))
+
+        hints = []
+        for attempt in range(2):
+            ret_code, shed_socket = connect(socket.AF_INET, ('127.0.0.1', 5005))
+            shed_socket.settimeout(2)
+            hints.append(json.loads(shed_socket.recv(100))['retry_after'])
+            assert shed_socket.recv(100) == ''
+        #The second shed client gets the slot after the first one
+        assert 0.5 <= hints[0] <= 1 and hints[1] == pytest.approx(hints[0] + 1, abs=0.1)
+
+        socket_handler.max_connections = 1
+        socket_handler.accept_bucket = None
+        ret_code, shed_socket = connect(socket.AF_INET, ('127.0.0.1', 5005))
+        shed_socket.settimeout(2)
+        assert 0.5 <= json.loads(shed_socket.recv(100))['retry_after'] <= 1
+        assert socket_handler.client_list.get_clients('Test') != []
+        socket_handler.stop_listening()
+
+    def test_admission_burst(self, monkeypatch):
+        """Test the connection limit holds for the connections accepted at once"""
+
+        monkeypatch.setenv('BOLT_SERVER_PORT', '5006')
+        monkeypatch.setenv('BOLT_MAX_CONNECTIONS', '3')
+        monkeypatch.setenv('BOLT_RETRY_AFTER', '0.5')
+        socket_handler = SocketHandler()
+        #Hold the listener in the admission of the first connection, so the
+        #others pile up in the backlog and are accepted in the same batch
+        sockets = []
+        with socket_handler.admission_lock:
+            for attempt in range(10):
+                ret_code, burst_socket = connect(socket.AF_INET, ('127.0.0.1', 5006))
+                burst_socket.settimeout(2)
+                sockets.append(burst_socket)
+            time.sleep(0.2)
+
+        hints = 0
+        for burst_socket in sockets[3:]:
+            hints = hints + ('retry_after' in json.loads(burst_socket.recv(100)))
+        assert hints == 7
+        assert len(socket_handler.handshaking) == 3
+        socket_handler.stop_listening()
+
+    def test_send_many(self, monkeypatch):
+        """Test a batch is written once per client and the failures are reported"""
+
+        monkeypatch.setenv('BOLT_SERVER_PORT', '5007')
+        socket_handler = SocketHandler()
+        ret_code, first_socket = connect(socket.AF_INET, ('127.0.0.1', 5007))
+        first_socket.sendall('a:first')
+        ret_code, second_socket = connect(socket.AF_INET, ('127.0.0.1', 5007))
+        second_socket.sendall('a,b:second')
+        wait_for(lambda: len(socket_handler.client_list.get_clients('a') or []) == 2 and
+                 socket_handler.client_list.get_clients('b'))
+
+        sent = socket_handler.send_many([('a', 'one', None, None), ('missing', 'two', None, None),
+                                         ('b', 'three', None, None)])
+        assert sorted(sent[0]) == ['first', 'second']
+        assert sent[1:] == [None, ['second']]
+
+        second_socket.settimeout(2)
+        data = ''
+        while data.count('\n') < 2:
+            data = data + second_socket.recv(100)
+        assert data == 'one\nthree\n'
+        first_socket.settimeout(2)
+        assert first_socket.recv(100) == 'one\n'
+        socket_handler.stop_listening()
+
+    def test_session_resume(self, monkeypatch):
+        """Test a client reconnecting within the grace period gets the missed messages"""
+
+        monkeypatch.setenv('BOLT_SERVER_PORT', '5008')
+        monkeypatch.setenv('BOLT_SESSION_GRACE', '5')
+        socket_handler = SocketHandler()
+        ret_code, test_socket = connect(socket.AF_INET, ('127.0.0.1', 5008))
+        test_socket.sendall('resume:agent')
+        wait_for(lambda: socket_handler.client_list.get_clients('resume'))
+        test_socket.close()
+        wait_for(lambda: 'agent' in socket_handler.sessions)
+        assert socket_handler.client_conns == {}
+
+        #The session stands in for the client while it is away
+        socket_handler.send_message('resume', 'missed')
+        ret_code, test_socket = connect(socket.AF_INET, ('127.0.0.1', 5008))
+        test_socket.sendall('resume:agent')
+        test_socket.settimeout(2)
+        assert test_socket.recv(100) == 'missed\n'
+        wait_for(lambda: socket_handler.sessions == {})
+        socket_handler.send_message('resume', 'live')
+        assert test_socket.recv(100) == 'live\n'
+        assert len(socket_handler.client_list.get_clients('resume')) == 1
+        assert len(socket_handler.client_conns['agent']) == 1
+        socket_handler.stop_listening()
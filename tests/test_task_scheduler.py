@@ -0,0 +1,114 @@
+'''
+File: test_task_scheduler.py
+Description: Test the task scheduling and the task deadline tracking
+Date: 19/10/2026
+Author: Saurabh Badhwar <sbadhwar@redhat.com>
+'''
+from bolt_server.execution_engine import TaskQueue, TaskScheduler, DeadlineQueue, RunTimeTracker
+import pytest
+
+class TestTaskScheduler(object):
+    """Test the dispatch order of the task scheduler"""
+
+    def drain(self, scheduler):
+        """Get all the scheduled tasks in their dispatch order"""
+
+        tasks = []
+        task_id = scheduler.next_task()
+        while task_id is not None:
+            tasks.append(task_id)
+            task_id = scheduler.next_task()
+        return tasks
+
+    def test_priority(self):
+        """Test the higher priority classes are dispatched first"""
+
+        scheduler = TaskScheduler()
+        scheduler.add_task('low', TaskQueue.PRIORITY_LOW, 'a')
+        scheduler.add_task('normal', TaskQueue.PRIORITY_NORMAL, 'a')
+        scheduler.add_task('high', TaskQueue.PRIORITY_HIGH, 'b')
+        assert self.drain(scheduler) == ['high', 'normal', 'low']
+        assert len(scheduler) == 0
+
+    def test_fair_share(self):
+        """Test the tenants share the dispatch by their weights"""
+
+        scheduler = TaskScheduler()
+        scheduler.set_weight('b', 2)
+        for index in range(4):
+            scheduler.add_task('a%d' % index, TaskQueue.PRIORITY_NORMAL, 'a')
+        for index in range(4):
+            scheduler.add_task('b%d' % index, TaskQueue.PRIORITY_NORMAL, 'b')
+        assert not scheduler.add_task('a0', TaskQueue.PRIORITY_NORMAL, 'a')
+        assert self.drain(scheduler) == ['a0', 'b0', 'b1', 'a1', 'b2', 'b3', 'a2', 'a3']
+
+    def test_requeue(self):
+        """Test a task added again keeps its place until it is forgotten"""
+
+        scheduler = TaskScheduler()
+        for index in range(3):
+            scheduler.add_task('a%d' % index, TaskQueue.PRIORITY_NORMAL, 'a')
+        assert scheduler.next_task() == 'a0'
+        scheduler.add_task('a3', TaskQueue.PRIORITY_NORMAL, 'a')
+        #The dispatch of the task was deferred
+        scheduler.add_task('a0', TaskQueue.PRIORITY_NORMAL, 'a')
+        assert self.drain(scheduler) == ['a0', 'a1', 'a2', 'a3']
+
+        scheduler.forget_task('a1')
+        for task_id in ('a1', 'a2'):
+            scheduler.add_task(task_id, TaskQueue.PRIORITY_NORMAL, 'a')
+        assert self.drain(scheduler) == ['a2', 'a1']
+
+    def test_invalid_weight(self):
+        """Test a tenant weight has to be positive"""
+
+        with pytest.raises(ValueError):
+            TaskScheduler().set_weight('a', 0)
+
+class TestDeadlineQueue(object):
+    """Test the tracking of the task deadlines"""
+
+    def test_expiry(self):
+        """Test only the current deadlines expire, in their order"""
+
+        deadlines = DeadlineQueue()
+        deadlines.set_deadline('a', 5)
+        deadlines.set_deadline('b', 3)
+        deadlines.set_deadline('c', 1)
+        deadlines.set_deadline('a', 2)
+        deadlines.cancel('c')
+        assert deadlines.pop_expired(4) == ['a', 'b']
+        assert deadlines.pop_expired(10) == []
+        assert len(deadlines) == 0
+
+    def test_run_time_median(self):
+        """Test the median needs enough run times"""
+
+        tracker = RunTimeTracker(samples=5)
+        for run_time in [9, 1, 2, 3, 4, 5]:
+            tracker.add('plugin', run_time)
+        assert tracker.get_median('plugin', min_samples=5) == 3
+        assert tracker.get_median('other') is None
+
+class TestTaskQueue(object):
+    """Test the task status index of the task queue"""
+
+    def test_status_index(self):
+        """Test the tasks are looked up by their current status"""
+
+        task_queue = TaskQueue()
+        first = task_queue.queue_task('first', 'Inventory', {}, ['rhel8'])
+        second = task_queue.queue_task('second', 'Inventory', {}, ['rhel8'], priority=TaskQueue.PRIORITY_HIGH)
+        task_queue.change_task_status(first, TaskQueue.TASK_RUNNING)
+        assert task_queue.get_tasks_by_status(TaskQueue.TASK_QUEUED) == [second]
+        assert task_queue.get_tasks_by_status(TaskQueue.TASK_RUNNING) == [first]
+        assert task_queue.get_task_schedule(second) == (TaskQueue.PRIORITY_HIGH, 'Inventory')
+
+    def test_unique_ids(self):
+        """Test a large batch of tasks with the same name gets distinct ids"""
+
+        task_queue = TaskQueue()
+        for index in range(30000):
+            task_queue.queue_task('same', 'Inventory', {}, ['rhel8'])
+        assert len(task_queue.get_task_list()) == 30000
+        assert len(task_queue.get_tasks_by_status(TaskQueue.TASK_QUEUED)) == 30000
@@ -0,0 +1,119 @@
+'''
+File: test_timer_wheel.py
+Description: Test the timer wheel and the delayed and recurring tasks
+Date: 19/10/2026
+Author: Saurabh Badhwar <sbadhwar@redhat.com>
+'''
+from bolt_server.execution_engine import ExecutionEngine, TimerWheel
+from bolt_server.memory_transport import MemorySocketHandler, FakeClient, VirtualClock
+from bolt_server.message_dispatcher import MessageDispatcher
+from test_memory_transport import RecordingLoader
+import random
+import pytest
+
+class TestTimerWheel(object):
+    """Test the hierarchical timer wheel"""
+
+    def test_levels(self):
+        """Test the timers fire on their tick from every level"""
+
+        wheel = TimerWheel(1.0)
+        wheel.add('first', 2.5)
+        wheel.add('second', 5)
+        wheel.add('minutes', 300)
+        wheel.add('hours', 70000)
+        wheel.add('years', 5e9)
+        wheel.add('cancelled', 4)
+        assert wheel.cancel('cancelled') and not wheel.cancel('cancelled')
+        assert len(wheel) == 5
+
+        assert wheel.advance(2.9) == []
+        assert wheel.advance(10) == ['first', 'second']
+        assert wheel.advance(299.5) == []
+        assert wheel.advance(300) == ['minutes']
+        assert wheel.advance(1e6) == ['hours']
+        assert 'years' in wheel and wheel.advance(5e9) == ['years']
+        assert len(wheel) == 0
+
+        #A timer already due fires on the next advance
+        wheel.add('late', 100)
+        assert wheel.advance(5e9) == ['late']
+
+    def test_random(self):
+        """Test the timers are never fired early nor more than a tick late"""
+
+        rand = random.Random(1)
+        wheel = TimerWheel(0.1, 1000.0)
+        now = 1000.0
+        pending = {}
+        for step in range(2000):
+            if rand.random() < 0.6:
+                key = rand.randint(0, 1000)
+                pending[key] = now + rand.choice((1, 100, 100000)) * rand.random()
+                wheel.add(key, pending[key])
+                continue
+
+            now = now + rand.choice((0.05, 10, 1000)) * rand.random()
+            for key in wheel.advance(now):
+                assert pending.pop(key) <= now
+            assert min(pending.values() or [now + 1]) > now - 0.1
+        assert len(wheel) == len(pending)
+
+class TestScheduledTasks(object):
+    """Test the delayed and recurring tasks of the execution engine"""
+
+    def get_engine(self):
+        """Get an engine over the in-memory transport with a replying client"""
+
+        clock = VirtualClock()
+        transport = MemorySocketHandler(clock)
+        transport.add_client(FakeClient('client', ['topic'], lambda payload: payload['index']))
+        loader = RecordingLoader(clock)
+        engine = ExecutionEngine(MessageDispatcher(transport), loader)
+        engine.clock = clock
+        engine.timer_random = random.Random(1)
+        #The tasks are never completed, which would coalesce the next firings
+        engine.coalesce = False
+        return clock, engine, loader
+
+    def test_schedule(self):
+        """Test the delayed and recurring tasks are submitted on time"""
+
+        clock, engine, loader = self.get_engine()
+        engine.schedule_task({'task_name': 'delayed', 'plugin_name': 'Plugin', 'task_params': {'index': 1},
+                              'task_topics': ['topic']}, delay=5)
+        recurring = engine.schedule_task({'task_name': 'recurring', 'plugin_name': 'Plugin',
+                                          'task_params': {'index': 2}, 'task_topics': ['topic']},
+                                         interval=60, jitter=10)
+        with pytest.raises(ValueError):
+            engine.schedule_task({'task_name': 'never', 'plugin_name': 'Plugin', 'task_params': {'index': 3},
+                                  'task_topics': ['topic']}, interval=0)
+
+        for second in range(200):
+            clock.advance_to(second)
+            engine.cycle_tasks()
+        assert [when for when, result in loader.results if result == 1] == [5]
+        fired = [when for when, result in loader.results if result == 2]
+        assert len(fired) == 4 and len(set(fired)) == 4
+        for firing, when in enumerate(fired):
+            assert 60 * firing <= when <= 60 * firing + 11
+
+        assert engine.cancel_schedule(recurring) and not engine.cancel_schedule(recurring)
+        clock.advance_to(400)
+        engine.cycle_tasks()
+        assert len(loader.results) == 5 and engine.timed_tasks == {}
+
+    def test_missed_firings(self):
+        """Test the firings missed while the cycles didn't run are skipped"""
+
+        clock, engine, loader = self.get_engine()
+        engine.schedule_task({'task_name': 'recurring', 'plugin_name': 'Plugin', 'task_params': {'index': 1},
+                              'task_topics': ['topic']}, delay=10, interval=10)
+        clock.advance_to(1005)
+        engine.cycle_tasks()
+        clock.advance_to(1009)
+        engine.cycle_tasks()
+        clock.advance_to(1010)
+        engine.cycle_tasks()
+        clock.advance(1)
+        assert [when for when, result in loader.results] == [1005, 1010]
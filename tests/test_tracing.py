@@ -0,0 +1,64 @@
+'''
+File: test_tracing.py
+Description: Test the task lifecycle tracer
+Date: 19/10/2026
+Author: Saurabh Badhwar <sbadhwar@redhat.com>
+'''
+from bolt_server.tracing import Tracer
+import json
+import pytest
+
+class TestTracer(object):
+    """Test the recording and the export of the spans"""
+
+    def test_spans(self):
+        """Test the open spans are ended and the buffer is bounded"""
+
+        tracer = Tracer(True, 3)
+        tracer.begin('task1', 'queue', 1.0)
+        assert tracer.end('task1', 'queue', 3.0).get_duration() == 2.0
+        assert tracer.end('task1', 'queue') is None
+
+        tracer.begin('task1', 'agent', 4.0, {'attempt': 1})
+        tracer.begin('task1', 'handle', 5.0)
+        tracer.close('task1', {'status': 'halted'})
+        assert sorted(span.name for span in tracer.get_spans('task1')) == ['agent', 'handle', 'queue']
+        assert tracer.get_spans('task1')[1].attributes['status'] == 'halted'
+
+        tracer.record('task2', 'send', 6.0, 7.0)
+        assert len(tracer.get_spans()) == 3
+        assert tracer.get_summary()['send'] == {'count': 1, 'p50': 1.0, 'p99': 1.0}
+
+    def test_disabled(self):
+        """Test the disabled tracer records nothing"""
+
+        tracer = Tracer(False)
+        tracer.begin('task1', 'queue')
+        assert tracer.end('task1', 'queue') is None
+        assert tracer.record('task1', 'send', 1.0, 2.0) is None
+        assert tracer.get_spans() == []
+
+    def test_export(self, tmpdir):
+        """Test the Chrome and the OpenTelemetry exports"""
+
+        tracer = Tracer(True)
+        tracer.record('task1', 'serialize', 1.0, 1.5, {'message_id': 'm1'})
+        tracer.record('task1', 'send', 1.5, 2.0)
+        tracer.record('task2', 'send', 1.5, 2.0)
+
+        path = str(tmpdir.join('chrome.json'))
+        tracer.export_chrome(path)
+        events = json.load(open(path))['traceEvents']
+        spans = [event for event in events if event['ph'] == 'X']
+        assert [(span['name'], span['ts'], span['dur']) for span in spans] == \
+            [('serialize', 1000000, 500000), ('send', 1500000, 500000), ('send', 1500000, 500000)]
+        assert spans[0]['tid'] != spans[2]['tid']
+
+        path = str(tmpdir.join('otel.json'))
+        tracer.export_otel(path)
+        otel_spans = json.load(open(path))['resourceSpans'][0]['scopeSpans'][0]['spans']
+        assert len(otel_spans) == 5
+        root = otel_spans[0]
+        assert root['name'] == 'task' and 'parentSpanId' not in root
+        assert [span['parentSpanId'] for span in otel_spans[1:3]] == [root['spanId']] * 2
+        assert otel_spans[1]['traceId'] == root['traceId'] != otel_spans[3]['traceId']